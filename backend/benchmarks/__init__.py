@@ -0,0 +1,42 @@
+"""
+Benchmarks for HisabPro
+Run a module directly, e.g. ``python -m benchmarks.reconciliation``
+"""
+
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import django
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """Configure Django so benchmarks can import the app modules"""
+    sys.path.append(BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hisabpro.settings')
+    django.setup()
+
+
+def start_server(kind, port, workers, env=None):
+    """Serve the app with gunicorn over ``kind`` ('wsgi' or 'asgi') and wait until it answers"""
+    command = [sys.executable, '-m', 'gunicorn', f'hisabpro.{kind}:application', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--timeout', '120', '--log-level', 'warning']
+    if kind == 'asgi':
+        command += ['--worker-class', 'uvicorn.workers.UvicornWorker']
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env={**os.environ, 'DEBUG': 'False', **(env or {})})
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1)
+            return process
+        except urllib.error.HTTPError:
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{kind} server did not start on port {port}')
@@ -0,0 +1,172 @@
+"""
+WSGI vs ASGI load test
+Serves the app both ways against a stand-in PostgREST with fixed latency and reports concurrent throughput
+
+    python -m benchmarks.async_views --concurrency 50 --duration 15 --latency 0.1
+
+Both servers get the same number of workers. By default both hit the async detail view; pass
+--wsgi-path /api/supabase/invoices/{id}/ to measure the sync view on the WSGI side instead.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import httpx
+
+from benchmarks import setup_django, start_server
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+USERNAME = 'async-bench'
+
+
+class PostgREST(BaseHTTPRequestHandler):
+    """Just enough of PostgREST for the invoice reads: eq/in filters, order, limit/offset and exact counts"""
+
+    protocol_version = 'HTTP/1.1'
+    tables = {}
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+        table = url.path.rsplit('/', 1)[-1]
+        params = dict(parse_qsl(url.query))
+        rows = self.tables.get(table, [])
+        for column, condition in params.items():
+            operator, _, value = condition.partition('.')
+            if operator == 'eq':
+                rows = [row for row in rows if str(row.get(column)) == value]
+            elif operator == 'in':
+                wanted = set(value.strip('()').split(','))
+                rows = [row for row in rows if str(row.get(column)) in wanted]
+        if 'order' in params:
+            column, _, direction = params['order'].partition('.')
+            rows = sorted(rows, key=lambda row: str(row.get(column)), reverse=direction == 'desc')
+        total = len(rows)
+        offset = int(params.get('offset', 0))
+        rows = rows[offset:offset + int(params['limit'])] if 'limit' in params else rows[offset:]
+
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if 'count=exact' in self.headers.get('Prefer', ''):
+            self.send_header('Content-Range', f'{offset}-{offset + len(rows) - 1}/{total}' if rows else f'*/{total}')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def seed(user_id, invoices):
+    rows, items = [], []
+    for n in range(invoices):
+        invoice_id = str(uuid.uuid4())
+        rows.append({
+            'id': invoice_id, 'user_id': user_id, 'invoice_number': f'AB-{n:05d}', 'client_name': f'Client {n % 17}',
+            'client_email': '', 'status': ('pending', 'paid', 'overdue')[n % 3], 'total_amount': 1180.0,
+            'due_date': '2026-01-31', 'created_at': f'2026-01-{n % 28 + 1:02d}T00:00:00+00:00',
+            'updated_at': f'2026-01-{n % 28 + 1:02d}T00:00:00+00:00',
+        })
+        items += [{
+            'id': str(uuid.uuid4()), 'invoice_id': invoice_id, 'description': f'Line {i}',
+            'quantity': 1, 'unit_price': 1000.0, 'total': 1000.0,
+        } for i in range(3)]
+    return {'invoices': rows, 'invoice_items': items}
+
+
+def start_upstream(tables, latency):
+    PostgREST.tables = tables
+    PostgREST.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PostgREST)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def load(url, token, concurrency, duration):
+    """Closed loop: ``concurrency`` clients each sending requests back to back for ``duration`` seconds"""
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(headers={'Authorization': f'Bearer {token}'}, timeout=60, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds the stand-in PostgREST takes per request')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--invoices', type=int, default=200)
+    parser.add_argument('--wsgi-path', default='/api/async/supabase/invoices/{id}/')
+    parser.add_argument('--asgi-path', default='/api/async/supabase/invoices/{id}/')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    user, _ = User.objects.get_or_create(username=USERNAME)
+    token = str(AccessToken.for_user(user))
+    tables = seed(user.id, args.invoices)
+    upstream = start_upstream(tables, args.latency)
+    upstream_url = f'http://127.0.0.1:{upstream.server_port}'
+    invoice_id = tables['invoices'][0]['id']
+
+    results = {}
+    for kind, port, path in (('wsgi', 8791, args.wsgi_path), ('asgi', 8792, args.asgi_path)):
+        server = start_server(kind, port, args.workers, {'SUPABASE_URL': upstream_url, 'SUPABASE_KEY': 'bench'})
+        try:
+            url = f'http://127.0.0.1:{port}' + path.replace('{id}', invoice_id)
+            print(f'{kind}: {args.concurrency} clients for {args.duration:g}s against {url}')
+            results[kind] = asyncio.run(load(url, token, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"\n{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for kind, result in results.items():
+        print(f"{kind:<8}{result['rps']:>10}{result['p50_ms']!s:>10}{result['p95_ms']!s:>10}{result['errors']:>8}")
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'args': vars(args), 'results': results}, out, indent=2)
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
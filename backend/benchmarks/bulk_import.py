@@ -0,0 +1,96 @@
+"""
+Bulk import benchmark
+Writes a synthetic CSV or JSON Lines ledger and imports it through the import pipeline
+
+    python -m benchmarks.bulk_import --invoices 100000 --items 10 --format csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+
+from invoices.importer import run_job  # noqa: E402
+from invoices.models import ImportJob  # noqa: E402
+
+USERNAME = 'import-bench'
+
+HEADER = [
+    'invoice_ref', 'client_name', 'client_email', 'issue_date', 'due_date', 'tax_rate',
+    'description', 'hsn_sac', 'quantity', 'unit_price',
+]
+
+
+def records(invoices, items, rng):
+    start = date(2024, 4, 1)
+    for n in range(invoices):
+        issue_date = start + timedelta(days=rng.randrange(365))
+        yield {
+            'invoice_ref': f'R{n}',
+            'client_name': f'Client {n % 997}',
+            'client_email': f'client{n % 997}@example.com',
+            'issue_date': issue_date.isoformat(),
+            'due_date': (issue_date + timedelta(days=30)).isoformat(),
+            'tax_rate': rng.choice(('0', '5', '12', '18', '28')),
+            'items': [{
+                'description': f'Line {line}',
+                'hsn_sac': '998314',
+                'quantity': str(rng.randrange(1, 20)),
+                'unit_price': f'{rng.randrange(100, 500_000) / 100:.2f}',
+            } for line in range(items)],
+        }
+
+
+def write_file(path, file_format, invoices, items, rng):
+    with open(path, 'w', newline='', encoding='utf-8') as fileobj:
+        if file_format == 'jsonl':
+            for record in records(invoices, items, rng):
+                fileobj.write(json.dumps(record) + '\n')
+            return
+        writer = csv.writer(fileobj)
+        writer.writerow(HEADER)
+        for record in records(invoices, items, rng):
+            head = [record[column] for column in HEADER[:6]]
+            for item in record['items']:
+                writer.writerow(head + [item['description'], item['hsn_sac'], item['quantity'], item['unit_price']])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--invoices', type=int, default=100_000)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    user, _ = User.objects.get_or_create(username=USERNAME)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'ledger.{args.format}')
+        started = time.perf_counter()
+        write_file(path, args.format, args.invoices, args.items, random.Random(args.seed))
+        print(f'Wrote {args.invoices:,} invoices x {args.items} items '
+              f'({os.path.getsize(path) / 2 ** 20:,.1f} MB) in {time.perf_counter() - started:.1f}s')
+
+        job = ImportJob.objects.create(user=user, source_path=path, format=args.format, chunk_size=args.chunk_size)
+        started = time.perf_counter()
+        job = run_job(job)
+        elapsed = time.perf_counter() - started
+
+    print(f'Import {job.status}: {job.invoices_created:,} invoices, {job.items_created:,} items in {elapsed:.1f}s '
+          f'({job.invoices_created / elapsed:,.0f} invoices/s, {job.items_created / elapsed:,.0f} items/s); '
+          f'{job.error_count} rejected')
+
+
+if __name__ == '__main__':
+    main()
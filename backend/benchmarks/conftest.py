@@ -0,0 +1,38 @@
+"""
+pytest setup for the micro-benchmarks
+Runs them against a throwaway test database filled by seed_benchmark_data
+
+    python -m pytest benchmarks --benchmark-json=.benchmarks/micro.json
+    python -m pytest benchmarks --benchmark-compare    # against the last saved run (--benchmark-autosave)
+"""
+
+import io
+
+import pytest
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+BENCH_USERS = 2
+BENCH_INVOICES = 300
+BENCH_ITEMS = 5
+
+
+@pytest.fixture(scope='session')
+def bench_user():
+    """A user with a few hundred seeded invoices in a fresh test database"""
+    setup_test_environment()
+    databases = setup_databases(verbosity=0, interactive=False)
+    call_command(
+        'seed_benchmark_data', users=BENCH_USERS, invoices=BENCH_INVOICES, items=BENCH_ITEMS, stdout=io.StringIO(),
+    )
+    yield User.objects.filter(username__startswith='bench-').order_by('username').first()
+    teardown_databases(databases, verbosity=0)
+    teardown_test_environment()
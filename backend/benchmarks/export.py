@@ -0,0 +1,114 @@
+"""
+Streaming export benchmark
+Exports a large ledger through the export view and reports throughput, time to first byte and peak RSS
+
+    python -m benchmarks.export --rows 1000000 --format csv
+"""
+
+import argparse
+import random
+import resource
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from invoices import views  # noqa: E402
+from invoices.models import Invoice, InvoiceItem  # noqa: E402
+
+USERNAME = 'export-bench'
+ITEMS_PER_INVOICE = 5
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux), falling back to the peak so far"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(rows, batch_size=5000):
+    """Make sure the benchmark user has ``rows`` line items; bulk inserts bypass save() on purpose"""
+    user, _ = User.objects.get_or_create(username=USERNAME)
+    existing = InvoiceItem.objects.filter(invoice__user=user).count()
+    invoices_needed = -(-(rows - existing) // ITEMS_PER_INVOICE)
+    if invoices_needed <= 0:
+        return user
+    print(f'Seeding {invoices_needed:,} invoices x {ITEMS_PER_INVOICE} items...')
+    rng = random.Random(11)
+    start = date(2024, 4, 1)
+    offset = Invoice.objects.filter(user=user).count()
+    for first in range(0, invoices_needed, batch_size):
+        invoices, items = [], []
+        for n in range(first, min(first + batch_size, invoices_needed)):
+            issue_date = start + timedelta(days=rng.randrange(365))
+            invoice = Invoice(
+                id=uuid.uuid4(), user=user, invoice_number=f'XB-{offset + n:08d}',
+                client_name=f'Client {n % 997}', client_email=f'client{n % 997}@example.com',
+                issue_date=issue_date, due_date=issue_date + timedelta(days=30),
+            )
+            subtotal = Decimal(0)
+            for line in range(ITEMS_PER_INVOICE):
+                quantity = Decimal(rng.randrange(1, 20))
+                price = Decimal(rng.randrange(100, 500_000)) / 100
+                items.append(InvoiceItem(
+                    invoice=invoice, description=f'Line {line}', quantity=quantity,
+                    unit_price=price, total=quantity * price,
+                ))
+                subtotal += quantity * price
+            invoice.subtotal = subtotal
+            invoice.tax_amount = (subtotal * Decimal('0.18')).quantize(Decimal('0.01'))
+            invoice.total_amount = invoice.subtotal + invoice.tax_amount
+            invoices.append(invoice)
+        Invoice.objects.bulk_create(invoices)
+        InvoiceItem.objects.bulk_create(items)
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Line items to export')
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv')
+    args = parser.parse_args()
+
+    user = seed(args.rows)
+    request = APIRequestFactory().get('/api/invoices/export', {'items': '1'})
+    force_authenticate(request, user)
+
+    baseline = current_rss_mb()
+    peak = baseline
+    started = time.perf_counter()
+    response = views.export_invoices(request, file_type=args.format)
+    first_byte = None
+    size = 0
+    chunks = 0
+    for chunk in response.streaming_content:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+        chunks += 1
+        if chunks % 64 == 0:
+            peak = max(peak, current_rss_mb())
+    elapsed = time.perf_counter() - started
+    peak = max(peak, current_rss_mb())
+
+    exported = InvoiceItem.objects.filter(invoice__user=user).count()
+    print(f'Exported {exported:,} item rows as {args.format} ({size / 2 ** 20:,.1f} MB) in {elapsed:.2f}s '
+          f'({exported / elapsed:,.0f} rows/s)')
+    print(f'Time to first byte: {first_byte * 1000:.1f} ms')
+    print(f'RSS before export: {baseline:,.1f} MB, peak during export: {peak:,.1f} MB '
+          f'(+{peak - baseline:,.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
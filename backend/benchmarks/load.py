@@ -0,0 +1,249 @@
+"""
+API load test
+Drives a weighted mix of list, detail, summary, PDF, create and webhook requests against the app and
+records throughput and p50/p95/p99 per scenario to JSON, so runs can be compared across commits
+
+    python -m benchmarks.load --concurrency 20 --duration 30
+    python -m benchmarks.load --compare .benchmarks/load/<earlier run>.json
+    python -m benchmarks.load --base-url http://staging:8000 --webhook-secret ...
+
+By default it seeds users with seed_benchmark_data and starts its own gunicorn (WSGI) on the configured
+database, with email sent to a dummy backend and a known webhook secret.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import httpx
+
+from benchmarks import BACKEND_DIR, setup_django, start_server
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from invoices.models import Invoice  # noqa: E402
+
+PREFIX = 'load-'
+WEBHOOK_SECRET = 'load-test-webhook-secret'
+RESULTS_DIR = os.path.join(BACKEND_DIR, '.benchmarks', 'load')
+
+# Share of requests per scenario: mostly reads, like the dashboard and invoice pages generate
+MIX = {'list': 30, 'detail': 25, 'summary': 20, 'pdf': 5, 'create': 10, 'webhook': 10}
+
+
+class Session:
+    """One seeded user: their token, some invoice ids, and the Razorpay order ids the webhook can settle"""
+
+    def __init__(self, user, invoice_ids, order_ids):
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        self.invoice_ids = invoice_ids
+        self.order_ids = order_ids
+        self.pages = max(1, Invoice.objects.filter(user=user).count() // 10)
+
+
+def prepare(users, invoices):
+    call_command('seed_benchmark_data', users=users, invoices=invoices, prefix=PREFIX, skip_checks=True)
+    sessions = []
+    for user in User.objects.filter(username__startswith=PREFIX).order_by('username')[:users]:
+        ids = list(Invoice.objects.filter(user=user).values_list('id', flat=True)[:200])
+        # Open invoices the webhook can mark as paid; queryset updates skip the signals on purpose
+        open_ids = list(Invoice.objects.filter(user=user, status__in=('pending', 'overdue')).values_list('id', flat=True))
+        order_ids = []
+        for invoice_id in open_ids:
+            order_id = f'order_{invoice_id.hex[:14]}'
+            Invoice.objects.filter(id=invoice_id).update(razorpay_order_id=order_id)
+            order_ids.append(order_id)
+        sessions.append(Session(user, [str(pk) for pk in ids], order_ids))
+    return sessions
+
+
+def build_request(scenario, session, rng, webhook_secret):
+    """(method, path, headers, body) for one request of ``scenario``"""
+    if scenario == 'list':
+        return 'GET', f'/api/invoices/?page={rng.randrange(1, session.pages + 1)}', session.headers, None
+    if scenario == 'detail':
+        return 'GET', f'/api/invoices/{rng.choice(session.invoice_ids)}/', session.headers, None
+    if scenario == 'summary':
+        return 'GET', '/api/invoices/summary/', session.headers, None
+    if scenario == 'pdf':
+        return 'GET', f'/api/invoices/{rng.choice(session.invoice_ids)}/pdf/', session.headers, None
+    if scenario == 'create':
+        issue_date = date.today() - timedelta(days=rng.randrange(30))
+        body = json.dumps({
+            'client_name': f'Load client {rng.randrange(50)}', 'client_email': 'load@example.com',
+            'issue_date': issue_date.isoformat(), 'due_date': (issue_date + timedelta(days=30)).isoformat(),
+            'items': [{
+                'description': f'Line {n}', 'quantity': str(rng.randrange(1, 5)),
+                'unit_price': f'{rng.uniform(100, 5000):.2f}',
+            } for n in range(rng.randrange(1, 6))],
+        }).encode()
+        return 'POST', '/api/invoices/', {**session.headers, 'Content-Type': 'application/json'}, body
+    if scenario == 'webhook':
+        order_id = rng.choice(session.order_ids) if session.order_ids else 'order_missing'
+        body = json.dumps({'event': 'payment.captured', 'payload': {'payment': {'entity': {
+            'id': f'pay_{uuid.uuid4().hex[:14]}', 'order_id': order_id, 'amount': rng.randrange(10_000, 500_000),
+            'status': 'captured',
+        }}}}).encode()
+        signature = hmac.new(webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        headers = {'Content-Type': 'application/json', 'X-Razorpay-Signature': signature}
+        return 'POST', '/api/webhook/razorpay/', headers, body
+    raise ValueError(f'Unknown scenario {scenario!r}')
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarise(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 1) if value is not None else None  # noqa: E731
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'rps': round(len(ordered) / elapsed, 1),
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+    }
+
+
+async def run(base_url, sessions, mix, concurrency, duration, webhook_secret, seed, record=True):
+    """Closed loop: ``concurrency`` virtual users each send requests back to back for ``duration`` seconds"""
+    scenarios, weights = zip(*mix.items())
+    latencies = {name: [] for name in scenarios}
+    errors = dict.fromkeys(scenarios, 0)
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def virtual_user(number):
+            rng = random.Random(f'{seed}:{number}')
+            session = sessions[number % len(sessions)]
+            while time.monotonic() < deadline:
+                scenario = rng.choices(scenarios, weights)[0]
+                method, path, headers, body = build_request(scenario, session, rng, webhook_secret)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=headers, content=body)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if not record:
+                    continue
+                if ok:
+                    latencies[scenario].append(time.perf_counter() - started)
+                else:
+                    errors[scenario] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {name: summarise(latencies[name], errors[name], elapsed) for name in scenarios}
+    results['all'] = summarise(
+        [value for values in latencies.values() for value in values], sum(errors.values()), elapsed,
+    )
+    return results
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def print_results(results, previous=None):
+    header = f"{'scenario':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    if previous:
+        header += f"{'Δ p95':>10}{'Δ req/s':>10}"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:<10}{result['rps']:>9}{result['p50_ms']!s:>9}{result['p95_ms']!s:>9}"
+                f"{result['p99_ms']!s:>9}{result['errors']:>8}")
+        before = (previous or {}).get(name)
+        if before and before['p95_ms'] and result['p95_ms']:
+            line += f"{(result['p95_ms'] / before['p95_ms'] - 1):>+10.1%}{(result['rps'] / before['rps'] - 1):>+10.1%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds of unrecorded traffic first')
+    parser.add_argument('--users', type=int, default=5, help='Seeded users the virtual users log in as')
+    parser.add_argument('--invoices', type=int, default=500, help='Mean invoices per seeded user')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers for the local server')
+    parser.add_argument('--port', type=int, default=8793)
+    parser.add_argument('--base-url', help='Test an already running server instead of starting one')
+    parser.add_argument('--webhook-secret', default=WEBHOOK_SECRET, help="The server's RAZORPAY_WEBHOOK_SECRET")
+    parser.add_argument('--mix', type=json.loads, default=MIX, help='Scenario weights as JSON')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help=f'Where to write the results (default: a new file in {RESULTS_DIR})')
+    parser.add_argument('--compare', help='An earlier results file to compare against')
+    args = parser.parse_args()
+
+    sessions = prepare(args.users, args.invoices)
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = start_server('wsgi', args.port, args.workers, {
+            'RAZORPAY_WEBHOOK_SECRET': args.webhook_secret,
+            'EMAIL_BACKEND': 'django.core.mail.backends.dummy.EmailBackend',
+            'PERF_LOG_SAMPLE_RATE': '0',
+        })
+        base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        if args.warmup:
+            asyncio.run(run(base_url, sessions, args.mix, args.concurrency, args.warmup, args.webhook_secret,
+                            args.seed, record=False))
+        print(f'{args.concurrency} virtual users for {args.duration:g}s against {base_url}\n')
+        results = asyncio.run(run(base_url, sessions, args.mix, args.concurrency, args.duration,
+                                  args.webhook_secret, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as earlier:
+            previous = json.load(earlier)['results']
+    print_results(results, previous)
+
+    commit, dirty = git_revision()
+    path = args.json
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'unknown'}.json")
+    with open(path, 'w') as out:
+        json.dump({
+            'commit': commit, 'dirty': dirty, 'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'args': {key: value for key, value in vars(args).items() if key not in ('json', 'compare')},
+            'results': results,
+        }, out, indent=2)
+    print(f'\nResults written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Bulk totals recomputation benchmark: Decimal vs integer-paise Money
+
+    python -m benchmarks.money --invoices 100000 --items 10
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from benchmarks import setup_django
+
+setup_django()
+
+from invoices import money  # noqa: E402
+from invoices.money import Money  # noqa: E402
+
+CENT = Decimal('0.01')
+
+
+def build_dataset(invoices, items, rng):
+    """Per invoice: (tax_rate, [(quantity, unit_price), ...]) as ORM Decimals"""
+    rates = [Decimal('0.00'), Decimal('5.00'), Decimal('12.00'), Decimal('18.00'), Decimal('28.00')]
+    return [
+        (rng.choice(rates), [
+            (Decimal(rng.randrange(1, 2000)) / 100, Decimal(rng.randrange(100, 10_000_000)) / 100)
+            for _ in range(items)
+        ])
+        for _ in range(invoices)
+    ]
+
+
+def totals_decimal(dataset):
+    """The pre-Money calculate_totals arithmetic, quantized as the DecimalFields would be"""
+    grand = Decimal(0)
+    for tax_rate, lines in dataset:
+        subtotal = sum((qty * price).quantize(CENT, rounding=ROUND_HALF_UP) for qty, price in lines)
+        tax = (subtotal * tax_rate / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        grand += subtotal + tax
+    return grand
+
+
+def totals_money(dataset):
+    grand = Money(0)
+    for tax_rate, lines in dataset:
+        subtotal = Money.sum(Money.from_decimal(price).times(qty) for qty, price in lines)
+        grand += subtotal + subtotal.percent(tax_rate)
+    return grand
+
+
+def totals_paise(dataset):
+    """The integer-paise kernel used for bulk recomputation, including the Decimal->paise conversion"""
+    hundredths = money._hundredths
+    grand = 0
+    for tax_rate, lines in dataset:
+        subtotal = 0
+        for qty, price in lines:
+            line, rem = divmod(hundredths(qty) * hundredths(price), 100)
+            subtotal += line + (rem >= 50)
+        tax, rem = divmod(subtotal * hundredths(tax_rate), 10000)
+        grand += subtotal + tax + (rem >= 5000)
+    return Money(grand)
+
+
+def totals_stored_paise(dataset):
+    """Same kernel when amounts are already stored as paise (Mongo Int64, rollups)"""
+    hundredths = money._hundredths
+    converted = [
+        (hundredths(tax_rate), [(hundredths(qty), hundredths(price)) for qty, price in lines])
+        for tax_rate, lines in dataset
+    ]
+    started = time.perf_counter()
+    grand = 0
+    for rate, lines in converted:
+        subtotal = 0
+        for qty, price in lines:
+            line, rem = divmod(qty * price, 100)
+            subtotal += line + (rem >= 50)
+        tax, rem = divmod(subtotal * rate, 10000)
+        grand += subtotal + tax + (rem >= 5000)
+    return Money(grand), time.perf_counter() - started
+
+
+def timed(func, dataset):
+    started = time.perf_counter()
+    result = func(dataset)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--invoices', type=int, default=100_000)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    dataset = build_dataset(args.invoices, args.items, random.Random(args.seed))
+    lines = args.invoices * args.items
+
+    decimal_total, decimal_time = timed(totals_decimal, dataset)
+    money_total, money_time = timed(totals_money, dataset)
+    paise_total, paise_time = timed(totals_paise, dataset)
+    stored_total, stored_time = totals_stored_paise(dataset)
+
+    assert Money.from_decimal(decimal_total) == money_total == paise_total == stored_total, 'totals disagree'
+    print(f'{args.invoices:,} invoices x {args.items} items ({lines:,} lines), grand total {money_total}')
+    print(f'Decimal:           {decimal_time:.2f}s ({lines / decimal_time:,.0f} lines/s)')
+    print(f'Money objects:     {money_time:.2f}s ({lines / money_time:,.0f} lines/s, '
+          f'{decimal_time / money_time:.1f}x)')
+    print(f'Paise kernel:      {paise_time:.2f}s ({lines / paise_time:,.0f} lines/s, '
+          f'{decimal_time / paise_time:.1f}x)')
+    print(f'Stored paise:      {stored_time:.2f}s ({lines / stored_time:,.0f} lines/s, '
+          f'{decimal_time / stored_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
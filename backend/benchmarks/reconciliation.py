@@ -0,0 +1,115 @@
+"""
+Reconciliation matching benchmark
+Matches synthetic statement rows against synthetic invoices, no database needed
+
+    python -m benchmarks.reconciliation --invoices 1000000 --rows 1000000
+"""
+
+import argparse
+import csv
+import io
+import random
+import time
+import uuid
+from datetime import date, timedelta
+
+from benchmarks import setup_django
+
+setup_django()
+
+from invoices.reconciliation import (  # noqa: E402
+    InvoiceIndex, InvoiceRef, Reconciler, StatementRow, read_razorpay_settlement
+)
+
+
+def build_invoices(count, rng):
+    start = date(2024, 4, 1)
+    invoices = []
+    for n in range(count):
+        issue_date = start + timedelta(days=rng.randrange(365))
+        invoices.append(InvoiceRef(
+            id=uuid.UUID(int=n + 1),
+            user_id=n % 500 + 1,
+            invoice_number=f'INV-{n % 500 + 1:04d}-{n:07d}',
+            order_id=f'order_{n:010d}' if n % 2 == 0 else '',
+            paise=rng.randrange(10_000, 50_000_000),
+            issue_date=issue_date,
+            due_date=issue_date + timedelta(days=30),
+            status='pending' if n % 5 else 'paid',
+        ))
+    return invoices
+
+
+def build_rows(invoices, count, rng):
+    """Mix of order-id, transaction-id, invoice-number, amount-only and unknown rows"""
+    rows = []
+    for line in range(count):
+        ref = invoices[rng.randrange(len(invoices))]
+        kind = line % 20
+        row_date = ref.issue_date + timedelta(days=rng.randrange(30))
+        if kind < 8 and ref.order_id:
+            rows.append(StatementRow(line, 'razorpay', row_date, ref.paise,
+                                     order_id=ref.order_id, transaction_id=f'pay_{line:012d}'))
+        elif kind < 12:
+            rows.append(StatementRow(line, 'bank', row_date, ref.paise, transaction_id=f'txn_{line - 1:012d}'))
+        elif kind < 16:
+            rows.append(StatementRow(line, 'bank', row_date, ref.paise, transaction_id=f'UTR{line:012d}',
+                                     description=f'NEFT CR {ref.invoice_number} ACME LTD'))
+        elif kind < 19:
+            rows.append(StatementRow(line, 'bank', row_date, ref.paise, transaction_id=f'UTR{line:012d}',
+                                     description='IMPS CR ACME LTD'))
+        else:
+            rows.append(StatementRow(line, 'bank', row_date, 1, transaction_id=f'UTR{line:012d}'))
+    return rows
+
+
+def bench_csv_parse(count):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['entity_id', 'type', 'credit', 'created_at', 'order_id', 'order_receipt'])
+    for n in range(count):
+        writer.writerow([f'pay_{n:012d}', 'payment', f'{n % 100000}.50', '2024-05-01 10:00:00',
+                         f'order_{n:010d}', f'invoice_INV-0001-{n:07d}'])
+    buffer.seek(0)
+    started = time.perf_counter()
+    parsed = sum(1 for _ in read_razorpay_settlement(buffer))
+    return parsed, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--invoices', type=int, default=1_000_000)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--parse-rows', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    invoices = build_invoices(args.invoices, rng)
+    rows = build_rows(invoices, args.rows, rng)
+
+    started = time.perf_counter()
+    index = InvoiceIndex()
+    for ref in invoices:
+        index.add_invoice(ref)
+    for n in range(0, args.rows, 2):
+        index.add_payment(f'txn_{n:012d}', None)
+    index_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = Reconciler(index).run(rows)
+    match_time = time.perf_counter() - started
+
+    parsed, parse_time = bench_csv_parse(args.parse_rows)
+
+    summary = result.summary()
+    print(f'Index build: {len(index):,} invoices in {index_time:.2f}s')
+    print(f"Matching:    {summary['rows']:,} rows in {match_time:.2f}s "
+          f"({summary['rows'] / match_time:,.0f} rows/s)")
+    print(f"             matched={summary['matched']:,} already_recorded={summary['already_recorded']:,} "
+          f"mismatched={summary['mismatched']:,} by_rule={summary['by_rule']}")
+    print(f'CSV parse:   {parsed:,} rows in {parse_time:.2f}s ({parsed / parse_time:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
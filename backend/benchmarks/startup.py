@@ -0,0 +1,98 @@
+"""
+Worker startup cost
+Boots Django in a fresh interpreter the way a gunicorn worker (URLconf) or Celery worker (task modules) does,
+and reports import time and RSS
+
+    python -m benchmarks.startup --worker web --top 15
+
+Payment, PDF, Mongo and async HTTP SDKs should only show up once a request needs them; any that are
+loaded at boot are listed under "heavy modules".
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks import BACKEND_DIR
+
+# Top-level packages a worker should not import until a request uses them
+HEAVY_MODULES = ('razorpay', 'reportlab', 'weasyprint', 'httpx', 'pymongo', 'lib')
+
+# What each kind of worker loads after django.setup()
+WORKERS = {
+    'web': 'from django.urls import get_resolver; get_resolver().url_patterns',
+    'celery': 'import hisabpro.celery',
+}
+
+BOOT = '''
+import json, os, sys, time
+started = time.perf_counter()
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hisabpro.settings')
+django.setup()
+{load}
+elapsed = time.perf_counter() - started
+status = open('/proc/self/status').read() if os.path.exists('/proc/self/status') else ''
+rss = next((int(line.split()[1]) for line in status.splitlines() if line.startswith('VmRSS:')), None)
+print(json.dumps({{
+    'boot_ms': round(elapsed * 1000, 1),
+    'rss_kb': rss,
+    'modules': len(sys.modules),
+    'heavy': sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+'''
+
+
+def _import_times(stderr):
+    """(cumulative us, module) for each import made at the outermost level, from ``-X importtime`` output"""
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.count('|') != 2:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two more spaces per level; only count the outermost ones
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            times.append((int(cumulative), name.strip()))
+    return sorted(times, reverse=True)
+
+
+def measure(worker='web', env=None):
+    """Boot a worker-like interpreter and return its timings, RSS and import breakdown"""
+    boot = BOOT.format(load=WORKERS[worker], heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', boot],
+        cwd=BACKEND_DIR, env={**os.environ, **(env or {})}, capture_output=True, text=True, check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = _import_times(result.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker', choices=WORKERS, default='web')
+    parser.add_argument('--runs', type=int, default=3, help='Boots to average over')
+    parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    reports = [measure(args.worker) for _ in range(args.runs)]
+    last = reports[-1]
+    boot_ms = round(sum(report['boot_ms'] for report in reports) / len(reports), 1)
+    rss_mb = round(last['rss_kb'] / 1024, 1) if last['rss_kb'] else None
+
+    print(f"{args.worker} worker boot: {boot_ms} ms over {args.runs} runs")
+    print(f"rss: {rss_mb} MB, modules loaded: {last['modules']}")
+    print(f"heavy modules: {', '.join(last['heavy']) or 'none'}")
+    print(f"\n{'module':<40}{'cumulative ms':>15}")
+    for us, name in last['imports'][:args.top]:
+        print(f"{name:<40}{us / 1000:>15.1f}")
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'worker': args.worker, 'boot_ms': boot_ms, 'rss_mb': rss_mb, **last}, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
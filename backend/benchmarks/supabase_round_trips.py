@@ -0,0 +1,119 @@
+"""
+Supabase round trips per endpoint
+Serves every Supabase read endpoint from the local stand-in (invoices/local_supabase.py) with injected latency,
+and reports round trips and wall time for a cold request and for the same request repeated once caches are warm
+
+    python -m benchmarks.supabase_round_trips --latency-ms 40 --invoices 300
+    python -m benchmarks.supabase_round_trips --json before.json
+
+Nothing leaves the process: the store is an in-memory SQLite database seeded for one user.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import setup_django
+
+os.environ['SUPABASE_LOCAL'] = 'True'
+os.environ.setdefault('SUPABASE_LOCAL_PATH', ':memory:')
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.test import Client  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from invoices.local_supabase import local_supabase  # noqa: E402
+
+USERNAME = 'supabase-bench'
+
+ENDPOINTS = [
+    ('dashboard', '/api/dashboard/'),
+    ('list', '/api/supabase/invoices/'),
+    ('summary', '/api/supabase/invoices/summary/'),
+    ('recent', '/api/supabase/invoices/recent/'),
+    ('changes', '/api/supabase/invoices/changes/'),
+    ('detail', '/api/supabase/invoices/{id}/'),
+    ('preview', '/api/supabase/invoices/{id}/preview/'),
+    ('async dashboard', '/api/async/dashboard/'),
+    ('async list', '/api/async/supabase/invoices/'),
+    ('async summary', '/api/async/supabase/invoices/summary/'),
+    ('async recent', '/api/async/supabase/invoices/recent/'),
+    ('async detail', '/api/async/supabase/invoices/{id}/'),
+]
+
+
+def seed(user_id, invoices, items, seed_value):
+    """Invoices spread over the last year, each with a few items; returns the newest invoice's id"""
+    rng = random.Random(seed_value)
+    local_supabase.clear()
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    rows, lines = [], []
+    for n in range(invoices):
+        stamp = (start + timedelta(minutes=rng.randrange(525_600))).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+        invoice_id = str(uuid.uuid4())
+        prices = [round(rng.uniform(100, 5000), 2) for _ in range(rng.randint(1, items))]
+        rows.append({
+            'id': invoice_id, 'user_id': user_id, 'invoice_number': f'LS-{n:05d}',
+            'client_name': f'Client {rng.randrange(40)}', 'client_email': 'client@example.com',
+            'status': rng.choices(['paid', 'pending', 'overdue', 'draft'], [60, 22, 13, 5])[0],
+            'total_amount': round(sum(prices), 2), 'due_date': stamp[:10], 'created_at': stamp, 'updated_at': stamp,
+        })
+        lines += [{
+            'id': str(uuid.uuid4()), 'invoice_id': invoice_id, 'description': f'Line {i}', 'quantity': 1,
+            'unit_price': price, 'total': price, 'created_at': stamp, 'updated_at': stamp,
+        } for i, price in enumerate(prices)]
+    local_supabase.load('invoices', rows)
+    local_supabase.load('invoice_items', lines)
+    return max(rows, key=lambda row: row['created_at'])['id']
+
+
+def measure(client, path):
+    local_supabase.reset_round_trips()
+    started = time.perf_counter()
+    response = client.get(path)
+    elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f'{path} returned {response.status_code}')
+    return {'round_trips': sum(local_supabase.reset_round_trips().values()), 'ms': round(elapsed * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=40, help='Injected delay per round trip')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Extra random delay, up to this much')
+    parser.add_argument('--invoices', type=int, default=300)
+    parser.add_argument('--items', type=int, default=4, help='Most items on one invoice')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    user, _ = User.objects.get_or_create(username=USERNAME)
+    local_supabase.connect()
+    invoice_id = seed(user.id, args.invoices, args.items, args.seed)
+    local_supabase.latency, local_supabase.jitter = args.latency_ms / 1000, args.jitter_ms / 1000
+    client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    results = {}
+    for name, path in ENDPOINTS:
+        path = path.replace('{id}', invoice_id)
+        cache.clear()
+        results[name] = {'cold': measure(client, path), 'warm': measure(client, path)}
+
+    print(f'{args.invoices} invoices, {args.latency_ms:g} ms per round trip\n')
+    print(f"{'endpoint':<17}{'cold trips':>11}{'cold ms':>10}{'warm trips':>12}{'warm ms':>10}")
+    for name, result in results.items():
+        cold, warm = result['cold'], result['warm']
+        print(f"{name:<17}{cold['round_trips']:>11}{cold['ms']:>10}{warm['round_trips']:>12}{warm['ms']:>10}")
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'args': vars(args), 'results': results}, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmarks for HisabPro
+Invoice totals, serialization and PDF rendering, timed with pytest-benchmark (see conftest.py)
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from invoices.dashboard import orm_summary
+from invoices.models import Invoice, InvoiceItem
+from invoices.money import Money
+from invoices.pdf_render import render_invoice_pdf
+from invoices.serializers import InvoiceSerializer
+from invoices.supabase_models import SupabaseInvoice, SupabaseInvoiceItem
+from invoices.supabase_serializers import SupabaseInvoiceSerializer
+
+PAGE = 20
+
+
+def _invoice(lines, gst_rate=None):
+    invoice = Invoice(tax_rate=Decimal('18.00'), place_of_supply='29')
+    items = []
+    for n in range(lines):
+        item = InvoiceItem(
+            invoice=invoice, quantity=Decimal(n % 7 + 1), unit_price=Decimal('1234.56') + n, gst_rate=gst_rate,
+        )
+        item.calculate_total()
+        items.append(item)
+    return invoice, items
+
+
+@pytest.fixture
+def page(bench_user):
+    # What the list view hands the serializer for one page
+    return list(
+        Invoice.objects.filter(user=bench_user).select_related('user')
+        .prefetch_related('items', 'payments')[:PAGE]
+    )
+
+
+@pytest.mark.parametrize('lines', [5, 50])
+def test_invoice_totals(benchmark, lines):
+    invoice, items = _invoice(lines)
+    benchmark(invoice.calculate_totals, items=items, seller_state='27')
+    assert invoice.total_amount > 0
+
+
+def test_invoice_totals_with_line_gst(benchmark):
+    invoice, items = _invoice(50, gst_rate=Decimal('12.00'))
+    benchmark(invoice.calculate_totals, items=items, seller_state='27')
+    assert invoice.tax_amount > 0
+
+
+def test_money_sum(benchmark):
+    amounts = [Money.from_decimal(Decimal(n) / 100) for n in range(10_000)]
+    assert benchmark(Money.sum, amounts) == Money.from_decimal(Decimal('499950.00'))
+
+
+def test_orm_summary(benchmark, bench_user):
+    summary = benchmark(orm_summary, Invoice.objects.filter(user=bench_user))
+    assert summary['total_invoices'] > 0
+
+
+def test_serialize_invoice_page(benchmark, page):
+    data = benchmark(lambda: InvoiceSerializer(page, many=True).data)
+    assert len(data) == PAGE
+
+
+def test_serialize_supabase_page(benchmark, page):
+    rows = [{
+        'id': str(invoice.id), 'invoice_number': invoice.invoice_number, 'client_name': invoice.client_name,
+        'client_email': invoice.client_email, 'status': invoice.status, 'issue_date': str(invoice.issue_date),
+        'due_date': str(invoice.due_date), 'subtotal': float(invoice.subtotal), 'tax_amount': float(invoice.tax_amount),
+        'total_amount': float(invoice.total_amount), 'items': [{
+            'id': str(item.id), 'description': item.description, 'quantity': float(item.quantity),
+            'unit_price': float(item.unit_price), 'total': float(item.total),
+        } for item in invoice.items.all()],
+    } for invoice in page]
+
+    def serialize():
+        invoices = []
+        for row in rows:
+            invoice = SupabaseInvoice.from_dict(row)
+            invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in row['items']]
+            invoices.append(invoice)
+        return SupabaseInvoiceSerializer(invoices, many=True).data
+
+    assert len(benchmark(serialize)) == PAGE
+
+
+def test_render_pdf(benchmark, page):
+    invoice = max(page, key=lambda invoice: len(invoice.items.all()))
+    pdf = benchmark(render_invoice_pdf, invoice)
+    assert pdf.startswith(b'%PDF')
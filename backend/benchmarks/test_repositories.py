@@ -0,0 +1,144 @@
+"""
+InvoiceRepository benchmarks
+The same page, batch fetch, summary and write timings for every store in invoices/repositories.py, with the round
+trips each call made recorded in extra_info. Supabase is the local stand-in holding a copy of the seeded data;
+set SUPABASE_LOCAL_LATENCY_MS to put a network in front of it, and MONGODB_TEST_URI to include MongoDB.
+
+    SUPABASE_LOCAL_LATENCY_MS=20 python -m pytest benchmarks/test_repositories.py
+"""
+
+import os
+import uuid
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from invoices.local_supabase import LocalSupabase
+from invoices.models import Invoice
+from invoices.money import Money
+from invoices.repositories import MongoInvoiceRepository, OrmInvoiceRepository, SupabaseInvoiceRepository
+
+PAGE = 20
+
+ITEMS = [
+    {'description': f'Line {n}', 'quantity': Decimal(n + 1), 'unit_price': Money.from_rupees('1234.56')}
+    for n in range(5)
+]
+
+NEW_INVOICE = {
+    'client_name': 'Bench Client', 'client_email': 'bench@example.com',
+    'issue_date': date(2024, 4, 1), 'due_date': date(2024, 5, 1),
+}
+
+STORES = ['orm', 'supabase-local'] + (['mongo'] if os.environ.get('MONGODB_TEST_URI') else [])
+
+
+def _orm_store():
+    def cost(fn):
+        with CaptureQueriesContext(connection) as captured:
+            fn()
+        return len(captured.captured_queries)
+
+    return OrmInvoiceRepository(), cost
+
+
+def _supabase_store(user):
+    local = LocalSupabase(path=':memory:')
+    local.connect()
+    invoices = Invoice.objects.filter(user=user).prefetch_related('items')
+    local.load('invoices', [{
+        'id': str(invoice.id), 'user_id': invoice.user_id, 'invoice_number': invoice.invoice_number,
+        'client_name': invoice.client_name, 'client_email': invoice.client_email,
+        'issue_date': invoice.issue_date.isoformat(), 'due_date': invoice.due_date.isoformat(),
+        'status': invoice.status, 'subtotal': str(invoice.subtotal), 'tax_rate': str(invoice.tax_rate),
+        'tax_amount': str(invoice.tax_amount), 'total_amount': str(invoice.total_amount),
+        'created_at': invoice.created_at.isoformat(timespec='microseconds'),
+        'updated_at': invoice.updated_at.isoformat(timespec='microseconds'),
+    } for invoice in invoices])
+    local.load('invoice_items', [{
+        'id': str(item.id), 'invoice_id': str(invoice.id), 'description': item.description,
+        'quantity': str(item.quantity), 'unit_price': str(item.unit_price), 'total': str(item.total),
+    } for invoice in invoices for item in invoice.items.all()])
+
+    def cost(fn):
+        local.reset_round_trips()
+        fn()
+        return sum(local.reset_round_trips().values())
+
+    return SupabaseInvoiceRepository(local), cost
+
+
+def _mongo_store(user):
+    from pymongo import MongoClient, monitoring
+
+    class Commands(monitoring.CommandListener):
+        count = 0
+
+        def started(self, event):
+            Commands.count += 1
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    client = MongoClient(os.environ['MONGODB_TEST_URI'], event_listeners=[Commands()])
+    repository = MongoInvoiceRepository(client[f'hisabpro_bench_{uuid.uuid4().hex[:8]}'])
+    for _ in range(PAGE * 2):
+        repository.create(user, NEW_INVOICE, ITEMS)
+
+    def cost(fn):
+        start = Commands.count
+        fn()
+        return Commands.count - start
+
+    return repository, cost, lambda: client.drop_database(repository.db.name)
+
+
+@pytest.fixture(scope='module', params=STORES)
+def store(request, bench_user):
+    """(repository, cost) where ``cost(fn)`` counts the round trips ``fn()`` makes"""
+    if request.param == 'orm':
+        yield _orm_store()
+    elif request.param == 'supabase-local':
+        yield _supabase_store(bench_user)
+    else:
+        repository, cost, drop = _mongo_store(bench_user)
+        yield repository, cost
+        drop()
+
+
+def _run(benchmark, store, fn):
+    repository, cost = store
+    benchmark.extra_info['round_trips'] = cost(fn)
+    return benchmark(fn)
+
+
+def test_page(benchmark, store, bench_user):
+    records, total = _run(benchmark, store, lambda: store[0].page(bench_user, PAGE))
+    assert len(records) == PAGE and total >= PAGE
+
+
+def test_get_many(benchmark, store, bench_user):
+    ids = [record['id'] for record in store[0].page(bench_user, PAGE, offset=PAGE)[0]]
+    found = _run(benchmark, store, lambda: store[0].get_many(bench_user, ids))
+    assert len(found) == len(ids)
+
+
+def test_summary(benchmark, store, bench_user):
+    summary = _run(benchmark, store, lambda: store[0].summary(bench_user))
+    assert summary['total_invoices'] >= PAGE
+
+
+def test_create_and_delete(benchmark, store, bench_user):
+    repository = store[0]
+
+    def write():
+        record = repository.create(bench_user, NEW_INVOICE, ITEMS)
+        return repository.delete(bench_user, record['id'])
+
+    assert _run(benchmark, store, write)
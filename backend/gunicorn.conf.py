@@ -0,0 +1,7 @@
+"""
+Gunicorn settings for serving HisabPro over WSGI
+Gunicorn reads ./gunicorn.conf.py on its own, so the Procfile, Dockerfile, docker-compose and Railway start
+commands all pick this up; gunicorn_asgi.py is the ASGI equivalent and names itself with -c.
+"""
+
+from hisabpro.metrics import child_exit  # noqa: F401
@@ -0,0 +1,22 @@
+"""
+Gunicorn settings for serving HisabPro over ASGI
+
+    gunicorn hisabpro.asgi:application -c gunicorn_asgi.py
+
+Each uvicorn worker runs one event loop, so the async views under /api/async/ keep many slow
+Supabase calls in flight per worker. Sync views still work; Django runs them in a thread pool.
+"""
+
+import multiprocessing
+
+# Gunicorn reads every module-level name that matches a setting, and ``config`` is one (the -c path)
+import decouple
+
+from hisabpro.metrics import child_exit  # noqa: F401
+
+bind = f"0.0.0.0:{decouple.config('PORT', default='8000')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = decouple.config('WEB_CONCURRENCY', default=min(multiprocessing.cpu_count(), 4), cast=int)
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
@@ -0,0 +1,114 @@
+"""
+Database settings for HisabPro
+Builds DATABASES['default'] from DATABASE_URL or, when DB_ENGINE is set, the DB_* variables docker-compose passes,
+and falls back to the SQLite file used in development otherwise; DATABASE_REPLICA_URL adds the read replica (routers.py)
+"""
+
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+ENGINES = {
+    'postgres': 'django.db.backends.postgresql',
+    'postgresql': 'django.db.backends.postgresql',
+    'pgsql': 'django.db.backends.postgresql',
+    'sqlite': 'django.db.backends.sqlite3',
+}
+
+# DB_POOL values: persistent connections only, psycopg's pool inside each worker, or an external pgbouncer
+POOL_MODES = ('', 'psycopg', 'pgbouncer')
+
+
+def parse_database_url(url):
+    """ENGINE/NAME/USER/PASSWORD/HOST/PORT/OPTIONS for a postgres:// or sqlite:/// URL"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.split('+', 1)[0]
+    if scheme not in ENGINES:
+        raise ImproperlyConfigured(f'Unsupported DATABASE_URL scheme {parts.scheme!r}')
+    if scheme == 'sqlite':
+        # sqlite:///relative.db, sqlite:////absolute/path.db, sqlite://:memory:
+        name = parts.netloc if parts.netloc == ':memory:' else unquote(parts.path[1:])
+        return {'ENGINE': ENGINES[scheme], 'NAME': name or ':memory:'}
+    return {
+        'ENGINE': ENGINES[scheme],
+        'NAME': unquote(parts.path.lstrip('/')),
+        'USER': unquote(parts.username or ''),
+        'PASSWORD': unquote(parts.password or ''),
+        'HOST': parts.hostname or '',
+        'PORT': str(parts.port or ''),
+        # e.g. ?sslmode=require&connect_timeout=5, passed through to libpq
+        'OPTIONS': dict(parse_qsl(parts.query)),
+    }
+
+
+def database_config(config, default_sqlite):
+    """DATABASES['default'], read through python-decouple's ``config``"""
+    url = config('DATABASE_URL', default='')
+    # DB_HOST alone is not enough: local .env files set it for tools other than Django
+    engine = config('DB_ENGINE', default='')
+    if url:
+        database = parse_database_url(url)
+    elif engine in ('', 'sqlite'):
+        return {'ENGINE': ENGINES['sqlite'], 'NAME': default_sqlite}
+    elif engine not in ENGINES:
+        raise ImproperlyConfigured(f"DB_ENGINE must be one of {', '.join(repr(name) for name in ENGINES)}")
+    else:
+        database = {
+            'ENGINE': ENGINES[engine],
+            'NAME': config('DB_NAME', default='hisabpro'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'OPTIONS': {},
+        }
+    if database['ENGINE'] != ENGINES['postgres']:
+        return database
+    return postgres_tuning(database, config)
+
+
+def replica_config(config, url):
+    """DATABASES['replica'] for ``url``, with the primary's connection settings"""
+    database = parse_database_url(url)
+    # Test runs read the primary's test database through this alias rather than creating their own
+    database['TEST'] = {'MIRROR': 'default'}
+    if database['ENGINE'] != ENGINES['postgres']:
+        return database
+    return postgres_tuning(database, config)
+
+
+def postgres_tuning(database, config):
+    """Connection lifetime, pooling and libpq options for a PostgreSQL alias"""
+    options = database['OPTIONS']
+    options.setdefault('connect_timeout', config('DB_CONNECT_TIMEOUT', default=5, cast=int))
+    sslmode = config('DB_SSLMODE', default='')
+    if sslmode:
+        options['sslmode'] = sslmode
+    statement_timeout = config('DB_STATEMENT_TIMEOUT_MS', default=0, cast=int)
+    if statement_timeout:
+        # A runaway report query is cancelled by the server rather than holding a worker and a connection
+        options['options'] = f'-c statement_timeout={statement_timeout}'
+
+    # Reuse each worker's connection across requests; the health check replaces one the server has dropped
+    database['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    database['CONN_HEALTH_CHECKS'] = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+
+    pool = config('DB_POOL', default='')
+    if pool not in POOL_MODES:
+        raise ImproperlyConfigured(f"DB_POOL must be one of {', '.join(repr(mode) for mode in POOL_MODES)}")
+    if pool == 'psycopg':
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured("DB_POOL='psycopg' needs Django 5.1 or later; use DB_POOL='pgbouncer' instead")
+        options['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        }
+        # The pool owns connection lifetime; Django refuses persistent connections alongside it
+        database['CONN_MAX_AGE'] = 0
+    elif pool == 'pgbouncer':
+        # Transaction pooling hands each transaction a different server connection, so a named cursor
+        # opened by .iterator() outside a transaction would vanish between fetches
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return database
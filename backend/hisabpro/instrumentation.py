@@ -0,0 +1,202 @@
+"""
+Request instrumentation for HisabPro
+Per-request totals for database queries, upstream services, cache lookups, serialization and rendering
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.mail.backends import smtp
+
+from . import metrics
+
+_trace = contextvars.ContextVar('hisabpro_trace', default=None)
+# Spans already open in this context, so nested calls to the same service are only counted once
+_open = contextvars.ContextVar('hisabpro_open_spans', default=frozenset())
+
+
+class Trace:
+    """Where one request spent its time; shared with any threads the request fans out to"""
+
+    def __init__(self, keep_queries=200):
+        self.started = time.perf_counter()
+        self.keep_queries = keep_queries
+        self.queries = 0
+        self.query_ms = 0.0
+        self.statements = []
+        self.spans = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, ms):
+        with self._lock:
+            self.queries += 1
+            self.query_ms += ms
+            if len(self.statements) < self.keep_queries:
+                self.statements.append((round(ms, 2), sql))
+
+    def add_span(self, name, ms):
+        with self._lock:
+            calls, total = self.spans.get(name, (0, 0.0))
+            self.spans[name] = (calls + 1, total + ms)
+
+    def add_cache(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def start(keep_queries=200):
+    """Begin tracing the current request; returns the token ``finish`` needs"""
+    return _trace.set(Trace(keep_queries))
+
+
+def finish(token):
+    _trace.reset(token)
+
+
+def current():
+    return _trace.get()
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block under ``name``, on the current request's trace if there is one"""
+    open_spans = _open.get()
+    if name in open_spans:
+        yield
+        return
+    trace = _trace.get()
+    token = _open.set(open_spans | {name})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if trace is not None:
+            trace.add_span(name, elapsed * 1000)
+        metrics.observe_span(name, elapsed)
+        _open.reset(token)
+
+
+def record_cache(hit):
+    metrics.observe_cache(hit)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_cache(hit)
+
+
+def server_timing(timings, descriptions=None):
+    """Server-Timing header value for {metric: milliseconds or None}, with optional {metric: description}"""
+    descriptions = descriptions or {}
+    entries = []
+    for name, ms in timings.items():
+        entry = name if ms is None else f'{name};dur={ms}'
+        if name in descriptions:
+            entry += f';desc="{descriptions[name]}"'
+        entries.append(entry)
+    return ', '.join(entries)
+
+
+def record_query(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook counting and timing every query made for a traced request"""
+    trace = _trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def install_query_wrapper(connection, **kwargs):
+    """Attach ``record_query`` to a database connection (also a ``connection_created`` receiver)"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Traced:
+    """Proxy timing every method call on a service client as ``name``.
+
+    Attributes holding objects from the same package (e.g. razorpay's ``client.order``) are proxied
+    too; anything else, such as the raw Supabase client, is returned as is.
+    """
+
+    def __init__(self, target, name):
+        self._target = target
+        self._name = name
+        self._package = type(target).__module__.split('.')[0]
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if callable(value):
+            @functools.wraps(value)
+            def timed(*args, **kwargs):
+                with span(self._name):
+                    return value(*args, **kwargs)
+            return timed
+        if type(value).__module__.split('.')[0] == self._package:
+            return Traced(value, self._name)
+        return value
+
+
+def mongo_command_listener():
+    """A pymongo command listener adding each command's server round trip to the ``mongo`` span"""
+    from pymongo import monitoring
+
+    class MongoCommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            self._record(event)
+
+        def failed(self, event):
+            self._record(event)
+
+        def _record(self, event):
+            metrics.observe_span('mongo', event.duration_micros / 1e6)
+            trace = _trace.get()
+            if trace is not None:
+                trace.add_span('mongo', event.duration_micros / 1000)
+
+    return MongoCommandTimer()
+
+
+class SMTPEmailBackend(smtp.EmailBackend):
+    """Django's SMTP backend with sends timed as ``smtp``"""
+
+    def send_messages(self, email_messages):
+        with span('smtp'):
+            return super().send_messages(email_messages)
+
+
+_serializers_timed = False
+
+
+def time_serializers():
+    """Time DRF's ``serializer.data`` as ``serialize``; nested serializers count towards their parent"""
+    global _serializers_timed
+    if _serializers_timed:
+        return
+    from rest_framework import serializers
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        data = cls.data.fget
+
+        def timed(self, data=data):
+            with span('serialize'):
+                return data(self)
+
+        cls.data = property(functools.wraps(data)(timed))
+    _serializers_timed = True
@@ -0,0 +1,160 @@
+"""
+Prometheus metrics for HisabPro
+Request, database, upstream, PDF, cache and Celery metrics, served in the text exposition format at /metrics
+
+With several gunicorn or Celery worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty writable
+directory in the environment of every process (before it starts); each process then writes its samples
+there and /metrics adds them up. The gunicorn configs install ``child_exit`` so a worker that exits
+takes its live gauges with it.
+"""
+
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Spans from hisabpro.instrumentation that are calls to another service
+EXTERNAL_SERVICES = ('supabase', 'mongo', 'razorpay', 'smtp')
+
+PDF_SIZE_BUCKETS = (5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# Samples are only written once a labelled series is first used, so creating the directory here is early enough
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUEST_LATENCY = Histogram(
+    'hisabpro_http_request_duration_seconds', 'Time to produce a response, by URL name', ['method', 'view'],
+)
+REQUESTS = Counter('hisabpro_http_requests', 'Responses sent, by URL name and status', ['method', 'view', 'status'])
+REQUEST_ERRORS = Counter(
+    'hisabpro_http_request_errors', 'Responses with a 4xx or 5xx status, by URL name', ['view', 'status'],
+)
+DB_QUERIES = Histogram(
+    'hisabpro_db_queries_per_request', 'SQL queries run for one request', ['view'], buckets=QUERY_COUNT_BUCKETS,
+)
+DB_TIME = Histogram('hisabpro_db_time_seconds', 'Time one request spent running SQL', ['view'])
+EXTERNAL_CALLS = Histogram(
+    'hisabpro_external_call_duration_seconds', 'Calls to Supabase, MongoDB, Razorpay and SMTP', ['service'],
+)
+PDF_RENDER = Histogram('hisabpro_pdf_render_duration_seconds', 'Invoice document render time', ['renderer'])
+PDF_SIZE = Histogram('hisabpro_pdf_size_bytes', 'Rendered invoice document size', ['renderer'], buckets=PDF_SIZE_BUCKETS)
+CACHE_LOOKUPS = Counter('hisabpro_cache_lookups', 'Read-through cache lookups, by hit or miss', ['result'])
+SINGLE_FLIGHT = Counter('hisabpro_single_flight', 'Single-flight calls, by flight and outcome', ['flight', 'outcome'])
+TASK_RUNTIME = Histogram('hisabpro_celery_task_duration_seconds', 'Celery task run time', ['task', 'state'])
+TASK_QUEUE_WAIT = Histogram(
+    'hisabpro_celery_task_queue_wait_seconds', 'Time between a task being sent and a worker starting it', ['task'],
+)
+
+
+def registry():
+    """The registry to expose: every worker's samples in multiprocess mode, otherwise this process's"""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def child_exit(server, worker):
+    """gunicorn ``child_exit`` hook: drop the exited worker's live gauge files from PROMETHEUS_MULTIPROC_DIR"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; needs ``Authorization: Bearer <METRICS_TOKEN>``, except under DEBUG with no token"""
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        # Per-view traffic and error counts are not for the public; production must set a token to scrape
+        return HttpResponse('Set METRICS_TOKEN to enable /metrics', status=403, content_type='text/plain')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def observe_request(request, response, seconds, queries, query_seconds):
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else '<unmatched>'
+    status = str(response.status_code)
+    REQUEST_LATENCY.labels(request.method, view).observe(seconds)
+    REQUESTS.labels(request.method, view, status).inc()
+    if response.status_code >= 400:
+        REQUEST_ERRORS.labels(view, status).inc()
+    DB_QUERIES.labels(view).observe(queries)
+    DB_TIME.labels(view).observe(query_seconds)
+
+
+def observe_span(name, seconds):
+    if name in EXTERNAL_SERVICES:
+        EXTERNAL_CALLS.labels(name).observe(seconds)
+
+
+def observe_cache(hit):
+    CACHE_LOOKUPS.labels('hit' if hit else 'miss').inc()
+
+
+def timed_pdf(renderer, render, *args):
+    """``render(*args)``, recording its duration and the size of the document it returns.
+
+    ``render`` returns the document bytes, or a (content, content type, filename) tuple whose HTML
+    fallbacks are recorded under the ``html`` renderer.
+    """
+    started = time.perf_counter()
+    result = render(*args)
+    content = result
+    if isinstance(result, tuple):
+        content, content_type = result[0], result[1]
+        if content_type != 'application/pdf':
+            renderer = 'html'
+    PDF_RENDER.labels(renderer).observe(time.perf_counter() - started)
+    PDF_SIZE.labels(renderer).observe(len(content))
+    return result
+
+
+_task_started = {}
+
+
+def _stamp_published(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    published = getattr(task.request, 'published_at', None)
+    # Scheduled (eta/countdown) tasks wait on purpose; only count time spent queued for a worker
+    if published is not None and not task.request.eta:
+        TASK_QUEUE_WAIT.labels(task.name).observe(max(time.time() - published, 0))
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+def _serve_worker_metrics(**kwargs):
+    from prometheus_client import start_http_server
+
+    start_http_server(settings.CELERY_METRICS_PORT, registry=registry())
+
+
+def connect_celery():
+    """Record run time and queue wait for every Celery task; hisabpro.tasks calls this on import.
+
+    Publishers (web, beat) stamp each message with the time it was sent. With CELERY_METRICS_PORT
+    set the worker also serves its own metrics, for deployments where it does not share
+    PROMETHEUS_MULTIPROC_DIR with the web workers (prefork workers need that directory either way).
+    """
+    from celery import signals
+
+    signals.before_task_publish.connect(_stamp_published, weak=False, dispatch_uid='hisabpro-metrics')
+    signals.task_prerun.connect(_task_prerun, weak=False, dispatch_uid='hisabpro-metrics')
+    signals.task_postrun.connect(_task_postrun, weak=False, dispatch_uid='hisabpro-metrics')
+    if settings.CELERY_METRICS_PORT:
+        signals.worker_init.connect(_serve_worker_metrics, weak=False, dispatch_uid='hisabpro-metrics')
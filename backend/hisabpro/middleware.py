@@ -0,0 +1,147 @@
+"""
+Middleware for HisabPro
+PerformanceMiddleware reports where each request's time went as a Server-Timing header and a JSON log line;
+ReplicaPinMiddleware keeps users who just wrote something reading from the primary
+"""
+
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import instrumentation, metrics, routers
+
+logger = logging.getLogger(__name__)
+
+
+class PerformanceMiddleware:
+    """Per-request query, upstream service, cache, serialization and render timings.
+
+    Every response gets a Server-Timing header (when PERF_SERVER_TIMING is on). A sample of requests
+    (PERF_LOG_SAMPLE_RATE) is logged at INFO; requests slower than PERF_SLOW_REQUEST_MS are always
+    logged, at WARNING and with their SQL.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(instrumentation.install_query_wrapper, dispatch_uid='hisabpro-query-timing')
+        for connection in connections.all(initialized_only=True):
+            instrumentation.install_query_wrapper(connection)
+        instrumentation.time_serializers()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = instrumentation.start(settings.PERF_MAX_QUERIES)
+        try:
+            response = self.get_response(request)
+            self.report(request, response, instrumentation.current())
+        finally:
+            instrumentation.finish(token)
+        return response
+
+    async def __acall__(self, request):
+        token = instrumentation.start(settings.PERF_MAX_QUERIES)
+        try:
+            response = await self.get_response(request)
+            self.report(request, response, instrumentation.current())
+        finally:
+            instrumentation.finish(token)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that from here to the post-render callback
+        trace = instrumentation.current()
+        if trace is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                trace.add_span('render', (time.perf_counter() - started) * 1000)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, trace):
+        elapsed = trace.elapsed_ms()
+        metrics.observe_request(request, response, elapsed / 1000, trace.queries, trace.query_ms / 1000)
+        total = round(elapsed, 1)
+        spans = {name: round(ms, 1) for name, (_, ms) in trace.spans.items()}
+
+        if settings.PERF_SERVER_TIMING:
+            timings = {'db': round(trace.query_ms, 1), **spans, 'app': total}
+            descriptions = {'db': f'{trace.queries} queries'}
+            descriptions.update({name: f'{calls} call(s)' for name, (calls, _) in trace.spans.items()})
+            if trace.cache_hits or trace.cache_misses:
+                timings['cache'] = None
+                descriptions['cache'] = f'{trace.cache_hits} hits {trace.cache_misses} misses'
+            header = instrumentation.server_timing(timings, descriptions)
+            # Views may already report their own sections (the dashboards do)
+            if response.has_header('Server-Timing'):
+                header = f"{response['Server-Timing']}, {header}"
+            response['Server-Timing'] = header
+
+        slow = total >= settings.PERF_SLOW_REQUEST_MS
+        if not slow and random.random() >= settings.PERF_LOG_SAMPLE_RATE:
+            return
+        user = getattr(request, 'user', None)
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user': user.pk if user is not None and user.is_authenticated else None,
+            'duration_ms': total,
+            'db_queries': trace.queries,
+            'db_ms': round(trace.query_ms, 1),
+            'spans': {name: {'calls': calls, 'ms': round(ms, 1)} for name, (calls, ms) in trace.spans.items()},
+            'cache_hits': trace.cache_hits,
+            'cache_misses': trace.cache_misses,
+        }
+        if slow:
+            line['queries'] = [{'ms': ms, 'sql': sql} for ms, sql in trace.statements]
+            logger.warning(f"slow request {json.dumps(line)}")
+        else:
+            logger.info(f"request {json.dumps(line)}")
+
+
+class ReplicaPinMiddleware:
+    """After a user's successful write, send their reads to the primary for a while (see hisabpro/routers.py)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.pin(request, response)
+        return response
+
+    def pin(self, request, response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+            return
+        # DRF copies the user it authenticated (JWT) back onto the Django request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and routers.replica_configured():
+            routers.pin_to_primary(user.pk)
@@ -0,0 +1,136 @@
+"""
+Read-replica routing for HisabPro
+Views wrapped in @replica_reads send their queries to the 'replica' database, unless the user wrote something in
+the last REPLICA_STICKY_SECONDS (so they read their own writes) or the replica is further behind than
+REPLICA_MAX_LAG_SECONDS. Every write, and every read outside those views, goes to the primary.
+"""
+
+import contextvars
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+
+LAG_CACHE_KEY = 'replica:lag'
+# Cached in place of a lag when the replica could not be asked
+UNREACHABLE = -1.0
+
+# Alias the current request reads from; None outside @replica_reads views
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+# Zero while the replica has replayed everything it has received, however long ago the last write was
+POSTGRES_LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+class ReplicaRouter:
+    """Reads follow the alias chosen for the request; writes always go to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES and 'hisabpro.routers.ReplicaRouter' in settings.DATABASE_ROUTERS
+
+
+def reading_replica():
+    """Whether the current queries are routed to the replica"""
+    return _read_alias.get() == REPLICA
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send ``user_id``'s reads to the primary until the replica has had time to catch up with their write"""
+    cache.set(_pin_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def measure_lag():
+    """Seconds the replica is behind the primary, or None when it cannot be asked"""
+    connection = connections[REPLICA]
+    if connection.vendor != 'postgresql':
+        # Nothing replicates into other databases on its own; treat them as current
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        logger.warning('Replica lag check failed; reading from the primary', exc_info=True)
+        return None
+    return float(lag or 0)
+
+
+def replica_lag():
+    """measure_lag(), shared by every worker for REPLICA_LAG_CHECK_SECONDS"""
+    lag = cache.get(LAG_CACHE_KEY)
+    if lag is None:
+        lag = measure_lag()
+        lag = UNREACHABLE if lag is None else lag
+        cache.set(LAG_CACHE_KEY, lag, settings.REPLICA_LAG_CHECK_SECONDS)
+    return None if lag == UNREACHABLE else lag
+
+
+def read_alias(user):
+    """The alias ``user``'s read-only request should use"""
+    if not replica_configured():
+        return PRIMARY
+    if getattr(user, 'is_authenticated', False) and cache.get(_pin_key(user.pk)):
+        return PRIMARY
+    lag = replica_lag()
+    if lag is None or lag > settings.REPLICA_MAX_LAG_SECONDS:
+        return PRIMARY
+    return REPLICA
+
+
+def _reading_from(alias, chunks):
+    """Re-enter the view's routing while a streamed body runs its queries, after the view has returned"""
+    chunks = iter(chunks)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield chunk
+
+
+def replica_reads(view):
+    """Route a read-only view's queries to the replica when that is safe; place below @api_view"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        # Authenticate (reading the user) before routing, so the user row always comes from the primary
+        alias = read_alias(request.user)
+        token = _read_alias.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        if getattr(response, 'streaming', False):
+            response.streaming_content = _reading_from(alias, response.streaming_content)
+        return response
+    return wrapped
@@ -3,7 +3,14 @@ from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from datetime import timedelta
-from invoices.models import Invoice
+from invoices.importer import run_job
+from invoices.models import ImportJob, Invoice
+from invoices.rollups import compact_rollups
+from invoices.sync import prune_tombstones
+
+from .metrics import connect_celery
+
+connect_celery()
 
 
 @shared_task
@@ -62,14 +69,14 @@ def update_invoice_statuses():
         status='pending',
         due_date__lt=today
     )
-    pending_invoices.update(status='overdue')
+    pending_invoices.update(status='overdue', updated_at=timezone.now())
     
     # Update overdue invoices to pending if due date is in the future
     overdue_invoices = Invoice.objects.filter(
         status='overdue',
         due_date__gte=today
     )
-    overdue_invoices.update(status='pending')
+    overdue_invoices.update(status='pending', updated_at=timezone.now())
 
 
 @shared_task
@@ -116,3 +123,25 @@ def send_due_date_reminders():
             
         except Exception as e:
             print(f"Failed to send due date reminder for invoice {invoice.invoice_number}: {str(e)}")
+
+
+@shared_task
+def compact_revenue_rollups(hours=26):
+    """Re-derive revenue rollups for invoices changed in the last day, including queryset updates"""
+    touched = compact_rollups(since=timezone.now() - timedelta(hours=hours))
+    return sum(len(days) for days in touched.values())
+
+
+@shared_task
+def run_import_job(job_id):
+    """Run (or resume) a bulk invoice import in the background"""
+    job = ImportJob.objects.select_related('user').get(pk=job_id)
+    if job.status == 'completed':
+        return job.invoices_created
+    return run_job(job).invoices_created
+
+
+@shared_task
+def prune_invoice_tombstones():
+    """Drop deletion markers older than the delta-sync retention window"""
+    return prune_tombstones()
@@ -5,6 +5,8 @@ from django.conf.urls.static import static
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from .metrics import metrics_view
+
 @csrf_exempt
 def api_root(request):
     """API root endpoint"""
@@ -21,6 +23,7 @@ def api_root(request):
 urlpatterns = [
     path('', api_root, name='api_root'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/auth/', include('auth_app.urls')),
     path('api/', include('invoices.urls')),
 ]
@@ -0,0 +1,179 @@
+"""
+Receivables aging for HisabPro
+Outstanding amounts bucketed by days past due, per client and overall, cached per user
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from hisabpro.routers import reading_replica
+
+from . import caching
+from .money import Money, bson_paise_expr, sql_hundredths
+
+OPEN_STATUSES = ('pending', 'overdue')
+
+# (key, first day past due, last day past due); None means unbounded
+BUCKETS = (
+    ('not_due', None, -1),
+    ('0_30', 0, 30),
+    ('31_60', 31, 60),
+    ('61_90', 61, 90),
+    ('90_plus', 91, None),
+)
+
+CACHE_TIMEOUT = 60 * 60
+
+BACKENDS = ('orm', 'mongo')
+
+
+def cache_key(user_id, today, backend='orm'):
+    # Buckets shift at midnight, so the date is part of the key
+    return caching.key('aging', user_id, backend, today.isoformat())
+
+
+def invalidate_aging(user_ids):
+    """Drop every cached aging report for the given users"""
+    caching.bump('aging', user_ids)
+
+
+def _due_between(today, first, last):
+    """Q for due dates that are first..last days in the past"""
+    q = Q()
+    if first is not None:
+        q &= Q(due_date__lte=today - timedelta(days=first))
+    if last is not None:
+        q &= Q(due_date__gte=today - timedelta(days=last))
+    return q
+
+
+def _empty_buckets():
+    return {key: Money(0) for key, _, _ in BUCKETS}
+
+
+def _render(clients, today):
+    overall = _empty_buckets()
+    rendered = []
+    for client in clients:
+        for key, _, _ in BUCKETS:
+            overall[key] += client['buckets'][key]
+        rendered.append({
+            'client_name': client['client_name'],
+            'client_email': client['client_email'],
+            'invoices': client['invoices'],
+            'total': str(Money.sum(client['buckets'].values())),
+            **{key: str(value) for key, value in client['buckets'].items()},
+        })
+    rendered.sort(key=lambda client: Money.parse(client['total']), reverse=True)
+    return {
+        'as_of': today.isoformat(),
+        'buckets': [key for key, _, _ in BUCKETS],
+        'overall': {
+            'invoices': sum(client['invoices'] for client in clients),
+            'total': str(Money.sum(overall.values())),
+            **{key: str(value) for key, value in overall.items()},
+        },
+        'clients': rendered,
+    }
+
+
+def compute_aging(user, today=None):
+    """One grouped query: a CASE on due_date per bucket, summed per client"""
+    today = today or timezone.localdate()
+    paise = sql_hundredths('total_amount')
+    rows = user.invoices.filter(status__in=OPEN_STATUSES).values('client_name', 'client_email').annotate(
+        invoices=Count('id'),
+        **{
+            f'bucket_{key}': Sum(Case(
+                When(_due_between(today, first, last), then=paise),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+            for key, first, last in BUCKETS
+        },
+    ).order_by()
+    clients = [{
+        'client_name': row['client_name'],
+        'client_email': row['client_email'],
+        'invoices': row['invoices'],
+        'buckets': {key: Money(row[f'bucket_{key}'] or 0) for key, _, _ in BUCKETS},
+    } for row in rows]
+    return _render(clients, today)
+
+
+def bucket_for(days_past_due):
+    for key, first, last in BUCKETS:
+        if (first is None or days_past_due >= first) and (last is None or days_past_due <= last):
+            return key
+
+
+def compute_rows_aging(rows, today=None):
+    """Aging from open invoice rows already fetched (Supabase has no grouped aggregate over REST)"""
+    today = today or timezone.localdate()
+    clients = {}
+    for row in rows:
+        client = clients.setdefault((row.get('client_name') or '', row.get('client_email') or ''), {
+            'client_name': row.get('client_name') or '',
+            'client_email': row.get('client_email') or '',
+            'invoices': 0,
+            'buckets': _empty_buckets(),
+        })
+        days_past_due = (today - date.fromisoformat(str(row['due_date'])[:10])).days
+        client['invoices'] += 1
+        client['buckets'][bucket_for(days_past_due)] += Money.from_rupees(row['total_amount'] or 0)
+    return _render(list(clients.values()), today)
+
+
+def get_aging(user, collection=None):
+    """Cached aging report for ``user``; pass a Mongo invoices collection to aggregate there instead"""
+    today = timezone.localdate()
+    key = cache_key(user.id, today, 'orm' if collection is None else 'mongo')
+    if collection is None:
+        # A lagging replica may not have the write that bumped this namespace yet (webhook and task writes pin
+        # no one); its report must not be cached under the new version for CACHE_TIMEOUT
+        return caching.remember(key, lambda: compute_aging(user, today), CACHE_TIMEOUT, store=not reading_replica())
+    return caching.remember(key, lambda: compute_mongo_aging(collection, user.id, today), CACHE_TIMEOUT)
+
+
+def mongo_aging_pipeline(user_id, today):
+    """Aggregation pipeline producing the same per-client buckets from the invoices collection"""
+    midnight = datetime.combine(today, time.min)
+    days_past_due = {'$floor': {'$divide': [
+        {'$subtract': [midnight, {'$toDate': '$due_date'}]}, 24 * 60 * 60 * 1000,
+    ]}}
+
+    def bucket(first, last):
+        bounds = []
+        if first is not None:
+            bounds.append({'$gte': ['$days_past_due', first]})
+        if last is not None:
+            bounds.append({'$lte': ['$days_past_due', last]})
+        return {'$sum': {'$cond': [{'$and': bounds}, '$amount', 0]}}
+
+    return [
+        {'$match': {'user_id': user_id, 'status': {'$in': list(OPEN_STATUSES)}}},
+        {'$project': {
+            'client_name': 1,
+            'client_email': 1,
+            'amount': bson_paise_expr('total_amount'),
+            'days_past_due': days_past_due,
+        }},
+        {'$group': {
+            '_id': {'client_name': '$client_name', 'client_email': '$client_email'},
+            'invoices': {'$sum': 1},
+            **{key: bucket(first, last) for key, first, last in BUCKETS},
+        }},
+    ]
+
+
+def compute_mongo_aging(collection, user_id, today=None):
+    today = today or timezone.localdate()
+    clients = [{
+        'client_name': row['_id'].get('client_name', ''),
+        'client_email': row['_id'].get('client_email', ''),
+        'invoices': row['invoices'],
+        'buckets': {key: Money(row[key]) for key, _, _ in BUCKETS},
+    } for row in collection.aggregate(mongo_aging_pipeline(user_id, today))]
+    return _render(clients, today)
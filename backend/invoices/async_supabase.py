@@ -0,0 +1,134 @@
+"""
+Async Supabase client for HisabPro
+Talks to PostgREST over a pooled httpx.AsyncClient so ASGI workers never block on Supabase
+"""
+
+import asyncio
+import weakref
+
+from django.conf import settings
+
+from hisabpro.instrumentation import span
+
+from .aging import OPEN_STATUSES
+from .money import Money
+
+# PostgREST caps a response at 1000 rows by default
+PAGE_SIZE = 1000
+
+SUMMARY_STATUSES = ('paid', 'pending', 'draft', 'overdue')
+
+
+def _in(values):
+    return 'in.(%s)' % ','.join(str(value) for value in values)
+
+
+class AsyncSupabase:
+    """The PostgREST queries the async views need, one pooled client per event loop"""
+
+    def __init__(self, url=None, key=None):
+        self.url = url
+        self.key = key
+        # httpx clients are bound to the loop that opened their connections; the dev server runs
+        # each async view in a fresh loop, uvicorn runs them all in one
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # Only ASGI workers serve these views, so WSGI workers never import httpx
+            import httpx
+
+            url = self.url or settings.SUPABASE_URL
+            key = self.key or settings.SUPABASE_KEY
+            client = httpx.AsyncClient(
+                base_url=f"{url.rstrip('/')}/rest/v1/",
+                headers={'apikey': key, 'Authorization': f'Bearer {key}'},
+                timeout=settings.SUPABASE_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                ),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def select(self, table, params, count=False):
+        """Rows matching PostgREST ``params``, plus the total match count when ``count`` is set"""
+        if settings.SUPABASE_LOCAL:
+            from .local_supabase import local_supabase
+            return await local_supabase.select(table, params, count)
+        headers = {'Prefer': 'count=exact'} if count else {}
+        with span('supabase'):
+            response = await self._client().get(table, params=params, headers=headers)
+        response.raise_for_status()
+        total = None
+        if count:
+            # Content-Range: 0-19/245, or */0 when nothing matched
+            total = int(response.headers.get('content-range', '*/0').rsplit('/', 1)[-1])
+        return response.json(), total
+
+    async def get_invoice(self, invoice_id):
+        rows, _ = await self.select('invoices', {'select': '*', 'id': f'eq.{invoice_id}', 'limit': 1})
+        return rows[0] if rows else None
+
+    async def get_invoice_items(self, invoice_id):
+        rows, _ = await self.select('invoice_items', {'select': '*', 'invoice_id': f'eq.{invoice_id}'})
+        return rows
+
+    async def items_for(self, invoice_ids):
+        """Items of several invoices in one request, grouped by invoice id"""
+        items = {}
+        if not invoice_ids:
+            return items
+        rows, _ = await self.select('invoice_items', {'select': '*', 'invoice_id': _in(invoice_ids)})
+        for item in rows:
+            items.setdefault(item['invoice_id'], []).append(item)
+        return items
+
+    async def user_invoices(self, user_id, limit, offset=0):
+        """(newest invoices, total count) for one page of a user's invoices"""
+        return await self.select('invoices', {
+            'select': '*', 'user_id': f'eq.{user_id}', 'order': 'created_at.desc',
+            'limit': limit, 'offset': offset,
+        }, count=True)
+
+    async def watermark(self, user_id):
+        rows, total = await self.select('invoices', {
+            'select': 'updated_at', 'user_id': f'eq.{user_id}', 'order': 'updated_at.desc', 'limit': 1,
+        }, count=True)
+        return (rows[0]['updated_at'] if rows else '', total or 0)
+
+    async def all_rows(self, table, params):
+        """Every matching row: the first page reports the total, the remaining pages are fetched together"""
+        first, total = await self.select(table, {**params, 'limit': PAGE_SIZE, 'offset': 0}, count=True)
+        pages = await asyncio.gather(*(
+            self.select(table, {**params, 'limit': PAGE_SIZE, 'offset': offset})
+            for offset in range(PAGE_SIZE, total or 0, PAGE_SIZE)
+        ))
+        return first + [row for rows, _ in pages for row in rows]
+
+    async def open_invoices(self, user_id):
+        return await self.all_rows('invoices', {
+            'select': 'client_name,client_email,total_amount,due_date,status',
+            'user_id': f'eq.{user_id}', 'status': _in(OPEN_STATUSES), 'order': 'id',
+        })
+
+    async def invoice_summary(self, user_id):
+        """Counts and totals per status, in the shape the summary serializer expects"""
+        rows = await self.all_rows('invoices', {
+            'select': 'status,total_amount', 'user_id': f'eq.{user_id}', 'order': 'id',
+        })
+        amounts = [(row['status'], Money.from_json(row['total_amount'] or 0)) for row in rows]
+        summary = {'total_invoices': len(rows), 'total_amount': Money.sum(amount for _, amount in amounts)}
+        for status in SUMMARY_STATUSES:
+            matching = [amount for row_status, amount in amounts if row_status == status]
+            summary[f'{status}_invoices'] = len(matching)
+            summary[f'{status}_amount'] = Money.sum(matching)
+        for status in ('paid', 'pending', 'overdue'):
+            summary[f'total_{status}_amount'] = summary[f'{status}_amount']
+        return summary
+
+
+async_supabase = AsyncSupabase()
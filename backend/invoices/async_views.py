@@ -0,0 +1,208 @@
+"""
+Async Supabase views for HisabPro
+Read endpoints for ASGI workers; independent upstream calls overlap with asyncio.gather instead of holding a worker each
+"""
+
+import asyncio
+import functools
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from hisabpro.instrumentation import record_cache
+
+from . import caching
+from .aging import compute_rows_aging
+from .async_supabase import async_supabase
+from .conditional import (
+    BODY_TIMEOUT, WATERMARK_TIMEOUT, list_etag, make_etag, not_modified, parse_timestamp, set_validators, watermark_key,
+)
+from .dashboard import RECENT_LIMIT, rows_overdue, server_timing
+from .supabase_models import SupabaseInvoice, SupabaseInvoiceItem
+from .supabase_serializers import InvoiceSummarySerializer, SupabaseInvoiceSerializer
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def render(data, status=200):
+    """JSON response rendered exactly as DRF would, without going through a (sync) APIView"""
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def _authenticate(request):
+    for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authenticator().authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def async_api_view(view):
+    """GET-only, authenticated async view; the DRF authenticators read the database, so they run off the loop"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return render({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        try:
+            user = await sync_to_async(_authenticate)(request)
+        except exceptions.AuthenticationFailed as e:
+            return render(e.detail if isinstance(e.detail, dict) else {'detail': e.detail}, status=401)
+        if user is None:
+            return render({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = user
+        try:
+            return await view(request, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error in {view.__name__}: {str(e)}")
+            return render({'error': str(e)}, status=500)
+    return wrapper
+
+
+async def _watermark(user_id):
+    # Same namespace as the sync views' watermark, so their writes invalidate this copy too
+    key = await sync_to_async(watermark_key)('supabase-async', user_id)
+    watermark = await cache.aget(key)
+    record_cache(hit=watermark is not None)
+    if watermark is None:
+        watermark = await async_supabase.watermark(user_id)
+        await cache.aset(key, watermark, WATERMARK_TIMEOUT)
+    return watermark
+
+
+async def _cached_body(name, user_id, etag, build):
+    key = await sync_to_async(caching.key)('body', user_id, f'{name}-async', etag)
+    body = await cache.aget(key)
+    record_cache(hit=body is not None)
+    if body is None:
+        body = await build()
+        await cache.aset(key, body, BODY_TIMEOUT)
+    return body
+
+
+def _with_items(rows, items):
+    invoices = []
+    for data in rows:
+        invoice = SupabaseInvoice.from_dict(data)
+        invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in items.get(data['id'], [])]
+        invoices.append(invoice)
+    return SupabaseInvoiceSerializer(invoices, many=True).data
+
+
+async def _recent(user_id):
+    rows, _ = await async_supabase.user_invoices(user_id, RECENT_LIMIT)
+    return _with_items(rows, await async_supabase.items_for([row['id'] for row in rows]))
+
+
+async def _summary(user_id):
+    return InvoiceSummarySerializer(await async_supabase.invoice_summary(user_id)).data
+
+
+async def _conditional(request, kind, build):
+    """Watermark ETag, 304 when current, otherwise the cached or freshly built body with validators"""
+    user_id = request.user.id
+    watermark = await _watermark(user_id)
+    etag = list_etag(kind, user_id, watermark)
+    last_modified = parse_timestamp(watermark[0])
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    return set_validators(render(await _cached_body(kind, user_id, etag, build)), etag, last_modified)
+
+
+@async_api_view
+async def invoice_list(request):
+    """One page of the user's invoices with their items: two upstream requests whatever the page size"""
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        size = min(max(int(request.GET.get('page_size', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return render({'error': 'page and page_size must be integers'}, status=400)
+
+    rows, total = await async_supabase.user_invoices(request.user.id, size, (page - 1) * size)
+    if page > 1 and not rows:
+        return render({'detail': 'Invalid page.'}, status=404)
+    results = _with_items(rows, await async_supabase.items_for([row['id'] for row in rows]))
+
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+    return render({
+        'count': total,
+        'next': replace_query_param(url, 'page', page + 1) if page * size < total else None,
+        'previous': previous,
+        'results': results,
+    })
+
+
+@async_api_view
+async def invoice_detail(request, pk):
+    """An invoice and its items, fetched concurrently"""
+    invoice_data, items = await asyncio.gather(
+        async_supabase.get_invoice(pk), async_supabase.get_invoice_items(pk),
+    )
+    if not invoice_data or invoice_data.get('user_id') != request.user.id:
+        return render({'error': 'Invoice not found'}, status=404)
+
+    updated_at = parse_timestamp(invoice_data.get('updated_at'))
+    etag = make_etag('supabase-invoice', pk, invoice_data.get('updated_at'))
+    response = not_modified(request, etag, updated_at)
+    if response is not None:
+        return response
+    return set_validators(render(_with_items([invoice_data], {invoice_data['id']: items})[0]), etag, updated_at)
+
+
+@async_api_view
+async def invoice_summary(request):
+    return await _conditional(request, 'supabase-summary-async', lambda: _summary(request.user.id))
+
+
+@async_api_view
+async def recent_invoices(request):
+    return await _conditional(request, 'supabase-recent-async', lambda: _recent(request.user.id))
+
+
+@async_api_view
+async def dashboard(request):
+    """The combined dashboard payload with summary, recent invoices and open invoices fetched concurrently"""
+    started = time.perf_counter()
+    user_id = request.user.id
+    today = timezone.localdate()
+    timings = {}
+
+    async def timed(name, awaitable):
+        section_started = time.perf_counter()
+        value = await awaitable
+        timings[name] = round((time.perf_counter() - section_started) * 1000, 1)
+        return value
+
+    async def build():
+        summary, recent, rows = await asyncio.gather(
+            timed('summary', _summary(user_id)),
+            timed('recent', _recent(user_id)),
+            timed('open', async_supabase.open_invoices(user_id)),
+        )
+        return {
+            'summary': summary,
+            'recent': recent,
+            'overdue': rows_overdue(rows, today),
+            'aging': compute_rows_aging(rows, today),
+        }
+
+    response = await _conditional(request, f'supabase-dashboard-async:{today.isoformat()}', build)
+    if response.status_code == 200:
+        timings = timings or {'cache': 0}
+        timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        response['Server-Timing'] = server_timing(timings)
+    return response
@@ -0,0 +1,231 @@
+"""
+Batch invoice writes for HisabPro
+Many creates, updates or status changes in one request, written with set-based SQL in one transaction
+"""
+
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .aging import invalidate_aging
+from .gst import seller_state_for
+from .importer import RecordError, check_total
+from .models import Invoice, InvoiceItem, InvoiceNumberSequence
+from .rollups import refresh_rollups
+from .serializers import InvoiceCreateSerializer
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = getattr(settings, 'INVOICE_BATCH_MAX_SIZE', 500)
+MAX_BATCH_BYTES = getattr(settings, 'INVOICE_BATCH_MAX_BYTES', 5 * 1024 * 1024)
+
+# Target status -> statuses an invoice may move from
+STATUS_TRANSITIONS = {
+    'paid': ('pending', 'overdue'),
+    'cancelled': ('pending', 'overdue'),
+}
+
+ITEM_TOTAL_FIELDS = ('invoice_id', 'total', 'gst_rate', 'cess_rate')
+
+
+class BatchTimer:
+    """Milliseconds spent in each phase of a batch, for logs and the response"""
+
+    def __init__(self):
+        self.phases = {}
+        self._started = self._mark = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self._mark) * 1000, 1)
+        self._mark = now
+
+    def as_dict(self):
+        return {**self.phases, 'total': round((time.perf_counter() - self._started) * 1000, 1)}
+
+
+def normalise_id(value):
+    """Canonical UUID string, or None when ``value`` cannot be an invoice id"""
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def _refresh_derived(user_id, days):
+    # Bulk writes skip the save signals that maintain aging and rollups
+    invalidate_aging([user_id])
+    refresh_rollups(user_id, days)
+
+
+class BatchWriter:
+    """Creates (entries without "id") and updates (entries with "id") for one user"""
+
+    def __init__(self, user):
+        self.user = user
+        self.seller_state = seller_state_for(user)
+
+    def _validate(self, entries, existing):
+        """Return (results, [(index, invoice, validated fields, validated items or None)])"""
+        results = [None] * len(entries)
+        valid = []
+        seen = set()
+        # One serializer of each kind is reused; building the field tree per entry dominated the cost
+        serializers = {False: InvoiceCreateSerializer(), True: InvoiceCreateSerializer(partial=True)}
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                results[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': ['Expected an object']}}
+                continue
+            invoice_id = entry.get('id')
+            invoice = None
+            if invoice_id:
+                invoice = existing.get(normalise_id(invoice_id))
+                error = None
+                if invoice is None:
+                    error = 'Invoice not found'
+                elif invoice.id in seen:
+                    error = 'Invoice appears more than once in the batch'
+                if error:
+                    results[index] = {'index': index, 'id': str(invoice_id), 'status': 'error', 'errors': {'id': [error]}}
+                    continue
+                seen.add(invoice.id)
+            try:
+                fields = dict(serializers[invoice is not None].run_validation(entry))
+            except ValidationError as e:
+                results[index] = {'index': index, 'status': 'error', 'errors': e.detail}
+                if invoice_id:
+                    results[index]['id'] = str(invoice_id)
+                continue
+            items = fields.pop('items', None)
+            valid.append((index, invoice, fields, items))
+        return results, valid
+
+    def _build(self, valid, current_items):
+        """Apply fields and compute totals in memory; returns {index: error} for invoices over the limit"""
+        errors = {}
+        self.created, self.updated, self.new_items, self.days = [], [], [], set()
+        for index, invoice, fields, items in valid:
+            is_new = invoice is None
+            if is_new:
+                invoice = Invoice(user=self.user, **fields)
+            else:
+                self.days.add(invoice.issue_date)
+                for name, value in fields.items():
+                    setattr(invoice, name, value)
+            if items is None:
+                line_items = current_items.get(invoice.id, [])
+            else:
+                line_items = [InvoiceItem(invoice=invoice, **item) for item in items]
+                for item in line_items:
+                    item.calculate_total()
+            invoice.calculate_totals(line_items, self.seller_state)
+            try:
+                check_total(invoice)
+            except RecordError as e:
+                errors[index] = str(e)
+                continue
+            self.days.add(invoice.issue_date)
+            if items is not None:
+                self.new_items.extend(line_items)
+            if is_new:
+                self.created.append((index, invoice, fields))
+            else:
+                self.updated.append((index, invoice, fields, items is not None))
+        return errors
+
+    def apply(self, entries):
+        timer = BatchTimer()
+        ids = [normalise_id(entry['id']) for entry in entries if isinstance(entry, dict) and entry.get('id')]
+        ids = [invoice_id for invoice_id in ids if invoice_id]
+        existing = {
+            str(invoice.id): invoice
+            for invoice in Invoice.objects.filter(user=self.user, id__in=ids)
+        } if ids else {}
+        results, valid = self._validate(entries, existing)
+        timer.lap('validate')
+
+        # Updates that keep their items still need them to recompute totals
+        keep_items = [invoice.id for _, invoice, _, items in valid if invoice is not None and items is None]
+        current_items = {}
+        for item in InvoiceItem.objects.filter(invoice_id__in=keep_items).only(*ITEM_TOTAL_FIELDS):
+            current_items.setdefault(item.invoice_id, []).append(item)
+        for index, error in self._build(valid, current_items).items():
+            results[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': [error]}}
+        timer.lap('build')
+
+        with transaction.atomic():
+            if self.created:
+                first = InvoiceNumberSequence.reserve(self.user, len(self.created))
+                for offset, (_, invoice, _) in enumerate(self.created):
+                    invoice.invoice_number = Invoice.format_invoice_number(self.user, first + offset)
+                Invoice.objects.bulk_create([invoice for _, invoice, _ in self.created])
+            if self.updated:
+                now = timezone.now()
+                fields = {'subtotal', 'tax_amount', 'total_amount', 'updated_at'}
+                for _, invoice, validated, _ in self.updated:
+                    invoice.updated_at = now
+                    fields.update(validated)
+                Invoice.objects.bulk_update([invoice for _, invoice, _, _ in self.updated], sorted(fields))
+                replaced = [invoice.id for _, invoice, _, has_items in self.updated if has_items]
+                if replaced:
+                    InvoiceItem.objects.filter(invoice_id__in=replaced).delete()
+            InvoiceItem.objects.bulk_create(self.new_items, batch_size=1000)
+            if self.created or self.updated:
+                transaction.on_commit(lambda: _refresh_derived(self.user.id, self.days))
+        timer.lap('write')
+
+        written = [('created', row[0], row[1]) for row in self.created]
+        written += [('updated', row[0], row[1]) for row in self.updated]
+        for outcome, index, invoice in written:
+            results[index] = {
+                'index': index, 'status': outcome, 'id': str(invoice.id),
+                'invoice_number': invoice.invoice_number, 'total_amount': str(invoice.total_amount),
+            }
+        timing = timer.as_dict()
+        logger.info(
+            f"Invoice batch for user {self.user.id}: {len(entries)} entries, {len(self.created)} created, "
+            f"{len(self.updated)} updated, {sum(r['status'] == 'error' for r in results)} failed in {timing}"
+        )
+        return results, timing
+
+
+def batch_status(user, ids, new_status):
+    """Move ``ids`` to ``new_status`` with one UPDATE; returns (per-id results, timing)"""
+    timer = BatchTimer()
+    allowed = STATUS_TRANSITIONS[new_status]
+    ids = list(dict.fromkeys(str(invoice_id) for invoice_id in ids))
+    with transaction.atomic():
+        current = {
+            str(row['id']): row
+            for row in Invoice.objects.select_for_update()
+            .filter(user=user, id__in=list(filter(None, map(normalise_id, ids))))
+            .values('id', 'status', 'issue_date')
+        }
+        results = []
+        movable = []
+        for invoice_id in ids:
+            row = current.get(normalise_id(invoice_id))
+            if row is None:
+                results.append({'id': invoice_id, 'status': 'error', 'error': 'Invoice not found'})
+            elif row['status'] == new_status:
+                results.append({'id': invoice_id, 'status': 'unchanged'})
+            elif row['status'] not in allowed:
+                results.append({'id': invoice_id, 'status': 'error',
+                                'error': f"Cannot change a {row['status']} invoice to {new_status}"})
+            else:
+                movable.append(row['id'])
+                results.append({'id': invoice_id, 'status': 'updated'})
+        timer.lap('select')
+        if movable:
+            Invoice.objects.filter(id__in=movable).update(status=new_status, updated_at=timezone.now())
+            days = {current[str(invoice_id)]['issue_date'] for invoice_id in movable}
+            transaction.on_commit(lambda: _refresh_derived(user.id, days))
+        timer.lap('update')
+    timing = timer.as_dict()
+    logger.info(f"Batch status {new_status} for user {user.id}: {len(ids)} ids, {len(movable)} updated in {timing}")
+    return results, timing
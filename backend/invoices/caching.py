@@ -0,0 +1,157 @@
+"""
+Cache namespaces for HisabPro
+Per-user versioned key spaces (bump a version to invalidate a whole namespace) and stampede-safe fills
+"""
+
+import logging
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from hisabpro.instrumentation import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Every namespace the app writes to; the management command reports on these
+NAMESPACES = {
+    'aging': 'Receivables aging reports',
+    'watermark': 'Supabase list watermarks behind ETags',
+    'body': 'Rendered summary, recent-invoice and dashboard payloads',
+}
+
+# A version key that was evicted restarts from the clock, so it can never reuse an old version
+VERSION_TIMEOUT = None
+
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+
+
+def _version_key(namespace, user_id):
+    return f'ns:{namespace}:{user_id}:version'
+
+
+def _fresh_version():
+    return time.time_ns() // 1000
+
+
+def versions(namespace, user_ids):
+    """Current version per user, creating missing ones"""
+    keys = {_version_key(namespace, user_id): user_id for user_id in user_ids}
+    found = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    for key, version in missing.items():
+        # add() so two processes racing to create the version agree on one value
+        if not cache.add(key, version, VERSION_TIMEOUT):
+            version = cache.get(key, version)
+        found[key] = version
+    return {keys[key]: version for key, version in found.items()}
+
+
+def key(namespace, user_id, *parts):
+    """Cache key inside ``namespace`` for ``user_id``; it changes whenever the namespace is bumped"""
+    version = versions(namespace, [user_id])[user_id]
+    return ':'.join([namespace, str(user_id), f'v{version}', *(str(part) for part in parts)])
+
+
+def bump(namespace, user_ids):
+    """Invalidate everything cached in ``namespace`` for these users in O(1) per user"""
+    for user_id in set(user_ids):
+        version_key = _version_key(namespace, user_id)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            # Never created or evicted; a clock-based version is newer than any that existed
+            cache.set(version_key, _fresh_version(), VERSION_TIMEOUT)
+
+
+def bump_all(user_ids):
+    for namespace in NAMESPACES:
+        bump(namespace, user_ids)
+
+
+def _lock_key(cache_key):
+    return f'{cache_key}:lock'
+
+
+def _wait_for(cache_key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def remember(cache_key, build, timeout=300, beta=1.0, store=True):
+    """Cached ``build()`` with stampede protection.
+
+    Entries are refreshed a little before they expire, with a probability that rises as expiry
+    nears and with how long the value took to build (probabilistic early expiration). Only the
+    process holding the fill lock rebuilds; everyone else keeps serving the current value, or on
+    a cold key waits briefly for the lock holder before building it themselves.
+
+    With ``store=False`` a cached value is still served, but a miss is built without filling the key
+    (for values built from data that may be older than the key, such as a replica read).
+    """
+    if not store:
+        entry = cache.get(cache_key)
+        record_cache(hit=entry is not None)
+        return build() if entry is None else entry[0]
+
+    entry = cache.get(cache_key)
+    now = time.time()
+    if entry is not None:
+        value, cost, expires = entry
+        if now - cost * beta * math.log(1.0 - random.random()) < expires:
+            record_cache(hit=True)
+            return value
+        if not cache.add(_lock_key(cache_key), 1, LOCK_TIMEOUT):
+            record_cache(hit=True)
+            return value
+    elif not cache.add(_lock_key(cache_key), 1, LOCK_TIMEOUT):
+        entry = _wait_for(cache_key)
+        if entry is not None:
+            record_cache(hit=True)
+            return entry[0]
+        logger.info(f"Cache fill for {cache_key} still locked after {LOCK_WAIT}s; building anyway")
+
+    record_cache(hit=False)
+    try:
+        started = time.time()
+        value = build()
+        finished = time.time()
+        cache.set(cache_key, (value, finished - started, finished + timeout), timeout)
+    finally:
+        cache.delete(_lock_key(cache_key))
+    return value
+
+
+def redis_client():
+    """The raw redis-py client behind the default cache, or None for other backends"""
+    get_client = getattr(getattr(cache, '_cache', None), 'get_client', None)
+    return get_client(write=True) if get_client else None
+
+
+def scan(namespace, user_id=None):
+    """Full Redis keys stored under ``namespace`` (optionally for one user); empty off Redis"""
+    client = redis_client()
+    if client is None:
+        return []
+    pattern = cache.make_key(f'{namespace}:{user_id if user_id is not None else "*"}:*')
+    return list(client.scan_iter(match=pattern, count=1000))
+
+
+def purge(namespace, user_id=None):
+    """Delete the stored keys of a namespace outright (Redis only); returns how many were removed"""
+    client = redis_client()
+    keys = scan(namespace, user_id)
+    if not keys:
+        return 0
+    removed = 0
+    for start in range(0, len(keys), 500):
+        removed += client.delete(*keys[start:start + 500])
+    return removed
@@ -0,0 +1,96 @@
+"""
+Conditional GET helpers for HisabPro
+ETags built from updated_at watermarks, so If-None-Match is answered before any serialization
+"""
+
+import hashlib
+from datetime import datetime
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from hisabpro.instrumentation import span
+
+from . import caching
+
+# Bump when a response's shape changes so clients drop validators issued for the old shape
+ETAG_VERSION = 1
+
+# Supabase watermarks are cached briefly; writes made through our views invalidate them at once
+WATERMARK_TIMEOUT = 30
+BODY_TIMEOUT = 300
+
+
+def make_etag(*parts):
+    """Weak ETag over ``parts``; weak because the same data renders differently per Accept header"""
+    text = '|'.join(str(part) for part in (ETAG_VERSION,) + parts)
+    return 'W/"%s"' % hashlib.blake2b(text.encode(), digest_size=12).hexdigest()
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user data: caches may keep it but must revalidate every time
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization', 'Accept'))
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 carrying the validators when the client's copy is current, otherwise None"""
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def parse_timestamp(value):
+    """datetime for a PostgREST timestamp string; None when it is missing or unparseable"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def orm_watermark(queryset):
+    """(latest updated_at, row count) for a queryset; answered from the (user, updated_at) index"""
+    row = queryset.aggregate(latest=Max('updated_at'), count=Count('id'))
+    return row['latest'], row['count']
+
+
+def list_etag(kind, user_id, watermark):
+    latest, count = watermark
+    stamp = latest.isoformat() if hasattr(latest, 'isoformat') else latest or ''
+    return make_etag(kind, user_id, stamp, count)
+
+
+def watermark_key(backend, user_id):
+    return caching.key('watermark', user_id, backend)
+
+
+def invalidate_watermark(backend, user_id):
+    # Bodies are keyed by ETag and simply stop being asked for, so only the watermark needs to go
+    caching.bump('watermark', [user_id])
+
+
+def supabase_watermark(client, user_id):
+    """(latest updated_at, row count) for a user's Supabase invoices in one request, cached briefly"""
+    def fetch():
+        with span('supabase'):
+            result = (
+                client.table('invoices').select('updated_at', count='exact')
+                .eq('user_id', user_id).order('updated_at', desc=True).limit(1).execute()
+            )
+        return (result.data[0]['updated_at'] if result.data else '', result.count or 0)
+
+    return caching.remember(watermark_key('supabase', user_id), fetch, WATERMARK_TIMEOUT)
+
+
+def cached_body(name, user_id, etag, build):
+    """Response data for ``etag``, built at most once per watermark"""
+    return caching.remember(caching.key('body', user_id, name, etag), build, BODY_TIMEOUT)
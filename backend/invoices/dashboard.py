@@ -0,0 +1,179 @@
+"""
+Dashboard payload for HisabPro
+Summary, recent invoices, overdue counts and aging in one response, timed per section
+"""
+
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.db.models import Count, Q, Sum
+
+from hisabpro.instrumentation import server_timing, span
+
+from .aging import OPEN_STATUSES, compute_rows_aging, get_aging
+from .serializers import InvoiceSerializer, InvoiceSummarySerializer
+from .supabase_models import SupabaseInvoice, SupabaseInvoiceItem
+from .supabase_serializers import InvoiceSummarySerializer as SupabaseSummarySerializer, SupabaseInvoiceSerializer
+
+logger = logging.getLogger(__name__)
+
+RECENT_LIMIT = 5
+DUE_SOON_DAYS = 7
+
+# PostgREST caps a response at 1000 rows by default, so open invoices are read in pages of that size
+SUPABASE_PAGE = 1000
+
+EMPTY_SUPABASE_SUMMARY = {
+    'total_invoices': 0,
+    'paid_invoices': 0,
+    'pending_invoices': 0,
+    'draft_invoices': 0,
+    'overdue_invoices': 0,
+    'total_amount': 0,
+    'paid_amount': 0,
+    'pending_amount': 0,
+    'draft_amount': 0,
+    'overdue_amount': 0,
+    'total_pending_amount': 0,
+    'total_paid_amount': 0,
+    'total_overdue_amount': 0,
+}
+
+
+def _timed(build):
+    started = time.perf_counter()
+    value = build()
+    return value, round((time.perf_counter() - started) * 1000, 1)
+
+
+def run_sections(sections, concurrent=False):
+    """Run {name: build} and return ({name: value}, {name: milliseconds}).
+
+    Concurrent sections each get a thread, which suits independent HTTP round trips; ORM sections
+    run in turn on the request's own database connection.
+    """
+    if concurrent:
+        with ThreadPoolExecutor(max_workers=len(sections), thread_name_prefix='dashboard') as pool:
+            # Each thread runs in a copy of the request's context so its upstream calls land on the request's trace
+            futures = {
+                name: pool.submit(contextvars.copy_context().run, _timed, build) for name, build in sections.items()
+            }
+            results = {name: future.result() for name, future in futures.items()}
+    else:
+        results = {name: _timed(build) for name, build in sections.items()}
+    return (
+        {name: value for name, (value, _) in results.items()},
+        {name: ms for name, (_, ms) in results.items()},
+    )
+
+
+def orm_summary(invoices):
+    """The dashboard totals in one aggregate query"""
+    totals = invoices.aggregate(
+        total_invoices=Count('id'),
+        pending_invoices=Count('id', filter=Q(status='pending')),
+        paid_invoices=Count('id', filter=Q(status='paid')),
+        overdue_invoices=Count('id', filter=Q(status='overdue')),
+        total_pending_amount=Sum('total_amount', filter=Q(status='pending')),
+        total_paid_amount=Sum('total_amount', filter=Q(status='paid')),
+        total_overdue_amount=Sum('total_amount', filter=Q(status='overdue')),
+        total_amount=Sum('total_amount'),
+    )
+    return InvoiceSummarySerializer({key: value or 0 for key, value in totals.items()}).data
+
+
+def orm_overdue(invoices, today):
+    return invoices.filter(status__in=OPEN_STATUSES).aggregate(
+        overdue=Count('id', filter=Q(status='overdue')),
+        past_due=Count('id', filter=Q(due_date__lt=today)),
+        due_soon=Count('id', filter=Q(due_date__gte=today, due_date__lte=today + timedelta(days=DUE_SOON_DAYS))),
+    )
+
+
+def orm_dashboard(user, today):
+    invoices = user.invoices.all()
+    recent = (
+        invoices.select_related('user').prefetch_related('items', 'payments').order_by('-created_at')[:RECENT_LIMIT]
+    )
+    return run_sections({
+        'summary': lambda: orm_summary(invoices),
+        'recent': lambda: InvoiceSerializer(recent, many=True).data,
+        'overdue': lambda: orm_overdue(invoices, today),
+        'aging': lambda: get_aging(user),
+    })
+
+
+def supabase_summary(service, user_id):
+    summary = service.get_invoice_summary(user_id)
+    logger.info(f"Summary data from service: {summary}")
+    # If summary is None or not the expected format, return default values
+    if not summary or not isinstance(summary, dict):
+        summary = EMPTY_SUPABASE_SUMMARY
+    return SupabaseSummarySerializer(summary).data
+
+
+def supabase_items(client, invoice_ids):
+    """Items of several Supabase invoices in one request, grouped by invoice id"""
+    items = {}
+    if invoice_ids:
+        with span('supabase'):
+            found = client.table('invoice_items').select('*').in_('invoice_id', list(invoice_ids)).execute().data
+        for item in found:
+            items.setdefault(item['invoice_id'], []).append(item)
+    return items
+
+
+def supabase_recent(service, user_id, limit=RECENT_LIMIT):
+    """Latest invoices with their items, fetched in one items query rather than one per invoice"""
+    rows = service.get_user_invoices(user_id, limit=limit)
+    items = supabase_items(service.client, [row['id'] for row in rows])
+
+    invoices = []
+    for data in rows:
+        invoice = SupabaseInvoice.from_dict(data)
+        invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in items.get(data['id'], [])]
+        invoices.append(invoice)
+    return SupabaseInvoiceSerializer(invoices, many=True).data
+
+
+def supabase_open_invoices(client, user_id):
+    """Status, due date, client and amount of every open invoice"""
+    rows = []
+    while True:
+        with span('supabase'):
+            page = (
+                client.table('invoices').select('client_name,client_email,total_amount,due_date,status')
+                .eq('user_id', user_id).in_('status', list(OPEN_STATUSES))
+                .order('id').range(len(rows), len(rows) + SUPABASE_PAGE - 1).execute().data
+            )
+        rows.extend(page)
+        if len(page) < SUPABASE_PAGE:
+            return rows
+
+
+def rows_overdue(rows, today):
+    counts = {'overdue': 0, 'past_due': 0, 'due_soon': 0}
+    for row in rows:
+        days_left = (date.fromisoformat(str(row['due_date'])[:10]) - today).days
+        counts['overdue'] += row['status'] == 'overdue'
+        counts['past_due'] += days_left < 0
+        counts['due_soon'] += 0 <= days_left <= DUE_SOON_DAYS
+    return counts
+
+
+def supabase_dashboard(service, user_id, today):
+    # Three independent round trips to Supabase, so they overlap instead of queueing
+    sections, timings = run_sections({
+        'summary': lambda: supabase_summary(service, user_id),
+        'recent': lambda: supabase_recent(service, user_id),
+        'open': lambda: supabase_open_invoices(service.client, user_id),
+    }, concurrent=True)
+    rows = sections.pop('open')
+    derived, derived_timings = run_sections({
+        'overdue': lambda: rows_overdue(rows, today),
+        'aging': lambda: compute_rows_aging(rows, today),
+    })
+    return {**sections, **derived}, {**timings, **derived_timings}
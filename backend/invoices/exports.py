@@ -0,0 +1,81 @@
+"""
+Invoice ledger exports for HisabPro
+Flat invoice or line-item rows streamed straight from a server-side cursor
+"""
+
+from datetime import datetime
+
+from .models import Invoice, InvoiceItem
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (header, ORM path) pairs; the order is the column order of the file
+INVOICE_COLUMNS = (
+    ('invoice_number', 'invoice_number'),
+    ('issue_date', 'issue_date'),
+    ('due_date', 'due_date'),
+    ('status', 'status'),
+    ('client_name', 'client_name'),
+    ('client_email', 'client_email'),
+    ('client_gstin', 'client_gstin'),
+    ('place_of_supply', 'place_of_supply'),
+    ('subtotal', 'subtotal'),
+    ('tax_rate', 'tax_rate'),
+    ('tax_amount', 'tax_amount'),
+    ('total_amount', 'total_amount'),
+)
+
+ITEM_COLUMNS = tuple(
+    (header, f'invoice__{path}') for header, path in INVOICE_COLUMNS
+    if header not in ('subtotal', 'tax_amount')
+) + (
+    ('description', 'description'),
+    ('hsn_sac', 'hsn_sac'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('gst_rate', 'gst_rate'),
+    ('cess_rate', 'cess_rate'),
+    ('line_total', 'total'),
+)
+
+
+def _date(params, name):
+    try:
+        return datetime.strptime(params[name], '%Y-%m-%d').date() if params.get(name) else None
+    except ValueError:
+        raise ValueError(f'{name} must be in YYYY-MM-DD format')
+
+
+def filtered_invoices(user, params):
+    """Invoices for ``user`` narrowed by the status, from, to and client query parameters"""
+    invoices = Invoice.objects.filter(user=user)
+    statuses = [value for value in params.get('status', '').split(',') if value]
+    if statuses:
+        valid = {choice for choice, _ in Invoice.STATUS_CHOICES}
+        unknown = set(statuses) - valid
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(sorted(unknown))}")
+        invoices = invoices.filter(status__in=statuses)
+    start, end = _date(params, 'from'), _date(params, 'to')
+    if start:
+        invoices = invoices.filter(issue_date__gte=start)
+    if end:
+        invoices = invoices.filter(issue_date__lte=end)
+    if params.get('client'):
+        invoices = invoices.filter(client_name__icontains=params['client'])
+    return invoices
+
+
+def export_rows(invoices, items=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Return (header, lazy row iterator); the query only runs once the iterator is consumed"""
+    if items:
+        columns = ITEM_COLUMNS
+        queryset = InvoiceItem.objects.filter(invoice__in=invoices).order_by(
+            'invoice__issue_date', 'invoice__invoice_number', 'id'
+        )
+    else:
+        columns = INVOICE_COLUMNS
+        queryset = invoices.order_by('issue_date', 'invoice_number')
+    header = [name for name, _ in columns]
+    rows = queryset.values_list(*(path for _, path in columns)).iterator(chunk_size=chunk_size)
+    return header, rows
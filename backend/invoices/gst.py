@@ -0,0 +1,116 @@
+"""
+GST tax engine for HisabPro
+Per-item HSN/SAC rates, CGST/SGST vs IGST split by place of supply, and cess
+"""
+
+import re
+from decimal import Decimal
+
+from .money import Money
+
+GSTIN_RE = re.compile(r'^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]$')
+
+STATE_CODES = {
+    '01': 'Jammu and Kashmir', '02': 'Himachal Pradesh', '03': 'Punjab', '04': 'Chandigarh',
+    '05': 'Uttarakhand', '06': 'Haryana', '07': 'Delhi', '08': 'Rajasthan', '09': 'Uttar Pradesh',
+    '10': 'Bihar', '11': 'Sikkim', '12': 'Arunachal Pradesh', '13': 'Nagaland', '14': 'Manipur',
+    '15': 'Mizoram', '16': 'Tripura', '17': 'Meghalaya', '18': 'Assam', '19': 'West Bengal',
+    '20': 'Jharkhand', '21': 'Odisha', '22': 'Chhattisgarh', '23': 'Madhya Pradesh', '24': 'Gujarat',
+    '26': 'Dadra and Nagar Haveli and Daman and Diu', '27': 'Maharashtra', '29': 'Karnataka',
+    '30': 'Goa', '31': 'Lakshadweep', '32': 'Kerala', '33': 'Tamil Nadu', '34': 'Puducherry',
+    '35': 'Andaman and Nicobar Islands', '36': 'Telangana', '37': 'Andhra Pradesh', '38': 'Ladakh',
+    '97': 'Other Territory',
+}
+
+STATE_CHOICES = sorted(STATE_CODES.items())
+
+
+def validate_gstin(gstin):
+    """Return an error message for a malformed GSTIN, or None"""
+    if not GSTIN_RE.match(gstin or ''):
+        return 'Enter a valid 15-character GSTIN.'
+    if gstin[:2] not in STATE_CODES:
+        return f'Unknown GST state code {gstin[:2]}.'
+    return None
+
+
+def gstin_state(gstin):
+    """State code embedded in a GSTIN, or '' when absent"""
+    code = (gstin or '')[:2]
+    return code if code in STATE_CODES else ''
+
+
+def is_inter_state(seller_state, place_of_supply):
+    """IGST applies when both states are known and differ"""
+    return bool(seller_state and place_of_supply and seller_state != place_of_supply)
+
+
+class TaxSplit:
+    """Tax on a taxable value, split into GST heads"""
+
+    __slots__ = ('taxable', 'cgst', 'sgst', 'igst', 'cess')
+
+    def __init__(self, taxable, cgst=None, sgst=None, igst=None, cess=None):
+        self.taxable = taxable
+        self.cgst = cgst or Money(0)
+        self.sgst = sgst or Money(0)
+        self.igst = igst or Money(0)
+        self.cess = cess or Money(0)
+
+    @property
+    def tax(self):
+        return self.cgst + self.sgst + self.igst + self.cess
+
+    def __add__(self, other):
+        return TaxSplit(
+            self.taxable + other.taxable, self.cgst + other.cgst, self.sgst + other.sgst,
+            self.igst + other.igst, self.cess + other.cess,
+        )
+
+    def to_dict(self):
+        return {
+            'taxable_value': str(self.taxable),
+            'cgst': str(self.cgst),
+            'sgst': str(self.sgst),
+            'igst': str(self.igst),
+            'cess': str(self.cess),
+            'total_tax': str(self.tax),
+        }
+
+
+def split_tax(taxable, rate, cess_rate=0, inter_state=False):
+    """Tax ``taxable`` at ``rate`` percent; intra-state tax is CGST + SGST at half the rate each"""
+    rate = Decimal(str(rate or 0))
+    cess = taxable.percent(cess_rate or 0)
+    if inter_state:
+        return TaxSplit(taxable, igst=taxable.percent(rate), cess=cess)
+    half = taxable.percent(rate / 2)
+    return TaxSplit(taxable, cgst=half, sgst=half, cess=cess)
+
+
+def seller_state_for(user):
+    """Seller's state from the GSTIN on the user's profile"""
+    profile = getattr(user, 'userprofile', None)
+    return gstin_state(profile.gst_number) if profile else ''
+
+
+def uses_item_rates(items):
+    """True when any line overrides the invoice rate or carries cess"""
+    return any(item.gst_rate is not None or item.cess_rate for item in items)
+
+
+def invoice_tax(invoice, items=None, seller_state=None):
+    """Per-line GST split for an invoice; lines without their own rate use invoice.tax_rate"""
+    if items is None:
+        items = list(invoice.items.all())
+    if seller_state is None:
+        seller_state = seller_state_for(invoice.user)
+    inter_state = is_inter_state(seller_state, invoice.place_of_supply)
+    total = TaxSplit(Money(0))
+    lines = []
+    for item in items:
+        rate = item.gst_rate if item.gst_rate is not None else invoice.tax_rate
+        line = split_tax(Money.from_decimal(item.total), rate, item.cess_rate, inter_state)
+        lines.append((item, line))
+        total = total + line
+    return total, lines
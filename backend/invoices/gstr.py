@@ -0,0 +1,187 @@
+"""
+GSTR-1 style return for HisabPro
+Aggregates a filing period into B2B, B2CL, B2CS and HSN sections with grouped SQL queries
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .gst import STATE_CODES, seller_state_for, split_tax
+from .models import InvoiceItem
+from .money import Money, sql_hundredths
+
+SECTIONS = ('b2b', 'b2cl', 'b2cs', 'hsn')
+
+TAX_COLUMNS = ['taxable_value', 'igst', 'cgst', 'sgst', 'cess']
+
+SECTION_COLUMNS = {
+    'b2b': ['gstin', 'receiver_name', 'invoice_number', 'invoice_date', 'invoice_value',
+            'place_of_supply', 'rate'] + TAX_COLUMNS,
+    'b2cl': ['invoice_number', 'invoice_date', 'invoice_value', 'place_of_supply', 'rate'] + TAX_COLUMNS,
+    'b2cs': ['type', 'place_of_supply', 'rate'] + TAX_COLUMNS,
+    'hsn': ['hsn_sac', 'quantity', 'items', 'rate'] + TAX_COLUMNS,
+}
+
+
+def _rate(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def _place(code):
+    return f'{code}-{STATE_CODES[code]}' if code in STATE_CODES else ''
+
+
+def _tax_fields(split):
+    return {
+        'taxable_value': str(split.taxable),
+        'igst': str(split.igst),
+        'cgst': str(split.cgst),
+        'sgst': str(split.sgst),
+        'cess': str(split.cess),
+    }
+
+
+class GSTR1Report:
+    """One seller's outward supplies for a filing period, section by section"""
+
+    def __init__(self, user, start, end):
+        self.user = user
+        self.start = start
+        self.end = end
+        self.seller_state = seller_state_for(user)
+        self.b2cl_threshold = Money.from_rupees(getattr(settings, 'GST_B2CL_THRESHOLD', 100000))
+
+    def items(self):
+        """Line items in the period with their effective rate"""
+        return InvoiceItem.objects.filter(
+            invoice__user=self.user,
+            invoice__issue_date__gte=self.start,
+            invoice__issue_date__lte=self.end,
+        ).exclude(invoice__status='cancelled').annotate(
+            rate=Coalesce('gst_rate', 'invoice__tax_rate'),
+        ).order_by()
+
+    def _inter_state(self):
+        """Q for items on invoices supplied outside the seller's state"""
+        if not self.seller_state:
+            return Q(pk__in=[])
+        return ~Q(invoice__place_of_supply='') & ~Q(invoice__place_of_supply=self.seller_state)
+
+    def _split(self, taxable_paise, rate, cess_rate, place_of_supply):
+        inter_state = bool(self.seller_state and place_of_supply and place_of_supply != self.seller_state)
+        return split_tax(Money(taxable_paise), rate, cess_rate, inter_state)
+
+    def _per_invoice(self, items):
+        """One row per (invoice, rate, cess rate), ordered like the invoice register"""
+        return items.values(
+            'invoice_id', 'rate', 'cess_rate',
+            gstin=F('invoice__client_gstin'),
+            receiver_name=F('invoice__client_name'),
+            invoice_number=F('invoice__invoice_number'),
+            invoice_date=F('invoice__issue_date'),
+            invoice_total=F('invoice__total_amount'),
+            pos=F('invoice__place_of_supply'),
+        ).annotate(
+            taxable=Sum(sql_hundredths('total')),
+        ).order_by('invoice_date', 'invoice_number', 'rate').iterator()
+
+    def b2b(self):
+        """Supplies to registered recipients, invoice-wise"""
+        for row in self._per_invoice(self.items().exclude(invoice__client_gstin='')):
+            pos = row['pos'] or self.seller_state
+            yield {
+                'gstin': row['gstin'],
+                'receiver_name': row['receiver_name'],
+                'invoice_number': row['invoice_number'],
+                'invoice_date': row['invoice_date'].isoformat(),
+                'invoice_value': str(Money.from_decimal(row['invoice_total'])),
+                'place_of_supply': _place(pos),
+                'rate': str(_rate(row['rate'])),
+                **_tax_fields(self._split(row['taxable'], row['rate'], row['cess_rate'], pos)),
+            }
+
+    def _large_inter_state(self):
+        return self._inter_state() & Q(invoice__total_amount__gt=self.b2cl_threshold.to_decimal())
+
+    def _b2cl_items(self):
+        return self.items().filter(self._large_inter_state(), invoice__client_gstin='')
+
+    def b2cl(self):
+        """Large inter-state supplies to unregistered recipients, invoice-wise"""
+        for row in self._per_invoice(self._b2cl_items()):
+            yield {
+                'invoice_number': row['invoice_number'],
+                'invoice_date': row['invoice_date'].isoformat(),
+                'invoice_value': str(Money.from_decimal(row['invoice_total'])),
+                'place_of_supply': _place(row['pos']),
+                'rate': str(_rate(row['rate'])),
+                **_tax_fields(self._split(row['taxable'], row['rate'], row['cess_rate'], row['pos'])),
+            }
+
+    def b2cs(self):
+        """All other unregistered supplies, summarised per state and rate"""
+        items = self.items().filter(invoice__client_gstin='').exclude(self._large_inter_state())
+        rows = items.values('rate', 'cess_rate', pos=F('invoice__place_of_supply')).annotate(
+            taxable=Sum(sql_hundredths('total'))
+        )
+        # Blank place of supply means the seller's own state; fold those into it
+        merged = {}
+        for row in rows:
+            key = (row['pos'] or self.seller_state, _rate(row['rate']), _rate(row['cess_rate']))
+            merged[key] = merged.get(key, 0) + row['taxable']
+        for (pos, rate, cess_rate), taxable in sorted(merged.items()):
+            yield {
+                'type': 'OE',
+                'place_of_supply': _place(pos),
+                'rate': str(rate),
+                **_tax_fields(self._split(taxable, rate, cess_rate, pos)),
+            }
+
+    def hsn(self):
+        """HSN/SAC-wise summary of all supplies"""
+        rows = self.items().values(
+            'hsn_sac', 'rate', 'cess_rate', pos=F('invoice__place_of_supply'),
+        ).annotate(
+            taxable=Sum(sql_hundredths('total')),
+            quantity=Sum(sql_hundredths('quantity')),
+            lines=Count('id'),
+        )
+        merged = {}
+        for row in rows:
+            key = (row['hsn_sac'], _rate(row['rate']))
+            split = self._split(row['taxable'], row['rate'], row['cess_rate'], row['pos'] or self.seller_state)
+            previous = merged.get(key)
+            if previous:
+                split = split + previous[0]
+                row['quantity'] += previous[1]
+                row['lines'] += previous[2]
+            merged[key] = (split, row['quantity'], row['lines'])
+        for (hsn_sac, rate), (split, quantity, lines) in sorted(merged.items()):
+            yield {
+                'hsn_sac': hsn_sac,
+                'quantity': str(Decimal(quantity).scaleb(-2)),
+                'items': lines,
+                'rate': str(rate),
+                **_tax_fields(split),
+            }
+
+    def section(self, name):
+        if name not in SECTIONS:
+            raise ValueError(f'Unknown GSTR-1 section: {name}')
+        return getattr(self, name)()
+
+    def summary(self):
+        """Per-section totals, computed from the section rows"""
+        totals = {}
+        for name in SECTIONS:
+            sums = {column: Money(0) for column in TAX_COLUMNS}
+            count = 0
+            for row in self.section(name):
+                count += 1
+                for column in TAX_COLUMNS:
+                    sums[column] += Money.parse(row[column])
+            totals[name] = {'rows': count, **{column: str(value) for column, value in sums.items()}}
+        return totals
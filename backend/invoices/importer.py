@@ -0,0 +1,369 @@
+"""
+Bulk invoice import for HisabPro
+Streams CSV or JSON Lines, validates in batches and bulk-creates invoices in resumable chunks
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .aging import invalidate_aging
+from .gst import STATE_CODES, gstin_state, seller_state_for, validate_gstin
+from .models import Invoice, InvoiceItem, InvoiceNumberSequence
+from .money import Money
+from .reconciliation import DateParser
+from .rollups import refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+# Errors beyond this many are counted but not stored on the job
+MAX_STORED_ERRORS = 1000
+
+# DecimalField(max_digits=10, decimal_places=2)
+MAX_AMOUNT = Money(99_999_999_99)
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+STATUSES = {choice for choice, _ in Invoice.STATUS_CHOICES}
+
+INVOICE_FIELDS = (
+    'invoice_number', 'client_name', 'client_email', 'client_phone', 'client_address', 'client_gstin',
+    'place_of_supply', 'issue_date', 'due_date', 'status', 'tax_rate', 'notes', 'terms_conditions',
+)
+ITEM_FIELDS = ('description', 'hsn_sac', 'quantity', 'unit_price', 'gst_rate', 'cess_rate')
+
+
+class Record:
+    """One invoice from the source file, before validation"""
+
+    __slots__ = ('number', 'line', 'data', 'items', 'error')
+
+    def __init__(self, number, line, data, items, error=None):
+        self.number = number
+        self.line = line
+        self.data = data
+        self.items = items
+        self.error = error
+
+
+def read_csv(fileobj):
+    """One row per line item; consecutive rows with the same invoice_ref (or invoice_number) form an invoice"""
+    reader = csv.reader(fileobj)
+    header = [name.strip().lower() for name in next(reader, [])]
+    key = 'invoice_ref' if 'invoice_ref' in header else 'invoice_number'
+    if key not in header:
+        raise ValueError('CSV needs an invoice_ref or invoice_number column to group line items')
+    key_col = header.index(key)
+    invoice_cols = [(name, header.index(name)) for name in INVOICE_FIELDS if name in header]
+    item_cols = [(name, header.index(name)) for name in ITEM_FIELDS if name in header]
+
+    current_key = None
+    record = None
+    number = 0
+    for line, row in enumerate(reader, start=2):
+        if not row or not any(row):
+            continue
+        row_key = row[key_col].strip() if key_col < len(row) else ''
+        if record is None or row_key != current_key or not row_key:
+            if record is not None:
+                yield record
+            number += 1
+            current_key = row_key
+            record = Record(number, line, {name: row[col] for name, col in invoice_cols if col < len(row)}, [])
+        record.items.append({name: row[col] for name, col in item_cols if col < len(row)})
+    if record is not None:
+        yield record
+
+
+def read_jsonl(fileobj):
+    """One invoice object per line, with its line items under "items" """
+    number = 0
+    for line, text in enumerate(fileobj, start=1):
+        text = text.strip()
+        if not text:
+            continue
+        number += 1
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            yield Record(number, line, None, [], error=f'invalid JSON: {e}')
+            continue
+        if not isinstance(data, dict):
+            yield Record(number, line, None, [], error='each line must be a JSON object')
+            continue
+        items = data.pop('items', None)
+        yield Record(number, line, data, items if isinstance(items, list) else [])
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class RecordError(Exception):
+    pass
+
+
+class RecordValidator:
+    """Hand-rolled field checks; far cheaper per row than running a serializer"""
+
+    def __init__(self):
+        self.parse_date = DateParser()
+
+    @staticmethod
+    def _text(data, field, max_length, required=False):
+        value = data.get(field)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise RecordError(f'{field} is required')
+        if len(value) > max_length:
+            raise RecordError(f'{field} is longer than {max_length} characters')
+        return value
+
+    @staticmethod
+    def _decimal(data, field, default=None, low=None, high=None, positive=False):
+        value = data.get(field)
+        if value is None or value == '':
+            if default is None:
+                return None
+            return default
+        try:
+            number = Decimal(str(value).strip().replace(',', ''))
+        except InvalidOperation:
+            raise RecordError(f'{field} is not a number')
+        if not number.is_finite() or number.as_tuple().exponent < -2:
+            raise RecordError(f'{field} must have at most 2 decimal places')
+        if positive and number <= 0:
+            raise RecordError(f'{field} must be greater than 0')
+        if low is not None and number < low:
+            raise RecordError(f'{field} must be at least {low}')
+        if high is not None and number > high:
+            raise RecordError(f'{field} must be at most {high}')
+        return number
+
+    def _date(self, data, field):
+        value = data.get(field)
+        if not value:
+            return None
+        try:
+            return self.parse_date(str(value))
+        except ValueError:
+            raise RecordError(f'{field} is not a valid date')
+
+    def invoice_fields(self, data):
+        fields = {
+            'invoice_number': self._text(data, 'invoice_number', 20),
+            'client_name': self._text(data, 'client_name', 200, required=True),
+            'client_email': self._text(data, 'client_email', 254, required=True),
+            'client_phone': self._text(data, 'client_phone', 15),
+            'client_address': self._text(data, 'client_address', 10_000),
+            'client_gstin': self._text(data, 'client_gstin', 15).upper(),
+            'place_of_supply': self._text(data, 'place_of_supply', 2),
+            'status': self._text(data, 'status', 20) or 'pending',
+            'tax_rate': self._decimal(data, 'tax_rate', Decimal('18.00'), low=0, high=100),
+            'notes': self._text(data, 'notes', 10_000),
+            'terms_conditions': self._text(data, 'terms_conditions', 10_000),
+        }
+        if not EMAIL_RE.match(fields['client_email']):
+            raise RecordError('client_email is not a valid email address')
+        if fields['status'] not in STATUSES:
+            raise RecordError(f"status must be one of {', '.join(sorted(STATUSES))}")
+        if fields['client_gstin']:
+            error = validate_gstin(fields['client_gstin'])
+            if error:
+                raise RecordError(f'client_gstin: {error}')
+            fields['place_of_supply'] = fields['place_of_supply'] or gstin_state(fields['client_gstin'])
+        if fields['place_of_supply'] and fields['place_of_supply'] not in STATE_CODES:
+            raise RecordError('place_of_supply is not a GST state code')
+
+        issue_date = self._date(data, 'issue_date')
+        if issue_date is None:
+            raise RecordError('issue_date is required')
+        due_date = self._date(data, 'due_date') or issue_date + timedelta(days=30)
+        if due_date < issue_date:
+            raise RecordError('due_date is before issue_date')
+        fields['issue_date'] = issue_date
+        fields['due_date'] = due_date
+        return fields
+
+    def item_fields(self, data, position):
+        if not isinstance(data, dict):
+            raise RecordError(f'item {position}: must be an object')
+        try:
+            return {
+                'description': self._text(data, 'description', 500, required=True),
+                'hsn_sac': self._text(data, 'hsn_sac', 8),
+                'quantity': self._decimal(data, 'quantity', Decimal('1'), positive=True, high=Decimal('99999999.99')),
+                'unit_price': self._decimal(data, 'unit_price', low=0, high=Decimal('99999999.99')),
+                'gst_rate': self._decimal(data, 'gst_rate', low=0, high=100),
+                'cess_rate': self._decimal(data, 'cess_rate', Decimal('0.00'), low=0, high=100),
+            }
+        except RecordError as e:
+            raise RecordError(f'item {position}: {e}')
+
+    def validate(self, record):
+        """Return (invoice fields, item field dicts) or raise RecordError"""
+        if record.error:
+            raise RecordError(record.error)
+        if not record.items:
+            raise RecordError('invoice has no line items')
+        invoice = self.invoice_fields(record.data)
+        items = [self.item_fields(item, position) for position, item in enumerate(record.items, start=1)]
+        for position, item in enumerate(items, start=1):
+            if item['unit_price'] is None:
+                raise RecordError(f'item {position}: unit_price is required')
+        return invoice, items
+
+
+def check_total(invoice):
+    if Money.from_decimal(invoice.total_amount) > MAX_AMOUNT:
+        raise RecordError('invoice total exceeds 99,999,999.99')
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Importer:
+    """Imports records for one user in transactional chunks, recording progress on an ImportJob"""
+
+    def __init__(self, job):
+        self.job = job
+        self.user = job.user
+        self.seller_state = seller_state_for(self.user)
+        self.validator = RecordValidator()
+
+    def _record_errors(self, errors):
+        job = self.job
+        job.error_count += len(errors)
+        room = MAX_STORED_ERRORS - len(job.errors)
+        if room > 0:
+            errors.sort(key=lambda error: error['record'])
+            job.errors.extend(errors[:room])
+
+    def _build(self, invoice_fields, item_fields):
+        invoice = Invoice(user=self.user, **invoice_fields)
+        items = [InvoiceItem(invoice=invoice, **fields) for fields in item_fields]
+        for item in items:
+            item.calculate_total()
+        invoice.calculate_totals(items, self.seller_state)
+        check_total(invoice)
+        return invoice, items
+
+    def process_chunk(self, records):
+        """Validate a chunk, then write every valid invoice in it in one transaction"""
+        built = []
+        errors = []
+        for record in records:
+            try:
+                invoice, items = self._build(*self.validator.validate(record))
+            except RecordError as e:
+                errors.append({'record': record.number, 'line': record.line, 'error': str(e)})
+                continue
+            built.append((record, invoice, items))
+
+        explicit = [invoice.invoice_number for _, invoice, _ in built if invoice.invoice_number]
+        taken = set(Invoice.objects.filter(invoice_number__in=explicit).values_list('invoice_number', flat=True))
+        accepted = []
+        for record, invoice, items in built:
+            number = invoice.invoice_number
+            if number:
+                if number in taken:
+                    errors.append({
+                        'record': record.number, 'line': record.line,
+                        'error': f'invoice_number {number} already exists',
+                    })
+                    continue
+                taken.add(number)
+            accepted.append((record, invoice, items))
+
+        job = self.job
+        self._record_errors(errors)
+        items = [item for _, _, invoice_items in accepted for item in invoice_items]
+        numbered = [invoice.invoice_number for _, invoice, _ in accepted if invoice.invoice_number]
+        try:
+            with transaction.atomic():
+                if numbered:
+                    # Keep the numbers the sequence hands out later clear of the ones this chunk brings with it
+                    InvoiceNumberSequence.advance_past(self.user, numbered)
+                unnumbered = [invoice for _, invoice, _ in accepted if not invoice.invoice_number]
+                if unnumbered:
+                    first = InvoiceNumberSequence.reserve(self.user, len(unnumbered))
+                    for offset, invoice in enumerate(unnumbered):
+                        invoice.invoice_number = Invoice.format_invoice_number(self.user, first + offset)
+                Invoice.objects.bulk_create([invoice for _, invoice, _ in accepted])
+                InvoiceItem.objects.bulk_create(items, batch_size=5000)
+
+                job.committed_records = records[-1].number
+                job.invoices_created += len(accepted)
+                job.items_created += len(items)
+                job.save(update_fields=[
+                    'committed_records', 'invoices_created', 'items_created', 'error_count', 'errors', 'updated_at',
+                ])
+        except DatabaseError as e:
+            # Retrying the chunk would fail the same way on every resume; report its rows and move past it
+            logger.exception(f"Import job {job.id}: records {records[0].number}-{records[-1].number} not saved")
+            self._record_errors([
+                {'record': record.number, 'line': record.line, 'error': f'could not be saved: {e}'}
+                for record, _, _ in accepted
+            ])
+            accepted = []
+            job.committed_records = records[-1].number
+            job.save(update_fields=['committed_records', 'error_count', 'errors', 'updated_at'])
+
+        # bulk_create skips the signals that maintain derived data
+        if accepted:
+            refresh_rollups(self.user.id, {invoice.issue_date for _, invoice, _ in accepted})
+        return len(accepted)
+
+    def run(self, fileobj):
+        job = self.job
+        reader = READERS[job.format]
+        records = (record for record in reader(fileobj) if record.number > job.committed_records)
+        for chunk in _chunks(records, job.chunk_size):
+            self.process_chunk(chunk)
+        invalidate_aging([self.user.id])
+
+
+def open_source(path):
+    """Uploaded files live in default storage; the management command passes local paths"""
+    if os.path.isabs(path):
+        return open(path, 'rb')
+    return default_storage.open(path, 'rb')
+
+
+def run_job(job):
+    """Run or resume ``job`` from its last committed chunk"""
+    job.status = 'running'
+    job.message = ''
+    job.finished_at = None
+    job.save(update_fields=['status', 'message', 'finished_at', 'updated_at'])
+    try:
+        with open_source(job.source_path) as raw:
+            fileobj = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            Importer(job).run(fileobj)
+    except Exception as e:
+        logger.exception(f"Import job {job.id} failed after {job.committed_records} records")
+        job.status = 'failed'
+        job.message = str(e)
+    else:
+        job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'message', 'finished_at', 'updated_at'])
+    return job
@@ -0,0 +1,505 @@
+"""
+Local Supabase for HisabPro
+An in-process stand-in for lib.supabase_service backed by SQLite, so the Supabase views can be run,
+benchmarked and load-tested offline. Every round trip sleeps for the configured latency first, and is
+counted, so batching and caching changes show up as fewer round trips and less waiting.
+
+    SUPABASE_LOCAL=True SUPABASE_LOCAL_LATENCY_MS=40 python manage.py runserver
+"""
+
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+
+from hisabpro.instrumentation import span
+
+from .async_supabase import SUMMARY_STATUSES
+from .money import Money
+
+# The tables setup_supabase_schema.py creates, in SQLite types
+SCHEMA = {
+    'invoices': {
+        'id': 'TEXT PRIMARY KEY',
+        'user_id': 'INTEGER NOT NULL',
+        'invoice_number': "TEXT NOT NULL DEFAULT ''",
+        'client_name': "TEXT NOT NULL DEFAULT ''",
+        'client_email': 'TEXT',
+        'client_phone': 'TEXT',
+        'client_address': 'TEXT',
+        'invoice_date': 'TEXT',
+        'issue_date': 'TEXT',
+        'due_date': 'TEXT',
+        'subtotal': 'REAL DEFAULT 0',
+        'tax_rate': 'REAL DEFAULT 0',
+        'tax_amount': 'REAL DEFAULT 0',
+        'total_amount': 'REAL DEFAULT 0',
+        'status': "TEXT DEFAULT 'pending'",
+        'notes': 'TEXT',
+        'terms_conditions': 'TEXT',
+        'payment_link': 'TEXT',
+        'payment_gateway': 'TEXT',
+        'payment_id': 'TEXT',
+        'created_at': 'TEXT',
+        'updated_at': 'TEXT',
+    },
+    'invoice_items': {
+        'id': 'TEXT PRIMARY KEY',
+        'invoice_id': 'TEXT NOT NULL REFERENCES invoices(id) ON DELETE CASCADE',
+        'description': "TEXT NOT NULL DEFAULT ''",
+        'quantity': 'REAL NOT NULL DEFAULT 0',
+        'unit_price': 'REAL NOT NULL DEFAULT 0',
+        'total': 'REAL NOT NULL DEFAULT 0',
+        'created_at': 'TEXT',
+        'updated_at': 'TEXT',
+    },
+    'invoice_tombstones': {
+        'invoice_id': 'TEXT PRIMARY KEY',
+        'user_id': 'INTEGER NOT NULL',
+        'invoice_number': 'TEXT',
+        'deleted_at': 'TEXT',
+    },
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_invoices_user_id ON invoices(user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_invoices_user_updated ON invoices(user_id, updated_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice_id ON invoice_items(invoice_id)',
+    'CREATE INDEX IF NOT EXISTS idx_invoice_tombstones_user_deleted '
+    'ON invoice_tombstones(user_id, deleted_at, invoice_id)',
+]
+
+PRIMARY_KEYS = {'invoices': 'id', 'invoice_items': 'id', 'invoice_tombstones': 'invoice_id'}
+
+OPERATORS = {'eq': '=', 'neq': '!=', 'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>='}
+
+
+def now():
+    # Fixed width, like PostgREST's timestamptz, so the text columns sort in time order
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+
+def _value(value):
+    if isinstance(value, Money):
+        return value.to_json()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class LocalResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class LocalQuery:
+    """One request through the supabase-py query builder, run against SQLite"""
+
+    def __init__(self, service, table):
+        service.check_columns(table, ())
+        self.service = service
+        self.table = table
+        self.columns = '*'
+        self.count = None
+        self.where = []
+        self.params = []
+        self.orders = []
+        self.limit_to = None
+        self.offset = 0
+        self.operation = 'select'
+        self.payload = None
+
+    def select(self, columns='*', count=None):
+        if columns != '*':
+            self.service.check_columns(self.table, columns.split(','))
+        self.columns, self.count = columns, count
+        return self
+
+    def insert(self, rows):
+        """Insert one row or a list of them; the result holds the stored rows"""
+        self.operation, self.payload = 'insert', [rows] if isinstance(rows, dict) else list(rows)
+        return self
+
+    def update(self, changes):
+        self.operation, self.payload = 'update', changes
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    def _filter(self, column, operator, value):
+        self.service.check_columns(self.table, [column])
+        if operator == 'in':
+            values = [_value(item) for item in value]
+            self.where.append(f"{column} IN ({','.join('?' * len(values))})" if values else '0')
+            self.params.extend(values)
+        else:
+            self.where.append(f'{column} {OPERATORS[operator]} ?')
+            self.params.append(_value(value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', values)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def or_(self, expression):
+        """``column.operator.value`` terms separated by commas, any of which may match"""
+        terms = []
+        for term in expression.split(','):
+            column, operator, value = term.split('.', 2)
+            self.service.check_columns(self.table, [column])
+            terms.append(f'{column} {OPERATORS[operator]} ?')
+            self.params.append(value)
+        self.where.append(f"({' OR '.join(terms)})")
+        return self
+
+    def order(self, column, desc=False):
+        self.service.check_columns(self.table, [column])
+        self.orders.append(f"{column} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count):
+        self.limit_to = count
+        return self
+
+    def range(self, start, end):
+        self.offset, self.limit_to = start, end - start + 1
+        return self
+
+    def _where(self):
+        return f" WHERE {' AND '.join(self.where)}" if self.where else ''
+
+    def rows(self):
+        """(matching rows, total count when one was asked for) without a round trip"""
+        where = self._where()
+        sql = f'SELECT {self.columns} FROM {self.table}{where}'
+        if self.orders:
+            sql += f" ORDER BY {', '.join(self.orders)}"
+        if self.limit_to is not None or self.offset:
+            sql += f' LIMIT {-1 if self.limit_to is None else int(self.limit_to)} OFFSET {int(self.offset)}'
+        rows = self.service.fetch(sql, self.params)
+        total = None
+        if self.count:
+            total = self.service.fetch(f'SELECT COUNT(*) AS total FROM {self.table}{where}', self.params)[0]['total']
+        return rows, total
+
+    def execute(self):
+        with self.service.round_trip(f'{self.operation} {self.table}'):
+            if self.operation == 'insert':
+                return LocalResult(self.service.insert_rows(self.table, self.payload))
+            if self.operation == 'update':
+                return LocalResult(self.service.update_rows(self.table, self._where(), self.params, self.payload))
+            if self.operation == 'delete':
+                return LocalResult(self.service.delete_rows(self.table, self._where(), self.params))
+            return LocalResult(*self.rows())
+
+
+class LocalClient:
+    """The ``supabase_service.client`` half: raw table queries"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def table(self, name):
+        return LocalQuery(self.service, name)
+
+
+class LocalSupabase:
+    """``supabase_service`` over a SQLite database, with injected per-round-trip latency"""
+
+    def __init__(self, path=None, latency=None, jitter=None):
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.round_trips = Counter()
+        self.client = None
+        self._connected = False
+        self._db = None
+        self._lock = threading.Lock()
+
+    # Connection and bookkeeping
+
+    def connect(self):
+        # Like the real service, connecting builds the client once and is not a round trip
+        if self._connected:
+            return True
+        with self._lock:
+            if self._db is None:
+                path = self.path or settings.SUPABASE_LOCAL_PATH
+                if self.latency is None:
+                    self.latency = settings.SUPABASE_LOCAL_LATENCY_MS / 1000
+                if self.jitter is None:
+                    self.jitter = settings.SUPABASE_LOCAL_JITTER_MS / 1000
+                # One connection shared by every thread; statements take the lock, the injected latency does not
+                db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+                db.row_factory = lambda cursor, row: {col[0]: value for col, value in zip(cursor.description, row)}
+                db.execute('PRAGMA foreign_keys = ON')
+                if str(path) != ':memory:':
+                    db.execute('PRAGMA journal_mode = WAL')
+                for table, columns in SCHEMA.items():
+                    body = ', '.join(f'{name} {kind}' for name, kind in columns.items())
+                    db.execute(f'CREATE TABLE IF NOT EXISTS {table} ({body})')
+                for statement in INDEXES:
+                    db.execute(statement)
+                db.commit()
+                self._db = db
+            self.client = LocalClient(self)
+            self._connected = True
+        return True
+
+    def check_columns(self, table, columns):
+        if table not in SCHEMA:
+            raise ValueError(f'Unknown table {table!r}')
+        unknown = set(columns) - set(SCHEMA[table])
+        if unknown:
+            raise ValueError(f"Unknown column(s) {', '.join(sorted(unknown))} on {table}")
+
+    def _delay(self):
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+    @contextmanager
+    def round_trip(self, name):
+        """Count a round trip and wait out the simulated network before running it"""
+        self.connect()
+        self.round_trips[name] += 1
+        with span('supabase'):
+            time.sleep(self._delay())
+            yield
+
+    def reset_round_trips(self):
+        """Round trips counted so far, by call, clearing the count"""
+        counted = dict(self.round_trips)
+        self.round_trips.clear()
+        return counted
+
+    def fetch(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock, self._db:
+            yield self._db
+
+    def _insert_sql(self, table, row):
+        columns = ', '.join(row)
+        return f"INSERT INTO {table} ({columns}) VALUES ({', '.join('?' * len(row))})", list(row.values())
+
+    def _with_defaults(self, table, data, stamp):
+        """``data`` limited to the table's columns, with the defaults the real schema fills in"""
+        row = {key: _value(value) for key, value in data.items() if key in SCHEMA[table]}
+        if table == 'invoice_tombstones':
+            row.setdefault('deleted_at', stamp)
+            return row
+        if not row.get('id'):
+            row['id'] = str(uuid.uuid4())
+        row.setdefault('created_at', stamp)
+        row.setdefault('updated_at', stamp)
+        if table == 'invoice_items' and row.get('total') in (None, ''):
+            row['total'] = Money.from_json(row.get('unit_price') or 0).times(row.get('quantity') or 0).to_json()
+        return row
+
+    def _rows(self, db, table, keys):
+        key = PRIMARY_KEYS[table]
+        found = {row[key]: row for row in db.execute(
+            f"SELECT * FROM {table} WHERE {key} IN ({','.join('?' * len(keys))})", keys,
+        ).fetchall()}
+        return [found[value] for value in keys if value in found]
+
+    def _touch(self, db, invoice_ids, stamp):
+        # The invoice_items_touch trigger: item changes move the invoice's updated_at too
+        invoice_ids = list(invoice_ids)
+        if invoice_ids:
+            db.execute(f"UPDATE invoices SET updated_at = ? WHERE id IN ({','.join('?' * len(invoice_ids))})",
+                       [stamp, *invoice_ids])
+
+    def insert_rows(self, table, rows):
+        """Insert ``rows`` in one transaction and return them as stored, like an insert returning representation"""
+        stamp = now()
+        rows = [self._with_defaults(table, row, stamp) for row in rows]
+        with self.transaction() as db:
+            for row in rows:
+                db.execute(*self._insert_sql(table, row))
+            if table == 'invoice_items':
+                self._touch(db, {row['invoice_id'] for row in rows}, stamp)
+            return self._rows(db, table, [row[PRIMARY_KEYS[table]] for row in rows])
+
+    def update_rows(self, table, where, params, changes):
+        """Apply ``changes`` to the rows matching ``where``; returns the updated rows"""
+        key = PRIMARY_KEYS[table]
+        stamp = now()
+        changes = {column: _value(value) for column, value in changes.items() if column in SCHEMA[table] and column != key}
+        if table == 'invoices':
+            # The invoices_touch trigger
+            changes['updated_at'] = stamp
+        with self.transaction() as db:
+            keys = [row[key] for row in db.execute(f'SELECT {key} FROM {table}{where}', params).fetchall()]
+            if not keys:
+                return []
+            marks = ','.join('?' * len(keys))
+            if changes:
+                assignments = ', '.join(f'{column} = ?' for column in changes)
+                db.execute(f'UPDATE {table} SET {assignments} WHERE {key} IN ({marks})', [*changes.values(), *keys])
+            rows = self._rows(db, table, keys)
+            if table == 'invoice_items':
+                self._touch(db, {row['invoice_id'] for row in rows}, stamp)
+            return rows
+
+    def delete_rows(self, table, where, params):
+        """Delete the rows matching ``where``, leaving tombstones for invoices; returns the deleted rows"""
+        key = PRIMARY_KEYS[table]
+        stamp = now()
+        with self.transaction() as db:
+            rows = db.execute(f'SELECT * FROM {table}{where}', params).fetchall()
+            if not rows:
+                return []
+            keys = [row[key] for row in rows]
+            if table == 'invoices':
+                # The invoices_tombstone trigger
+                db.executemany(
+                    'INSERT INTO invoice_tombstones (invoice_id, user_id, invoice_number, deleted_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (invoice_id) DO UPDATE SET deleted_at = excluded.deleted_at',
+                    [(row['id'], row['user_id'], row['invoice_number'], stamp) for row in rows],
+                )
+            db.execute(f"DELETE FROM {table} WHERE {key} IN ({','.join('?' * len(keys))})", keys)
+            if table == 'invoice_items':
+                self._touch(db, {row['invoice_id'] for row in rows}, stamp)
+            return rows
+
+    def load(self, table, rows):
+        """Bulk insert ``rows`` exactly as given, with no latency, defaults or triggers; for seeding"""
+        self.connect()
+        self.check_columns(table, ())
+        with self.transaction() as db:
+            for row in rows:
+                db.execute(*self._insert_sql(table, {key: _value(value) for key, value in row.items()}))
+
+    def clear(self):
+        self.connect()
+        with self.transaction() as db:
+            for table in reversed(list(SCHEMA)):
+                db.execute(f'DELETE FROM {table}')
+
+    # The supabase_service interface
+
+    def get_invoice(self, invoice_id):
+        with self.round_trip('get_invoice'):
+            rows = self.fetch('SELECT * FROM invoices WHERE id = ?', [str(invoice_id)])
+        return rows[0] if rows else None
+
+    def get_user_invoices(self, user_id, limit=None):
+        with self.round_trip('get_user_invoices'):
+            query = LocalQuery(self, 'invoices').eq('user_id', user_id).order('created_at', desc=True)
+            if limit:
+                query.limit(limit)
+            return query.rows()[0]
+
+    def get_all_invoices(self):
+        with self.round_trip('get_all_invoices'):
+            return self.fetch('SELECT * FROM invoices ORDER BY created_at DESC')
+
+    def get_invoice_count(self, user_id):
+        with self.round_trip('get_invoice_count'):
+            return self.fetch('SELECT COUNT(*) AS total FROM invoices WHERE user_id = ?', [user_id])[0]['total']
+
+    def get_invoice_items(self, invoice_id):
+        with self.round_trip('get_invoice_items'):
+            return self.fetch('SELECT * FROM invoice_items WHERE invoice_id = ? ORDER BY created_at, id',
+                              [str(invoice_id)])
+
+    def get_invoice_summary(self, user_id):
+        """Counts and totals per status, in the shape the summary serializer expects"""
+        with self.round_trip('get_invoice_summary'):
+            rows = self.fetch('SELECT status, total_amount FROM invoices WHERE user_id = ?', [user_id])
+        amounts = [(row['status'], Money.from_json(row['total_amount'] or 0)) for row in rows]
+        summary = {'total_invoices': len(rows), 'total_amount': Money.sum(amount for _, amount in amounts)}
+        for status in SUMMARY_STATUSES:
+            matching = [amount for row_status, amount in amounts if row_status == status]
+            summary[f'{status}_invoices'] = len(matching)
+            summary[f'{status}_amount'] = Money.sum(matching)
+        for status in ('paid', 'pending', 'overdue'):
+            summary[f'total_{status}_amount'] = summary[f'{status}_amount']
+        return summary
+
+    def create_invoice(self, data):
+        """Insert an invoice and return its id"""
+        with self.round_trip('create_invoice'):
+            return self.insert_rows('invoices', [data])[0]['id']
+
+    def create_invoice_item(self, data):
+        """Insert an item, totalling it when the caller did not, and return its id"""
+        with self.round_trip('create_invoice_item'):
+            return self.insert_rows('invoice_items', [data])[0]['id']
+
+    def update_invoice(self, invoice_id, data):
+        """Update an invoice's known columns; False when there was no such invoice"""
+        with self.round_trip('update_invoice'):
+            return bool(self.update_rows('invoices', ' WHERE id = ?', [str(invoice_id)], data))
+
+    def delete_invoice(self, invoice_id):
+        """Delete an invoice and its items, leaving a tombstone for delta sync"""
+        with self.round_trip('delete_invoice'):
+            return bool(self.delete_rows('invoices', ' WHERE id = ?', [str(invoice_id)]))
+
+    def delete_invoice_item(self, item_id):
+        with self.round_trip('delete_invoice_item'):
+            return bool(self.delete_rows('invoice_items', ' WHERE id = ?', [str(item_id)]))
+
+    # AsyncSupabase.select, for the async views
+
+    async def select(self, table, params, count=False):
+        """Rows matching PostgREST ``params``, plus the total match count when ``count`` is set"""
+        self.connect()
+        self.round_trips[f'GET {table}'] += 1
+        with span('supabase'):
+            await asyncio.sleep(self._delay())
+            query = LocalQuery(self, table).select(params.get('select', '*'), count='exact' if count else None)
+            for column, condition in params.items():
+                if column in ('select', 'order', 'limit', 'offset'):
+                    continue
+                operator, _, value = condition.partition('.')
+                if operator == 'in':
+                    query.in_(column, value.strip('()').split(','))
+                else:
+                    query._filter(column, operator, value)
+            for term in filter(None, str(params.get('order', '')).split(',')):
+                column, _, direction = term.partition('.')
+                query.order(column, desc=direction == 'desc')
+            if 'limit' in params:
+                query.limit(int(params['limit']))
+            query.offset = int(params.get('offset', 0))
+            return query.rows()
+
+
+local_supabase = LocalSupabase()
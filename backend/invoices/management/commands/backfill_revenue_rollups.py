@@ -0,0 +1,28 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily and monthly revenue rollups from invoice history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rollups for this username')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rollup rows per bulk insert')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            try:
+                user_ids = [User.objects.get(username=options['user']).id]
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist")
+
+        started = time.perf_counter()
+        days, months = backfill(user_ids=user_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {days} daily and {months} monthly rollups in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices import caching
+
+
+class Command(BaseCommand):
+    help = 'Inspect or flush the per-user cache namespaces'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('show', 'flush'))
+        parser.add_argument('--user', action='append', default=[], help='Username (repeatable)')
+        parser.add_argument('--all-users', action='store_true', help='Flush the namespaces for every user')
+        parser.add_argument('--namespace', action='append', choices=sorted(caching.NAMESPACES), default=[],
+                            help='Namespace (repeatable); defaults to all of them')
+        parser.add_argument('--purge', action='store_true',
+                            help='Also delete the orphaned keys right away instead of letting them expire (Redis only)')
+
+    def handle(self, *args, **options):
+        namespaces = options['namespace'] or sorted(caching.NAMESPACES)
+        users = list(User.objects.filter(username__in=options['user']).order_by('username'))
+        missing = set(options['user']) - {user.username for user in users}
+        if missing:
+            raise CommandError(f"Unknown user(s): {', '.join(sorted(missing))}")
+
+        backend = settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]
+        self.stdout.write(f'Cache backend: {backend} ({settings.CACHES["default"].get("LOCATION", "")})')
+        if caching.redis_client() is None:
+            self.stdout.write('Key counts need Redis; a local-memory cache only lives inside its own process')
+
+        if options['action'] == 'show':
+            for namespace in namespaces:
+                stored = len(caching.scan(namespace)) if caching.redis_client() else '-'
+                self.stdout.write(f'{namespace:<10} {stored!s:>8} keys  {caching.NAMESPACES[namespace]}')
+                for user in users:
+                    version = caching.versions(namespace, [user.id])[user.id]
+                    keys = len(caching.scan(namespace, user.id)) if caching.redis_client() else '-'
+                    self.stdout.write(f'  {user.username}: version {version}, {keys} keys')
+            return
+
+        if options['all_users']:
+            users = list(User.objects.all())
+        elif not users:
+            raise CommandError('Pass --user USERNAME (repeatable) or --all-users to flush')
+
+        user_ids = [user.id for user in users]
+        for namespace in namespaces:
+            caching.bump(namespace, user_ids)
+            purged = 0
+            if options['purge']:
+                if options['all_users']:
+                    purged = caching.purge(namespace)
+                else:
+                    purged = sum(caching.purge(namespace, user_id) for user_id in user_ids)
+            self.stdout.write(f'{namespace}: bumped {len(user_ids)} users' + (f', purged {purged} keys' if purged else ''))
+        self.stdout.write(self.style.SUCCESS('Flushed'))
@@ -0,0 +1,29 @@
+from decouple import config
+from django.core.management.base import BaseCommand
+
+from invoices.mongo_indexes import MONGO_INDEXES, ensure_mongo_indexes
+from invoices.services import mongodb_service
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB invoice indexes; safe to run on every deploy (ORM indexes come from migrate)'
+
+    def handle(self, *args, **options):
+        # Runs before the web server on every deploy, so a deployment without MongoDB must not fail here
+        db = None
+        if config('MONGODB_URI', default=''):
+            try:
+                mongodb_service._ensure_connected()
+                db = mongodb_service.db
+            except ImportError:
+                # lib/mongodb.py was removed with the move to Supabase
+                pass
+        if db is None:
+            self.stdout.write('MongoDB is not configured or not reachable; no indexes created')
+            return
+
+        failed = ensure_mongo_indexes(db, force=True)
+        for collection, keys in failed:
+            self.stdout.write(self.style.WARNING(f'{collection} {keys}: not created, see the log'))
+        total = sum(map(len, MONGO_INDEXES.values()))
+        self.stdout.write(self.style.SUCCESS(f'{total - len(failed)} of {total} MongoDB indexes in place'))
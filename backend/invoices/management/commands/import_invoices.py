@@ -0,0 +1,63 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.importer import READERS, run_job
+from invoices.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = 'Bulk import invoices from CSV (one row per line item) or JSON Lines (one invoice per line)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='File to import')
+        parser.add_argument('--user', help='Username that will own the invoices')
+        parser.add_argument('--format', choices=sorted(READERS), help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Invoices per transaction')
+        parser.add_argument('--resume', metavar='JOB_ID', help='Resume an earlier job from its last committed chunk')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                job = ImportJob.objects.select_related('user').get(pk=options['resume'])
+            except (ImportJob.DoesNotExist, ValueError):
+                raise CommandError(f"Import job {options['resume']!r} does not exist")
+            if job.status == 'completed':
+                raise CommandError('That import job has already completed')
+            self.stdout.write(f'Resuming job {job.id} after record {job.committed_records}')
+        else:
+            if not options['path'] or not options['user']:
+                raise CommandError('A path and --user are required unless --resume is given')
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist")
+            path = os.path.abspath(options['path'])
+            file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+            if file_format == 'json':
+                file_format = 'jsonl'
+            if file_format not in READERS:
+                raise CommandError('Could not tell the file format; pass --format')
+            job = ImportJob.objects.create(
+                user=user, source_path=path, format=file_format, chunk_size=options['chunk_size'],
+            )
+            self.stdout.write(f'Created import job {job.id}')
+
+        started = time.perf_counter()
+        created_before = job.invoices_created
+        job = run_job(job)
+        elapsed = time.perf_counter() - started
+        created = job.invoices_created - created_before
+        rate = created / elapsed if elapsed else 0
+
+        for error in job.errors[:20]:
+            self.stdout.write(f"  record {error['record']} (line {error['line']}): {error['error']}")
+        summary = (
+            f'{created} invoices ({job.items_created} items in total) imported in {elapsed:.2f}s '
+            f'({rate:,.0f} invoices/s); {job.error_count} records rejected'
+        )
+        if job.status == 'failed':
+            raise CommandError(f'{summary}. Failed: {job.message}. Resume with --resume {job.id}')
+        self.stdout.write(self.style.SUCCESS(summary))
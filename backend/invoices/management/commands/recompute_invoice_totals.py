@@ -0,0 +1,173 @@
+import time
+from itertools import islice
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from invoices.aging import invalidate_aging
+from invoices.gst import invoice_tax
+from invoices.models import Invoice, InvoiceItem
+from invoices.money import Money, sql_hundredths
+from invoices.rollups import compact_rollups
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def item_subtotals(items, chunk_size):
+    """Yield (invoice_id, subtotal_paise, item_count) in invoice_id order using NumPy group-by per chunk"""
+    rows = items.order_by('invoice_id').annotate(paise=sql_hundredths('total')).values_list(
+        'invoice_id', 'paise'
+    ).iterator(chunk_size=chunk_size)
+
+    pending_id, pending_sum, pending_count = None, 0, 0
+    for chunk in _chunks(rows, chunk_size):
+        ids, paise = zip(*chunk)
+        keys = np.array(ids, dtype=object)
+        amounts = np.fromiter(paise, dtype=np.int64, count=len(paise))
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        sums = np.add.reduceat(amounts, starts)
+        counts = np.diff(np.append(starts, len(keys)))
+        for invoice_id, subtotal, count in zip(keys[starts].tolist(), sums.tolist(), counts.tolist()):
+            # A group can straddle two chunks; keep adding until the id changes
+            if invoice_id == pending_id:
+                pending_sum += subtotal
+                pending_count += count
+                continue
+            if pending_id is not None:
+                yield pending_id, pending_sum, pending_count
+            pending_id, pending_sum, pending_count = invoice_id, subtotal, count
+    if pending_id is not None:
+        yield pending_id, pending_sum, pending_count
+
+
+def tax_paise(subtotals, rates):
+    """Vectorized Money.percent: subtotal * rate% rounded half-up to the paisa"""
+    scaled = subtotals * rates
+    magnitude = (2 * np.abs(scaled) + 10000) // 20000
+    return np.where(scaled < 0, -magnitude, magnitude)
+
+
+class Command(BaseCommand):
+    help = 'Recompute invoice subtotal, tax and total from line items in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only recompute invoices belonging to this username')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Item rows fetched per chunk')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Invoices per bulk_update')
+        parser.add_argument('--dry-run', action='store_true', help='Report differences without writing')
+        parser.add_argument('--show', type=int, default=20, help='Number of differences to print')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        items = InvoiceItem.objects.all()
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist")
+            invoices = invoices.filter(user=user)
+            items = items.filter(invoice__user=user)
+
+        self.dry_run = options['dry_run']
+        self.show = options['show']
+        self.shown = 0
+        self.changed = 0
+        self.item_rows = 0
+        # Invoices with line-level GST rates or cess go through the GST engine instead of the vectorized path
+        self.line_rated = set(items.filter(Q(gst_rate__isnull=False) | ~Q(cess_rate=0)).values_list(
+            'invoice_id', flat=True
+        ).distinct())
+        started = time.perf_counter()
+        run_started = timezone.now()
+
+        invoice_rows = invoices.order_by('id').annotate(
+            rate=sql_hundredths('tax_rate'),
+            subtotal_paise=sql_hundredths('subtotal'),
+            tax_paise=sql_hundredths('tax_amount'),
+            total_paise=sql_hundredths('total_amount'),
+        ).values_list(
+            'id', 'invoice_number', 'rate', 'subtotal_paise', 'tax_paise', 'total_paise'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        groups = item_subtotals(items, options['chunk_size'])
+        group_id, group_sum, group_count = next(groups, (None, 0, 0))
+        processed = 0
+        for batch in _chunks(invoice_rows, options['batch_size']):
+            subtotals = np.zeros(len(batch), dtype=np.int64)
+            for position, row in enumerate(batch):
+                # Both streams are ordered by invoice id, so this is a merge join
+                while group_id is not None and group_id < row[0]:
+                    group_id, group_sum, group_count = next(groups, (None, 0, 0))
+                if group_id == row[0]:
+                    subtotals[position] = group_sum
+                    self.item_rows += group_count
+            self._apply_batch(batch, subtotals)
+            processed += len(batch)
+
+        if self.changed and not self.dry_run:
+            # bulk_update bypasses the model signals that keep the aging cache and rollups fresh
+            invalidate_aging(invoices.values_list('user_id', flat=True).distinct())
+            compact_rollups(since=run_started)
+
+        elapsed = time.perf_counter() - started
+        rate = (self.item_rows + processed) / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Processed {processed} invoices and {self.item_rows} items in {elapsed:.2f}s '
+            f'({rate:,.0f} rows/s); {self.changed} invoices '
+            f"{'would change' if self.dry_run else 'updated'}"
+        )
+
+    def _line_rated_taxes(self, batch, positions, taxes):
+        invoices = Invoice.objects.select_related('user__userprofile').prefetch_related(
+            Prefetch('items', queryset=InvoiceItem.objects.only('invoice_id', 'total', 'gst_rate', 'cess_rate'))
+        ).in_bulk([batch[position][0] for position in positions])
+        for position in positions:
+            invoice = invoices[batch[position][0]]
+            taxes[position] = invoice_tax(invoice, list(invoice.items.all()))[0].tax.paise
+
+    def _apply_batch(self, batch, subtotals):
+        rates = np.fromiter((row[2] for row in batch), dtype=np.int64, count=len(batch))
+        current = np.array([row[3:6] for row in batch], dtype=np.int64)
+        taxes = tax_paise(subtotals, rates)
+        line_rated = [position for position, row in enumerate(batch) if row[0] in self.line_rated]
+        if line_rated:
+            self._line_rated_taxes(batch, line_rated, taxes)
+        totals = subtotals + taxes
+        computed = np.column_stack((subtotals, taxes, totals))
+        changed = np.flatnonzero((computed != current).any(axis=1))
+        if not len(changed):
+            return
+        self.changed += len(changed)
+
+        updates = []
+        for position in changed.tolist():
+            pk, number = batch[position][:2]
+            subtotal, tax, total = (Money(int(value)) for value in computed[position])
+            if self.shown < self.show:
+                self.shown += 1
+                self.stdout.write(
+                    f'{number}: subtotal {Money(int(current[position][0]))} -> {subtotal}, '
+                    f'tax {Money(int(current[position][1]))} -> {tax}, '
+                    f'total {Money(int(current[position][2]))} -> {total}'
+                )
+            updates.append(Invoice(
+                pk=pk, subtotal=subtotal.to_decimal(), tax_amount=tax.to_decimal(),
+                total_amount=total.to_decimal(),
+            ))
+        if not self.dry_run:
+            now = timezone.now()
+            with transaction.atomic():
+                Invoice.objects.bulk_update(updates, ['subtotal', 'tax_amount', 'total_amount'])
+                # bulk_update skips auto_now; one plain UPDATE is far cheaper than another CASE column
+                Invoice.objects.filter(pk__in=[invoice.pk for invoice in updates]).update(updated_at=now)
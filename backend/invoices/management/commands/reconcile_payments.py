@@ -0,0 +1,70 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.reconciliation import (
+    STATEMENT_READERS, InvoiceIndex, Reconciler, apply_result, write_mismatch_report
+)
+
+
+class Command(BaseCommand):
+    help = 'Reconcile a Razorpay settlement export or bank statement CSV against invoices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to reconcile')
+        parser.add_argument('--format', choices=sorted(STATEMENT_READERS), default='razorpay')
+        parser.add_argument('--user', help='Only match invoices belonging to this username')
+        parser.add_argument('--date-window', type=int, default=7,
+                            help='Days of slack around issue/due date for amount matches')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--report', help='Write the mismatch report to this CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Match only, do not write payments')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist")
+
+        started = time.perf_counter()
+        index = InvoiceIndex.from_database(user=user)
+        indexed = time.perf_counter()
+        self.stdout.write(f'Indexed {len(index)} invoices in {indexed - started:.2f}s')
+
+        reader = STATEMENT_READERS[options['format']]
+        reconciler = Reconciler(index, date_window_days=options['date_window'])
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as fileobj:
+                result = reconciler.run(reader(fileobj))
+        except (OSError, ValueError) as e:
+            # Missing header columns; a row that cannot be read is reported as invalid_row instead
+            raise CommandError(str(e))
+        matched = time.perf_counter()
+
+        summary = result.summary()
+        elapsed = matched - indexed
+        rate = summary['rows'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Matched {summary['matched']} of {summary['rows']} rows in {elapsed:.2f}s "
+            f"({rate:,.0f} rows/s); {summary['already_recorded']} already recorded, "
+            f"{summary['mismatched']} mismatched"
+        )
+        for rule, count in sorted(summary['by_rule'].items()):
+            self.stdout.write(f'  {rule}: {count}')
+
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as fileobj:
+                write_mismatch_report(result, fileobj)
+            self.stdout.write(f"Mismatch report written to {options['report']}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: no changes written'))
+            return
+
+        created, flipped = apply_result(result, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} payments and marked {flipped} invoices as paid'
+        ))
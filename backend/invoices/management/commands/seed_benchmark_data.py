@@ -0,0 +1,177 @@
+import math
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from invoices import caching
+from invoices.gst import STATE_CODES
+from invoices.models import Invoice, InvoiceItem, InvoiceNumberSequence, Payment
+from invoices.rollups import backfill
+
+USERNAME_PREFIX = 'bench-'
+PASSWORD = 'bench-password'
+
+# Roughly how a small business's book looks a year in
+STATUS_WEIGHTS = {'paid': 60, 'pending': 22, 'overdue': 13, 'cancelled': 5}
+GST_RATES = [(None, 55), (Decimal('18.00'), 20), (Decimal('12.00'), 10), (Decimal('5.00'), 8),
+             (Decimal('28.00'), 5), (Decimal('0.00'), 2)]
+PAYMENT_TERMS = [(15, 30), (30, 50), (45, 15), (60, 5)]
+QUANTITIES = [(1, 50), (2, 20), (3, 10), (5, 8), (10, 7), (25, 3), (100, 2)]
+SERVICES = ['Consulting', 'Design work', 'Website hosting', 'Annual maintenance', 'Hardware supply',
+            'Software licence', 'Training session', 'Support retainer', 'Printing', 'Logistics']
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*(choices.items() if isinstance(choices, dict) else choices))
+    return rng.choices(values, weights)[0]
+
+
+class Generator:
+    """Deterministic synthetic books: heavy-tailed invoice counts and prices, repeat clients, seasonal dates"""
+
+    def __init__(self, seed, invoices, items, days):
+        # String seeds hash the same way in every process, unlike hash()-based ones
+        self.rng = random.Random(seed)
+        self.invoices = invoices
+        self.items = items
+        self.days = days
+        self.today = timezone.localdate()
+        self.states = sorted(STATE_CODES)
+
+    def invoice_count(self):
+        # Log-normal around the requested mean: most users are small, a few are very busy
+        sigma = 0.8
+        return max(1, round(self.rng.lognormvariate(math.log(self.invoices) - sigma ** 2 / 2, sigma)))
+
+    def clients(self, count):
+        return [{
+            'client_name': f'Client {n:03d} Pvt Ltd',
+            'client_email': f'accounts{n}@client{n}.example.com',
+            'client_phone': f'9{self.rng.randrange(10 ** 9):09d}',
+            'place_of_supply': self.rng.choice(self.states),
+        } for n in range(count)]
+
+    def issue_date(self):
+        # Busier towards the end of each quarter
+        while True:
+            day = self.today - timedelta(days=self.rng.randrange(self.days))
+            if self.rng.random() < 0.6 + 0.4 * ((day.month - 1) % 3) / 2:
+                return day
+
+    def line_items(self, invoice):
+        count = min(1 + int(self.rng.expovariate(1 / max(self.items - 1, 0.01))), self.items * 4)
+        item_rate = _weighted(self.rng, GST_RATES)
+        items = []
+        for _ in range(count):
+            quantity = Decimal(_weighted(self.rng, QUANTITIES))
+            unit_price = Decimal(round(self.rng.lognormvariate(7.5, 1.1), 2)).quantize(Decimal('0.01'))
+            item = InvoiceItem(
+                invoice=invoice, description=self.rng.choice(SERVICES), quantity=quantity,
+                unit_price=min(unit_price, Decimal('50000.00')), gst_rate=item_rate,
+                hsn_sac=f'99{self.rng.randrange(10 ** 4):04d}',
+            )
+            item.calculate_total()
+            items.append(item)
+        return items
+
+    def invoice(self, user, number, client):
+        issue_date = self.issue_date()
+        due_date = issue_date + timedelta(days=_weighted(self.rng, PAYMENT_TERMS))
+        status = _weighted(self.rng, STATUS_WEIGHTS)
+        if status in ('pending', 'overdue'):
+            # Most old invoices have been paid by now; a few stay overdue for good
+            if due_date < self.today - timedelta(days=90) and self.rng.random() < 0.8:
+                status = 'paid'
+            else:
+                status = 'overdue' if due_date < self.today else 'pending'
+        invoice = Invoice(
+            id=uuid.UUID(int=self.rng.getrandbits(128), version=4), user=user, invoice_number=Invoice.format_invoice_number(user, number),
+            issue_date=issue_date, due_date=due_date, status=status, **client,
+        )
+        items = self.line_items(invoice)
+        invoice.calculate_totals(items=items, seller_state='')
+        return invoice, items
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, invoices and line items for benchmarks and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Users to create')
+        parser.add_argument('--invoices', type=int, default=500, help='Mean invoices per user')
+        parser.add_argument('--items', type=int, default=4, help='Mean line items per invoice')
+        parser.add_argument('--days', type=int, default=365, help='Spread issue dates over this many days')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--prefix', default=USERNAME_PREFIX, help='Username prefix for the generated users')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Invoices per bulk insert')
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated users first')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['invoices'] < 1 or options['items'] < 1:
+            raise CommandError('--users, --invoices and --items must be at least 1')
+        prefix = options['prefix']
+        if options['flush']:
+            deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(f'Deleted {deleted:,} rows from earlier runs')
+
+        started = time.perf_counter()
+        created_users, totals = [], {'invoices': 0, 'items': 0, 'payments': 0}
+        for n in range(options['users']):
+            username = f'{prefix}{n:04d}'
+            # One generator per user, so a user's books don't depend on which others were skipped, and keyed
+            # by username so runs with different prefixes don't generate the same invoice ids
+            generator = Generator(f"{options['seed']}:{username}", options['invoices'], options['items'], options['days'])
+            count = generator.invoice_count()
+            clients = generator.clients(max(3, round(math.sqrt(count) * 2)))
+            user, created = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+            if created:
+                user.set_password(PASSWORD)
+                user.save(update_fields=['password'])
+            elif Invoice.objects.filter(user=user).exists():
+                self.stdout.write(f'{username} already has invoices; skipping (use --flush to regenerate)')
+                continue
+            for key, value in self.seed_user(generator, user, count, clients, options['batch_size']).items():
+                totals[key] += value
+            created_users.append(user.id)
+
+        if created_users:
+            # Bulk inserts skip the signals that keep these up to date
+            backfill(user_ids=created_users)
+            caching.bump_all(created_users)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(created_users)} users, {totals['invoices']:,} invoices, {totals['items']:,} items and "
+            f"{totals['payments']:,} payments in {time.perf_counter() - started:.1f}s (password: {PASSWORD})"
+        ))
+
+    def seed_user(self, generator, user, count, clients, batch_size):
+        rng = generator.rng
+        # Repeat customers: a few clients get most of the invoices
+        weights = [1 / (rank + 1) for rank in range(len(clients))]
+        first = InvoiceNumberSequence.reserve(user, count)
+        totals = {'invoices': 0, 'items': 0, 'payments': 0}
+        with transaction.atomic():
+            for start in range(0, count, batch_size):
+                invoices, items, payments = [], [], []
+                for number in range(first + start, first + min(start + batch_size, count)):
+                    invoice, lines = generator.invoice(user, number, rng.choices(clients, weights)[0])
+                    invoices.append(invoice)
+                    items.extend(lines)
+                    if invoice.status == 'paid':
+                        payments.append(Payment(
+                            invoice=invoice, amount=invoice.total_amount,
+                            transaction_id=f'pay_{rng.getrandbits(56):014x}',
+                        ))
+                Invoice.objects.bulk_create(invoices)
+                InvoiceItem.objects.bulk_create(items)
+                Payment.objects.bulk_create(payments)
+                totals['invoices'] += len(invoices)
+                totals['items'] += len(items)
+                totals['payments'] += len(payments)
+        return totals
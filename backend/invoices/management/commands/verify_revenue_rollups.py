@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.rollups import refresh_rollups, verify
+
+
+class Command(BaseCommand):
+    help = 'Compare revenue rollups with raw invoice aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only verify rollups for this username')
+        parser.add_argument('--show', type=int, default=20, help='Number of discrepancies to print')
+        parser.add_argument('--fix', action='store_true', help='Recompute the days that disagree')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            try:
+                user_ids = [User.objects.get(username=options['user']).id]
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist")
+
+        problems = verify(user_ids=user_ids)
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Revenue rollups match invoice aggregates'))
+            return
+
+        for granularity, user_id, period, expected, actual in problems[:options['show']]:
+            self.stdout.write(f'{granularity} {period} user {user_id}: expected {expected}, found {actual}')
+
+        if options['fix']:
+            days = {}
+            for granularity, user_id, period, _, _ in problems:
+                if granularity == 'day':
+                    days.setdefault(user_id, set()).add(period)
+            for user_id, user_days in days.items():
+                refresh_rollups(user_id, user_days)
+            self.stdout.write(self.style.WARNING(
+                f'Recomputed {sum(map(len, days.values()))} days; run again to confirm'
+            ))
+            return
+        raise CommandError(f'{len(problems)} rollup rows disagree with invoice aggregates')
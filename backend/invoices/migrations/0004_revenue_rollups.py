@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0003_invoice_aging_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoiced_paise', models.BigIntegerField(default=0)),
+                ('invoiced_count', models.IntegerField(default=0)),
+                ('paid_paise', models.BigIntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('outstanding_paise', models.BigIntegerField(default=0)),
+                ('outstanding_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonthlyRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoiced_paise', models.BigIntegerField(default=0)),
+                ('invoiced_count', models.IntegerField(default=0)),
+                ('paid_paise', models.BigIntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('outstanding_paise', models.BigIntegerField(default=0)),
+                ('outstanding_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.DateField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'issue_date'], name='invoice_user_issue_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='monthlyrevenuerollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='dailyrevenuerollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrevenuerollup',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='monthly_rollup_user_month_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrevenuerollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='daily_rollup_user_day_uniq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0005_bulk_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceTombstone',
+            fields=[
+                ('invoice_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('invoice_number', models.CharField(max_length=20)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='invoice_user_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='invoicetombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='invoicetombstone',
+            index=models.Index(fields=['user', 'deleted_at', 'invoice_id'], name='tombstone_user_deleted_idx'),
+        ),
+    ]
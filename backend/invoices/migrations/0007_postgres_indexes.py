@@ -0,0 +1,64 @@
+"""
+Postgres-only indexes, built CONCURRENTLY so migrating a live database does not lock invoice writes.
+They are invisible to Django's model state and skipped on other databases (SQLite in development and tests).
+"""
+
+from django.db import migrations
+
+# (name, CREATE statement); the DROP for each is built from the name in Migration.operations
+INDEXES = [
+    # Export's client filter is client_name ILIKE '%...%', which only a trigram index can serve
+    (
+        'invoice_client_name_trgm_idx',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS invoice_client_name_trgm_idx '
+        'ON invoices_invoice USING gin (client_name gin_trgm_ops)',
+    ),
+    # Summary counts and sums per status straight from the index, without visiting the table
+    (
+        'invoice_user_status_total_idx',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS invoice_user_status_total_idx '
+        'ON invoices_invoice (user_id, status) INCLUDE (total_amount)',
+    ),
+    # Newest-first invoice lists
+    (
+        'invoice_user_created_idx',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS invoice_user_created_idx '
+        'ON invoices_invoice (user_id, created_at DESC, id DESC)',
+    ),
+    # Tombstones are only ever appended in deleted_at order; BRIN stays tiny for range scans when pruning
+    (
+        'tombstone_deleted_brin_idx',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS tombstone_deleted_brin_idx '
+        'ON invoices_invoicetombstone USING brin (deleted_at)',
+    ),
+]
+
+
+class PostgresSQL(migrations.RunSQL):
+    """RunSQL that only runs on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('invoices', '0006_delta_sync'),
+    ]
+
+    operations = [
+        # Trusted since PostgreSQL 13, so the database owner can create it without superuser
+        PostgresSQL('CREATE EXTENSION IF NOT EXISTS pg_trgm', migrations.RunSQL.noop),
+    ] + [
+        PostgresSQL(create, f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+        for name, create in INDEXES
+    ]
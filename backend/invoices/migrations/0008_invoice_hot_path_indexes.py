@@ -0,0 +1,69 @@
+"""
+Declared indexes for the invoice hot paths: the nightly tasks, the payment webhook, lists and the admin filters.
+Built CONCURRENTLY on PostgreSQL so migrating a live database does not lock invoice writes.
+"""
+
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex, built CONCURRENTLY on PostgreSQL and normally elsewhere"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class DeclarePostgresIndex(migrations.AddIndex):
+    """AddIndex for an index 0007 already built on PostgreSQL; creates it on other databases only"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('invoices', '0007_postgres_indexes'),
+    ]
+
+    operations = [
+        DeclarePostgresIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='invoice_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('status__in', ('pending', 'overdue'))), fields=['status', 'due_date', 'last_reminder_sent'], name='invoice_open_due_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['razorpay_order_id'], name='invoice_razorpay_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['due_date'], name='invoice_due_date_idx'),
+        ),
+    ]
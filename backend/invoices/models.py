@@ -1,9 +1,16 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 import uuid
 
+from .aging import OPEN_STATUSES, invalidate_aging
+from .gst import STATE_CHOICES, invoice_tax, uses_item_rates
+from .money import Money
+
 
 class Invoice(models.Model):
     STATUS_CHOICES = [
@@ -20,6 +27,8 @@ class Invoice(models.Model):
     client_email = models.EmailField()
     client_phone = models.CharField(max_length=15, blank=True)
     client_address = models.TextField(blank=True)
+    client_gstin = models.CharField(max_length=15, blank=True)
+    place_of_supply = models.CharField(max_length=2, blank=True, choices=STATE_CHOICES)
     
     issue_date = models.DateField()
     due_date = models.DateField()
@@ -42,38 +51,70 @@ class Invoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Fields derived data depends on; saves that leave them untouched skip the refresh
+    AGING_FIELDS = {'status', 'total_amount', 'due_date', 'client_name', 'client_email'}
+    ROLLUP_FIELDS = {'status', 'total_amount', 'issue_date'}
+    TRACKED_FIELDS = tuple(sorted(AGING_FIELDS | ROLLUP_FIELDS))
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status', 'due_date'], name='invoice_user_status_due_idx'),
+            models.Index(fields=['user', 'issue_date'], name='invoice_user_issue_date_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='invoice_user_updated_idx'),
+            # Newest-first lists (0007 built it concurrently on PostgreSQL before it was declared here)
+            models.Index(fields=['user', '-created_at', '-id'], name='invoice_user_created_idx'),
+            # The nightly status and reminder tasks, across all users; paid and cancelled invoices stay out of it
+            models.Index(fields=['status', 'due_date', 'last_reminder_sent'], name='invoice_open_due_idx',
+                         condition=models.Q(status__in=OPEN_STATUSES)),
+            # Payment webhook lookups
+            models.Index(fields=['razorpay_order_id'], name='invoice_razorpay_order_idx'),
+            # Admin's due-date filter
+            models.Index(fields=['due_date'], name='invoice_due_date_idx'),
+            # PostgreSQL-only indexes (trigram, covering and BRIN) are in migration 0007
+        ]
     
     def __str__(self):
         return f"Invoice #{self.invoice_number} - {self.client_name}"
     
-    def save(self, *args, **kwargs):
-        # Calculate totals
-        self.calculate_totals()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = instance.tracked_state()
+        return instance
+    
+    def tracked_state(self):
+        return {field: self.__dict__.get(field) for field in self.TRACKED_FIELDS}
+    
+    def save(self, *args, items=None, **kwargs):
+        # Calculate totals; pass ``items`` when the invoice's items are already in memory (or not yet saved)
+        self.calculate_totals(items=items)
         super().save(*args, **kwargs)
     
-    def calculate_totals(self):
-        """Calculate subtotal, tax, and total amounts"""
-        subtotal = sum(item.total for item in self.items.all())
-        self.subtotal = subtotal
-        self.tax_amount = (subtotal * self.tax_rate) / 100
-        self.total_amount = self.subtotal + self.tax_amount
+    def calculate_totals(self, items=None, seller_state=None):
+        """Calculate subtotal, tax, and total amounts; pass ``items`` when they are already in memory"""
+        if items is None:
+            # invoice_id too: the related manager reads it off every row, and a deferred field costs a query each
+            items = list(self.items.only('invoice_id', 'total', 'gst_rate', 'cess_rate'))
+        subtotal = Money.sum(Money.from_decimal(item.total) for item in items)
+        if uses_item_rates(items):
+            # Line-level GST: each item taxed at its own rate, plus cess
+            tax = invoice_tax(self, items, seller_state)[0].tax
+        else:
+            tax = subtotal.percent(self.tax_rate)
+        self.subtotal = subtotal.to_decimal()
+        self.tax_amount = tax.to_decimal()
+        self.total_amount = (subtotal + tax).to_decimal()
     
     def generate_invoice_number(self):
         """Generate unique invoice number"""
         if not self.invoice_number:
-            last_invoice = Invoice.objects.filter(user=self.user).order_by('-created_at').first()
-            if last_invoice and last_invoice.invoice_number:
-                try:
-                    last_number = int(last_invoice.invoice_number.split('-')[-1])
-                    new_number = last_number + 1
-                except (ValueError, IndexError):
-                    new_number = 1
-            else:
-                new_number = 1
-            
-            self.invoice_number = f"INV-{self.user.id:04d}-{new_number:04d}"
+            new_number = InvoiceNumberSequence.reserve(self.user, 1)
+            self.invoice_number = self.format_invoice_number(self.user, new_number)
+    
+    @staticmethod
+    def format_invoice_number(user, number):
+        return f"INV-{user.id:04d}-{number:04d}"
     
     def update_status(self):
         """Update invoice status based on due date and payment"""
@@ -96,13 +137,20 @@ class InvoiceItem(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
     total = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     
+    hsn_sac = models.CharField(max_length=8, blank=True)
+    gst_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # falls back to invoice.tax_rate
+    cess_rate = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    
     def save(self, *args, **kwargs):
-        self.total = self.quantity * self.unit_price
+        self.calculate_total()
         super().save(*args, **kwargs)
         # Recalculate invoice totals
         self.invoice.calculate_totals()
         self.invoice.save()
     
+    def calculate_total(self):
+        self.total = Money.from_decimal(self.unit_price).times(self.quantity).to_decimal()
+    
     def __str__(self):
         return f"{self.description} - {self.quantity} x {self.unit_price}"
 
@@ -110,7 +158,8 @@ class InvoiceItem(models.Model):
 class Payment(models.Model):
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    payment_date = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, which would overwrite the date reconciliation takes from the statement
+    payment_date = models.DateTimeField(default=timezone.now)
     payment_method = models.CharField(max_length=50, default='razorpay')
     transaction_id = models.CharField(max_length=255, blank=True)
     status = models.CharField(max_length=20, default='completed')
@@ -118,3 +167,182 @@ class Payment(models.Model):
     
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.amount}"
+
+
+class InvoiceNumberSequence(models.Model):
+    """Next invoice number per user; numbers are handed out in blocks under a row lock"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    next_number = models.PositiveIntegerField(default=1)
+    
+    @classmethod
+    def reserve(cls, user, count):
+        """Reserve ``count`` consecutive numbers for ``user`` and return the first"""
+        with transaction.atomic():
+            sequence = cls.objects.select_for_update().filter(user=user).first()
+            if sequence is None:
+                sequence = cls.objects.create(user=user, next_number=cls._first_free(user))
+                # Lock the new row so concurrent reservations queue behind this one
+                sequence = cls.objects.select_for_update().get(pk=sequence.pk)
+            first = sequence.next_number
+            sequence.next_number = first + count
+            sequence.save(update_fields=['next_number'])
+        return first
+    
+    @classmethod
+    def advance_past(cls, user, numbers):
+        """Move ``user``'s sequence beyond invoice numbers assigned outside it, such as imported ones"""
+        highest = cls._highest_suffix(numbers)
+        # Without a row, reserve() starts from the user's invoices, which include these
+        cls.objects.filter(user=user, next_number__lte=highest).update(next_number=highest + 1)
+    
+    @staticmethod
+    def _highest_suffix(numbers):
+        highest = 0
+        for number in numbers:
+            suffix = number.rsplit('-', 1)[-1]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest
+    
+    @classmethod
+    def _first_free(cls, user):
+        """One past the highest numeric suffix among the user's existing invoice numbers"""
+        numbers = Invoice.objects.filter(user=user).values_list('invoice_number', flat=True).iterator()
+        return cls._highest_suffix(numbers) + 1
+    
+    def __str__(self):
+        return f"{self.user_id}: next {self.next_number}"
+
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    source_path = models.CharField(max_length=500)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    chunk_size = models.PositiveIntegerField(default=1000)
+    
+    # Records are invoices; everything up to committed_records is durable and skipped on resume
+    committed_records = models.PositiveIntegerField(default=0)
+    invoices_created = models.PositiveIntegerField(default=0)
+    items_created = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Import {self.id} ({self.status})"
+
+
+class InvoiceTombstone(models.Model):
+    """Left behind when an invoice is deleted so delta sync can tell clients to drop it"""
+    invoice_id = models.UUIDField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    invoice_number = models.CharField(max_length=20)
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'invoice_id'], name='tombstone_user_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Deleted {self.invoice_number} at {self.deleted_at}"
+
+
+class RevenueRollup(models.Model):
+    """Invoiced, paid and outstanding totals (in paise) for invoices issued in one period"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    invoiced_paise = models.BigIntegerField(default=0)
+    invoiced_count = models.IntegerField(default=0)
+    paid_paise = models.BigIntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+    outstanding_paise = models.BigIntegerField(default=0)
+    outstanding_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    TOTAL_FIELDS = (
+        'invoiced_paise', 'invoiced_count', 'paid_paise', 'paid_count',
+        'outstanding_paise', 'outstanding_count',
+    )
+    
+    class Meta:
+        abstract = True
+
+
+class DailyRevenueRollup(RevenueRollup):
+    day = models.DateField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='daily_rollup_user_day_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.day}: {self.invoiced_count} invoices"
+
+
+class MonthlyRevenueRollup(RevenueRollup):
+    month = models.DateField()  # first day of the month
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='monthly_rollup_user_month_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m}: {self.invoiced_count} invoices"
+
+
+@receiver(post_save, sender=Invoice)
+def refresh_derived_on_save(sender, instance, created, **kwargs):
+    from .rollups import refresh_rollups
+    
+    previous = getattr(instance, '_loaded_state', None)
+    state = instance.tracked_state()
+    if created or previous is None:
+        changed = set(Invoice.TRACKED_FIELDS)
+    else:
+        changed = {field for field in Invoice.TRACKED_FIELDS if previous[field] != state[field]}
+    if changed & Invoice.AGING_FIELDS:
+        invalidate_aging([instance.user_id])
+    if changed & Invoice.ROLLUP_FIELDS:
+        days = {state['issue_date']}
+        if previous and previous['issue_date']:
+            days.add(previous['issue_date'])
+        refresh_rollups(instance.user_id, days)
+    instance._loaded_state = state
+
+
+@receiver(post_delete, sender=Invoice)
+def refresh_derived_on_delete(sender, instance, origin=None, **kwargs):
+    from .rollups import refresh_rollups
+    
+    # Deleting the user cascades to their invoices; their rollups and tombstones go with them, and writing
+    # rows that point at the user being deleted would fail its foreign key
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    invalidate_aging([instance.user_id])
+    refresh_rollups(instance.user_id, {instance.issue_date})
+    InvoiceTombstone.objects.update_or_create(
+        invoice_id=instance.id,
+        defaults={'user_id': instance.user_id, 'invoice_number': instance.invoice_number, 'deleted_at': timezone.now()},
+    )
@@ -0,0 +1,204 @@
+"""
+Money value type for HisabPro
+Amounts are held as integer paise so arithmetic is exact and fast on every backend
+"""
+
+from decimal import Decimal, InvalidOperation
+from functools import total_ordering
+
+
+def _half_up_div(numerator, denominator):
+    """Integer division rounding halves away from zero"""
+    if numerator >= 0:
+        return (2 * numerator + denominator) // (2 * denominator)
+    return -((-2 * numerator + denominator) // (2 * denominator))
+
+
+def _ratio(value):
+    """Exact (numerator, denominator) of an int, Decimal, float or numeric string"""
+    if type(value) is int:
+        return value, 1
+    if type(value) is not Decimal:
+        value = Decimal(str(value))
+    return value.as_integer_ratio()
+
+
+def _hundredths(value):
+    """Convert a rate, quantity or rupee amount to an integer of hundredths, rounding half-up"""
+    if type(value) is int:
+        return value * 100
+    if type(value) is not Decimal:
+        value = Decimal(str(value))
+    numerator, denominator = value.as_integer_ratio()
+    if 100 % denominator == 0:
+        return numerator * (100 // denominator)
+    return _half_up_div(numerator * 100, denominator)
+
+
+@total_ordering
+class Money:
+    """An INR amount stored as integer paise"""
+
+    __slots__ = ('paise',)
+
+    def __init__(self, paise=0):
+        self.paise = paise if type(paise) is int else int(paise)
+
+    # Constructors / adapters
+
+    @classmethod
+    def from_decimal(cls, value):
+        """From an ORM DecimalField value (rupees)"""
+        if value is None:
+            return cls(0)
+        return cls(_hundredths(value))
+
+    @classmethod
+    def parse(cls, value):
+        """From text such as '1,180.50' or '₹ 99'"""
+        text = str(value or '').strip().replace(',', '').replace('₹', '').strip()
+        if not text:
+            return cls(0)
+        whole, _, frac = text.partition('.')
+        if whole.lstrip('-').isdigit() and (not frac or frac.isdigit()) and len(frac) <= 2:
+            paise = abs(int(whole)) * 100 + int((frac + '00')[:2])
+            return cls(-paise if whole.startswith('-') else paise)
+        try:
+            return cls.from_decimal(Decimal(text))
+        except InvalidOperation:
+            raise ValueError(f'Invalid amount: {value!r}')
+
+    @classmethod
+    def from_rupees(cls, value):
+        """From any rupee amount: Decimal, int, float or string"""
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, Decimal):
+            return cls.from_decimal(value)
+        if isinstance(value, int):
+            return cls(value * 100)
+        if isinstance(value, float):
+            return cls.from_decimal(Decimal(repr(value)))
+        return cls.parse(value)
+
+    # Supabase stores amounts in numeric columns and returns them as JSON numbers
+    from_json = from_rupees
+
+    def to_json(self):
+        return self.paise / 100
+
+    @classmethod
+    def from_bson(cls, value):
+        """From a Mongo value: Int64 holds paise, legacy floats hold rupees"""
+        from bson.int64 import Int64
+        if isinstance(value, Int64):
+            return cls(int(value))
+        return cls.from_rupees(value or 0)
+
+    def to_bson(self):
+        from bson.int64 import Int64
+        return Int64(self.paise)
+
+    def to_decimal(self):
+        return Decimal(self.paise).scaleb(-2)
+
+    # Arithmetic
+
+    @classmethod
+    def sum(cls, amounts):
+        return cls(sum(amount.paise for amount in amounts))
+
+    def percent(self, rate):
+        """Tax or discount at ``rate`` percent, rounded half-up to the paisa"""
+        numerator, denominator = _ratio(rate)
+        return Money(_half_up_div(self.paise * numerator, 100 * denominator))
+
+    def times(self, quantity):
+        """Line total for ``quantity`` units, rounded half-up to the paisa"""
+        if type(quantity) is int:
+            return Money(self.paise * quantity)
+        return Money(_half_up_div(self.paise * _hundredths(quantity), 100))
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.paise + other.paise)
+        if other == 0:
+            return self
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.paise - other.paise)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.paise)
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return Money(self.paise * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.paise == other.paise
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.paise < other.paise
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.paise)
+
+    def __bool__(self):
+        return self.paise != 0
+
+    def __str__(self):
+        sign = '-' if self.paise < 0 else ''
+        rupees, paise = divmod(abs(self.paise), 100)
+        return f'{sign}{rupees}.{paise:02d}'
+
+    def __repr__(self):
+        return f'Money({self})'
+
+    def __format__(self, spec):
+        if not spec:
+            return str(self)
+        return format(self.to_decimal(), spec)
+
+
+def sql_hundredths(field):
+    """ORM expression for a 2-decimal column as an exact integer of hundredths (paise for amounts)"""
+    from django.db.models import BigIntegerField, F
+    from django.db.models.functions import Cast, Round
+    return Cast(Round(F(field) * 100), BigIntegerField())
+
+
+def bson_rupees_expr(field):
+    """Mongo aggregation expression reading ``field`` as rupees whether stored as Int64 paise or float"""
+    path = f'${field}'
+    return {
+        '$cond': [
+            {'$eq': [{'$type': path}, 'long']},
+            {'$divide': [path, 100]},
+            {'$ifNull': [path, 0]},
+        ]
+    }
+
+
+def bson_paise_expr(field):
+    """Mongo aggregation expression reading ``field`` as integer paise whether stored as Int64 or float rupees"""
+    path = f'${field}'
+    return {
+        '$cond': [
+            {'$eq': [{'$type': path}, 'long']},
+            path,
+            {'$round': [{'$multiply': [{'$ifNull': [path, 0]}, 100]}, 0]},
+        ]
+    }
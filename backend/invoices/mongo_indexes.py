@@ -0,0 +1,60 @@
+"""
+MongoDB indexes for HisabPro
+The index set behind the MongoDB invoice queries. ``manage.py ensure_indexes`` creates it on every deploy, and each
+process checks it again the first time it uses a database; creating an index that already exists is a no-op.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# collection -> [(keys, create_index options)]
+MONGO_INDEXES = {
+    'invoices': [
+        # Newest-first pages (repositories.py, and the legacy service's get_user_invoices and search)
+        ([('user_id', 1), ('created_at', -1), ('id', -1)], {}),
+        # Per-status summaries and the aging pipeline's open-invoice match
+        ([('user_id', 1), ('status', 1), ('due_date', 1)], {}),
+        # Delta sync's change query
+        ([('user_id', 1), ('updated_at', 1), ('id', 1)], {}),
+        # Detail reads, updates and deletes by the application's id
+        ([('id', 1)], {}),
+        ([('invoice_number', 1)], {'unique': True}),
+    ],
+    'invoice_items': [
+        ([('invoice_id', 1), ('position', 1)], {}),
+    ],
+    'invoice_tombstones': [
+        ([('user_id', 1), ('deleted_at', 1), ('invoice_id', 1)], {}),
+    ],
+    'payments': [
+        ([('invoice_id', 1)], {}),
+    ],
+    'user_profiles': [
+        ([('user_id', 1)], {'unique': True}),
+    ],
+}
+
+# (server address, database name) of each database already checked; an id(db) can be reused once a db is collected
+_ensured = set()
+
+
+def ensure_mongo_indexes(db, force=False):
+    """Create any missing index in MONGO_INDEXES, once per process; returns the (collection, keys) that failed"""
+    key = (db.client.address, db.name)
+    if key in _ensured and not force:
+        return []
+    from pymongo.errors import OperationFailure
+
+    failed = []
+    for collection, indexes in MONGO_INDEXES.items():
+        for keys, options in indexes:
+            try:
+                db[collection].create_index(keys, **options)
+            except OperationFailure as error:
+                # An index on the same keys with other options (made by hand), or duplicates blocking a unique one;
+                # the queries still run, so report it rather than failing the request or the deploy
+                logger.warning('Could not create the %s index on %s: %s', collection, keys, error)
+                failed.append((collection, keys))
+    _ensured.add(key)
+    return failed
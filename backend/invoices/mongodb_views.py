@@ -11,28 +11,20 @@ from django.http import HttpResponse
 from django.core.mail import send_mail
 from django.utils import timezone
 from django.conf import settings
-import razorpay
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
 from datetime import datetime
 import json
 from decimal import Decimal
 
-from lib.mongodb import mongodb_service
+from .aging import get_aging, invalidate_aging
+from .money import Money
+from .services import mongodb_service
+from .sync import CursorExpired, mongo_changes, page_size
 from .serializers import (
     InvoiceSerializer, InvoiceCreateSerializer, InvoiceSummarySerializer,
     RazorpayPaymentLinkSerializer, SendReminderSerializer
 )
 
-# Configure Razorpay
-razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
 
 class MongoDBInvoiceListCreateView(generics.ListCreateAPIView):
     serializer_class = InvoiceSerializer
@@ -77,10 +69,10 @@ class MongoDBInvoiceListCreateView(generics.ListCreateAPIView):
                     'issue_date': invoice.get('issue_date'),
                     'due_date': invoice.get('due_date'),
                     'status': invoice.get('status'),
-                    'subtotal': str(invoice.get('subtotal', 0)),
+                    'subtotal': str(Money.from_bson(invoice.get('subtotal', 0))),
                     'tax_rate': str(invoice.get('tax_rate', 0)),
-                    'tax_amount': str(invoice.get('tax_amount', 0)),
-                    'total_amount': str(invoice.get('total_amount', 0)),
+                    'tax_amount': str(Money.from_bson(invoice.get('tax_amount', 0))),
+                    'total_amount': str(Money.from_bson(invoice.get('total_amount', 0))),
                     'notes': invoice.get('notes', ''),
                     'terms_conditions': invoice.get('terms_conditions', ''),
                     'razorpay_payment_link': invoice.get('razorpay_payment_link', ''),
@@ -121,22 +113,28 @@ class MongoDBInvoiceListCreateView(generics.ListCreateAPIView):
                     new_number = 1
                 invoice_data['invoice_number'] = f"INV-{request.user.id:04d}-{new_number:04d}"
             
-            # Convert Decimal fields to float for MongoDB
-            for field in ['subtotal', 'tax_rate', 'tax_amount', 'total_amount']:
-                if field in invoice_data and isinstance(invoice_data[field], Decimal):
-                    invoice_data[field] = float(invoice_data[field])
+            # Store amounts as Int64 paise, rates as float
+            for field in ['subtotal', 'tax_amount', 'total_amount']:
+                if field in invoice_data:
+                    invoice_data[field] = Money.from_rupees(invoice_data[field]).to_bson()
+            if isinstance(invoice_data.get('tax_rate'), Decimal):
+                invoice_data['tax_rate'] = float(invoice_data['tax_rate'])
+            invoice_data['created_at'] = invoice_data['updated_at'] = timezone.now()
             
             # Create invoice in MongoDB
             invoice_id = mongodb_service.create_invoice(invoice_data)
+            invalidate_aging([request.user.id])
             
             # Add items if provided
             items_data = request.data.get('items', [])
             for item in items_data:
                 item['invoice_id'] = invoice_id
-                # Convert Decimal fields
-                for field in ['quantity', 'unit_price', 'total']:
-                    if field in item and isinstance(item[field], Decimal):
-                        item[field] = float(item[field])
+                # Store amounts as Int64 paise
+                for field in ['unit_price', 'total']:
+                    if field in item:
+                        item[field] = Money.from_rupees(item[field]).to_bson()
+                if isinstance(item.get('quantity'), Decimal):
+                    item['quantity'] = float(item['quantity'])
                 mongodb_service.create_invoice_item(item)
             
             return Response(
@@ -193,10 +191,10 @@ class MongoDBInvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
                 'issue_date': invoice.get('issue_date'),
                 'due_date': invoice.get('due_date'),
                 'status': invoice.get('status'),
-                'subtotal': str(invoice.get('subtotal', 0)),
+                'subtotal': str(Money.from_bson(invoice.get('subtotal', 0))),
                 'tax_rate': str(invoice.get('tax_rate', 0)),
-                'tax_amount': str(invoice.get('tax_amount', 0)),
-                'total_amount': str(invoice.get('total_amount', 0)),
+                'tax_amount': str(Money.from_bson(invoice.get('tax_amount', 0))),
+                'total_amount': str(Money.from_bson(invoice.get('total_amount', 0))),
                 'notes': invoice.get('notes', ''),
                 'terms_conditions': invoice.get('terms_conditions', ''),
                 'razorpay_payment_link': invoice.get('razorpay_payment_link', ''),
@@ -239,15 +237,19 @@ class MongoDBInvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
             # Prepare update data
             update_data = serializer.validated_data.copy()
             
-            # Convert Decimal fields to float for MongoDB
-            for field in ['subtotal', 'tax_rate', 'tax_amount', 'total_amount']:
-                if field in update_data and isinstance(update_data[field], Decimal):
-                    update_data[field] = float(update_data[field])
+            # Store amounts as Int64 paise, rates as float
+            for field in ['subtotal', 'tax_amount', 'total_amount']:
+                if field in update_data:
+                    update_data[field] = Money.from_rupees(update_data[field]).to_bson()
+            if isinstance(update_data.get('tax_rate'), Decimal):
+                update_data['tax_rate'] = float(update_data['tax_rate'])
+            update_data['updated_at'] = timezone.now()
             
             # Update invoice in MongoDB
             success = mongodb_service.update_invoice(invoice_id, update_data)
             
             if success:
+                invalidate_aging([request.user.id])
                 return Response({'message': 'Invoice updated successfully'})
             else:
                 return Response(
@@ -284,6 +286,18 @@ class MongoDBInvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
             success = mongodb_service.delete_invoice(invoice_id)
             
             if success:
+                invalidate_aging([request.user.id])
+                # Delta sync clients learn about deletions from tombstones
+                mongodb_service.db.invoice_tombstones.replace_one(
+                    {'invoice_id': invoice_id},
+                    {
+                        'invoice_id': invoice_id,
+                        'user_id': request.user.id,
+                        'invoice_number': invoice.get('invoice_number', ''),
+                        'deleted_at': timezone.now(),
+                    },
+                    upsert=True,
+                )
                 return Response({'message': 'Invoice deleted successfully'})
             else:
                 return Response(
@@ -313,10 +327,11 @@ class MongoDBInvoiceSummaryView(APIView):
             paid_invoices = len([i for i in invoices if i.get('status') == 'paid'])
             overdue_invoices = len([i for i in invoices if i.get('status') == 'overdue'])
             
-            total_pending_amount = sum(float(i.get('total_amount', 0)) for i in invoices if i.get('status') == 'pending')
-            total_paid_amount = sum(float(i.get('total_amount', 0)) for i in invoices if i.get('status') == 'paid')
-            total_overdue_amount = sum(float(i.get('total_amount', 0)) for i in invoices if i.get('status') == 'overdue')
-            total_amount = sum(float(i.get('total_amount', 0)) for i in invoices)
+            amounts = [(i.get('status'), Money.from_bson(i.get('total_amount', 0))) for i in invoices]
+            total_pending_amount = Money.sum(a for s, a in amounts if s == 'pending')
+            total_paid_amount = Money.sum(a for s, a in amounts if s == 'paid')
+            total_overdue_amount = Money.sum(a for s, a in amounts if s == 'overdue')
+            total_amount = Money.sum(a for s, a in amounts)
             
             summary = {
                 'total_invoices': total_invoices,
@@ -339,6 +354,67 @@ class MongoDBInvoiceSummaryView(APIView):
             )
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def mongodb_invoice_aging(request):
+    """Receivables aging from a MongoDB aggregation pipeline"""
+    try:
+        mongodb_service._ensure_connected()
+        return Response(get_aging(request.user, collection=mongodb_service.db.invoices))
+    except Exception as e:
+        return Response(
+            {'error': f'Failed to fetch aging: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _sync_invoice_data(invoice):
+    items = [
+        {**item, **{field: str(Money.from_bson(item[field])) for field in ('unit_price', 'total') if field in item}}
+        for item in invoice.get('items', [])
+    ]
+    return {
+        'id': invoice.get('id'),
+        'invoice_number': invoice.get('invoice_number'),
+        'client_name': invoice.get('client_name'),
+        'client_email': invoice.get('client_email'),
+        'client_phone': invoice.get('client_phone'),
+        'client_address': invoice.get('client_address'),
+        'issue_date': invoice.get('issue_date'),
+        'due_date': invoice.get('due_date'),
+        'status': invoice.get('status'),
+        'subtotal': str(Money.from_bson(invoice.get('subtotal', 0))),
+        'tax_rate': str(invoice.get('tax_rate', 0)),
+        'tax_amount': str(Money.from_bson(invoice.get('tax_amount', 0))),
+        'total_amount': str(Money.from_bson(invoice.get('total_amount', 0))),
+        'notes': invoice.get('notes', ''),
+        'terms_conditions': invoice.get('terms_conditions', ''),
+        'created_at': invoice.get('created_at'),
+        'updated_at': invoice.get('updated_at'),
+        'items': items,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def mongodb_invoice_changes(request):
+    """Invoices created, updated or deleted after ?since=<cursor>, read from MongoDB"""
+    try:
+        limit = page_size(request.query_params)
+        mongodb_service._ensure_connected()
+        page = mongo_changes(mongodb_service.db, request.user.id, request.query_params.get('since'), limit)
+    except CursorExpired as e:
+        return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {'error': f'Failed to fetch invoice changes: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    return Response(page.as_dict([_sync_invoice_data(invoice) for invoice in page.changes]))
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def mongodb_recent_invoices(request):
@@ -355,7 +431,7 @@ def mongodb_recent_invoices(request):
                 'client_name': invoice.get('client_name'),
                 'client_email': invoice.get('client_email'),
                 'status': invoice.get('status'),
-                'total_amount': str(invoice.get('total_amount', 0)),
+                'total_amount': str(Money.from_bson(invoice.get('total_amount', 0))),
                 'due_date': invoice.get('due_date'),
                 'created_at': invoice.get('created_at'),
             }
@@ -390,7 +466,7 @@ def mongodb_search_invoices(request):
                 'client_name': invoice.get('client_name'),
                 'client_email': invoice.get('client_email'),
                 'status': invoice.get('status'),
-                'total_amount': str(invoice.get('total_amount', 0)),
+                'total_amount': str(Money.from_bson(invoice.get('total_amount', 0))),
                 'due_date': invoice.get('due_date'),
                 'created_at': invoice.get('created_at'),
             }
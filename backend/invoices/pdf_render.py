@@ -0,0 +1,154 @@
+"""
+ReportLab invoice rendering for HisabPro
+Kept out of views.py so only workers that render a PDF pay for importing ReportLab
+"""
+
+import io
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+
+def render_invoice_pdf(invoice):
+    """Invoice rendered as an A4 PDF with ReportLab"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    
+    # Styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    
+    # Header
+    elements.append(Paragraph(f"INVOICE #{invoice.invoice_number}", title_style))
+    elements.append(Spacer(1, 20))
+    
+    # Company and Client Info
+    company_info = []
+    if invoice.user.userprofile.company_name:
+        company_info.append([Paragraph(f"<b>From:</b>", styles['Normal']), 
+                           Paragraph(invoice.user.userprofile.company_name, styles['Normal'])])
+    if invoice.user.userprofile.address:
+        company_info.append(['', Paragraph(invoice.user.userprofile.address, styles['Normal'])])
+    if invoice.user.userprofile.phone:
+        company_info.append(['', Paragraph(f"Phone: {invoice.user.userprofile.phone}", styles['Normal'])])
+    if invoice.user.userprofile.gst_number:
+        company_info.append(['', Paragraph(f"GST: {invoice.user.userprofile.gst_number}", styles['Normal'])])
+    
+    client_info = []
+    client_info.append([Paragraph(f"<b>To:</b>", styles['Normal']), 
+                       Paragraph(invoice.client_name, styles['Normal'])])
+    if invoice.client_address:
+        client_info.append(['', Paragraph(invoice.client_address, styles['Normal'])])
+    if invoice.client_phone:
+        client_info.append(['', Paragraph(f"Phone: {invoice.client_phone}", styles['Normal'])])
+    if invoice.client_email:
+        client_info.append(['', Paragraph(f"Email: {invoice.client_email}", styles['Normal'])])
+    
+    # Combine company and client info
+    info_data = []
+    for i in range(max(len(company_info), len(client_info))):
+        row = []
+        if i < len(company_info):
+            row.extend(company_info[i])
+        else:
+            row.extend(['', ''])
+        if i < len(client_info):
+            row.extend(client_info[i])
+        else:
+            row.extend(['', ''])
+        info_data.append(row)
+    
+    info_table = Table(info_data, colWidths=[1*inch, 2*inch, 1*inch, 2*inch])
+    info_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(info_table)
+    elements.append(Spacer(1, 20))
+    
+    # Invoice Details
+    details_data = [
+        ['Issue Date:', invoice.issue_date.strftime('%B %d, %Y')],
+        ['Due Date:', invoice.due_date.strftime('%B %d, %Y')],
+        ['Status:', invoice.status.title()],
+    ]
+    
+    details_table = Table(details_data, colWidths=[1*inch, 2*inch])
+    details_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(details_table)
+    elements.append(Spacer(1, 20))
+    
+    # Items Table
+    items_data = [['Description', 'Quantity', 'Unit Price', 'Total']]
+    for item in invoice.items.all():
+        items_data.append([
+            item.description,
+            str(item.quantity),
+            f"₹{item.unit_price:,.2f}",
+            f"₹{item.total:,.2f}"
+        ])
+    
+    items_table = Table(items_data, colWidths=[3*inch, 1*inch, 1*inch, 1*inch])
+    items_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+    ]))
+    elements.append(items_table)
+    elements.append(Spacer(1, 20))
+    
+    # Totals
+    totals_data = [
+        ['Subtotal:', f"₹{invoice.subtotal:,.2f}"],
+        ['Tax ({:.1f}%):'.format(invoice.tax_rate), f"₹{invoice.tax_amount:,.2f}"],
+        ['Total:', f"₹{invoice.total_amount:,.2f}"],
+    ]
+    
+    totals_table = Table(totals_data, colWidths=[4*inch, 2*inch])
+    totals_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, -1), (1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, -1), (1, -1), 14),
+        ('LINEABOVE', (0, -1), (1, -1), 1, colors.black),
+    ]))
+    elements.append(totals_table)
+    
+    # Notes and Terms
+    if invoice.notes:
+        elements.append(Spacer(1, 20))
+        elements.append(Paragraph(f"<b>Notes:</b>", styles['Heading3']))
+        elements.append(Paragraph(invoice.notes, styles['Normal']))
+    
+    if invoice.terms_conditions:
+        elements.append(Spacer(1, 20))
+        elements.append(Paragraph(f"<b>Terms & Conditions:</b>", styles['Heading3']))
+        elements.append(Paragraph(invoice.terms_conditions, styles['Normal']))
+    
+    # Build PDF
+    doc.build(elements)
+    return buffer.getvalue()
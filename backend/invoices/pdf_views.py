@@ -15,8 +15,12 @@ import logging
 import io
 import os
 
+from hisabpro.metrics import timed_pdf
+
+from .conditional import make_etag, not_modified, parse_timestamp, set_validators
+from .singleflight import single_flight
 from .supabase_models import SupabaseInvoice
-from lib.supabase_service import supabase_service
+from .services import supabase_service
 
 logger = logging.getLogger(__name__)
 
@@ -34,63 +38,66 @@ def generate_invoice_pdf(request, invoice_id):
         if not invoice_data:
             return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get invoice items
-        items_data = supabase_service.get_invoice_items(invoice_id)
-        
-        # Create invoice object
-        invoice = SupabaseInvoice.from_dict(invoice_data)
-        invoice.items = items_data
-        
-        # Business information (you can make this configurable)
-        business_info = {
-            'business_name': getattr(settings, 'BUSINESS_NAME', 'Your Business Name'),
-            'business_email': getattr(settings, 'BUSINESS_EMAIL', 'contact@yourbusiness.com'),
-            'business_phone': getattr(settings, 'BUSINESS_PHONE', '+1 (555) 123-4567'),
-            'business_address': getattr(settings, 'BUSINESS_ADDRESS', '123 Business Street\nCity, State 12345'),
-            'business_logo': getattr(settings, 'BUSINESS_LOGO', None),
-            'payment_terms': getattr(settings, 'PAYMENT_TERMS', 'Net 30 days'),
-        }
-        
-        # Render the template
-        html_content = render_to_string('invoice_template.html', {
-            'invoice': invoice,
-            'business_name': business_info['business_name'],
-            'business_email': business_info['business_email'],
-            'business_phone': business_info['business_phone'],
-            'business_address': business_info['business_address'],
-            'business_logo': business_info['business_logo'],
-            'payment_terms': business_info['payment_terms'],
-        })
-        
-        # Generate PDF using weasyprint or similar
-        try:
-            from weasyprint import HTML, CSS
-            from weasyprint.text.fonts import FontConfiguration
-            
-            # Configure fonts
-            font_config = FontConfiguration()
+        def render():
+            # Get invoice items
+            items_data = supabase_service.get_invoice_items(invoice_id)
             
-            # Create PDF
-            html_doc = HTML(string=html_content)
-            css = CSS(string='''
-                @page { size: A4; margin: 20mm; }
-                body { font-family: Arial, sans-serif; }
-            ''', font_config=font_config)
+            # Create invoice object
+            invoice = SupabaseInvoice.from_dict(invoice_data)
+            invoice.items = items_data
             
-            pdf_bytes = html_doc.write_pdf(stylesheets=[css], font_config=font_config)
+            # Business information (you can make this configurable)
+            business_info = {
+                'business_name': getattr(settings, 'BUSINESS_NAME', 'Your Business Name'),
+                'business_email': getattr(settings, 'BUSINESS_EMAIL', 'contact@yourbusiness.com'),
+                'business_phone': getattr(settings, 'BUSINESS_PHONE', '+1 (555) 123-4567'),
+                'business_address': getattr(settings, 'BUSINESS_ADDRESS', '123 Business Street\nCity, State 12345'),
+                'business_logo': getattr(settings, 'BUSINESS_LOGO', None),
+                'payment_terms': getattr(settings, 'PAYMENT_TERMS', 'Net 30 days'),
+            }
             
-            # Create response
-            response = HttpResponse(pdf_bytes, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.pdf"'
+            # Render the template
+            html_content = render_to_string('invoice_template.html', {
+                'invoice': invoice,
+                'business_name': business_info['business_name'],
+                'business_email': business_info['business_email'],
+                'business_phone': business_info['business_phone'],
+                'business_address': business_info['business_address'],
+                'business_logo': business_info['business_logo'],
+                'payment_terms': business_info['payment_terms'],
+            })
             
-            return response
-            
-        except ImportError:
-            # Fallback: return HTML if weasyprint is not available
-            logger.warning("WeasyPrint not available, returning HTML instead")
-            response = HttpResponse(html_content, content_type='text/html')
-            response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.html"'
-            return response
+            # Generate PDF using weasyprint or similar
+            try:
+                from weasyprint import HTML, CSS
+                from weasyprint.text.fonts import FontConfiguration
+                
+                # Configure fonts
+                font_config = FontConfiguration()
+                
+                # Create PDF
+                html_doc = HTML(string=html_content)
+                css = CSS(string='''
+                    @page { size: A4; margin: 20mm; }
+                    body { font-family: Arial, sans-serif; }
+                ''', font_config=font_config)
+                
+                pdf_bytes = html_doc.write_pdf(stylesheets=[css], font_config=font_config)
+                
+                return pdf_bytes, 'application/pdf', f'invoice_{invoice.invoice_number}.pdf'
+                
+            except ImportError:
+                # Fallback: return HTML if weasyprint is not available
+                logger.warning("WeasyPrint not available, returning HTML instead")
+                return html_content, 'text/html', f'invoice_{invoice.invoice_number}.html'
+        
+        # Repeated clicks on "Download PDF" share one render of this version of the invoice
+        content, content_type, filename = single_flight(
+            'pdf', ('weasyprint', invoice_id, invoice_data.get('updated_at')), lambda: timed_pdf('weasyprint', render),
+        )
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
             
     except Exception as e:
         logger.error(f"Error generating PDF: {str(e)}")
@@ -110,13 +117,6 @@ def preview_invoice_html(request, invoice_id):
         if not invoice_data:
             return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get invoice items
-        items_data = supabase_service.get_invoice_items(invoice_id)
-        
-        # Create invoice object
-        invoice = SupabaseInvoice.from_dict(invoice_data)
-        invoice.items = items_data
-        
         # Business information
         business_info = {
             'business_name': getattr(settings, 'BUSINESS_NAME', 'Your Business Name'),
@@ -127,6 +127,20 @@ def preview_invoice_html(request, invoice_id):
             'payment_terms': getattr(settings, 'PAYMENT_TERMS', 'Net 30 days'),
         }
         
+        # Item writes touch the invoice row, so its updated_at versions the whole page
+        updated_at = parse_timestamp(invoice_data.get('updated_at'))
+        etag = make_etag('preview', invoice_id, invoice_data.get('updated_at'), sorted(business_info.items()))
+        response = not_modified(request, etag, updated_at)
+        if response is not None:
+            return response
+        
+        # Get invoice items
+        items_data = supabase_service.get_invoice_items(invoice_id)
+        
+        # Create invoice object
+        invoice = SupabaseInvoice.from_dict(invoice_data)
+        invoice.items = items_data
+        
         # Render the template
         html_content = render_to_string('invoice_template.html', {
             'invoice': invoice,
@@ -138,7 +152,7 @@ def preview_invoice_html(request, invoice_id):
             'payment_terms': business_info['payment_terms'],
         })
         
-        return HttpResponse(html_content, content_type='text/html')
+        return set_validators(HttpResponse(html_content, content_type='text/html'), etag, updated_at)
         
     except Exception as e:
         logger.error(f"Error generating HTML preview: {str(e)}")
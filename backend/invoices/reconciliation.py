@@ -0,0 +1,439 @@
+"""
+Payment reconciliation for HisabPro
+Matches Razorpay settlement exports and bank statements to invoices in bulk
+"""
+
+import csv
+import logging
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .aging import invalidate_aging
+from .models import Invoice, Payment
+from .money import Money
+from .rollups import refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('pending', 'overdue')
+
+# Amounts shared by more open invoices than this get a date-sorted index instead of a scan per row
+AMOUNT_SCAN_LIMIT = 16
+
+INVOICE_NUMBER_RE = re.compile(r'INV-[0-9]+(?:-[0-9]+)?', re.IGNORECASE)
+
+DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%d/%m/%y',
+    '%d-%b-%Y',
+    '%d %b %Y',
+    '%Y-%m-%d %H:%M:%S',
+    '%d/%m/%Y %H:%M:%S',
+)
+
+# Header aliases used by the common Indian bank statement exports
+BANK_COLUMNS = {
+    'date': ('date', 'txn date', 'transaction date', 'value date', 'tran date'),
+    'description': ('description', 'narration', 'particulars', 'remarks', 'details'),
+    'reference': ('reference', 'ref no', 'ref no.', 'chq/ref no', 'chq/ref number', 'cheque/ref no', 'utr', 'utr number'),
+    'credit': ('credit', 'credit amount', 'deposit', 'deposit amt', 'deposit amt.', 'cr amount', 'amount'),
+}
+
+
+class DateParser:
+    """Parses statement dates, remembering the last format that worked"""
+
+    def __init__(self):
+        self._last = DATE_FORMATS[0]
+
+    def __call__(self, value):
+        text = (value or '').strip()
+        if not text:
+            return None
+        if len(text) >= 10 and text[4] == '-' and text[7] == '-':
+            try:
+                return date.fromisoformat(text[:10])
+            except ValueError:
+                pass
+        try:
+            return datetime.strptime(text, self._last).date()
+        except ValueError:
+            pass
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt).date()
+            except ValueError:
+                continue
+            self._last = fmt
+            return parsed
+        try:
+            return datetime.fromisoformat(text.replace('Z', '+00:00')).date()
+        except ValueError:
+            raise ValueError(f'Invalid date: {value!r}')
+
+
+class StatementRow:
+    """A single credit line from a settlement export or bank statement"""
+
+    __slots__ = ('line', 'source', 'date', 'paise', 'order_id', 'transaction_id', 'reference', 'description', 'error')
+
+    def __init__(self, line, source, date, paise, order_id='', transaction_id='', reference='', description='',
+                 error=''):
+        self.line = line
+        self.source = source
+        self.date = date
+        self.paise = paise
+        self.order_id = order_id
+        self.transaction_id = transaction_id
+        self.reference = reference
+        self.description = description
+        # Why the row could not be read (an unparseable date or amount); such rows are only reported
+        self.error = error
+
+
+class InvoiceRef:
+    """Lightweight in-memory view of an invoice used by the matcher"""
+
+    __slots__ = ('id', 'user_id', 'invoice_number', 'order_id', 'paise', 'issue_date', 'due_date', 'status')
+
+    def __init__(self, id, user_id, invoice_number, order_id, paise, issue_date, due_date, status):
+        self.id = id
+        self.user_id = user_id
+        self.invoice_number = invoice_number
+        self.order_id = order_id
+        self.paise = paise
+        self.issue_date = issue_date
+        self.due_date = due_date
+        self.status = status
+
+
+def _get(record, col):
+    return record[col].strip() if col is not None and col < len(record) else ''
+
+
+def _column_finder(header):
+    positions = {name.strip().lower(): i for i, name in enumerate(header)}
+
+    def column(*names):
+        for name in names:
+            if name in positions:
+                return positions[name]
+        return None
+    return column
+
+
+def read_razorpay_settlement(fileobj):
+    """Stream payment rows from a Razorpay settlement reconciliation CSV"""
+    parse_date = DateParser()
+    reader = csv.reader(fileobj)
+    column = _column_finder(next(reader, []))
+    type_col = column('type')
+    amount_col = column('credit', 'amount')
+    date_col = column('created_at', 'settled_at')
+    order_col = column('order_id')
+    txn_col = column('entity_id', 'payment_id')
+    receipt_col = column('order_receipt')
+    desc_col = column('description')
+    if amount_col is None or date_col is None:
+        raise ValueError('Settlement export is missing amount or date columns')
+
+    for line, record in enumerate(reader, start=2):
+        if not record or (type_col is not None and _get(record, type_col) != 'payment'):
+            continue
+        fields = {
+            'order_id': _get(record, order_col),
+            'transaction_id': _get(record, txn_col),
+            'reference': _get(record, receipt_col),
+            'description': _get(record, desc_col),
+        }
+        try:
+            row_date = parse_date(_get(record, date_col))
+            paise = Money.parse(_get(record, amount_col)).paise
+        except ValueError as e:
+            yield StatementRow(line, 'razorpay', None, 0, error=str(e), **fields)
+            continue
+        yield StatementRow(line, 'razorpay', row_date, paise, **fields)
+
+
+def read_bank_statement(fileobj):
+    """Stream credit rows from a bank statement CSV, skipping debits"""
+    parse_date = DateParser()
+    reader = csv.reader(fileobj)
+    column = _column_finder(next(reader, []))
+    columns = {key: column(*aliases) for key, aliases in BANK_COLUMNS.items()}
+    columns = {key: col for key, col in columns.items() if col is not None}
+    missing = {'date', 'credit'} - set(columns)
+    if missing:
+        raise ValueError(f"Bank statement is missing columns: {', '.join(sorted(missing))}")
+
+    date_col = columns['date']
+    credit_col = columns['credit']
+    desc_col = columns.get('description')
+    ref_col = columns.get('reference')
+    for line, record in enumerate(reader, start=2):
+        if len(record) <= max(date_col, credit_col):
+            continue
+        reference = _get(record, ref_col)
+        fields = {'transaction_id': reference, 'reference': reference, 'description': _get(record, desc_col)}
+        try:
+            paise = Money.parse(record[credit_col]).paise
+            if paise <= 0:
+                continue
+            row_date = parse_date(record[date_col])
+        except ValueError as e:
+            yield StatementRow(line, 'bank', None, 0, error=str(e), **fields)
+            continue
+        yield StatementRow(line, 'bank', row_date, paise, **fields)
+
+
+STATEMENT_READERS = {
+    'razorpay': read_razorpay_settlement,
+    'bank': read_bank_statement,
+}
+
+
+class InvoiceIndex:
+    """Hash indexes over invoices and recorded payments"""
+
+    def __init__(self):
+        self.by_order = {}
+        self.by_number = {}
+        self.by_amount = {}
+        self.by_transaction = {}
+
+    def add_invoice(self, ref):
+        if ref.order_id:
+            self.by_order[ref.order_id] = ref
+        self.by_number[ref.invoice_number.upper()] = ref
+        if ref.status in OPEN_STATUSES:
+            self.by_amount.setdefault(ref.paise, []).append(ref)
+
+    def add_payment(self, transaction_id, invoice_id):
+        self.by_transaction[transaction_id] = invoice_id
+
+    def __len__(self):
+        return len(self.by_number)
+
+    @classmethod
+    def from_database(cls, user=None, chunk_size=10000):
+        """Build the index with two streaming queries"""
+        index = cls()
+        invoices = Invoice.objects.all()
+        payments = Payment.objects.exclude(transaction_id='')
+        if user is not None:
+            invoices = invoices.filter(user=user)
+            payments = payments.filter(invoice__user=user)
+
+        rows = invoices.order_by().values_list(
+            'id', 'user_id', 'invoice_number', 'razorpay_order_id',
+            'total_amount', 'issue_date', 'due_date', 'status',
+        ).iterator(chunk_size=chunk_size)
+        for pk, user_id, number, order_id, total, issue_date, due_date, status in rows:
+            index.add_invoice(InvoiceRef(
+                pk, user_id, number, order_id, Money.from_decimal(total).paise, issue_date, due_date, status
+            ))
+
+        for transaction_id, invoice_id in payments.order_by().values_list(
+                'transaction_id', 'invoice_id').iterator(chunk_size=chunk_size):
+            index.add_payment(transaction_id, invoice_id)
+        return index
+
+
+class AmountCandidates:
+    """Unclaimed open invoices of one amount, sorted by issue date so a row's date window is a slice"""
+
+    def __init__(self, refs):
+        self.refs = sorted(refs, key=lambda ref: ref.issue_date)
+        self.issued = [ref.issue_date for ref in self.refs]
+        # Bounds how far before a row's date a still-payable invoice can have been issued
+        self.longest = max([timedelta(0)] + [ref.due_date - ref.issue_date for ref in self.refs])
+
+    def around(self, day, window):
+        """Invoices issued no later than ``day + window`` and due no earlier than ``day - window``"""
+        start = bisect_left(self.issued, day - window - self.longest)
+        stop = bisect_right(self.issued, day + window)
+        return [ref for ref in self.refs[start:stop] if day <= ref.due_date + window]
+
+    def remove(self, ref):
+        position = bisect_left(self.issued, ref.issue_date)
+        while position < len(self.refs) and self.issued[position] == ref.issue_date:
+            if self.refs[position] is ref:
+                del self.refs[position], self.issued[position]
+                return
+            position += 1
+
+
+class ReconciliationResult:
+    """Matches and mismatches produced by a reconciliation run"""
+
+    def __init__(self):
+        self.matches = []
+        self.mismatches = []
+        self.already_recorded = 0
+        self.rows = 0
+        self.rules = Counter()
+
+    def summary(self):
+        return {
+            'rows': self.rows,
+            'matched': len(self.matches),
+            'already_recorded': self.already_recorded,
+            'mismatched': len(self.mismatches),
+            'by_rule': dict(self.rules),
+        }
+
+
+class Reconciler:
+    """Matches statement rows to invoices using the in-memory indexes"""
+
+    def __init__(self, index, date_window_days=7):
+        self.index = index
+        self.window = timedelta(days=date_window_days)
+        self.claimed = set()
+        # AmountCandidates per amount, built the first time a row needs it
+        self.amounts = {}
+
+    def _candidates(self, paise):
+        candidates = self.amounts.get(paise)
+        if candidates is None:
+            refs = self.index.by_amount.get(paise, ())
+            candidates = self.amounts[paise] = AmountCandidates(ref for ref in refs if ref.id not in self.claimed)
+        return candidates
+
+    def claim(self, ref):
+        self.claimed.add(ref.id)
+        # Claimed invoices leave the amount index, so later rows never scan past them
+        if ref.paise in self.amounts:
+            self.amounts[ref.paise].remove(ref)
+
+    def _by_amount(self, row):
+        refs = self.index.by_amount.get(row.paise)
+        if not refs or row.date is None:
+            return None, 'no_match'
+        window = self.window
+        if len(refs) <= AMOUNT_SCAN_LIMIT:
+            found = [
+                ref for ref in refs
+                if ref.id not in self.claimed
+                and ref.issue_date - window <= row.date <= ref.due_date + window
+            ]
+        else:
+            found = self._candidates(row.paise).around(row.date, window)
+        if len(found) == 1:
+            return found[0], None
+        return None, 'ambiguous_amount' if found else 'no_match'
+
+    def match_row(self, row):
+        """Return (invoice_ref, rule, reason) for a single row"""
+        index = self.index
+        if row.error:
+            return None, None, 'invalid_row'
+        if row.transaction_id and row.transaction_id in index.by_transaction:
+            return None, 'transaction_id', 'already_recorded'
+
+        ref = index.by_order.get(row.order_id) if row.order_id else None
+        rule = 'order_id'
+        if ref is None:
+            rule = 'invoice_number'
+            for number in INVOICE_NUMBER_RE.findall(f'{row.reference} {row.description}'):
+                ref = index.by_number.get(number.upper())
+                if ref is not None:
+                    break
+        if ref is None:
+            rule = 'amount_date'
+            ref, reason = self._by_amount(row)
+            if ref is None:
+                return None, None, reason
+
+        if ref.status == 'cancelled':
+            return ref, rule, 'invoice_cancelled'
+        if ref.status not in OPEN_STATUSES:
+            # Paid by another route (mark-as-paid records no payment) or by an earlier run over rows
+            # without transaction ids; recording the row again would double-count it
+            return ref, rule, 'already_paid'
+        if ref.paise != row.paise:
+            return ref, rule, 'amount_mismatch'
+        if ref.id in self.claimed:
+            return ref, rule, 'duplicate_payment'
+        return ref, rule, None
+
+    def run(self, rows):
+        result = ReconciliationResult()
+        for row in rows:
+            result.rows += 1
+            ref, rule, reason = self.match_row(row)
+            if reason == 'already_recorded':
+                result.already_recorded += 1
+                continue
+            if reason:
+                result.mismatches.append((row, ref, reason))
+                continue
+            self.claim(ref)
+            result.rules[rule] += 1
+            result.matches.append((row, ref, rule))
+        return result
+
+
+def _refresh_derived(touched):
+    invalidate_aging(touched)
+    for user_id, days in touched.items():
+        refresh_rollups(user_id, days)
+
+
+def apply_result(result, batch_size=1000):
+    """Bulk-create missing payments and flip matched open invoices to paid"""
+    payments = []
+    to_flip = []
+    touched = {}
+    now = timezone.now()
+    for row, ref, rule in result.matches:
+        payments.append(Payment(
+            invoice_id=ref.id,
+            amount=Money(row.paise).to_decimal(),
+            # Statements carry the day the money arrived, not the time
+            payment_date=timezone.make_aware(datetime.combine(row.date, time.min)) if row.date else now,
+            payment_method='razorpay' if row.source == 'razorpay' else 'bank_transfer',
+            transaction_id=row.transaction_id,
+            status='completed',
+            notes=f'Reconciled from {row.source} statement line {row.line} ({rule}, {row.date})',
+        ))
+        if ref.status in OPEN_STATUSES:
+            to_flip.append(ref.id)
+            touched.setdefault(ref.user_id, set()).add(ref.issue_date)
+
+    with transaction.atomic():
+        Payment.objects.bulk_create(payments, batch_size=batch_size)
+        for start in range(0, len(to_flip), batch_size):
+            Invoice.objects.filter(
+                pk__in=to_flip[start:start + batch_size], status__in=OPEN_STATUSES
+            ).update(status='paid', updated_at=now)
+        # Queryset updates bypass the model signals
+        transaction.on_commit(lambda: _refresh_derived(touched))
+
+    logger.info(f"Reconciliation applied: {len(payments)} payments created, {len(to_flip)} invoices marked paid")
+    return len(payments), len(to_flip)
+
+
+MISMATCH_REPORT_HEADER = [
+    'line', 'source', 'date', 'amount', 'order_id', 'transaction_id',
+    'reference', 'description', 'reason', 'invoice_number', 'invoice_amount', 'detail',
+]
+
+
+def write_mismatch_report(result, fileobj):
+    """Write one CSV line per unmatched or inconsistent statement row"""
+    writer = csv.writer(fileobj)
+    writer.writerow(MISMATCH_REPORT_HEADER)
+    for row, ref, reason in result.mismatches:
+        writer.writerow([
+            row.line, row.source, row.date, '' if row.error else str(Money(row.paise)), row.order_id,
+            row.transaction_id, row.reference, row.description, reason,
+            ref.invoice_number if ref else '', str(Money(ref.paise)) if ref else '', row.error,
+        ])
@@ -0,0 +1,611 @@
+"""
+Invoice repositories for HisabPro
+One storage interface over the Django ORM, Supabase and MongoDB, so the invoice views (repository_views.py)
+and their batching, caching and pagination are written once; INVOICE_REPOSITORY picks the store
+"""
+
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import Protocol
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import caching
+from .aging import invalidate_aging
+from .conditional import (
+    WATERMARK_TIMEOUT, invalidate_watermark, orm_watermark, parse_timestamp, supabase_watermark, watermark_key,
+)
+from .models import Invoice, InvoiceItem, InvoiceNumberSequence
+from .money import Money, bson_paise_expr
+from .mongo_indexes import ensure_mongo_indexes
+from .serializers import InvoiceCreateSerializer
+from .services import mongodb_service, supabase_service
+
+DEFAULT_TAX_RATE = Decimal('18.00')
+SUMMARY_STATUSES = ('pending', 'paid', 'overdue')
+
+# What a repository accepts in ``data``; amounts are always worked out from the items
+INVOICE_FIELDS = (
+    'client_name', 'client_email', 'client_phone', 'client_address', 'issue_date', 'due_date', 'status',
+    'tax_rate', 'notes', 'terms_conditions', 'payment_link', 'order_id',
+)
+
+
+class InvoiceRepository(Protocol):
+    """The invoice store behind the unified views.
+
+    Invoices are plain dicts: string ids, dates as dates, amounts as Money, and the invoice's ``items``
+    (each with ``id``, ``description``, ``quantity``, ``unit_price`` and ``total``) included. Calls that
+    read or write several invoices or items take a fixed number of round trips however many there are.
+    """
+
+    name: str
+
+    def page(self, user, limit, offset=0):
+        """(one page of the user's invoices, newest first, and how many they have in all)"""
+
+    def get_many(self, user, ids):
+        """{id: invoice} for those of ``ids`` that exist and belong to ``user``"""
+
+    def get(self, user, invoice_id):
+        """The invoice, or None when it does not exist or is someone else's"""
+
+    def summary(self, user):
+        """Counts and totals per status, in InvoiceSummarySerializer's shape"""
+
+    def watermark(self, user):
+        """(latest updated_at, invoice count) of the user's invoices, for validators"""
+
+    def create(self, user, data, items):
+        """Store a new invoice and its items; returns the invoice"""
+
+    def update(self, user, invoice_id, data, items=None):
+        """Apply ``data``, and replace the items when ``items`` is given; None when there is no such invoice"""
+
+    def delete(self, user, invoice_id):
+        """True when the invoice existed and was deleted"""
+
+
+def line_total(item):
+    return Money.from_rupees(item['unit_price']).times(item['quantity'])
+
+
+def invoice_totals(items, tax_rate):
+    """(subtotal, tax, total) with tax charged at the invoice's rate, as Invoice.calculate_totals does"""
+    subtotal = Money.sum(line_total(item) for item in items)
+    tax = subtotal.percent(tax_rate)
+    return subtotal, tax, subtotal + tax
+
+
+def build_summary(by_status, total_invoices, total_amount):
+    """The summary from {status: (count, Money)} plus the overall count and amount"""
+    summary = {'total_invoices': total_invoices, 'total_amount': total_amount}
+    for status in SUMMARY_STATUSES:
+        count, amount = by_status.get(status, (0, Money()))
+        summary[f'{status}_invoices'] = count
+        summary[f'total_{status}_amount'] = amount
+    return summary
+
+
+def next_invoice_number(user):
+    # Numbers come from the ORM's per-user sequence whichever store holds the invoice
+    return Invoice.format_invoice_number(user, InvoiceNumberSequence.reserve(user, 1))
+
+
+def valid_ids(ids):
+    """The strings among ``ids`` that are UUIDs; anything else cannot match an invoice"""
+    found = []
+    for value in ids:
+        try:
+            found.append(str(uuid.UUID(str(value))))
+        except ValueError:
+            continue
+    return found
+
+
+def as_date(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def as_datetime(value):
+    if isinstance(value, str):
+        value = parse_timestamp(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        # pymongo hands back naive UTC datetimes
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value
+
+
+def _stamps(count):
+    """Increasing created_at values, so items written together read back in the order they were given"""
+    start = datetime.now(dt_timezone.utc)
+    return [(start + timedelta(microseconds=n)).isoformat(timespec='microseconds') for n in range(count)]
+
+
+class BaseRepository:
+    name = None
+
+    def get(self, user, invoice_id):
+        return self.get_many(user, [invoice_id]).get(str(invoice_id))
+
+    def fields(self, data):
+        return {field: data[field] for field in INVOICE_FIELDS if field in data}
+
+    def changed(self, user):
+        # Cached watermarks (and so every ETag built from them) must move at once after our own writes
+        invalidate_watermark(self.name, user.id)
+
+
+class OrmInvoiceRepository(BaseRepository):
+    name = 'orm'
+
+    COLUMNS = {'payment_link': 'razorpay_payment_link', 'order_id': 'razorpay_order_id'}
+
+    def invoices(self, user):
+        return Invoice.objects.filter(user=user)
+
+    def record(self, invoice, items=None):
+        items = invoice.items.all() if items is None else items
+        return {
+            'id': str(invoice.id),
+            'invoice_number': invoice.invoice_number,
+            'client_name': invoice.client_name,
+            'client_email': invoice.client_email,
+            'client_phone': invoice.client_phone,
+            'client_address': invoice.client_address,
+            'issue_date': invoice.issue_date,
+            'due_date': invoice.due_date,
+            'status': invoice.status,
+            'tax_rate': invoice.tax_rate,
+            'subtotal': Money.from_decimal(invoice.subtotal),
+            'tax_amount': Money.from_decimal(invoice.tax_amount),
+            'total_amount': Money.from_decimal(invoice.total_amount),
+            'notes': invoice.notes,
+            'terms_conditions': invoice.terms_conditions,
+            'payment_link': invoice.razorpay_payment_link,
+            'order_id': invoice.razorpay_order_id,
+            'created_at': invoice.created_at,
+            'updated_at': invoice.updated_at,
+            'items': [{
+                'id': str(item.id),
+                'description': item.description,
+                'quantity': item.quantity,
+                'unit_price': Money.from_decimal(item.unit_price),
+                'total': Money.from_decimal(item.total),
+            } for item in items],
+        }
+
+    def build_items(self, invoice, items):
+        return InvoiceCreateSerializer.build_items(invoice, [{
+            'description': item['description'],
+            'quantity': item['quantity'],
+            'unit_price': Money.from_rupees(item['unit_price']).to_decimal(),
+        } for item in items])
+
+    def apply(self, invoice, data):
+        for field, value in self.fields(data).items():
+            setattr(invoice, self.COLUMNS.get(field, field), value)
+
+    def page(self, user, limit, offset=0):
+        invoices = self.invoices(user)
+        rows = invoices.prefetch_related('items').order_by('-created_at', '-id')[offset:offset + limit]
+        return [self.record(invoice) for invoice in rows], invoices.count()
+
+    def get_many(self, user, ids):
+        ids = valid_ids(ids)
+        if not ids:
+            return {}
+        invoices = self.invoices(user).filter(id__in=ids).prefetch_related('items')
+        return {str(invoice.id): self.record(invoice) for invoice in invoices}
+
+    def summary(self, user):
+        rows = self.invoices(user).order_by().values('status').annotate(count=Count('id'), amount=Sum('total_amount'))
+        by_status = {row['status']: (row['count'], Money.from_decimal(row['amount'] or 0)) for row in rows}
+        return build_summary(
+            by_status, sum(count for count, _ in by_status.values()), Money.sum(amount for _, amount in by_status.values()),
+        )
+
+    def watermark(self, user):
+        return orm_watermark(self.invoices(user))
+
+    def create(self, user, data, items):
+        invoice = Invoice(user=user, tax_rate=DEFAULT_TAX_RATE)
+        self.apply(invoice, data)
+        invoice.generate_invoice_number()
+        built = self.build_items(invoice, items)
+        with transaction.atomic():
+            invoice.save(items=built)
+            InvoiceItem.objects.bulk_create(built)
+        return self.record(invoice, built)
+
+    def update(self, user, invoice_id, data, items=None):
+        invoice = self.invoices(user).filter(id__in=valid_ids([invoice_id])).first()
+        if invoice is None:
+            return None
+        self.apply(invoice, data)
+        if items is None:
+            invoice.save()
+            return self.record(invoice)
+        built = self.build_items(invoice, items)
+        with transaction.atomic():
+            invoice.items.all().delete()
+            InvoiceItem.objects.bulk_create(built)
+            invoice.save(items=built)
+        return self.record(invoice, built)
+
+    def delete(self, user, invoice_id):
+        _, deleted = self.invoices(user).filter(id__in=valid_ids([invoice_id])).delete()
+        return deleted.get(Invoice._meta.label, 0) > 0
+
+    def changed(self, user):
+        # The ORM watermark is read live, so there is nothing cached to move
+        pass
+
+
+class SupabaseInvoiceRepository(BaseRepository):
+    name = 'supabase'
+
+    COLUMNS = {'order_id': 'payment_id'}
+
+    def __init__(self, service=None):
+        self._service = service
+
+    @property
+    def service(self):
+        service = self._service if self._service is not None else supabase_service
+        service.connect()
+        return service
+
+    def table(self, name):
+        return self.service.client.table(name)
+
+    def record(self, row, items):
+        return {
+            'id': row['id'],
+            'invoice_number': row.get('invoice_number') or '',
+            'client_name': row.get('client_name') or '',
+            'client_email': row.get('client_email') or '',
+            'client_phone': row.get('client_phone') or '',
+            'client_address': row.get('client_address') or '',
+            'issue_date': as_date(row.get('issue_date') or row.get('invoice_date')),
+            'due_date': as_date(row.get('due_date')),
+            'status': row.get('status') or 'pending',
+            'tax_rate': Decimal(str(row.get('tax_rate') or 0)).quantize(Decimal('0.01')),
+            'subtotal': Money.from_json(row.get('subtotal') or 0),
+            'tax_amount': Money.from_json(row.get('tax_amount') or 0),
+            'total_amount': Money.from_json(row.get('total_amount') or 0),
+            'notes': row.get('notes') or '',
+            'terms_conditions': row.get('terms_conditions') or '',
+            'payment_link': row.get('payment_link') or '',
+            'order_id': row.get('payment_id') or '',
+            'created_at': as_datetime(row.get('created_at')),
+            'updated_at': as_datetime(row.get('updated_at')),
+            'items': [{
+                'id': item['id'],
+                'description': item.get('description') or '',
+                'quantity': Decimal(str(item.get('quantity') or 0)).quantize(Decimal('0.01')),
+                'unit_price': Money.from_json(item.get('unit_price') or 0),
+                'total': Money.from_json(item.get('total') or 0),
+            } for item in items],
+        }
+
+    def items_for(self, invoice_ids):
+        """Raw item rows of several invoices in one request, grouped by invoice id"""
+        grouped = {invoice_id: [] for invoice_id in invoice_ids}
+        if invoice_ids:
+            rows = (
+                self.table('invoice_items').select('*').in_('invoice_id', list(invoice_ids))
+                .order('created_at').order('id').execute().data
+            )
+            for item in rows:
+                grouped.setdefault(item['invoice_id'], []).append(item)
+        return grouped
+
+    def records(self, rows):
+        items = self.items_for([row['id'] for row in rows])
+        return [self.record(row, items[row['id']]) for row in rows]
+
+    def fetch(self, user, ids):
+        ids = valid_ids(ids)
+        if not ids:
+            return []
+        return self.table('invoices').select('*').eq('user_id', user.id).in_('id', ids).execute().data
+
+    def columns(self, data):
+        columns = {}
+        for field, value in self.fields(data).items():
+            if isinstance(value, date):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = float(value)
+            columns[self.COLUMNS.get(field, field)] = value
+        if 'order_id' in data:
+            columns['payment_gateway'] = 'razorpay'
+        return columns
+
+    def amounts(self, items, tax_rate):
+        subtotal, tax, total = invoice_totals(items, tax_rate)
+        return {'subtotal': subtotal.to_json(), 'tax_amount': tax.to_json(), 'total_amount': total.to_json()}
+
+    def insert_items(self, invoice_id, items):
+        """Every item in one insert"""
+        if not items:
+            return []
+        return self.table('invoice_items').insert([{
+            'invoice_id': invoice_id,
+            'description': item['description'],
+            'quantity': float(item['quantity']),
+            'unit_price': Money.from_rupees(item['unit_price']).to_json(),
+            'total': line_total(item).to_json(),
+            'created_at': stamp,
+        } for item, stamp in zip(items, _stamps(len(items)))]).execute().data
+
+    def page(self, user, limit, offset=0):
+        result = (
+            self.table('invoices').select('*', count='exact').eq('user_id', user.id)
+            .order('created_at', desc=True).order('id', desc=True).range(offset, offset + limit - 1).execute()
+        )
+        return self.records(result.data), result.count or 0
+
+    def get_many(self, user, ids):
+        return {record['id']: record for record in self.records(self.fetch(user, ids))}
+
+    def summary(self, user):
+        # Aggregated by the service in one request rather than by paging every row over here
+        raw = self.service.get_invoice_summary(user.id) or {}
+
+        def amount(status):
+            return Money.from_json(raw.get(f'total_{status}_amount') or raw.get(f'{status}_amount') or 0)
+
+        by_status = {status: (raw.get(f'{status}_invoices') or 0, amount(status)) for status in SUMMARY_STATUSES}
+        return build_summary(by_status, raw.get('total_invoices') or 0, Money.from_json(raw.get('total_amount') or 0))
+
+    def watermark(self, user):
+        latest, count = supabase_watermark(self.service.client, user.id)
+        return parse_timestamp(latest), count
+
+    def create(self, user, data, items):
+        tax_rate = data.get('tax_rate', DEFAULT_TAX_RATE)
+        row = {
+            'status': 'pending', **self.columns(data), 'tax_rate': float(tax_rate),
+            'user_id': user.id, 'invoice_number': next_invoice_number(user), **self.amounts(items, tax_rate),
+        }
+        invoice = self.table('invoices').insert(row).execute().data[0]
+        stored = self.insert_items(invoice['id'], items)
+        self.changed(user)
+        return self.record(invoice, stored)
+
+    def update(self, user, invoice_id, data, items=None):
+        rows = self.fetch(user, [invoice_id])
+        if not rows:
+            return None
+        invoice_id = rows[0]['id']
+        columns = self.columns(data)
+        stored = None
+        if items is not None or 'tax_rate' in data:
+            if items is None:
+                stored = self.items_for([invoice_id])[invoice_id]
+            tax_rate = data.get('tax_rate', rows[0].get('tax_rate') or 0)
+            columns.update(self.amounts(items if items is not None else stored, tax_rate))
+        row = self.table('invoices').update(columns).eq('id', invoice_id).eq('user_id', user.id).execute().data[0]
+        if items is not None:
+            # Replace the items with one delete and one insert, not a request per line
+            self.table('invoice_items').delete().eq('invoice_id', invoice_id).execute()
+            stored = self.insert_items(invoice_id, items)
+        elif stored is None:
+            stored = self.items_for([invoice_id])[invoice_id]
+        self.changed(user)
+        return self.record(row, stored)
+
+    def delete(self, user, invoice_id):
+        ids = valid_ids([invoice_id])
+        if not ids:
+            return False
+        # Items go with it (ON DELETE CASCADE) and a trigger leaves the tombstone
+        deleted = self.table('invoices').delete().eq('id', ids[0]).eq('user_id', user.id).execute().data
+        if deleted:
+            self.changed(user)
+        return bool(deleted)
+
+
+class MongoInvoiceRepository(BaseRepository):
+    name = 'mongo'
+
+    COLUMNS = {'payment_link': 'razorpay_payment_link', 'order_id': 'razorpay_order_id'}
+
+    def __init__(self, db=None):
+        self._db = db
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        mongodb_service._ensure_connected()
+        if mongodb_service.db is not None:
+            ensure_mongo_indexes(mongodb_service.db)
+        return mongodb_service.db
+
+    def record(self, doc, items):
+        return {
+            'id': doc['id'],
+            'invoice_number': doc.get('invoice_number') or '',
+            'client_name': doc.get('client_name') or '',
+            'client_email': doc.get('client_email') or '',
+            'client_phone': doc.get('client_phone') or '',
+            'client_address': doc.get('client_address') or '',
+            'issue_date': as_date(doc.get('issue_date')),
+            'due_date': as_date(doc.get('due_date')),
+            'status': doc.get('status') or 'pending',
+            'tax_rate': Decimal(str(doc.get('tax_rate') or 0)).quantize(Decimal('0.01')),
+            'subtotal': Money.from_bson(doc.get('subtotal', 0)),
+            'tax_amount': Money.from_bson(doc.get('tax_amount', 0)),
+            'total_amount': Money.from_bson(doc.get('total_amount', 0)),
+            'notes': doc.get('notes') or '',
+            'terms_conditions': doc.get('terms_conditions') or '',
+            'payment_link': doc.get('razorpay_payment_link') or '',
+            'order_id': doc.get('razorpay_order_id') or '',
+            'created_at': as_datetime(doc.get('created_at')),
+            'updated_at': as_datetime(doc.get('updated_at')),
+            'items': [{
+                'id': item['id'],
+                'description': item.get('description') or '',
+                'quantity': Decimal(str(item.get('quantity') or 0)).quantize(Decimal('0.01')),
+                'unit_price': Money.from_bson(item.get('unit_price', 0)),
+                'total': Money.from_bson(item.get('total', 0)),
+            } for item in items],
+        }
+
+    def items_for(self, invoice_ids):
+        grouped = {invoice_id: [] for invoice_id in invoice_ids}
+        if invoice_ids:
+            found = self.db.invoice_items.find({'invoice_id': {'$in': list(invoice_ids)}}, {'_id': 0})
+            for item in found.sort([('invoice_id', 1), ('position', 1)]):
+                grouped.setdefault(item['invoice_id'], []).append(item)
+        return grouped
+
+    def records(self, docs):
+        items = self.items_for([doc['id'] for doc in docs])
+        return [self.record(doc, items[doc['id']]) for doc in docs]
+
+    def fields_for(self, data):
+        fields = {}
+        for field, value in self.fields(data).items():
+            if isinstance(value, date):
+                # Stored as ISO strings, which the aging pipeline's $toDate reads
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = float(value)
+            fields[self.COLUMNS.get(field, field)] = value
+        return fields
+
+    def amounts(self, items, tax_rate):
+        subtotal, tax, total = invoice_totals(items, tax_rate)
+        return {'subtotal': subtotal.to_bson(), 'tax_amount': tax.to_bson(), 'total_amount': total.to_bson()}
+
+    def insert_items(self, invoice_id, items):
+        docs = [{
+            'id': str(uuid.uuid4()),
+            'invoice_id': invoice_id,
+            'position': position,
+            'description': item['description'],
+            'quantity': float(item['quantity']),
+            'unit_price': Money.from_rupees(item['unit_price']).to_bson(),
+            'total': line_total(item).to_bson(),
+        } for position, item in enumerate(items)]
+        if docs:
+            # insert_many adds _id to each document; keep the returned copies free of it
+            self.db.invoice_items.insert_many([dict(doc) for doc in docs])
+        return docs
+
+    def page(self, user, limit, offset=0):
+        total = self.db.invoices.count_documents({'user_id': user.id})
+        docs = list(
+            self.db.invoices.find({'user_id': user.id}, {'_id': 0})
+            .sort([('created_at', -1), ('id', -1)]).skip(offset).limit(limit)
+        )
+        return self.records(docs), total
+
+    def get_many(self, user, ids):
+        ids = [str(value) for value in ids]
+        if not ids:
+            return {}
+        docs = list(self.db.invoices.find({'user_id': user.id, 'id': {'$in': ids}}, {'_id': 0}))
+        return {record['id']: record for record in self.records(docs)}
+
+    def summary(self, user):
+        rows = list(self.db.invoices.aggregate([
+            {'$match': {'user_id': user.id}},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'amount': {'$sum': bson_paise_expr('total_amount')}}},
+        ]))
+        by_status = {row['_id']: (row['count'], Money(int(row['amount']))) for row in rows}
+        return build_summary(
+            by_status, sum(count for count, _ in by_status.values()), Money.sum(amount for _, amount in by_status.values()),
+        )
+
+    def watermark(self, user):
+        def fetch():
+            rows = list(self.db.invoices.aggregate([
+                {'$match': {'user_id': user.id}},
+                {'$group': {'_id': None, 'latest': {'$max': '$updated_at'}, 'count': {'$sum': 1}}},
+            ]))
+            return (as_datetime(rows[0]['latest']), rows[0]['count']) if rows else (None, 0)
+
+        return caching.remember(watermark_key(self.name, user.id), fetch, WATERMARK_TIMEOUT)
+
+    def create(self, user, data, items):
+        now = datetime.now(dt_timezone.utc)
+        tax_rate = data.get('tax_rate', DEFAULT_TAX_RATE)
+        doc = {
+            'status': 'pending', **self.fields_for(data), 'tax_rate': float(tax_rate),
+            'id': str(uuid.uuid4()), 'user_id': user.id, 'invoice_number': next_invoice_number(user),
+            **self.amounts(items, tax_rate), 'created_at': now, 'updated_at': now,
+        }
+        self.db.invoices.insert_one(dict(doc))
+        stored = self.insert_items(doc['id'], items)
+        self.changed(user)
+        return self.record(doc, stored)
+
+    def update(self, user, invoice_id, data, items=None):
+        doc = self.db.invoices.find_one({'id': str(invoice_id), 'user_id': user.id}, {'_id': 0})
+        if doc is None:
+            return None
+        changes = {**self.fields_for(data), 'updated_at': datetime.now(dt_timezone.utc)}
+        stored = None
+        if items is not None or 'tax_rate' in data:
+            if items is None:
+                stored = self.items_for([doc['id']])[doc['id']]
+                lines = [{**item, 'unit_price': Money.from_bson(item['unit_price'])} for item in stored]
+            else:
+                lines = items
+            changes.update(self.amounts(lines, data.get('tax_rate', doc.get('tax_rate') or 0)))
+        self.db.invoices.update_one({'id': doc['id']}, {'$set': changes})
+        if items is not None:
+            self.db.invoice_items.delete_many({'invoice_id': doc['id']})
+            stored = self.insert_items(doc['id'], items)
+        elif stored is None:
+            stored = self.items_for([doc['id']])[doc['id']]
+        self.changed(user)
+        return self.record({**doc, **changes}, stored)
+
+    def delete(self, user, invoice_id):
+        doc = self.db.invoices.find_one_and_delete({'id': str(invoice_id), 'user_id': user.id})
+        if doc is None:
+            return False
+        self.db.invoice_items.delete_many({'invoice_id': doc['id']})
+        # Delta sync clients learn about deletions from tombstones
+        self.db.invoice_tombstones.replace_one({'invoice_id': doc['id']}, {
+            'invoice_id': doc['id'], 'user_id': user.id, 'invoice_number': doc.get('invoice_number', ''),
+            'deleted_at': datetime.now(dt_timezone.utc),
+        }, upsert=True)
+        self.changed(user)
+        return True
+
+    def changed(self, user):
+        super().changed(user)
+        invalidate_aging([user.id])
+
+
+REPOSITORIES = {
+    'orm': OrmInvoiceRepository,
+    'supabase': SupabaseInvoiceRepository,
+    'mongo': MongoInvoiceRepository,
+}
+
+
+def get_repository(name=None):
+    """The repository ``name`` (default INVOICE_REPOSITORY) over the app's configured services"""
+    name = name or settings.INVOICE_REPOSITORY
+    try:
+        return REPOSITORIES[name]()
+    except KeyError:
+        raise ImproperlyConfigured(f"INVOICE_REPOSITORY must be one of {', '.join(REPOSITORIES)}, not {name!r}")
@@ -0,0 +1,246 @@
+"""
+Store-agnostic invoice views for HisabPro
+The /api/v2/invoices/ endpoints, written once over the InvoiceRepository (repositories.py) that
+INVOICE_REPOSITORY selects; every invoice is scoped to the requesting user whichever store holds it
+"""
+
+import logging
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from hisabpro.metrics import timed_pdf
+
+from .conditional import cached_body, list_etag, make_etag, not_modified, set_validators
+from .dashboard import RECENT_LIMIT
+from .repositories import get_repository
+from .serializers import (
+    InvoiceRecordSerializer, InvoiceSummarySerializer, RazorpayPaymentLinkSerializer,
+)
+from .services import razorpay_client
+from .singleflight import single_flight
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Most ids one ?ids= batch fetch may ask for
+MAX_BATCH_IDS = 100
+
+
+def _positive_int(value, default):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+def _page_links(request, page, page_size, count):
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) if page * page_size < count else None
+    if page <= 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page - 1)
+    return next_url, previous_url
+
+
+def _batch(request, repository):
+    """The invoices named in ?ids=, in the order asked for, from one get_many"""
+    ids = [value for value in request.query_params.get('ids', '').split(',') if value]
+    if len(ids) > MAX_BATCH_IDS:
+        return Response({'error': f'At most {MAX_BATCH_IDS} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+    found = repository.get_many(request.user, ids)
+    records = [found[invoice_id] for invoice_id in dict.fromkeys(ids) if invoice_id in found]
+    return Response({'results': InvoiceRecordSerializer(records, many=True).data})
+
+
+def _pdf_invoice(record, user):
+    """The record with the attribute access render_invoice_pdf expects of an Invoice"""
+    class Items(list):
+        def all(self):
+            return self
+
+    invoice = SimpleNamespace(**record)
+    invoice.user = user
+    invoice.items = Items(SimpleNamespace(**item) for item in record['items'])
+    # Invoices created outside HisabPro may lack dates; fall back to when they were created
+    invoice.issue_date = record['issue_date'] or record['created_at']
+    invoice.due_date = record['due_date'] or invoice.issue_date
+    return invoice
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_list(request):
+    """Page through the user's invoices, fetch several by ?ids=, or create one"""
+    repository = get_repository()
+    if request.method == 'POST':
+        serializer = InvoiceRecordSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        items = data.pop('items')
+        record = repository.create(request.user, data, items)
+        return Response(InvoiceRecordSerializer(record).data, status=status.HTTP_201_CREATED)
+
+    if 'ids' in request.query_params:
+        return _batch(request, repository)
+
+    page = _positive_int(request.query_params.get('page'), 1)
+    page_size = min(_positive_int(request.query_params.get('page_size'), PAGE_SIZE), MAX_PAGE_SIZE)
+    watermark = repository.watermark(request.user)
+    etag = list_etag(f'v2-list:{repository.name}:{page}:{page_size}', request.user.id, watermark)
+    response = not_modified(request, etag, watermark[0])
+    if response is not None:
+        return response
+
+    def build():
+        records, count = repository.page(request.user, page_size, (page - 1) * page_size)
+        return {'count': count, 'results': InvoiceRecordSerializer(records, many=True).data}
+
+    data = cached_body(f'v2-list:{repository.name}', request.user.id, etag, build)
+    next_url, previous_url = _page_links(request, page, page_size, data['count'])
+    body = {'count': data['count'], 'next': next_url, 'previous': previous_url, 'results': data['results']}
+    return set_validators(Response(body), etag, watermark[0])
+
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_detail(request, invoice_id):
+    repository = get_repository()
+    if request.method == 'DELETE':
+        if not repository.delete(request.user, invoice_id):
+            return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    if request.method == 'PATCH':
+        serializer = InvoiceRecordSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        items = data.pop('items', None)
+        record = repository.update(request.user, invoice_id, data, items)
+        if record is None:
+            return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(InvoiceRecordSerializer(record).data)
+
+    record = repository.get(request.user, invoice_id)
+    if record is None:
+        return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Item edits move the invoice's updated_at in every store, so it covers the whole body
+    etag = make_etag('v2-invoice', repository.name, record['id'], record['updated_at'].isoformat())
+    response = not_modified(request, etag, record['updated_at'])
+    if response is not None:
+        return response
+    return set_validators(Response(InvoiceRecordSerializer(record).data), etag, record['updated_at'])
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_summary(request):
+    repository = get_repository()
+    watermark = repository.watermark(request.user)
+    etag = list_etag(f'v2-summary:{repository.name}', request.user.id, watermark)
+    response = not_modified(request, etag, watermark[0])
+    if response is not None:
+        return response
+
+    def build():
+        return InvoiceSummarySerializer(repository.summary(request.user)).data
+
+    data = single_flight(
+        'summary', (repository.name, request.user.id, etag),
+        lambda: cached_body(f'v2-summary:{repository.name}', request.user.id, etag, build),
+    )
+    return set_validators(Response(data), etag, watermark[0])
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def recent_invoices(request):
+    """The newest invoices, for the dashboard"""
+    repository = get_repository()
+    watermark = repository.watermark(request.user)
+    etag = list_etag(f'v2-recent:{repository.name}', request.user.id, watermark)
+    response = not_modified(request, etag, watermark[0])
+    if response is not None:
+        return response
+    records, _ = repository.page(request.user, RECENT_LIMIT)
+    return set_validators(Response(InvoiceRecordSerializer(records, many=True).data), etag, watermark[0])
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_pdf(request, invoice_id):
+    repository = get_repository()
+    record = repository.get(request.user, invoice_id)
+    if record is None:
+        return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    # ReportLab is only loaded by workers that actually render a PDF
+    from .pdf_render import render_invoice_pdf
+
+    invoice = _pdf_invoice(record, request.user)
+    pdf_bytes = single_flight(
+        'pdf', (repository.name, record['id'], record['updated_at']),
+        lambda: timed_pdf('reportlab', render_invoice_pdf, invoice),
+    )
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="invoice_{record["invoice_number"]}.pdf"'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_payment_link(request, invoice_id):
+    repository = get_repository()
+    record = repository.get(request.user, invoice_id)
+    if record is None:
+        return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        def create():
+            amount_paise = record['total_amount'].paise
+            order = razorpay_client.order.create(data={
+                'amount': amount_paise,
+                'currency': 'INR',
+                'receipt': f'invoice_{record["invoice_number"]}',
+                'notes': {'invoice_number': record['invoice_number'], 'client_name': record['client_name']},
+            })
+            payment_link = razorpay_client.payment_link.create(data={
+                'amount': amount_paise,
+                'currency': 'INR',
+                'accept_partial': False,
+                'reference_id': f'invoice_{record["invoice_number"]}',
+                'description': f'Payment for Invoice #{record["invoice_number"]}',
+                'callback_url': f'{settings.FRONTEND_URL}/payment-success',
+                'callback_method': 'get',
+            })
+            repository.update(
+                request.user, record['id'], {'payment_link': payment_link['short_url'], 'order_id': order['id']},
+            )
+            return {'payment_link': payment_link['short_url'], 'order_id': order['id']}
+
+        # A double-click must not open two Razorpay orders for the same invoice
+        link = single_flight('payment-link', (repository.name, record['id'], record['total_amount'].paise), create)
+        return Response(RazorpayPaymentLinkSerializer(link).data)
+
+    except Exception as e:
+        logger.error(f"Error creating payment link for invoice {invoice_id}: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_mark_paid(request, invoice_id):
+    repository = get_repository()
+    if repository.update(request.user, invoice_id, {'status': 'paid'}) is None:
+        return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'message': 'Invoice marked as paid'})
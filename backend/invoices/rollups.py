@@ -0,0 +1,228 @@
+"""
+Revenue rollups for HisabPro
+Daily and monthly invoiced/paid/outstanding totals kept in step with invoices for dashboard charts
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import DailyRevenueRollup, Invoice, MonthlyRevenueRollup, RevenueRollup
+from .money import Money, sql_hundredths
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('pending', 'overdue')
+
+TOTAL_FIELDS = RevenueRollup.TOTAL_FIELDS
+
+
+def invoice_totals():
+    """Aggregate expressions producing every rollup column from a group of invoices"""
+    paise = sql_hundredths('total_amount')
+    paid = Q(status='paid')
+    outstanding = Q(status__in=OPEN_STATUSES)
+    return {
+        'invoiced_paise': Sum(paise),
+        'invoiced_count': Count('id'),
+        'paid_paise': Sum(paise, filter=paid),
+        'paid_count': Count('id', filter=paid),
+        'outstanding_paise': Sum(paise, filter=outstanding),
+        'outstanding_count': Count('id', filter=outstanding),
+    }
+
+
+def rollup_totals():
+    """Aggregate expressions summing daily rollup rows"""
+    return {field: Sum(field) for field in TOTAL_FIELDS}
+
+
+def _totals(row):
+    return {field: row[field] or 0 for field in TOTAL_FIELDS}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def next_day(day):
+    return day + timedelta(days=1)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _upsert(model, period_field, user_id, rows):
+    """Write ``{period: totals}`` for one user, deleting periods that no longer have invoices"""
+    keep = [
+        model(user_id=user_id, **{period_field: period}, **totals)
+        for period, totals in rows.items() if totals['invoiced_count']
+    ]
+    empty = [period for period, totals in rows.items() if not totals['invoiced_count']]
+    if keep:
+        model.objects.bulk_create(
+            keep,
+            update_conflicts=True,
+            unique_fields=['user', period_field],
+            update_fields=list(TOTAL_FIELDS) + ['updated_at'],
+        )
+    if empty:
+        model.objects.filter(user_id=user_id, **{f'{period_field}__in': empty}).delete()
+
+
+def refresh_months(user_id, months):
+    """Rebuild monthly rows for ``months`` from the daily rows"""
+    months = sorted(set(months))
+    if not months:
+        return
+    rows = {month: dict.fromkeys(TOTAL_FIELDS, 0) for month in months}
+    daily = DailyRevenueRollup.objects.filter(
+        user_id=user_id, day__gte=months[0], day__lt=next_month(months[-1])
+    ).annotate(month=TruncMonth('day')).values('month').annotate(**rollup_totals()).order_by()
+    for row in daily:
+        if row['month'] in rows:
+            rows[row['month']] = _totals(row)
+    _upsert(MonthlyRevenueRollup, 'month', user_id, rows)
+
+
+def refresh_rollups(user_id, days):
+    """Recompute the given issue days for one user, then the months containing them"""
+    days = {day for day in days if day}
+    if not days:
+        return
+    rows = {day: dict.fromkeys(TOTAL_FIELDS, 0) for day in days}
+    aggregates = Invoice.objects.filter(user_id=user_id, issue_date__in=days).exclude(
+        status='cancelled'
+    ).values('issue_date').annotate(**invoice_totals()).order_by()
+    with transaction.atomic():
+        for row in aggregates:
+            rows[row['issue_date']] = _totals(row)
+        _upsert(DailyRevenueRollup, 'day', user_id, rows)
+        refresh_months(user_id, {month_start(day) for day in days})
+
+
+def compact_rollups(since):
+    """Re-derive rollups for every day touched by invoices updated since ``since``
+
+    Queryset updates bypass the model signals, so this catches anything they missed.
+    """
+    touched = defaultdict(set)
+    pairs = Invoice.objects.filter(updated_at__gte=since).values_list('user_id', 'issue_date').distinct()
+    for user_id, day in pairs.order_by().iterator():
+        touched[user_id].add(day)
+    for user_id, days in touched.items():
+        refresh_rollups(user_id, days)
+    logger.info(f"Compacted revenue rollups for {sum(map(len, touched.values()))} days across {len(touched)} users")
+    return touched
+
+
+def backfill(user_ids=None, batch_size=5000):
+    """Rebuild all rollups from invoice history with two grouped queries"""
+    invoices = Invoice.objects.exclude(status='cancelled')
+    daily = DailyRevenueRollup.objects.all()
+    monthly = MonthlyRevenueRollup.objects.all()
+    if user_ids is not None:
+        invoices = invoices.filter(user_id__in=user_ids)
+        daily = daily.filter(user_id__in=user_ids)
+        monthly = monthly.filter(user_id__in=user_ids)
+
+    with transaction.atomic():
+        daily.delete()
+        monthly.delete()
+        rows = invoices.values('user_id', 'issue_date').annotate(**invoice_totals()).order_by().iterator()
+        days = 0
+        for chunk in _chunks(rows, batch_size):
+            DailyRevenueRollup.objects.bulk_create([
+                DailyRevenueRollup(user_id=row['user_id'], day=row['issue_date'], **_totals(row))
+                for row in chunk
+            ])
+            days += len(chunk)
+
+        rows = daily.annotate(month=TruncMonth('day')).values('user_id', 'month').annotate(
+            **rollup_totals()
+        ).order_by().iterator()
+        months = 0
+        for chunk in _chunks(rows, batch_size):
+            MonthlyRevenueRollup.objects.bulk_create([
+                MonthlyRevenueRollup(user_id=row['user_id'], month=row['month'], **_totals(row))
+                for row in chunk
+            ])
+            months += len(chunk)
+    return days, months
+
+
+def verify(user_ids=None):
+    """Compare rollup rows with raw invoice aggregates; returns a list of discrepancies"""
+    invoices = Invoice.objects.exclude(status='cancelled')
+    if user_ids is not None:
+        invoices = invoices.filter(user_id__in=user_ids)
+
+    problems = []
+    checks = (
+        ('day', DailyRevenueRollup, invoices.values('user_id', period=F('issue_date'))),
+        ('month', MonthlyRevenueRollup, invoices.values('user_id', period=TruncMonth('issue_date'))),
+    )
+    for granularity, model, grouped in checks:
+        expected = {
+            (row['user_id'], row['period']): _totals(row)
+            for row in grouped.annotate(**invoice_totals()).order_by().iterator()
+        }
+        stored = model.objects.all()
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+        actual = {
+            (row['user_id'], row[granularity]): _totals(row)
+            for row in stored.values('user_id', granularity, *TOTAL_FIELDS).iterator()
+        }
+        for key in sorted(expected.keys() | actual.keys()):
+            if expected.get(key) != actual.get(key):
+                problems.append((granularity, key[0], key[1], expected.get(key), actual.get(key)))
+    return problems
+
+
+def timeseries(user, granularity, start, end):
+    """Rollup rows between ``start`` and ``end`` with empty periods filled in"""
+    if granularity == 'month':
+        model, field = MonthlyRevenueRollup, 'month'
+        start, end = month_start(start), month_start(end)
+        step = next_month
+    else:
+        model, field = DailyRevenueRollup, 'day'
+        step = next_day
+
+    stored = {
+        row[field]: row
+        for row in model.objects.filter(
+            user=user, **{f'{field}__gte': start, f'{field}__lte': end}
+        ).values(field, *TOTAL_FIELDS)
+    }
+    points = []
+    period = start
+    while period <= end:
+        row = stored.get(period) or dict.fromkeys(TOTAL_FIELDS, 0)
+        points.append({
+            'period': period.isoformat(),
+            'invoiced': str(Money(row['invoiced_paise'])),
+            'invoiced_count': row['invoiced_count'],
+            'paid': str(Money(row['paid_paise'])),
+            'paid_count': row['paid_count'],
+            'outstanding': str(Money(row['outstanding_paise'])),
+            'outstanding_count': row['outstanding_count'],
+        })
+        period = step(period)
+    return points
@@ -1,18 +1,50 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Invoice, InvoiceItem, Payment
+from .models import ImportJob, Invoice, InvoiceItem, Payment
+from .gst import gstin_state, validate_gstin
+from .money import Money
 from auth_app.serializers import UserSerializer
 
 
+class MoneyField(serializers.Field):
+    """Rupee amount backed by Money; rendered as a '1180.50' string or a JSON number"""
+    default_error_messages = {
+        'invalid': 'A valid amount is required.',
+        'min_value': 'Ensure this amount is greater than or equal to {min_value}.',
+    }
+
+    def __init__(self, coerce_to_string=True, min_value=None, **kwargs):
+        self.coerce_to_string = coerce_to_string
+        self.min_value = min_value
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            money = Money.from_rupees(data)
+        except (TypeError, ValueError, OverflowError):
+            # OverflowError: 'Infinity' parses as a Decimal but has no paise
+            self.fail('invalid')
+        if self.min_value is not None and money < Money.from_rupees(self.min_value):
+            self.fail('min_value', min_value=self.min_value)
+        return money
+
+    def to_representation(self, value):
+        money = Money.from_rupees(value)
+        return str(money) if self.coerce_to_string else money.to_json()
+
+
 class InvoiceItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = InvoiceItem
-        fields = ['id', 'description', 'quantity', 'unit_price', 'total']
+        fields = ['id', 'description', 'hsn_sac', 'quantity', 'unit_price', 'gst_rate', 'cess_rate', 'total']
 
 
 class InvoiceItemCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = InvoiceItem
-        fields = ['description', 'quantity', 'unit_price']
+        fields = ['description', 'hsn_sac', 'quantity', 'unit_price', 'gst_rate', 'cess_rate']
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -30,7 +62,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
         model = Invoice
         fields = [
             'id', 'invoice_number', 'user', 'client_name', 'client_email', 'client_phone', 'client_address',
-            'issue_date', 'due_date', 'status', 'subtotal', 'tax_rate', 'tax_amount', 'total_amount',
+            'client_gstin', 'place_of_supply', 'issue_date', 'due_date', 'status', 'subtotal', 'tax_rate', 'tax_amount', 'total_amount',
             'notes', 'terms_conditions', 'razorpay_payment_link', 'last_reminder_sent', 'reminder_count',
             'created_at', 'updated_at', 'items', 'payments'
         ]
@@ -43,21 +75,44 @@ class InvoiceCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
         fields = [
-            'client_name', 'client_email', 'client_phone', 'client_address',
+            'client_name', 'client_email', 'client_phone', 'client_address', 'client_gstin', 'place_of_supply',
             'issue_date', 'due_date', 'tax_rate', 'notes', 'terms_conditions', 'items'
         ]
     
+    def validate_client_gstin(self, value):
+        value = value.strip().upper()
+        if value:
+            error = validate_gstin(value)
+            if error:
+                raise serializers.ValidationError(error)
+        return value
+    
+    def validate(self, attrs):
+        # A registered recipient's place of supply defaults to the state in their GSTIN
+        if attrs.get('client_gstin') and not attrs.get('place_of_supply'):
+            attrs['place_of_supply'] = gstin_state(attrs['client_gstin'])
+        return attrs
+    
+    @staticmethod
+    def build_items(invoice, items_data):
+        items = [InvoiceItem(invoice=invoice, **item_data) for item_data in items_data]
+        for item in items:
+            item.calculate_total()
+        return items
+    
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        invoice = Invoice.objects.create(**validated_data)
+        invoice = Invoice(**validated_data)
         
         # Generate invoice number
         invoice.generate_invoice_number()
-        invoice.save()
         
-        # Create invoice items
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=invoice, **item_data)
+        # One invoice write with its final totals, then the items in one insert; saving items one
+        # by one would re-total and re-save the invoice (and its rollups) for every line
+        items = self.build_items(invoice, items_data)
+        with transaction.atomic():
+            invoice.save(items=items)
+            InvoiceItem.objects.bulk_create(items)
         
         return invoice
     
@@ -67,16 +122,17 @@ class InvoiceCreateSerializer(serializers.ModelSerializer):
         # Update invoice fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
         
-        # Update invoice items
-        if items_data:
-            # Delete existing items
+        if not items_data:
+            instance.save()
+            return instance
+        
+        # Replace the items, then save the invoice once with totals from the new ones
+        items = self.build_items(instance, items_data)
+        with transaction.atomic():
             instance.items.all().delete()
-            
-            # Create new items
-            for item_data in items_data:
-                InvoiceItem.objects.create(invoice=instance, **item_data)
+            InvoiceItem.objects.bulk_create(items)
+            instance.save(items=items)
         
         return instance
 
@@ -86,10 +142,42 @@ class InvoiceSummarySerializer(serializers.Serializer):
     pending_invoices = serializers.IntegerField()
     paid_invoices = serializers.IntegerField()
     overdue_invoices = serializers.IntegerField()
-    total_pending_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    total_paid_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    total_overdue_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_pending_amount = MoneyField()
+    total_paid_amount = MoneyField()
+    total_overdue_amount = MoneyField()
+    total_amount = MoneyField()
+
+
+class InvoiceRecordItemSerializer(serializers.Serializer):
+    """An item of an invoice as the repositories (repositories.py) hold it"""
+    id = serializers.CharField(read_only=True)
+    description = serializers.CharField(max_length=500)
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    unit_price = MoneyField(min_value=0)
+    total = MoneyField(read_only=True)
+
+
+class InvoiceRecordSerializer(serializers.Serializer):
+    """An invoice from any repository; amounts are always computed from the items"""
+    id = serializers.CharField(read_only=True)
+    invoice_number = serializers.CharField(read_only=True)
+    client_name = serializers.CharField(max_length=200)
+    client_email = serializers.EmailField()
+    client_phone = serializers.CharField(max_length=15, required=False, allow_blank=True)
+    client_address = serializers.CharField(required=False, allow_blank=True)
+    issue_date = serializers.DateField()
+    due_date = serializers.DateField()
+    status = serializers.ChoiceField(choices=Invoice.STATUS_CHOICES, required=False)
+    tax_rate = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0'), required=False)
+    subtotal = MoneyField(read_only=True)
+    tax_amount = MoneyField(read_only=True)
+    total_amount = MoneyField(read_only=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+    terms_conditions = serializers.CharField(required=False, allow_blank=True)
+    payment_link = serializers.CharField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
+    items = InvoiceRecordItemSerializer(many=True, allow_empty=False)
 
 
 class RazorpayPaymentLinkSerializer(serializers.Serializer):
@@ -99,3 +187,13 @@ class RazorpayPaymentLinkSerializer(serializers.Serializer):
 
 class SendReminderSerializer(serializers.Serializer):
     message = serializers.CharField(required=False, allow_blank=True)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'format', 'status', 'committed_records', 'invoices_created', 'items_created',
+            'error_count', 'errors', 'message', 'created_at', 'updated_at', 'finished_at'
+        ]
+        read_only_fields = fields
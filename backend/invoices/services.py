@@ -0,0 +1,34 @@
+"""
+Service clients for HisabPro
+Each SDK is imported, and its client built, the first time a request touches it rather than when a worker boots
+"""
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from hisabpro.instrumentation import Traced, mongo_command_listener
+
+
+def _razorpay_client():
+    import razorpay
+    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+    return Traced(client, 'razorpay')
+
+
+def _mongodb_service():
+    # Listeners only apply to clients created after they are registered, so this has to come first
+    from pymongo import monitoring
+    monitoring.register(mongo_command_listener())
+    return import_string('lib.mongodb.mongodb_service')
+
+
+def _supabase_service():
+    # SUPABASE_LOCAL swaps in the SQLite stand-in for offline benchmarks
+    path = 'invoices.local_supabase.local_supabase' if settings.SUPABASE_LOCAL else 'lib.supabase_service.supabase_service'
+    return Traced(import_string(path), 'supabase')
+
+
+razorpay_client = SimpleLazyObject(_razorpay_client)
+supabase_service = SimpleLazyObject(_supabase_service)
+mongodb_service = SimpleLazyObject(_mongodb_service)
@@ -0,0 +1,153 @@
+"""
+Single-flight execution for HisabPro
+Concurrent identical calls run once: threads in this process wait on the leader, other workers wait on a cache lock and read the result it publishes
+"""
+
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from prometheus_client import REGISTRY
+
+from hisabpro.metrics import SINGLE_FLIGHT, registry as metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Every flight name in use; the metrics view reports on these
+FLIGHTS = {
+    'summary': 'Dashboard invoice summary (Django ORM)',
+    'supabase-summary': 'Dashboard invoice summary (Supabase)',
+    'dashboard': 'Combined dashboard payloads',
+    'pdf': 'Invoice PDF renders',
+    'payment-link': 'Payment link generation',
+}
+
+# leader ran the work; local shared a result from a thread in this process; remote shared a result
+# another worker published; fallback gave up waiting on another worker and ran the work itself
+OUTCOMES = ('leader', 'local', 'remote', 'fallback')
+
+# How long a leader may hold the cross-worker lock, and how long its result stays readable
+LOCK_TIMEOUT = 60
+RESULT_TIMEOUT = 15
+WAIT_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def flight_key(name, key):
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest()
+    return f'singleflight:{name}:{digest}'
+
+
+def _record(name, outcome):
+    SINGLE_FLIGHT.labels(name, outcome).inc()
+
+
+def _counts(registry):
+    # Read back from the Prometheus counter rather than counting twice
+    counts = {name: dict.fromkeys(OUTCOMES, 0) for name in FLIGHTS}
+    for family in registry.collect():
+        if family.name != 'hisabpro_single_flight':
+            continue
+        for sample in family.samples:
+            if sample.name.endswith('_total'):
+                flight = counts.setdefault(sample.labels['flight'], dict.fromkeys(OUTCOMES, 0))
+                flight[sample.labels['outcome']] = int(sample.value)
+    return counts
+
+
+def local_counts():
+    """Outcome counts recorded by this process since it started"""
+    return _counts(REGISTRY)
+
+
+def stats():
+    """Outcome counts per flight, summed over every worker writing to PROMETHEUS_MULTIPROC_DIR"""
+    return _counts(metrics_registry())
+
+
+def single_flight(name, key, fn):
+    """Result of ``fn()``, shared by every call with the same ``name`` and ``key`` that overlaps it.
+
+    ``key`` must identify everything the result depends on (user, object, version) and the result
+    must be picklable so waiters in other workers can read it from the cache. Errors are shared
+    with the threads waiting in this process; other workers retry once the lock is released.
+    """
+    full_key = flight_key(name, key)
+    with _flights_lock:
+        flight = _flights.get(full_key)
+        leader = flight is None
+        if leader:
+            flight = _flights[full_key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        _record(name, 'local')
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        flight.value = _across_workers(name, full_key, fn)
+        return flight.value
+    except BaseException as error:
+        flight.error = error
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(full_key, None)
+        flight.done.set()
+
+
+def _across_workers(name, full_key, fn):
+    lock_key = f'{full_key}:lock'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while not cache.add(lock_key, token, LOCK_TIMEOUT):
+        holder = cache.get(lock_key)
+        if holder is None:
+            # Released between our add() and get(); try to take it
+            continue
+        result = _wait_for(f'{full_key}:{holder}', lock_key, holder, deadline)
+        if result is not None:
+            _record(name, 'remote')
+            return result[0]
+        if time.monotonic() >= deadline:
+            logger.info(f"Single-flight {name} still locked after {WAIT_TIMEOUT}s; running anyway")
+            _record(name, 'fallback')
+            return fn()
+        # The holder failed without publishing a result; compete to lead the retry
+
+    try:
+        value = fn()
+        # Results are published under the leader's token, so a late waiter never reads an older flight
+        cache.set(f'{full_key}:{token}', (value,), RESULT_TIMEOUT)
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    _record(name, 'leader')
+    return value
+
+
+def _wait_for(result_key, lock_key, holder, deadline):
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        found = cache.get_many([result_key, lock_key])
+        if result_key in found:
+            return found[result_key]
+        if found.get(lock_key) != holder:
+            # Published and released between polls, or the holder gave up
+            return cache.get(result_key)
+    return None
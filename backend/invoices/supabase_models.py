@@ -7,14 +7,16 @@ from datetime import datetime, date
 from decimal import Decimal
 from typing import List, Dict, Any, Optional
 
+from .money import Money
+
 class SupabaseInvoiceItem:
     def __init__(self, data: Dict[str, Any] = None):
         self.id = data.get('id') if data else None
         self.invoice_id = data.get('invoice_id') if data else None
         self.description = data.get('description', '')
         self.quantity = float(data.get('quantity', 0))
-        self.unit_price = float(data.get('unit_price', 0))
-        self.total = float(data.get('total', 0))
+        self.unit_price = Money.from_json(data.get('unit_price', 0)).to_json()
+        self.total = Money.from_json(data.get('total', 0)).to_json()
         self.created_at = data.get('created_at')
         self.updated_at = data.get('updated_at')
     
@@ -36,7 +38,7 @@ class SupabaseInvoiceItem:
     
     def calculate_total(self):
         """Calculate total for this item"""
-        self.total = self.quantity * self.unit_price
+        self.total = Money.from_json(self.unit_price).times(self.quantity).to_json()
         return self.total
 
 class SupabaseInvoice:
@@ -57,10 +59,10 @@ class SupabaseInvoice:
         self.due_date = due_date_str if isinstance(due_date_str, str) else None
         
         # Financial data
-        self.subtotal = float(data.get('subtotal', 0))
+        self.subtotal = Money.from_json(data.get('subtotal', 0)).to_json()
         self.tax_rate = float(data.get('tax_rate', 0))
-        self.tax_amount = float(data.get('tax_amount', 0))
-        self.total_amount = float(data.get('total_amount', 0))
+        self.tax_amount = Money.from_json(data.get('tax_amount', 0)).to_json()
+        self.total_amount = Money.from_json(data.get('total_amount', 0)).to_json()
         
         # Status and metadata
         self.status = data.get('status', 'pending')
@@ -111,13 +113,14 @@ class SupabaseInvoice:
     def calculate_totals(self):
         """Calculate subtotal, tax, and total amounts"""
         # Calculate subtotal from items
-        self.subtotal = sum(item.total for item in self.items)
+        subtotal = Money.sum(Money.from_json(item.total) for item in self.items)
         
         # Calculate tax
-        self.tax_amount = (self.subtotal * self.tax_rate) / 100
+        tax = subtotal.percent(self.tax_rate)
         
-        # Calculate total
-        self.total_amount = self.subtotal + self.tax_amount
+        self.subtotal = subtotal.to_json()
+        self.tax_amount = tax.to_json()
+        self.total_amount = (subtotal + tax).to_json()
         
         return {
             'subtotal': self.subtotal,
@@ -155,7 +158,7 @@ class SupabasePayment:
     def __init__(self, data: Dict[str, Any] = None):
         self.id = data.get('id') if data else None
         self.invoice_id = data.get('invoice_id') if data else None
-        self.amount = float(data.get('amount', 0))
+        self.amount = Money.from_json(data.get('amount', 0)).to_json()
         self.currency = data.get('currency', 'INR')
         self.payment_method = data.get('payment_method', '')
         self.payment_gateway = data.get('payment_gateway', '')
@@ -5,6 +5,7 @@ Handles data serialization for invoices, items, and payments
 
 from rest_framework import serializers
 from .supabase_models import SupabaseInvoice, SupabaseInvoiceItem, SupabasePayment
+from .serializers import MoneyField
 from typing import List, Dict, Any
 
 class SupabaseInvoiceItemSerializer(serializers.Serializer):
@@ -12,8 +13,8 @@ class SupabaseInvoiceItemSerializer(serializers.Serializer):
     invoice_id = serializers.CharField(required=False)
     description = serializers.CharField(max_length=500)
     quantity = serializers.FloatField(min_value=0)
-    unit_price = serializers.FloatField(min_value=0)
-    total = serializers.FloatField(read_only=True)
+    unit_price = MoneyField(coerce_to_string=False, min_value=0)
+    total = MoneyField(coerce_to_string=False, read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
     updated_at = serializers.DateTimeField(read_only=True)
     
@@ -40,10 +41,10 @@ class SupabaseInvoiceSerializer(serializers.Serializer):
     client_address = serializers.CharField(required=False, allow_blank=True)
     issue_date = serializers.DateField(required=False)
     due_date = serializers.DateField(required=False)
-    subtotal = serializers.FloatField(min_value=0, required=False, default=0)
+    subtotal = MoneyField(coerce_to_string=False, min_value=0, required=False, default=0)
     tax_rate = serializers.FloatField(min_value=0, max_value=100, required=False, default=0)
-    tax_amount = serializers.FloatField(min_value=0, required=False, default=0)
-    total_amount = serializers.FloatField(min_value=0)
+    tax_amount = MoneyField(coerce_to_string=False, min_value=0, required=False, default=0)
+    total_amount = MoneyField(coerce_to_string=False, min_value=0)
     status = serializers.ChoiceField(choices=['pending', 'paid', 'overdue', 'cancelled'], default='pending')
     notes = serializers.CharField(required=False, allow_blank=True)
     terms_conditions = serializers.CharField(required=False, allow_blank=True)
@@ -108,7 +109,7 @@ class SupabaseInvoiceSerializer(serializers.Serializer):
 class SupabasePaymentSerializer(serializers.Serializer):
     id = serializers.CharField(read_only=True)
     invoice_id = serializers.CharField()
-    amount = serializers.FloatField(min_value=0)
+    amount = MoneyField(coerce_to_string=False, min_value=0)
     currency = serializers.CharField(max_length=3, default='INR')
     payment_method = serializers.CharField(max_length=50, required=False, allow_blank=True)
     payment_gateway = serializers.CharField(max_length=50, required=False, allow_blank=True)
@@ -138,14 +139,14 @@ class InvoiceSummarySerializer(serializers.Serializer):
     pending_invoices = serializers.IntegerField()
     draft_invoices = serializers.IntegerField(required=False, default=0)
     overdue_invoices = serializers.IntegerField(required=False, default=0)
-    total_amount = serializers.FloatField()
-    paid_amount = serializers.FloatField()
-    pending_amount = serializers.FloatField()
-    draft_amount = serializers.FloatField(required=False, default=0)
-    overdue_amount = serializers.FloatField(required=False, default=0)
-    total_pending_amount = serializers.FloatField(required=False, default=0)
-    total_paid_amount = serializers.FloatField(required=False, default=0)
-    total_overdue_amount = serializers.FloatField(required=False, default=0)
+    total_amount = MoneyField(coerce_to_string=False)
+    paid_amount = MoneyField(coerce_to_string=False)
+    pending_amount = MoneyField(coerce_to_string=False)
+    draft_amount = MoneyField(coerce_to_string=False, required=False, default=0)
+    overdue_amount = MoneyField(coerce_to_string=False, required=False, default=0)
+    total_pending_amount = MoneyField(coerce_to_string=False, required=False, default=0)
+    total_paid_amount = MoneyField(coerce_to_string=False, required=False, default=0)
+    total_overdue_amount = MoneyField(coerce_to_string=False, required=False, default=0)
 
 class InvoiceListSerializer(serializers.Serializer):
     """Serializer for invoice list with pagination"""
@@ -10,8 +10,12 @@ from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django.core.cache import cache
 from django.http import HttpResponse
+from django.utils import timezone
 import io
 import logging
+import time
+
+from hisabpro.metrics import timed_pdf
 
 from .supabase_serializers import (
     SupabaseInvoiceSerializer, 
@@ -21,7 +25,15 @@ from .supabase_serializers import (
     InvoiceListSerializer
 )
 from .supabase_models import SupabaseInvoice, SupabaseInvoiceItem, SupabasePayment
-from lib.supabase_service import supabase_service
+from .money import Money
+from .conditional import (
+    cached_body, invalidate_watermark, list_etag, make_etag, not_modified, parse_timestamp, set_validators,
+    supabase_watermark,
+)
+from .dashboard import server_timing, supabase_dashboard, supabase_items, supabase_recent, supabase_summary
+from .singleflight import single_flight
+from .sync import CursorExpired, page_size, supabase_changes
+from .services import supabase_service
 
 logger = logging.getLogger(__name__)
 
@@ -42,14 +54,14 @@ class SupabaseInvoiceListCreateView(generics.ListCreateAPIView):
             supabase_service.connect()
             user_id = self.request.user.id
             invoices_data = supabase_service.get_user_invoices(user_id)
+            # Every invoice's items in one request rather than one per invoice
+            items = supabase_items(supabase_service.client, [data['id'] for data in invoices_data])
             
             # Convert to SupabaseInvoice objects
             invoices = []
             for data in invoices_data:
                 invoice = SupabaseInvoice.from_dict(data)
-                # Get items for this invoice
-                items_data = supabase_service.get_invoice_items(invoice.id)
-                invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in items_data]
+                invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in items.get(data['id'], [])]
                 invoices.append(invoice)
             
             return invoices
@@ -91,7 +103,10 @@ class SupabaseInvoiceListCreateView(generics.ListCreateAPIView):
             
             # Filter out fields that don't exist in Supabase table
             allowed_fields = ['invoice_number', 'client_name', 'client_email', 'total_amount', 'status', 'notes', 'payment_link', 'payment_gateway', 'payment_id', 'invoice_date', 'due_date']
-            filtered_data = {k: v for k, v in invoice_data.items() if k in allowed_fields}
+            filtered_data = {
+                k: v.to_json() if isinstance(v, Money) else v
+                for k, v in invoice_data.items() if k in allowed_fields
+            }
             
             invoice_id = supabase_service.create_invoice(filtered_data)
             
@@ -103,6 +118,7 @@ class SupabaseInvoiceListCreateView(generics.ListCreateAPIView):
             for item_data in items_data:
                 item_data['invoice_id'] = invoice_id
                 supabase_service.create_invoice_item(item_data)
+            invalidate_watermark('supabase', request.user.id)
             
             # Get the created invoice
             created_invoice_data = supabase_service.get_invoice(invoice_id)
@@ -153,6 +169,29 @@ class SupabaseInvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
             logger.error(f"Error getting invoice: {str(e)}")
             return None
     
+    def retrieve(self, request, *args, **kwargs):
+        """Get an invoice; the ETag comes from the invoice row alone, so a 304 skips the items query"""
+        try:
+            supabase_service.connect()
+            invoice_id = self.kwargs.get('pk')
+            invoice_data = supabase_service.get_invoice(invoice_id)
+            if not invoice_data or invoice_data.get('user_id') != request.user.id:
+                return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+            
+            updated_at = parse_timestamp(invoice_data.get('updated_at'))
+            etag = make_etag('supabase-invoice', invoice_id, invoice_data.get('updated_at'))
+            response = not_modified(request, etag, updated_at)
+            if response is not None:
+                return response
+            
+            invoice = SupabaseInvoice.from_dict(invoice_data)
+            items_data = supabase_service.get_invoice_items(invoice_id)
+            invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in items_data]
+            return set_validators(Response(self.get_serializer(invoice).data), etag, updated_at)
+        except Exception as e:
+            logger.error(f"Error getting invoice: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
     def update(self, request, *args, **kwargs):
         """Update an invoice"""
         try:
@@ -183,6 +222,7 @@ class SupabaseInvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
                 for item_data in items_data:
                     item_data['invoice_id'] = invoice_id
                     supabase_service.create_invoice_item(item_data)
+            invalidate_watermark('supabase', request.user.id)
             
             # Get updated invoice
             updated_invoice_data = supabase_service.get_invoice(invoice_id)
@@ -216,6 +256,7 @@ class SupabaseInvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
             success = supabase_service.delete_invoice(invoice_id)
             
             if success:
+                invalidate_watermark('supabase', request.user.id)
                 return Response(status=status.HTTP_204_NO_CONTENT)
             else:
                 return Response({'error': 'Failed to delete invoice'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -232,34 +273,82 @@ def supabase_invoice_summary(request):
         supabase_service.connect()
         user_id = request.user.id
         
-        summary_data = supabase_service.get_invoice_summary(user_id)
-        logger.info(f"Summary data from service: {summary_data}")
-        
-        # If summary_data is None or not the expected format, return default values
-        if not summary_data or not isinstance(summary_data, dict):
-            summary_data = {
-                'total_invoices': 0,
-                'paid_invoices': 0,
-                'pending_invoices': 0,
-                'draft_invoices': 0,
-                'overdue_invoices': 0,
-                'total_amount': 0,
-                'paid_amount': 0,
-                'pending_amount': 0,
-                'draft_amount': 0,
-                'overdue_amount': 0,
-                'total_pending_amount': 0,
-                'total_paid_amount': 0,
-                'total_overdue_amount': 0
-            }
+        watermark = supabase_watermark(supabase_service.client, user_id)
+        etag = list_etag('supabase-summary', user_id, watermark)
+        last_modified = parse_timestamp(watermark[0])
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
         
-        serializer = InvoiceSummarySerializer(summary_data)
+        def build():
+            return supabase_summary(supabase_service, user_id)
         
-        return Response(serializer.data)
+        # Summary, recent and list arrive together when the dashboard opens; identical ones share one fill
+        data = single_flight('supabase-summary', (user_id, etag), lambda: cached_body('summary', user_id, etag, build))
+        return set_validators(Response(data), etag, last_modified)
     except Exception as e:
         logger.error(f"Error getting invoice summary: {str(e)}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def supabase_dashboard_view(request):
+    """Summary, recent invoices, overdue counts and aging for the dashboard in one round trip"""
+    try:
+        started = time.perf_counter()
+        supabase_service.connect()
+        user_id = request.user.id
+        today = timezone.localdate()
+        
+        # Aging buckets move at midnight, so the day is part of the validator
+        watermark = supabase_watermark(supabase_service.client, user_id)
+        etag = list_etag(f'supabase-dashboard:{today.isoformat()}', user_id, watermark)
+        last_modified = parse_timestamp(watermark[0])
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        
+        timings = {}
+        
+        def build():
+            payload, section_timings = supabase_dashboard(supabase_service, user_id, today)
+            timings.update(section_timings)
+            return payload
+        
+        data = single_flight('dashboard', (user_id, etag), lambda: cached_body('dashboard', user_id, etag, build))
+        response = set_validators(Response(data), etag, last_modified)
+        # Sections only appear when this request built the payload; otherwise it came from the cache
+        timings = timings or {'cache': 0}
+        timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        response['Server-Timing'] = server_timing(timings)
+        return response
+    except Exception as e:
+        logger.error(f"Error building dashboard: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def supabase_invoice_changes(request):
+    """Invoices created, updated or deleted after ?since=<cursor>, read from Supabase"""
+    try:
+        limit = page_size(request.query_params)
+        supabase_service.connect()
+        page = supabase_changes(supabase_service.client, request.user.id, request.query_params.get('since'), limit)
+    except CursorExpired as e:
+        return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error getting invoice changes: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    invoices = []
+    for data in page.changes:
+        invoice = SupabaseInvoice.from_dict(data)
+        invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in data['items']]
+        invoices.append(invoice)
+    return Response(page.as_dict(SupabaseInvoiceSerializer(invoices, many=True).data))
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def supabase_recent_invoices(request):
@@ -268,19 +357,17 @@ def supabase_recent_invoices(request):
         supabase_service.connect()
         user_id = request.user.id
         
-        recent_invoices_data = supabase_service.get_user_invoices(user_id, limit=5)
+        watermark = supabase_watermark(supabase_service.client, user_id)
+        etag = list_etag('supabase-recent', user_id, watermark)
+        last_modified = parse_timestamp(watermark[0])
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
         
-        # Convert to SupabaseInvoice objects
-        recent_invoices = []
-        for data in recent_invoices_data:
-            invoice = SupabaseInvoice.from_dict(data)
-            # Get items for this invoice
-            items_data = supabase_service.get_invoice_items(invoice.id)
-            invoice.items = [SupabaseInvoiceItem.from_dict(item) for item in items_data]
-            recent_invoices.append(invoice)
+        def build():
+            return supabase_recent(supabase_service, user_id)
         
-        serializer = SupabaseInvoiceSerializer(recent_invoices, many=True)
-        return Response(serializer.data)
+        return set_validators(Response(cached_body('recent', user_id, etag, build)), etag, last_modified)
     except Exception as e:
         logger.error(f"Error getting recent invoices: {str(e)}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -296,6 +383,7 @@ def mark_invoice_as_paid(request, invoice_id):
         success = supabase_service.update_invoice(invoice_id, {'status': 'paid'})
         
         if success:
+            invalidate_watermark('supabase', request.user.id)
             return Response({'message': 'Invoice marked as paid'})
         else:
             return Response({'error': 'Failed to update invoice'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -304,14 +392,228 @@ def mark_invoice_as_paid(request, invoice_id):
         logger.error(f"Error marking invoice as paid: {str(e)}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _render_supabase_pdf(invoice_id, invoice_data):
+    """(content, content type, filename) for a Supabase invoice; HTML when ReportLab cannot render it"""
+    from django.template.loader import render_to_string
+    from django.conf import settings
+    
+    # Get items
+    items_data = supabase_service.get_invoice_items(invoice_id)
+    
+    # Create invoice object
+    invoice = SupabaseInvoice.from_dict(invoice_data)
+    invoice.items = items_data
+    
+    # Business information
+    business_info = {
+        'business_name': getattr(settings, 'BUSINESS_NAME', 'Your Business Name'),
+        'business_email': getattr(settings, 'BUSINESS_EMAIL', 'contact@yourbusiness.com'),
+        'business_phone': getattr(settings, 'BUSINESS_PHONE', '+1 (555) 123-4567'),
+        'business_address': getattr(settings, 'BUSINESS_ADDRESS', '123 Business Street\nCity, State 12345'),
+        'business_logo': getattr(settings, 'BUSINESS_LOGO', None),
+        'payment_terms': getattr(settings, 'PAYMENT_TERMS', 'Net 30 days'),
+    }
+    
+    # Render the professional template
+    html_content = render_to_string('invoice_template.html', {
+        'invoice': invoice,
+        'business_name': business_info['business_name'],
+        'business_email': business_info['business_email'],
+        'business_phone': business_info['business_phone'],
+        'business_address': business_info['business_address'],
+        'business_logo': business_info['business_logo'],
+        'payment_terms': business_info['payment_terms'],
+    })
+    
+    # Generate PDF using reportlab (pure Python, works on all platforms)
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch, mm
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
+        from io import BytesIO
+        
+        # Create PDF buffer
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
+        elements = []
+        
+        # Get styles
+        styles = getSampleStyleSheet()
+        
+        # Custom styles
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#2c3e50')
+        )
+        
+        header_style = ParagraphStyle(
+            'Header',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=10,
+            textColor=colors.HexColor('#2c3e50')
+        )
+        
+        normal_style = ParagraphStyle(
+            'Normal',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=6
+        )
+        
+        # Title
+        elements.append(Paragraph("INVOICE", title_style))
+        elements.append(Spacer(1, 20))
+        
+        # Header section with business and client info
+        header_data = [
+            [
+                # Business info (left)
+                Paragraph(f"<b>{business_info['business_name']}</b><br/>"
+                         f"{business_info['business_email']}<br/>"
+                         f"{business_info['business_phone']}<br/>"
+                         f"{business_info['business_address']}", normal_style),
+                # Client info (right)
+                Paragraph(f"<b>Bill To:</b><br/>"
+                         f"<b>{invoice.client_name or 'N/A'}</b><br/>"
+                         f"{invoice.client_email or ''}<br/>"
+                         f"{invoice.client_phone or ''}<br/>"
+                         f"{invoice.client_address or ''}", normal_style)
+            ]
+        ]
+        
+        header_table = Table(header_data, colWidths=[doc.width/2.0]*2)
+        header_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ]))
+        elements.append(header_table)
+        elements.append(Spacer(1, 20))
+        
+        # Invoice details
+        elements.append(Paragraph("Invoice Details", header_style))
+        invoice_details = [
+            ['Invoice Number:', invoice.invoice_number or 'N/A'],
+            ['Issue Date:', invoice.issue_date or 'N/A'],
+            ['Due Date:', invoice.due_date or 'N/A'],
+            ['Status:', (invoice.status or 'draft').upper()],
+            ['Payment Terms:', business_info['payment_terms']]
+        ]
+        
+        details_table = Table(invoice_details, colWidths=[2*inch, 4*inch])
+        details_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
+        ]))
+        elements.append(details_table)
+        elements.append(Spacer(1, 20))
+        
+        # Items table
+        elements.append(Paragraph("Items & Services", header_style))
+        if invoice.items:
+            items_data = [['Item/Service', 'Description', 'Qty', 'Rate', 'Tax', 'Amount']]
+            for item in invoice.items:
+                items_data.append([
+                    item.get('name', 'Service'),
+                    item.get('description', '-'),
+                    str(item.get('quantity', 1)),
+                    f"${item.get('unit_price', 0):.2f}",
+                    f"${item.get('tax_amount', 0):.2f}",
+                    f"${item.get('total', 0):.2f}"
+                ])
+            
+            items_table = Table(items_data, colWidths=[1.5*inch, 2*inch, 0.5*inch, 1*inch, 0.8*inch, 1*inch])
+            items_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 10),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
+                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+                ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ]))
+            elements.append(items_table)
+        else:
+            elements.append(Paragraph("No items added", normal_style))
+        
+        elements.append(Spacer(1, 20))
+        
+        # Totals
+        totals_data = [
+            ['Total:', f"${invoice.total_amount or 0:.2f}"]
+        ]
+        
+        # Add optional fields if they exist
+        if hasattr(invoice, 'subtotal') and invoice.subtotal:
+            totals_data.insert(0, ['Subtotal:', f"${invoice.subtotal:.2f}"])
+        if hasattr(invoice, 'tax_amount') and invoice.tax_amount:
+            totals_data.insert(-1, ['Tax:', f"${invoice.tax_amount:.2f}"])
+        if hasattr(invoice, 'discount_amount') and invoice.discount_amount:
+            totals_data.insert(-1, ['Discount:', f"-${invoice.discount_amount:.2f}"])
+        
+        totals_table = Table(totals_data, colWidths=[4*inch, 2*inch])
+        totals_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('BACKGROUND', (0, -1), (1, -1), colors.HexColor('#2c3e50')),
+            ('TEXTCOLOR', (0, -1), (1, -1), colors.white),
+        ]))
+        elements.append(totals_table)
+        
+        # Notes
+        if hasattr(invoice, 'notes') and invoice.notes:
+            elements.append(Spacer(1, 20))
+            elements.append(Paragraph("Notes:", header_style))
+            elements.append(Paragraph(invoice.notes, normal_style))
+        
+        # Footer
+        elements.append(Spacer(1, 30))
+        footer_text = "Thank you for your business!"
+        footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=colors.grey
+        )
+        elements.append(Paragraph(footer_text, footer_style))
+        
+        # Build PDF
+        doc.build(elements)
+        buffer.seek(0)
+        pdf_bytes = buffer.getvalue()
+        
+        return pdf_bytes, 'application/pdf', f'invoice_{invoice.invoice_number}.pdf'
+        
+    except Exception as e:
+        # Fallback: return HTML if reportlab fails
+        logger.warning(f"PDF generation failed: {str(e)}, returning HTML instead")
+        return html_content, 'text/html', f'invoice_{invoice.invoice_number}.html'
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def download_invoice_pdf(request, invoice_id):
     """Download invoice as PDF using the professional A4 template"""
     try:
-        from django.template.loader import render_to_string
-        from django.conf import settings
-        
         supabase_service.connect()
         
         # Get invoice data
@@ -319,223 +621,14 @@ def download_invoice_pdf(request, invoice_id):
         if not invoice_data:
             return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get items
-        items_data = supabase_service.get_invoice_items(invoice_id)
-        
-        # Create invoice object
-        invoice = SupabaseInvoice.from_dict(invoice_data)
-        invoice.items = items_data
-        
-        # Business information
-        business_info = {
-            'business_name': getattr(settings, 'BUSINESS_NAME', 'Your Business Name'),
-            'business_email': getattr(settings, 'BUSINESS_EMAIL', 'contact@yourbusiness.com'),
-            'business_phone': getattr(settings, 'BUSINESS_PHONE', '+1 (555) 123-4567'),
-            'business_address': getattr(settings, 'BUSINESS_ADDRESS', '123 Business Street\nCity, State 12345'),
-            'business_logo': getattr(settings, 'BUSINESS_LOGO', None),
-            'payment_terms': getattr(settings, 'PAYMENT_TERMS', 'Net 30 days'),
-        }
-        
-        # Render the professional template
-        html_content = render_to_string('invoice_template.html', {
-            'invoice': invoice,
-            'business_name': business_info['business_name'],
-            'business_email': business_info['business_email'],
-            'business_phone': business_info['business_phone'],
-            'business_address': business_info['business_address'],
-            'business_logo': business_info['business_logo'],
-            'payment_terms': business_info['payment_terms'],
-        })
-        
-        # Generate PDF using reportlab (pure Python, works on all platforms)
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch, mm
-            from reportlab.lib import colors
-            from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
-            from io import BytesIO
-            
-            # Create PDF buffer
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
-            elements = []
-            
-            # Get styles
-            styles = getSampleStyleSheet()
-            
-            # Custom styles
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                spaceAfter=30,
-                alignment=TA_CENTER,
-                textColor=colors.HexColor('#2c3e50')
-            )
-            
-            header_style = ParagraphStyle(
-                'Header',
-                parent=styles['Heading2'],
-                fontSize=16,
-                spaceAfter=10,
-                textColor=colors.HexColor('#2c3e50')
-            )
-            
-            normal_style = ParagraphStyle(
-                'Normal',
-                parent=styles['Normal'],
-                fontSize=10,
-                spaceAfter=6
-            )
-            
-            # Title
-            elements.append(Paragraph("INVOICE", title_style))
-            elements.append(Spacer(1, 20))
-            
-            # Header section with business and client info
-            header_data = [
-                [
-                    # Business info (left)
-                    Paragraph(f"<b>{business_info['business_name']}</b><br/>"
-                             f"{business_info['business_email']}<br/>"
-                             f"{business_info['business_phone']}<br/>"
-                             f"{business_info['business_address']}", normal_style),
-                    # Client info (right)
-                    Paragraph(f"<b>Bill To:</b><br/>"
-                             f"<b>{invoice.client_name or 'N/A'}</b><br/>"
-                             f"{invoice.client_email or ''}<br/>"
-                             f"{invoice.client_phone or ''}<br/>"
-                             f"{invoice.client_address or ''}", normal_style)
-                ]
-            ]
-            
-            header_table = Table(header_data, colWidths=[doc.width/2.0]*2)
-            header_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-                ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ]))
-            elements.append(header_table)
-            elements.append(Spacer(1, 20))
-            
-            # Invoice details
-            elements.append(Paragraph("Invoice Details", header_style))
-            invoice_details = [
-                ['Invoice Number:', invoice.invoice_number or 'N/A'],
-                ['Issue Date:', invoice.issue_date or 'N/A'],
-                ['Due Date:', invoice.due_date or 'N/A'],
-                ['Status:', (invoice.status or 'draft').upper()],
-                ['Payment Terms:', business_info['payment_terms']]
-            ]
-            
-            details_table = Table(invoice_details, colWidths=[2*inch, 4*inch])
-            details_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
-            ]))
-            elements.append(details_table)
-            elements.append(Spacer(1, 20))
-            
-            # Items table
-            elements.append(Paragraph("Items & Services", header_style))
-            if invoice.items:
-                items_data = [['Item/Service', 'Description', 'Qty', 'Rate', 'Tax', 'Amount']]
-                for item in invoice.items:
-                    items_data.append([
-                        item.get('name', 'Service'),
-                        item.get('description', '-'),
-                        str(item.get('quantity', 1)),
-                        f"${item.get('unit_price', 0):.2f}",
-                        f"${item.get('tax_amount', 0):.2f}",
-                        f"${item.get('total', 0):.2f}"
-                    ])
-                
-                items_table = Table(items_data, colWidths=[1.5*inch, 2*inch, 0.5*inch, 1*inch, 0.8*inch, 1*inch])
-                items_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ]))
-                elements.append(items_table)
-            else:
-                elements.append(Paragraph("No items added", normal_style))
-            
-            elements.append(Spacer(1, 20))
-            
-            # Totals
-            totals_data = [
-                ['Total:', f"${invoice.total_amount or 0:.2f}"]
-            ]
-            
-            # Add optional fields if they exist
-            if hasattr(invoice, 'subtotal') and invoice.subtotal:
-                totals_data.insert(0, ['Subtotal:', f"${invoice.subtotal:.2f}"])
-            if hasattr(invoice, 'tax_amount') and invoice.tax_amount:
-                totals_data.insert(-1, ['Tax:', f"${invoice.tax_amount:.2f}"])
-            if hasattr(invoice, 'discount_amount') and invoice.discount_amount:
-                totals_data.insert(-1, ['Discount:', f"-${invoice.discount_amount:.2f}"])
-            
-            totals_table = Table(totals_data, colWidths=[4*inch, 2*inch])
-            totals_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('BACKGROUND', (0, -1), (1, -1), colors.HexColor('#2c3e50')),
-                ('TEXTCOLOR', (0, -1), (1, -1), colors.white),
-            ]))
-            elements.append(totals_table)
-            
-            # Notes
-            if hasattr(invoice, 'notes') and invoice.notes:
-                elements.append(Spacer(1, 20))
-                elements.append(Paragraph("Notes:", header_style))
-                elements.append(Paragraph(invoice.notes, normal_style))
-            
-            # Footer
-            elements.append(Spacer(1, 30))
-            footer_text = "Thank you for your business!"
-            footer_style = ParagraphStyle(
-                'Footer',
-                parent=styles['Normal'],
-                fontSize=10,
-                alignment=TA_CENTER,
-                textColor=colors.grey
-            )
-            elements.append(Paragraph(footer_text, footer_style))
-            
-            # Build PDF
-            doc.build(elements)
-            buffer.seek(0)
-            pdf_bytes = buffer.getvalue()
-            
-            # Create response
-            response = HttpResponse(pdf_bytes, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.pdf"'
-            
-            return response
-            
-        except Exception as e:
-            # Fallback: return HTML if reportlab fails
-            logger.warning(f"PDF generation failed: {str(e)}, returning HTML instead")
-            response = HttpResponse(html_content, content_type='text/html')
-            response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.html"'
-            return response
+        # Repeated clicks on "Download PDF" share one render of this version of the invoice
+        content, content_type, filename = single_flight(
+            'pdf', ('supabase', invoice_id, invoice_data.get('updated_at')),
+            lambda: timed_pdf('reportlab', _render_supabase_pdf, invoice_id, invoice_data),
+        )
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
             
     except Exception as e:
         logger.error(f"Error generating PDF: {str(e)}")
@@ -553,19 +646,26 @@ def generate_payment_link(request, invoice_id):
         if not invoice_data:
             return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # For now, return a placeholder payment link
-        # You can integrate with actual payment gateways here
-        payment_link = f"https://payment.example.com/pay/{invoice_id}"
+        def create():
+            # For now, return a placeholder payment link
+            # You can integrate with actual payment gateways here
+            payment_link = f"https://payment.example.com/pay/{invoice_id}"
+            
+            # Update invoice with payment link
+            update_data = {
+                'payment_link': payment_link,
+                'payment_gateway': 'example',
+                'payment_id': f"pay_{invoice_id}"
+            }
+            return payment_link, supabase_service.update_invoice(invoice_id, update_data)
         
-        # Update invoice with payment link
-        update_data = {
-            'payment_link': payment_link,
-            'payment_gateway': 'example',
-            'payment_id': f"pay_{invoice_id}"
-        }
-        success = supabase_service.update_invoice(invoice_id, update_data)
+        # A double-click must not create two payment links for the same invoice
+        payment_link, success = single_flight(
+            'payment-link', (invoice_id, invoice_data.get('total_amount')), create
+        )
         
         if success:
+            invalidate_watermark('supabase', request.user.id)
             return Response({
                 'payment_link': payment_link,
                 'gateway': 'example',
@@ -0,0 +1,224 @@
+"""
+Delta sync for HisabPro
+Invoices created, updated or deleted since a cursor, for clients that keep a local copy
+"""
+
+import base64
+import heapq
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from hisabpro.instrumentation import span
+
+from .dashboard import supabase_items
+from .models import Invoice, InvoiceTombstone
+from .mongo_indexes import ensure_mongo_indexes
+
+SYNC_PAGE_SIZE = 200
+MAX_SYNC_PAGE_SIZE = 1000
+
+# Rows newer than this are held back: a transaction that began earlier may still commit
+# with an older updated_at, and a cursor that had already moved past it would never see it
+SETTLE_SECONDS = getattr(settings, 'INVOICE_SYNC_SETTLE_SECONDS', 2)
+
+# Tombstones are pruned after this long; older cursors have to start over
+TOMBSTONE_RETENTION_DAYS = getattr(settings, 'INVOICE_TOMBSTONE_RETENTION_DAYS', 90)
+
+
+class CursorError(ValueError):
+    pass
+
+
+class CursorExpired(Exception):
+    """The cursor is older than the tombstone retention window; the client must resync from scratch"""
+
+
+def encode_cursor(moment, key):
+    token = f'{moment.isoformat()}|{key}'.encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (moment, key) for a cursor from a previous page, or None to start from the beginning"""
+    if not token:
+        return None
+    try:
+        text = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        moment, key = text.split('|', 1)
+        moment = datetime.fromisoformat(moment)
+    except (ValueError, UnicodeDecodeError):
+        raise CursorError('Invalid sync cursor')
+    if timezone.is_naive(moment):
+        raise CursorError('Invalid sync cursor')
+    if moment < timezone.now() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        raise CursorExpired('Sync cursor has expired; fetch again without a cursor')
+    return moment, key
+
+
+def sync_window():
+    """Upper bound for rows returned by this request"""
+    return timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+
+
+def _aware(moment):
+    # pymongo and PostgREST hand back naive UTC datetimes and ISO strings respectively
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
+
+
+class SyncPage:
+    """One page of changes in (timestamp, id) order; ``changes`` holds backend-specific invoice objects"""
+
+    def __init__(self, changes, deleted, next_cursor, has_more):
+        self.changes = changes
+        self.deleted = deleted
+        self.next_cursor = next_cursor
+        self.has_more = has_more
+
+    def as_dict(self, serialized_changes):
+        return {
+            'changes': serialized_changes,
+            'deleted': self.deleted,
+            'next_cursor': self.next_cursor,
+            'has_more': self.has_more,
+        }
+
+
+def merge_page(updated, deleted, limit, cursor_token):
+    """Merge two (moment, key, value) streams already sorted by (moment, key), each of at most limit + 1 rows"""
+    updated = [(_aware(moment), str(key), True, value) for moment, key, value in updated]
+    deleted = [(_aware(moment), str(key), False, value) for moment, key, value in deleted]
+    merged = list(heapq.merge(updated, deleted, key=lambda row: (row[0], row[1])))
+    page = merged[:limit]
+    changes = [value for _, _, is_update, value in page if is_update]
+    tombstones = [value for _, _, is_update, value in page if not is_update]
+    next_cursor = encode_cursor(page[-1][0], page[-1][1]) if page else cursor_token
+    return SyncPage(changes, tombstones, next_cursor, len(merged) > limit)
+
+
+def _tombstone(invoice_id, invoice_number, deleted_at):
+    return {'id': str(invoice_id), 'invoice_number': invoice_number, 'deleted_at': _aware(deleted_at).isoformat()}
+
+
+def orm_changes(user, cursor_token, limit=SYNC_PAGE_SIZE):
+    """Changed Invoice objects (items and payments prefetched) and tombstones from the ORM"""
+    cursor = decode_cursor(cursor_token)
+    until = sync_window()
+    invoices = Invoice.objects.filter(user=user, updated_at__lte=until)
+    tombstones = InvoiceTombstone.objects.filter(user=user, deleted_at__lte=until)
+    if cursor:
+        moment, key = cursor
+        try:
+            key = uuid.UUID(key)
+        except ValueError:
+            raise CursorError('Invalid sync cursor')
+        # The plain lower bound is redundant but lets the index range-scan instead of filtering every row
+        invoices = invoices.filter(updated_at__gte=moment).filter(Q(updated_at__gt=moment) | Q(id__gt=key))
+        tombstones = tombstones.filter(deleted_at__gte=moment).filter(Q(deleted_at__gt=moment) | Q(invoice_id__gt=key))
+    invoices = (
+        invoices.select_related('user').prefetch_related('items', 'payments')
+        .order_by('updated_at', 'id')[:limit + 1]
+    )
+    tombstones = tombstones.order_by('deleted_at', 'invoice_id')[:limit + 1]
+    return merge_page(
+        [(invoice.updated_at, invoice.id, invoice) for invoice in invoices],
+        [(t.deleted_at, t.invoice_id, _tombstone(t.invoice_id, t.invoice_number, t.deleted_at)) for t in tombstones],
+        limit, cursor_token,
+    )
+
+
+def _postgrest_after(column, key_column, cursor):
+    moment, key = cursor
+    stamp = moment.isoformat()
+    return f'{column}.gt.{stamp},{key_column}.gt.{key}'
+
+
+def supabase_changes(client, user_id, cursor_token, limit=SYNC_PAGE_SIZE):
+    """Changed invoice rows (with their items under "items") and tombstones from Supabase"""
+    cursor = decode_cursor(cursor_token)
+    until = sync_window().isoformat()
+    invoices = client.table('invoices').select('*').eq('user_id', user_id).lte('updated_at', until)
+    tombstones = (
+        client.table('invoice_tombstones').select('invoice_id,invoice_number,deleted_at')
+        .eq('user_id', user_id).lte('deleted_at', until)
+    )
+    if cursor:
+        stamp = cursor[0].isoformat()
+        invoices = invoices.gte('updated_at', stamp).or_(_postgrest_after('updated_at', 'id', cursor))
+        tombstones = tombstones.gte('deleted_at', stamp).or_(_postgrest_after('deleted_at', 'invoice_id', cursor))
+    with span('supabase'):
+        rows = invoices.order('updated_at').order('id').limit(limit + 1).execute().data
+        deleted = tombstones.order('deleted_at').order('invoice_id').limit(limit + 1).execute().data
+
+    # One items query for the page instead of one per invoice
+    items = supabase_items(client, [row['id'] for row in rows[:limit]])
+    for row in rows:
+        row['items'] = items.get(row['id'], [])
+    return merge_page(
+        [(row['updated_at'], row['id'], row) for row in rows],
+        [(t['deleted_at'], t['invoice_id'], _tombstone(t['invoice_id'], t['invoice_number'], t['deleted_at']))
+         for t in deleted],
+        limit, cursor_token,
+    )
+
+
+def mongo_changes(db, user_id, cursor_token, limit=SYNC_PAGE_SIZE):
+    """Changed invoice documents (with their items under "items") and tombstones from MongoDB"""
+    cursor = decode_cursor(cursor_token)
+    ensure_mongo_indexes(db)
+    until = sync_window()
+    invoice_filter = {'user_id': user_id, 'updated_at': {'$lte': until}}
+    tombstone_filter = {'user_id': user_id, 'deleted_at': {'$lte': until}}
+    if cursor:
+        moment, key = cursor
+        invoice_filter['updated_at']['$gte'] = moment
+        invoice_filter['$or'] = [{'updated_at': {'$gt': moment}}, {'id': {'$gt': key}}]
+        tombstone_filter['deleted_at']['$gte'] = moment
+        tombstone_filter['$or'] = [{'deleted_at': {'$gt': moment}}, {'invoice_id': {'$gt': key}}]
+    rows = list(
+        db.invoices.find(invoice_filter, {'_id': 0})
+        .sort([('updated_at', 1), ('id', 1)]).limit(limit + 1)
+    )
+    deleted = list(
+        db.invoice_tombstones.find(tombstone_filter, {'_id': 0})
+        .sort([('deleted_at', 1), ('invoice_id', 1)]).limit(limit + 1)
+    )
+
+    items = {}
+    if rows:
+        ids = [row['id'] for row in rows[:limit]]
+        for item in db.invoice_items.find({'invoice_id': {'$in': ids}}, {'_id': 0}):
+            items.setdefault(item['invoice_id'], []).append(item)
+    for row in rows:
+        row['items'] = items.get(row['id'], [])
+    return merge_page(
+        [(row['updated_at'], row['id'], row) for row in rows],
+        [(t['deleted_at'], t['invoice_id'], _tombstone(t['invoice_id'], t.get('invoice_number', ''), t['deleted_at']))
+         for t in deleted],
+        limit, cursor_token,
+    )
+
+
+def page_size(params):
+    """The ``limit`` query parameter, clamped to MAX_SYNC_PAGE_SIZE"""
+    try:
+        limit = int(params.get('limit', SYNC_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, MAX_SYNC_PAGE_SIZE)
+
+
+def prune_tombstones(now=None):
+    """Delete ORM tombstones older than the retention window; returns how many were removed"""
+    cutoff = (now or timezone.now()) - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    deleted, _ = InvoiceTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
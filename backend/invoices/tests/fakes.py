@@ -0,0 +1,276 @@
+"""
+Recording fakes for the external services
+Stand in for supabase_service, mongodb_service and razorpay_client (and the Celery and async Supabase
+clients) during tests, logging every call made through them so tests can count round trips
+"""
+
+import uuid
+from contextlib import contextmanager
+from unittest import mock
+
+from django.utils import timezone
+from django.utils.functional import empty
+
+from invoices import services
+from invoices.async_supabase import async_supabase
+
+
+class CallLog(list):
+    """(service, call) pairs in the order they were made"""
+
+    def record(self, service, call):
+        self.append((service, call))
+
+    def counts(self):
+        totals = {}
+        for service, _ in self:
+            totals[service] = totals.get(service, 0) + 1
+        return totals
+
+
+def _matches(value, expected):
+    return str(value) == str(expected)
+
+
+class FakeResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """The subset of the PostgREST query builder the views use, evaluated against in-memory rows"""
+
+    def __init__(self, supabase, table):
+        self.supabase = supabase
+        self.table = table
+        self.filters = []
+        self.orders = []
+        self.columns = '*'
+        self.count = None
+        self.start = 0
+        self.stop = None
+        self.description = [f'table {table}']
+
+    def _step(self, description, check=None):
+        self.description.append(description)
+        if check is not None:
+            self.filters.append(check)
+        return self
+
+    def select(self, columns='*', count=None):
+        self.columns, self.count = columns, count
+        return self._step(f'select {columns}')
+
+    def eq(self, column, value):
+        return self._step(f'{column}=eq.{value}', lambda row: _matches(row.get(column), value))
+
+    def in_(self, column, values):
+        allowed = {str(value) for value in values}
+        return self._step(f'{column}=in.({len(values)} values)', lambda row: str(row.get(column)) in allowed)
+
+    def lt(self, column, value):
+        return self._step(f'{column}=lt.{value}', lambda row: str(row.get(column)) < str(value))
+
+    def lte(self, column, value):
+        return self._step(f'{column}=lte.{value}', lambda row: str(row.get(column)) <= str(value))
+
+    def gt(self, column, value):
+        return self._step(f'{column}=gt.{value}', lambda row: str(row.get(column)) > str(value))
+
+    def gte(self, column, value):
+        return self._step(f'{column}=gte.{value}', lambda row: str(row.get(column)) >= str(value))
+
+    def or_(self, expression):
+        # Only keyset cursors use or=(...); the gte filter beside it already bounds the page
+        return self._step(f'or=({expression})')
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self._step(f"order={column}{'.desc' if desc else ''}")
+
+    def limit(self, count):
+        self.stop = self.start + count
+        return self._step(f'limit={count}')
+
+    def range(self, start, end):
+        self.start, self.stop = start, end + 1
+        return self._step(f'range={start}-{end}')
+
+    def rows(self):
+        """(matching rows, total count when asked for one)"""
+        rows = [row for row in self.supabase.tables.get(self.table, []) if all(check(row) for check in self.filters)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: str(row.get(column)), reverse=desc)
+        total = len(rows) if self.count else None
+        rows = rows[self.start:self.stop]
+        if self.columns != '*':
+            columns = self.columns.split(',')
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return [dict(row) for row in rows], total
+
+    def execute(self):
+        self.supabase.calls.record('supabase', ' '.join(self.description))
+        return FakeResult(*self.rows())
+
+
+class FakeSupabaseClient:
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def table(self, name):
+        return FakeQuery(self.supabase, name)
+
+
+class FakeSupabase:
+    """supabase_service over in-memory ``invoices``, ``invoice_items`` and ``invoice_tombstones`` tables"""
+
+    def __init__(self, calls, invoices=(), items=(), tombstones=()):
+        self.calls = calls
+        self.tables = {
+            'invoices': [dict(row) for row in invoices],
+            'invoice_items': [dict(row) for row in items],
+            'invoice_tombstones': [dict(row) for row in tombstones],
+        }
+        self.client = FakeSupabaseClient(self)
+
+    def _record(self, call):
+        self.calls.record('supabase', call)
+
+    def _find(self, table, row_id):
+        return next((row for row in self.tables[table] if _matches(row['id'], row_id)), None)
+
+    def connect(self):
+        # The real service builds its client once; connecting again is not a round trip
+        return True
+
+    def get_user_invoices(self, user_id, limit=None):
+        self._record(f'get_user_invoices({user_id}, limit={limit})')
+        rows = [row for row in self.tables['invoices'] if _matches(row['user_id'], user_id)]
+        rows.sort(key=lambda row: row['created_at'], reverse=True)
+        return [dict(row) for row in rows[:limit]]
+
+    def get_invoice(self, invoice_id):
+        self._record(f'get_invoice({invoice_id})')
+        row = self._find('invoices', invoice_id)
+        return dict(row) if row else None
+
+    def get_invoice_items(self, invoice_id):
+        self._record(f'get_invoice_items({invoice_id})')
+        return [dict(row) for row in self.tables['invoice_items'] if _matches(row['invoice_id'], invoice_id)]
+
+    def get_invoice_summary(self, user_id):
+        self._record(f'get_invoice_summary({user_id})')
+        rows = [row for row in self.tables['invoices'] if _matches(row['user_id'], user_id)]
+        summary = {'total_invoices': len(rows), 'total_amount': sum(float(row['total_amount']) for row in rows)}
+        for status in ('paid', 'pending', 'draft', 'overdue'):
+            matching = [row for row in rows if row['status'] == status]
+            summary[f'{status}_invoices'] = len(matching)
+            summary[f'{status}_amount'] = sum(float(row['total_amount']) for row in matching)
+        return summary
+
+    def create_invoice(self, data):
+        self._record('create_invoice()')
+        now = timezone.now().isoformat()
+        row = {'id': str(uuid.uuid4()), 'created_at': now, 'updated_at': now, **data}
+        self.tables['invoices'].append(row)
+        return row['id']
+
+    def create_invoice_item(self, data):
+        self._record(f"create_invoice_item({data.get('invoice_id')})")
+        row = {'id': str(uuid.uuid4()), **data}
+        self.tables['invoice_items'].append(row)
+        return row['id']
+
+    def update_invoice(self, invoice_id, data):
+        self._record(f'update_invoice({invoice_id})')
+        row = self._find('invoices', invoice_id)
+        if row is None:
+            return False
+        row.update(data, updated_at=timezone.now().isoformat())
+        return True
+
+    def delete_invoice(self, invoice_id):
+        self._record(f'delete_invoice({invoice_id})')
+        row = self._find('invoices', invoice_id)
+        if row is None:
+            return False
+        self.tables['invoices'].remove(row)
+        return True
+
+    def delete_invoice_item(self, item_id):
+        self._record(f'delete_invoice_item({item_id})')
+        row = self._find('invoice_items', item_id)
+        if row is not None:
+            self.tables['invoice_items'].remove(row)
+        return row is not None
+
+    async def select(self, table, params, count=False):
+        """``AsyncSupabase.select`` over the same tables, reading PostgREST query parameters"""
+        self._record(f"GET {table}?{'&'.join(f'{key}={value}' for key, value in params.items())}")
+        query = FakeQuery(self, table).select(params.get('select', '*'), count='exact' if count else None)
+        for column, condition in params.items():
+            if column in ('select', 'order', 'limit', 'offset'):
+                continue
+            operator, _, value = condition.partition('.')
+            if operator == 'in':
+                query.in_(column, value.strip('()').split(','))
+            else:
+                getattr(query, operator)(column, value)
+        for term in filter(None, params.get('order', '').split(',')):
+            column, _, direction = term.partition('.')
+            query.order(column, desc=direction == 'desc')
+        query.start = int(params.get('offset', 0))
+        if 'limit' in params:
+            query.stop = query.start + int(params['limit'])
+        return query.rows()
+
+
+class FakeClient:
+    """Any attribute chain on a client (``client.order.create``, ``service.db.invoices.find``); calls are logged"""
+
+    def __init__(self, calls, service, results=None, path=''):
+        self._calls = calls
+        self._service = service
+        self._results = results or {}
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        path = f'{self._path}.{name}' if self._path else name
+        return FakeClient(self._calls, self._service, self._results, path)
+
+    def __call__(self, *args, **kwargs):
+        self._calls.record(self._service, self._path)
+        return self._results.get(self._path)
+
+
+RAZORPAY_RESULTS = {
+    'order.create': {'id': 'order_fake0000001'},
+    'payment_link.create': {'id': 'plink_fake0000001', 'short_url': 'https://rzp.io/i/fake'},
+}
+
+
+@contextmanager
+def fake_services(supabase=None):
+    """Swap every external client for a recording fake; yields the shared CallLog"""
+    calls = supabase.calls if supabase is not None else CallLog()
+    supabase = supabase or FakeSupabase(calls)
+    fakes = {
+        'supabase_service': supabase,
+        'mongodb_service': FakeClient(calls, 'mongo', {'get_user_invoices': [], 'search_invoices': []}),
+        'razorpay_client': FakeClient(calls, 'razorpay', RAZORPAY_RESULTS),
+    }
+    # The views hold the lazy objects themselves, so filling them in reaches every module at once
+    for name, fake in fakes.items():
+        getattr(services, name)._wrapped = fake
+    from hisabpro.tasks import run_import_job
+
+    try:
+        with mock.patch.object(async_supabase, 'select', supabase.select), \
+                mock.patch.object(run_import_job, 'delay', lambda *args: calls.record('celery', 'run_import_job')):
+            yield calls
+    finally:
+        for name in fakes:
+            getattr(services, name)._wrapped = empty
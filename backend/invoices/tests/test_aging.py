@@ -0,0 +1,88 @@
+"""
+Receivables aging
+Buckets open invoices by days past due, per client and overall, and caches the report per user (aging.py)
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from invoices.aging import BUCKETS, bucket_for, compute_aging, compute_rows_aging, get_aging
+from invoices.models import Invoice
+
+TODAY = date(2024, 7, 1)
+
+
+class AgingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('aging-owner')
+        self.count = 0
+
+    def invoice(self, days_past_due, total='100.00', client='Acme', status='pending', today=TODAY):
+        self.count += 1
+        due = today - timedelta(days=days_past_due)
+        invoice = Invoice.objects.create(
+            user=self.user, invoice_number=f'INV-A-{self.count:04d}', client_name=client,
+            client_email=f'{client.lower()}@example.com', issue_date=due - timedelta(days=30), due_date=due,
+            status=status,
+        )
+        # save() recomputes the total from the invoice's items, and these have none
+        Invoice.objects.filter(pk=invoice.pk).update(total_amount=Decimal(total))
+        return invoice
+
+    def test_bucket_edges(self):
+        self.assertEqual([bucket_for(days) for days in (-1, 0, 30, 31, 60, 61, 90, 91, 400)],
+                         ['not_due', '0_30', '0_30', '31_60', '31_60', '61_90', '61_90', '90_plus', '90_plus'])
+
+    def test_buckets_per_client_and_overall(self):
+        for days in (-5, 0, 30, 31, 61, 91):
+            self.invoice(days)
+        self.invoice(45, total='250.50', client='Globex', status='overdue')
+        # Settled invoices are not receivable
+        self.invoice(45, total='999.00', status='paid')
+        self.invoice(45, total='999.00', status='cancelled')
+
+        report = compute_aging(self.user, TODAY)
+        self.assertEqual(report['as_of'], '2024-07-01')
+        self.assertEqual(report['buckets'], [key for key, _, _ in BUCKETS])
+        self.assertEqual(report['overall'], {
+            'invoices': 7, 'total': '850.50', 'not_due': '100.00', '0_30': '200.00', '31_60': '350.50',
+            '61_90': '100.00', '90_plus': '100.00',
+        })
+        # Largest balance first
+        self.assertEqual([(client['client_name'], client['invoices'], client['total'])
+                          for client in report['clients']], [('Acme', 6, '600.00'), ('Globex', 1, '250.50')])
+
+    def test_row_aging_matches_the_grouped_query(self):
+        for days, client, total in ((-5, 'Acme', '100.00'), (15, 'Acme', '100.00'), (75, 'Globex', '40.25'),
+                                    (200, 'Globex', '99.99')):
+            self.invoice(days, client=client, total=total)
+        rows = Invoice.objects.filter(status__in=('pending', 'overdue')).values(
+            'client_name', 'client_email', 'due_date', 'total_amount',
+        )
+        # Supabase returns numbers and ISO dates
+        rows = [{**row, 'due_date': row['due_date'].isoformat(), 'total_amount': float(row['total_amount'])}
+                for row in rows]
+        self.assertEqual(compute_rows_aging(rows, TODAY), compute_aging(self.user, TODAY))
+
+    def test_report_is_cached_until_an_invoice_changes(self):
+        today = timezone.localdate()
+        invoice = self.invoice(10, today=today)
+        self.assertEqual(get_aging(self.user)['overall']['0_30'], '100.00')
+
+        # Bypassing the signals leaves the cached report in place
+        Invoice.objects.filter(pk=invoice.pk).update(total_amount=Decimal('300.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_aging(self.user)['overall']['0_30'], '100.00')
+
+        # A save bumps the user's aging namespace
+        invoice.refresh_from_db()
+        invoice.status = 'paid'
+        invoice.save()
+        self.assertEqual(get_aging(self.user)['overall']['invoices'], 0)
@@ -0,0 +1,122 @@
+"""
+Async Supabase views
+Read endpoints for ASGI workers: authentication, paging, 304s and the concurrent dashboard (async_views.py)
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from invoices import async_supabase as async_supabase_module
+from invoices.async_supabase import async_supabase
+
+from .fakes import CallLog, FakeSupabase, fake_services
+
+
+@override_settings(PERF_SERVER_TIMING=False)
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('async-owner')
+        self.token = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        today = timezone.localdate()
+        self.rows = [{
+            'id': f'sb-{number}', 'user_id': self.user.id, 'invoice_number': f'INV-S-{number:04d}',
+            'client_name': 'Client', 'client_email': 'client@example.com', 'status': status,
+            'total_amount': 1180.0, 'issue_date': (today - timedelta(days=60)).isoformat(),
+            'due_date': (today + timedelta(days=due)).isoformat(),
+            'created_at': f'2024-04-{number + 1:02d}T00:00:00+00:00',
+            'updated_at': f'2024-04-{number + 1:02d}T00:00:00+00:00',
+        } for number, (status, due) in enumerate((('pending', -10), ('overdue', -40), ('paid', -5)))]
+        items = [{'id': f'item-{row["id"]}', 'invoice_id': row['id'], 'description': 'Design',
+                  'quantity': 1, 'unit_price': 1000.0, 'amount': 1000.0} for row in self.rows]
+        self.supabase = FakeSupabase(CallLog(), self.rows, items)
+
+    def get(self, path, data=None, etag=None):
+        # Django 4.2's AsyncClient drops client-wide headers, so the token goes on every request
+        headers = {'Authorization': self.token}
+        if etag:
+            headers['If-None-Match'] = etag
+        return AsyncClient().get(path, data, headers=headers)
+
+    async def test_needs_a_token_and_a_get(self):
+        path = reverse('async-supabase-invoice-summary')
+        self.assertEqual((await AsyncClient().get(path)).status_code, 401)
+        self.assertEqual((await AsyncClient().get(path, headers={'Authorization': 'Bearer nonsense'})).status_code, 401)
+        self.assertEqual((await AsyncClient().post(path, headers={'Authorization': self.token})).status_code, 405)
+
+    async def test_list_pages(self):
+        path = reverse('async-supabase-invoice-list')
+        with fake_services(self.supabase) as calls:
+            first = await self.get(path, {'page_size': 2})
+            # One request for the page and its count, one for all of its items
+            self.assertEqual(calls.counts(), {'supabase': 2})
+            second = await self.get(path, {'page_size': 2, 'page': 2})
+            beyond = await self.get(path, {'page_size': 2, 'page': 3})
+            bad = await self.get(path, {'page': 'two'})
+        data = first.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([invoice['invoice_number'] for invoice in data['results']], ['INV-S-0002', 'INV-S-0001'])
+        self.assertEqual([len(invoice['items']) for invoice in data['results']], [1, 1])
+        self.assertIn('page=2', data['next'])
+        self.assertIsNone(data['previous'])
+        self.assertIsNone(second.json()['next'])
+        self.assertNotIn('page=', second.json()['previous'])
+        self.assertEqual(beyond.status_code, 404)
+        self.assertEqual(bad.status_code, 400)
+
+    async def test_detail_is_the_owners_only(self):
+        with fake_services(self.supabase):
+            response = await self.get(reverse('async-supabase-invoice-detail', kwargs={'pk': 'sb-1'}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['items']), 1)
+            again = await self.get(reverse('async-supabase-invoice-detail', kwargs={'pk': 'sb-1'}),
+                                   etag=response['ETag'])
+            self.assertEqual(again.status_code, 304)
+
+            self.supabase.tables['invoices'][1]['user_id'] = self.user.id + 1
+            missing = await self.get(reverse('async-supabase-invoice-detail', kwargs={'pk': 'sb-1'}))
+            self.assertEqual(missing.status_code, 404)
+
+    async def test_summary_revalidates_from_the_cached_watermark(self):
+        path = reverse('async-supabase-invoice-summary')
+        with fake_services(self.supabase) as calls:
+            first = await self.get(path)
+            self.assertEqual(first.json()['total_invoices'], 3)
+            self.assertEqual(first.json()['paid_invoices'], 1)
+            del calls[:]
+            again = await self.get(path, etag=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(calls.counts(), {})
+
+    async def test_dashboard(self):
+        with fake_services(self.supabase):
+            response = await self.get(reverse('async-dashboard'))
+            cached = await self.get(reverse('async-dashboard'))
+        data = response.json()
+        self.assertEqual(sorted(data), ['aging', 'overdue', 'recent', 'summary'])
+        self.assertEqual(data['overdue'], {'overdue': 1, 'past_due': 2, 'due_soon': 0})
+        self.assertEqual(data['aging']['overall']['invoices'], 2)
+        names = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(sorted(names), ['open', 'recent', 'summary', 'total'])
+        self.assertTrue(cached['Server-Timing'].startswith('cache;dur=0'))
+
+    async def test_upstream_errors_become_500s(self):
+        with fake_services(self.supabase), \
+                mock.patch.object(async_supabase, 'select', side_effect=ConnectionError('supabase down')):
+            response = await self.get(reverse('async-supabase-invoice-list'))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'error': 'supabase down'})
+
+    async def test_all_rows_fetches_the_remaining_pages_together(self):
+        with fake_services(self.supabase) as calls, mock.patch.object(async_supabase_module, 'PAGE_SIZE', 1):
+            rows = await async_supabase.open_invoices(self.user.id)
+        self.assertEqual(sorted(row['status'] for row in rows), ['overdue', 'pending'])
+        self.assertEqual(calls.counts(), {'supabase': 2})
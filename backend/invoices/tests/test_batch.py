@@ -0,0 +1,132 @@
+"""
+Batch invoice writes
+Creates, updates and status changes through the batch endpoints, with per-entry results and size limits (batch.py)
+"""
+
+import json
+import uuid
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from invoices.batch import batch_status
+from invoices.models import Invoice, InvoiceItem
+
+
+def _entry(**fields):
+    return {
+        'client_name': 'Batch Client', 'client_email': 'client@example.com',
+        'issue_date': '2024-04-01', 'due_date': '2024-05-01',
+        'items': [{'description': 'Design', 'quantity': '2', 'unit_price': '500.00', 'gst_rate': '18'}],
+        **fields,
+    }
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('batch-owner')
+        self.other = User.objects.create_user('batch-other')
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def invoice(self, user=None, status='pending', number='INV-B-0001'):
+        return Invoice.objects.create(
+            user=user or self.user, invoice_number=number, client_name='Client', client_email='client@example.com',
+            issue_date=date(2024, 4, 1), due_date=date(2024, 5, 1), status=status,
+        )
+
+    def post(self, name, payload, **extra):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json', **extra)
+
+    def test_valid_entries_are_written_alongside_failed_ones(self):
+        existing = self.invoice()
+        response = self.post('invoice-batch', {'invoices': [
+            _entry(),
+            _entry(client_email='not-an-email'),
+            {'id': str(existing.id), 'client_name': 'Renamed'},
+            {'id': str(uuid.uuid4()), 'client_name': 'Nobody'},
+            'not an object',
+        ]})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['created'], body['updated'], body['failed']), (1, 1, 3))
+        self.assertEqual([result['status'] for result in body['results']],
+                         ['created', 'error', 'updated', 'error', 'error'])
+        self.assertIn('client_email', body['results'][1]['errors'])
+
+        created = Invoice.objects.get(id=body['results'][0]['id'])
+        self.assertEqual(created.total_amount, Decimal('1180.00'))
+        self.assertEqual(InvoiceItem.objects.filter(invoice=created).count(), 1)
+        self.assertEqual(Invoice.objects.get(id=existing.id).client_name, 'Renamed')
+
+    def test_a_batch_where_every_entry_fails_is_a_bad_request(self):
+        response = self.post('invoice-batch', {'invoices': [_entry(client_email='not-an-email')]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['failed'], 1)
+
+    def test_another_users_invoice_is_not_found(self):
+        foreign = self.invoice(user=self.other)
+        response = self.post('invoice-batch', {'invoices': [{'id': str(foreign.id), 'client_name': 'Mine now'}]})
+        self.assertEqual(response.json()['results'][0]['errors'], {'id': ['Invoice not found']})
+        self.assertEqual(Invoice.objects.get(id=foreign.id).client_name, 'Client')
+
+    def test_the_same_invoice_twice_in_one_batch(self):
+        existing = self.invoice()
+        entries = [{'id': str(existing.id), 'notes': 'first'}, {'id': str(existing.id), 'notes': 'second'}]
+        results = self.post('invoice-batch', {'invoices': entries}).json()['results']
+        self.assertEqual([result['status'] for result in results], ['updated', 'error'])
+        self.assertEqual(Invoice.objects.get(id=existing.id).notes, 'first')
+
+    def test_size_limits(self):
+        with mock.patch('invoices.views.MAX_BATCH_SIZE', 2):
+            response = self.post('invoice-batch', {'invoices': [_entry(), _entry(), _entry()]})
+        self.assertEqual(response.status_code, 413)
+        # An oversized body is refused before it is parsed
+        with mock.patch('invoices.views.MAX_BATCH_BYTES', 10), \
+                mock.patch('rest_framework.parsers.JSONParser.parse') as parse:
+            response = self.post('invoice-batch-status', {'status': 'paid', 'ids': [str(uuid.uuid4())]})
+        self.assertEqual(response.status_code, 413)
+        parse.assert_not_called()
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_empty_or_missing_entries(self):
+        self.assertEqual(self.post('invoice-batch', {'invoices': []}).status_code, 400)
+        self.assertEqual(self.post('invoice-batch-status', {'status': 'paid'}).status_code, 400)
+
+    def test_a_malformed_content_length_is_a_bad_request(self):
+        response = self.post('invoice-batch', {'invoices': [_entry()]}, CONTENT_LENGTH='lots')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Invalid Content-Length header')
+
+    def test_status_changes(self):
+        pending = self.invoice(number='INV-B-0001')
+        overdue = self.invoice(status='overdue', number='INV-B-0002')
+        paid = self.invoice(status='paid', number='INV-B-0003')
+        cancelled = self.invoice(status='cancelled', number='INV-B-0004')
+        foreign = self.invoice(user=self.other, number='INV-B-0005')
+        ids = [str(invoice.id) for invoice in (pending, overdue, paid, cancelled, foreign)] + ['not-a-uuid']
+
+        results, _ = batch_status(self.user, ids, 'paid')
+        self.assertEqual([result['status'] for result in results],
+                         ['updated', 'updated', 'unchanged', 'error', 'error', 'error'])
+        self.assertEqual(results[3]['error'], 'Cannot change a cancelled invoice to paid')
+        statuses = dict(Invoice.objects.values_list('invoice_number', 'status'))
+        self.assertEqual(statuses, {
+            'INV-B-0001': 'paid', 'INV-B-0002': 'paid', 'INV-B-0003': 'paid', 'INV-B-0004': 'cancelled',
+            'INV-B-0005': 'pending',
+        })
+
+    def test_status_endpoint(self):
+        invoice = self.invoice()
+        response = self.post('invoice-batch-status', {'status': 'overdue', 'ids': [str(invoice.id)]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status must be one of', response.json()['error'])
+        response = self.post('invoice-batch-status', {'status': 'cancelled', 'ids': [str(invoice.id)]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(Invoice.objects.get(id=invoice.id).status, 'cancelled')
@@ -0,0 +1,126 @@
+"""
+Cache namespaces
+Per-user versioned key spaces invalidated by bumping a version, and the stampede-safe fill behind them (caching.py)
+"""
+
+import io
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from invoices import caching
+
+
+class NamespaceTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_keys_carry_the_users_version(self):
+        first = caching.key('aging', 7, 'orm', '2024-07-01')
+        self.assertRegex(first, r'^aging:7:v\d+:orm:2024-07-01$')
+        self.assertEqual(caching.key('aging', 7, 'orm', '2024-07-01'), first)
+
+    def test_a_bump_moves_only_that_user_and_namespace(self):
+        before = {(namespace, user_id): caching.key(namespace, user_id)
+                  for namespace in ('aging', 'body') for user_id in (1, 2)}
+        caching.bump('aging', [1, 1])
+        after = {(namespace, user_id): caching.key(namespace, user_id) for namespace, user_id in before}
+        self.assertEqual([name for name in before if before[name] != after[name]], [('aging', 1)])
+        # Bumped once, even though the user was listed twice
+        self.assertEqual(caching.versions('aging', [1])[1], int(before['aging', 1].split(':')[2][1:]) + 1)
+
+    def test_bump_all(self):
+        before = {namespace: caching.key(namespace, 1) for namespace in caching.NAMESPACES}
+        caching.bump_all([1])
+        self.assertTrue(all(caching.key(namespace, 1) != key for namespace, key in before.items()))
+
+    def test_an_evicted_version_never_comes_back_to_an_old_value(self):
+        old = caching.key('aging', 1)
+        caching.bump('aging', [1])
+        cache.delete(caching._version_key('aging', 1))
+        new = caching.key('aging', 1)
+        self.assertNotEqual(new, old)
+        # Bumping a missing version starts it from the clock as well
+        cache.delete(caching._version_key('aging', 1))
+        caching.bump('aging', [1])
+        self.assertNotIn(caching.key('aging', 1), (old, new))
+
+    def test_versions_for_many_users_at_once(self):
+        versions = caching.versions('body', [1, 2, 3])
+        self.assertEqual(sorted(versions), [1, 2, 3])
+        self.assertEqual(caching.versions('body', [2]), {2: versions[2]})
+
+
+class RememberTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_builds_once_then_serves_the_cache(self):
+        self.assertEqual(caching.remember('k', self.build, 60), 1)
+        self.assertEqual(caching.remember('k', self.build, 60), 1)
+        self.assertEqual(self.builds, 1)
+        self.assertIsNone(cache.get(caching._lock_key('k')))
+
+    def expiring_entry(self):
+        # Took 10s to build and expires in 1s, so an average draw refreshes it early
+        cache.set('k', (0, 10.0, time.time() + 1), 60)
+
+    def test_rebuilds_early_as_expiry_nears(self):
+        self.expiring_entry()
+        with mock.patch('invoices.caching.random.random', return_value=0.5):
+            self.assertEqual(caching.remember('k', self.build, 60), 1)
+        self.assertEqual(caching.remember('k', self.build, 60), 1)
+
+    def test_only_the_lock_holder_rebuilds(self):
+        self.expiring_entry()
+        cache.add(caching._lock_key('k'), 1)
+        with mock.patch('invoices.caching.random.random', return_value=0.5):
+            self.assertEqual(caching.remember('k', self.build, 60), 0)
+        self.assertEqual(self.builds, 0)
+
+    def test_a_cold_key_held_by_another_process_is_built_after_the_wait(self):
+        cache.add(caching._lock_key('k'), 1)
+        with mock.patch.object(caching, 'LOCK_WAIT', 0.1):
+            self.assertEqual(caching.remember('k', self.build, 60), 1)
+
+    def test_without_store_a_miss_is_not_cached(self):
+        self.assertEqual(caching.remember('k', self.build, 60, store=False), 1)
+        self.assertEqual(caching.remember('k', self.build, 60, store=False), 2)
+        caching.remember('k', self.build, 60)
+        self.assertEqual(caching.remember('k', self.build, 60, store=False), 3)
+
+
+class CacheNamespacesCommandTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cache-owner')
+
+    def test_flush_bumps_the_users_namespaces(self):
+        before = caching.key('body', self.user.id)
+        out = io.StringIO()
+        call_command('cache_namespaces', 'flush', user=['cache-owner'], namespace=['body'], stdout=out)
+        self.assertNotEqual(caching.key('body', self.user.id), before)
+        self.assertIn('body: bumped 1 users', out.getvalue())
+
+    def test_show(self):
+        out = io.StringIO()
+        call_command('cache_namespaces', 'show', user=['cache-owner'], stdout=out)
+        self.assertIn('cache-owner: version', out.getvalue())
+
+    def test_flush_needs_users(self):
+        with self.assertRaises(CommandError):
+            call_command('cache_namespaces', 'flush', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('cache_namespaces', 'flush', user=['nobody'], stdout=io.StringIO())
@@ -0,0 +1,107 @@
+"""
+Conditional GETs
+Invoice, summary and list endpoints send ETag and Last-Modified, and answer a current client with 304 before
+building the body (conditional.py)
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from invoices.conditional import invalidate_watermark, make_etag
+from invoices.models import Invoice, InvoiceItem, Payment
+
+from .fakes import CallLog, FakeSupabase, fake_services
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('etag-owner')
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.invoice = self.create_invoice('INV-E-0001')
+
+    def create_invoice(self, number):
+        invoice = Invoice.objects.create(
+            user=self.user, invoice_number=number, client_name='Client', client_email='client@example.com',
+            issue_date=date(2024, 4, 1), due_date=date(2024, 5, 1),
+        )
+        InvoiceItem.objects.create(invoice=invoice, description='Design', quantity=Decimal('1'),
+                                   unit_price=Decimal('1000.00'))
+        return invoice
+
+    def revalidate(self, path, response):
+        return self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_invoice_detail(self):
+        path = reverse('invoice-detail', kwargs={'pk': self.invoice.pk})
+        first = self.client.get(path)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        self.assertIn('Authorization', first['Vary'])
+
+        # The token's user, then the validators; nothing is serialized
+        with self.assertNumQueries(2):
+            again = self.revalidate(path, first)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+        self.assertEqual(again.content, b'')
+
+        # A payment changes the body without touching the invoice's updated_at
+        Payment.objects.create(invoice=self.invoice, amount=Decimal('100.00'), payment_method='upi')
+        changed = self.revalidate(path, first)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_if_modified_since(self):
+        path = reverse('invoice-detail', kwargs={'pk': self.invoice.pk})
+        first = self.client.get(path)
+        self.assertEqual(self.client.get(path, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        earlier = http_date((timezone.now() - timedelta(days=1)).timestamp())
+        self.assertEqual(self.client.get(path, HTTP_IF_MODIFIED_SINCE=earlier).status_code, 200)
+
+    def test_a_stale_or_foreign_etag_gets_the_body(self):
+        path = reverse('invoice-summary')
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=make_etag('summary', 0, '', 0)).status_code, 200)
+
+    def test_lists_follow_the_users_invoices(self):
+        for name in ('invoice-summary', 'recent-invoices', 'invoice-dashboard'):
+            with self.subTest(name=name):
+                path = reverse(name)
+                first = self.client.get(path)
+                self.assertEqual(self.revalidate(path, first).status_code, 304)
+
+                invoice = self.create_invoice(f'INV-E-{name}')
+                self.assertEqual(self.revalidate(path, first).status_code, 200)
+                invoice.delete()
+
+    def test_supabase_summary_answers_from_the_cached_watermark(self):
+        now = timezone.now().isoformat()
+        rows = [{
+            'id': 'sb-1', 'user_id': self.user.id, 'invoice_number': 'INV-S-0001', 'status': 'pending',
+            'total_amount': 1180.0, 'due_date': '2024-05-01', 'created_at': now, 'updated_at': now,
+        }]
+        supabase = FakeSupabase(CallLog(), rows)
+        path = reverse('supabase-invoice-summary')
+        with fake_services(supabase) as calls:
+            first = self.client.get(path)
+            self.assertEqual(first.status_code, 200)
+            del calls[:]
+            again = self.revalidate(path, first)
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(calls.counts().get('supabase', 0), 0)
+
+            # An edit made elsewhere shows once the cached watermark expires; our own writes drop it at once
+            supabase.tables['invoices'][0]['updated_at'] = timezone.now().isoformat()
+            self.assertEqual(self.revalidate(path, first).status_code, 304)
+            invalidate_watermark('supabase', self.user.id)
+            self.assertEqual(self.revalidate(path, first).status_code, 200)
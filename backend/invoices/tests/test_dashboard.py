@@ -0,0 +1,121 @@
+"""
+Dashboard endpoints
+Summary, recent invoices, overdue counts and aging in one response, with each section's time in Server-Timing
+(dashboard.py)
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from invoices import dashboard
+from invoices.dashboard import rows_overdue, run_sections
+from invoices.models import Invoice, InvoiceItem
+
+from .fakes import CallLog, FakeSupabase, fake_services
+
+
+def timing_names(response):
+    return [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+
+
+class RunSectionsTests(TestCase):
+
+    def test_values_and_timings_per_section(self):
+        for concurrent in (False, True):
+            with self.subTest(concurrent=concurrent):
+                values, timings = run_sections({'a': lambda: 1, 'b': lambda: 2}, concurrent=concurrent)
+                self.assertEqual(values, {'a': 1, 'b': 2})
+                self.assertEqual(list(timings), ['a', 'b'])
+                self.assertTrue(all(ms >= 0 for ms in timings.values()))
+
+    def test_rows_overdue(self):
+        today = date(2024, 7, 1)
+        rows = [
+            {'status': 'overdue', 'due_date': '2024-06-01'},
+            {'status': 'pending', 'due_date': '2024-06-30T00:00:00'},
+            {'status': 'pending', 'due_date': '2024-07-01'},
+            {'status': 'pending', 'due_date': '2024-07-08'},
+            {'status': 'pending', 'due_date': '2024-07-09'},
+        ]
+        self.assertEqual(rows_overdue(rows, today), {'overdue': 1, 'past_due': 2, 'due_soon': 2})
+
+
+@override_settings(PERF_SERVER_TIMING=False)
+class OrmDashboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('dashboard-owner')
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        today = timezone.localdate()
+        for number, (status, due) in enumerate((('pending', -10), ('overdue', -40), ('paid', -5), ('pending', 3))):
+            invoice = Invoice.objects.create(
+                user=self.user, invoice_number=f'INV-D-{number:04d}', client_name='Client',
+                client_email='client@example.com', issue_date=today - timedelta(days=60),
+                due_date=today + timedelta(days=due), status=status,
+            )
+            InvoiceItem.objects.create(invoice=invoice, description='Design', quantity=Decimal('1'),
+                                       unit_price=Decimal('1000.00'))
+
+    def test_sections(self):
+        response = self.client.get(reverse('invoice-dashboard'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(sorted(data), ['aging', 'overdue', 'recent', 'summary'])
+        self.assertEqual(data['summary']['total_invoices'], 4)
+        self.assertEqual(data['summary']['paid_invoices'], 1)
+        self.assertEqual(len(data['recent']), 4)
+        self.assertEqual(data['overdue'], {'overdue': 1, 'past_due': 2, 'due_soon': 1})
+        self.assertEqual(data['aging']['overall']['invoices'], 3)
+        self.assertEqual(timing_names(response), ['summary', 'recent', 'overdue', 'aging', 'total'])
+
+    def test_a_cached_body_reports_no_sections(self):
+        self.client.get(reverse('invoice-dashboard'))
+        again = self.client.get(reverse('invoice-dashboard'))
+        self.assertEqual(timing_names(again), ['cache', 'total'])
+
+
+@override_settings(PERF_SERVER_TIMING=False)
+class SupabaseDashboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('supabase-dashboard-owner')
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        today = timezone.localdate()
+        now = timezone.now().isoformat()
+        self.invoices = [{
+            'id': f'sb-{number}', 'user_id': self.user.id, 'invoice_number': f'INV-S-{number:04d}',
+            'client_name': 'Client', 'client_email': 'client@example.com', 'status': status,
+            'total_amount': 1180.0, 'issue_date': (today - timedelta(days=60)).isoformat(),
+            'due_date': (today + timedelta(days=due)).isoformat(), 'created_at': now, 'updated_at': now,
+        } for number, (status, due) in enumerate((('pending', -10), ('overdue', -40), ('paid', -5), ('pending', 3)))]
+        self.items = [{'id': f'item-{row["id"]}', 'invoice_id': row['id'], 'description': 'Design',
+                       'quantity': 1, 'unit_price': 1000.0, 'amount': 1000.0} for row in self.invoices]
+
+    def test_sections_from_few_round_trips(self):
+        supabase = FakeSupabase(CallLog(), self.invoices, self.items)
+        # Small pages so the open invoices take more than one
+        with fake_services(supabase) as calls, mock.patch.object(dashboard, 'SUPABASE_PAGE', 2):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['summary']['total_invoices'], 4)
+        self.assertEqual([len(invoice['items']) for invoice in data['recent']], [1, 1, 1, 1])
+        self.assertEqual(data['overdue'], {'overdue': 1, 'past_due': 2, 'due_soon': 1})
+        self.assertEqual(data['aging']['overall']['invoices'], 3)
+        self.assertEqual(timing_names(response), ['summary', 'recent', 'open', 'overdue', 'aging', 'total'])
+
+        # The watermark, the summary, the recent invoices and all their items at once, then two pages of open ones
+        item_reads = [call for service, call in calls if 'table invoice_items' in call]
+        self.assertEqual(len(item_reads), 1)
+        open_pages = [call for service, call in calls if 'status=in.' in call]
+        self.assertEqual(len(open_pages), 2)
@@ -0,0 +1,50 @@
+"""
+Database settings
+DATABASES['default'] from DATABASE_URL, DB_ENGINE with the DB_* variables, or the development SQLite file
+(hisabpro/database.py)
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from hisabpro.database import database_config
+
+
+def settings_from(environ):
+    """A stand-in for python-decouple's ``config`` reading ``environ``"""
+    def config(name, default=None, cast=None):
+        value = environ.get(name, default)
+        return cast(value) if cast is not None and isinstance(value, str) else value
+    return config
+
+
+class DatabaseConfigTests(SimpleTestCase):
+
+    def test_sqlite_unless_told_otherwise(self):
+        # A .env written for psql or docker-compose sets DB_HOST without meaning Django should use it
+        for environ in ({}, {'DB_HOST': 'localhost', 'DB_NAME': 'hisabpro'}, {'DB_ENGINE': 'sqlite'}):
+            with self.subTest(environ=environ):
+                self.assertEqual(database_config(settings_from(environ), 'dev.sqlite3'),
+                                 {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'dev.sqlite3'})
+
+    def test_db_engine_selects_the_db_variables(self):
+        database = database_config(settings_from({
+            'DB_ENGINE': 'postgresql', 'DB_HOST': 'db', 'DB_USER': 'hisabpro', 'DB_PASSWORD': 'secret',
+        }), 'dev.sqlite3')
+        self.assertEqual(
+            {key: database[key] for key in ('ENGINE', 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')},
+            {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'hisabpro', 'USER': 'hisabpro',
+             'PASSWORD': 'secret', 'HOST': 'db', 'PORT': '5432'},
+        )
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+
+    def test_database_url_wins(self):
+        database = database_config(settings_from({
+            'DATABASE_URL': 'postgres://app:pw@primary:6432/books?sslmode=require', 'DB_ENGINE': 'sqlite',
+        }), 'dev.sqlite3')
+        self.assertEqual((database['HOST'], database['PORT'], database['NAME']), ('primary', '6432', 'books'))
+        self.assertEqual(database['OPTIONS']['sslmode'], 'require')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_config(settings_from({'DB_ENGINE': 'mysql'}), 'dev.sqlite3')
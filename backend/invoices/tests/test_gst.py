@@ -0,0 +1,157 @@
+"""
+GST
+The CGST/SGST vs IGST split, cess and per-line rates (gst.py), and the GSTR-1 sections built on them (gstr.py)
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from invoices.gst import is_inter_state, split_tax, validate_gstin
+from invoices.gstr import GSTR1Report
+from invoices.models import Invoice, InvoiceItem
+from invoices.money import Money
+
+SELLER_GSTIN = '27AAPFU0939F1ZV'  # Maharashtra
+BUYER_GSTIN = '29AAGCB7383J1Z4'  # Karnataka
+LOCAL_BUYER_GSTIN = '27AAGCB7383J1Z6'
+
+
+class SplitTaxTests(SimpleTestCase):
+
+    def test_intra_state_is_half_cgst_half_sgst(self):
+        split = split_tax(Money(100000), Decimal('18'))
+        self.assertEqual((split.cgst, split.sgst, split.igst), (Money(9000), Money(9000), Money(0)))
+        self.assertEqual(split.tax, Money(18000))
+
+    def test_inter_state_is_igst(self):
+        split = split_tax(Money(100000), Decimal('18'), inter_state=True)
+        self.assertEqual((split.cgst, split.sgst, split.igst), (Money(0), Money(0), Money(18000)))
+
+    def test_each_half_rounds_to_the_paisa(self):
+        # 9% of 1.05 is 0.0945, so each half rounds down and together they are a paisa under 18% in one
+        split = split_tax(Money(105), Decimal('18'))
+        self.assertEqual((split.cgst, split.sgst), (Money(9), Money(9)))
+        self.assertEqual(split_tax(Money(105), Decimal('18'), inter_state=True).igst, Money(19))
+
+    def test_cess_is_on_top_of_either_split(self):
+        for inter_state in (False, True):
+            split = split_tax(Money(100000), Decimal('28'), cess_rate=Decimal('12'), inter_state=inter_state)
+            self.assertEqual(split.cess, Money(12000))
+            self.assertEqual(split.tax, Money(40000))
+
+    def test_which_states(self):
+        self.assertTrue(is_inter_state('27', '29'))
+        self.assertFalse(is_inter_state('27', '27'))
+        # An unknown seller or place of supply is treated as intra-state
+        self.assertFalse(is_inter_state('', '29'))
+        self.assertFalse(is_inter_state('27', ''))
+
+    def test_gstin_validation(self):
+        self.assertIsNone(validate_gstin(SELLER_GSTIN))
+        self.assertIsNotNone(validate_gstin('27AAPFU0939F1Z'))
+        self.assertEqual(validate_gstin('25AAPFU0939F1ZV'), 'Unknown GST state code 25.')
+
+
+class GSTTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('gst-seller')
+        self.user.userprofile.gst_number = SELLER_GSTIN
+        self.user.userprofile.save()
+        self.count = 0
+
+    def invoice(self, lines, place_of_supply='', client_gstin='', issue_date=date(2024, 4, 10), status='pending'):
+        self.count += 1
+        invoice = Invoice.objects.create(
+            user=self.user, invoice_number=f'INV-G-{self.count:04d}', client_name=f'Client {self.count}',
+            client_email='client@example.com', client_gstin=client_gstin, place_of_supply=place_of_supply,
+            issue_date=issue_date, due_date=date(2024, 5, 31), status=status,
+        )
+        for unit_price, rate, cess_rate, *hsn_sac in lines:
+            InvoiceItem.objects.create(
+                invoice=invoice, description='Goods', hsn_sac=hsn_sac[0] if hsn_sac else '998314',
+                quantity=Decimal('1'), unit_price=Decimal(unit_price), gst_rate=Decimal(rate),
+                cess_rate=Decimal(cess_rate),
+            )
+        invoice.refresh_from_db()
+        return invoice
+
+
+class InvoiceTaxTests(GSTTestCase):
+
+    def test_intra_state_invoice(self):
+        invoice = self.invoice([('1000.00', '18', '0')], place_of_supply='27')
+        self.assertEqual((invoice.tax_amount, invoice.total_amount), (Decimal('180.00'), Decimal('1180.00')))
+
+    def test_inter_state_invoice_with_mixed_rates_and_cess(self):
+        invoice = self.invoice([('1000.00', '18', '0'), ('1000.00', '28', '12')], place_of_supply='29')
+        # 180 + 280 IGST, 120 cess
+        self.assertEqual(invoice.tax_amount, Decimal('580.00'))
+        self.assertEqual(invoice.total_amount, Decimal('2580.00'))
+
+
+class GSTR1Tests(GSTTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.invoice([('1000.00', '18', '0')], place_of_supply='29', client_gstin=BUYER_GSTIN)
+        self.invoice([('1000.00', '28', '12')], place_of_supply='27', client_gstin=LOCAL_BUYER_GSTIN)
+        # Unregistered, in the seller's state: one with the state left blank, folded into the other
+        self.invoice([('500.00', '18', '0')])
+        self.invoice([('1500.00', '18', '0')], place_of_supply='27')
+        # Unregistered, another state, under the B2CL threshold
+        self.invoice([('2000.00', '12', '0', '8471')], place_of_supply='29')
+        # Unregistered, another state, over the threshold
+        self.invoice([('100000.00', '18', '0', '8471')], place_of_supply='07')
+        # Neither cancelled invoices nor ones outside the period are reported
+        self.invoice([('9999.00', '18', '0')], place_of_supply='27', status='cancelled')
+        self.invoice([('9999.00', '18', '0')], place_of_supply='27', issue_date=date(2024, 5, 1))
+        self.report = GSTR1Report(self.user, date(2024, 4, 1), date(2024, 4, 30))
+
+    def test_b2b(self):
+        rows = list(self.report.b2b())
+        self.assertEqual([(row['gstin'], row['place_of_supply']) for row in rows],
+                         [(BUYER_GSTIN, '29-Karnataka'), (LOCAL_BUYER_GSTIN, '27-Maharashtra')])
+        self.assertEqual((rows[0]['igst'], rows[0]['cgst'], rows[0]['sgst']), ('180.00', '0.00', '0.00'))
+        self.assertEqual((rows[1]['igst'], rows[1]['cgst'], rows[1]['sgst'], rows[1]['cess']),
+                         ('0.00', '140.00', '140.00', '120.00'))
+        self.assertEqual(rows[1]['invoice_value'], '1400.00')
+
+    def test_b2cl(self):
+        (row,) = self.report.b2cl()
+        self.assertEqual((row['place_of_supply'], row['invoice_value'], row['igst']),
+                         ('07-Delhi', '118000.00', '18000.00'))
+
+    def test_b2cs_groups_by_state_and_rate(self):
+        rows = [(row['place_of_supply'], row['rate'], row['taxable_value'], row['cgst'], row['sgst'], row['igst'])
+                for row in self.report.b2cs()]
+        self.assertEqual(rows, [
+            ('27-Maharashtra', '18.00', '2000.00', '180.00', '180.00', '0.00'),
+            ('29-Karnataka', '12.00', '2000.00', '0.00', '0.00', '240.00'),
+        ])
+
+    def test_hsn(self):
+        rows = {(row['hsn_sac'], row['rate']): row for row in self.report.hsn()}
+        self.assertEqual(sorted(rows), [('8471', '12.00'), ('8471', '18.00'), ('998314', '18.00'),
+                                        ('998314', '28.00')])
+        services = rows['998314', '18.00']
+        self.assertEqual((services['items'], services['quantity'], services['taxable_value']), (3, '3.00', '3000.00'))
+        self.assertEqual((services['igst'], services['cgst'], services['sgst']), ('180.00', '180.00', '180.00'))
+
+    def test_summary_totals(self):
+        summary = self.report.summary()
+        self.assertEqual(summary['b2b'], {
+            'rows': 2, 'taxable_value': '2000.00', 'igst': '180.00', 'cgst': '140.00', 'sgst': '140.00',
+            'cess': '120.00',
+        })
+        self.assertEqual(summary['b2cs'], {
+            'rows': 2, 'taxable_value': '4000.00', 'igst': '240.00', 'cgst': '180.00', 'sgst': '180.00',
+            'cess': '0.00',
+        })
+        self.assertEqual(summary['b2cl']['rows'], 1)
+        # Every supply in the period is in the HSN summary once
+        self.assertEqual(summary['hsn']['taxable_value'], '106000.00')
+        self.assertEqual(summary['hsn']['igst'], '18420.00')
@@ -0,0 +1,118 @@
+"""
+Bulk invoice import
+Runs CSV and JSON Lines files through the resumable importer the import jobs use (importer.py)
+"""
+
+import os
+import tempfile
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import TestCase
+
+from invoices.importer import run_job
+from invoices.models import ImportJob, Invoice, InvoiceItem, InvoiceNumberSequence
+
+HEADER = 'invoice_ref,invoice_number,client_name,client_email,issue_date,description,quantity,unit_price,gst_rate\n'
+
+
+def _row(ref, number='', email='client@example.com', issue_date='2024-04-01', unit_price='500.00'):
+    return f'{ref},{number},Client {ref},{email},{issue_date},Design,2,{unit_price},18\n'
+
+
+class ImporterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('import-owner')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def job(self, content, file_format='csv', **fields):
+        path = os.path.join(self.directory, f'source.{file_format}')
+        with open(path, 'w') as fileobj:
+            fileobj.write(content)
+        return ImportJob.objects.create(user=self.user, source_path=path, format=file_format, **fields)
+
+    def errors(self, job):
+        return {error['record']: error['error'] for error in job.errors}
+
+    def test_malformed_rows_are_reported_and_the_rest_imported(self):
+        job = run_job(self.job(
+            HEADER + _row('a') + _row('b', email='nobody') + _row('c', issue_date='31/13/2024')
+            + _row('d', unit_price='12.345') + _row('e')
+        ))
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual((job.invoices_created, job.items_created, job.error_count), (2, 2, 3))
+        self.assertEqual(self.errors(job), {
+            2: 'client_email is not a valid email address',
+            3: 'issue_date is not a valid date',
+            4: 'item 1: unit_price must have at most 2 decimal places',
+        })
+        self.assertEqual(Invoice.objects.get(client_name='Client a').total_amount, 1180)
+
+    def test_malformed_json_lines(self):
+        job = run_job(self.job(
+            '{"client_name": "Client", "client_email": "client@example.com", "issue_date": "2024-04-01", '
+            '"items": [{"description": "Design", "unit_price": "100"}]}\n'
+            'not json\n'
+            '["a list"]\n'
+            '{"client_name": "No items", "client_email": "client@example.com", "issue_date": "2024-04-01"}\n',
+            file_format='jsonl',
+        ))
+        self.assertEqual(job.invoices_created, 1)
+        errors = self.errors(job)
+        self.assertTrue(errors[2].startswith('invalid JSON'))
+        self.assertEqual(errors[3], 'each line must be a JSON object')
+        self.assertEqual(errors[4], 'invoice has no line items')
+
+    def test_duplicate_invoice_numbers(self):
+        Invoice.objects.create(
+            user=self.user, invoice_number='IMP-0001', client_name='Existing', client_email='client@example.com',
+            issue_date=date(2024, 4, 1), due_date=date(2024, 5, 1),
+        )
+        job = run_job(self.job(HEADER + _row('a', 'IMP-0001') + _row('b', 'IMP-0002') + _row('c', 'IMP-0002')))
+        self.assertEqual(job.invoices_created, 1)
+        self.assertEqual(self.errors(job), {
+            1: 'invoice_number IMP-0001 already exists',
+            3: 'invoice_number IMP-0002 already exists',
+        })
+
+    def test_imported_numbers_move_the_sequence_past_them(self):
+        self.assertEqual(InvoiceNumberSequence.reserve(self.user, 1), 1)
+        imported = Invoice.format_invoice_number(self.user, 50)
+        job = run_job(self.job(HEADER + _row('a', imported) + _row('b')))
+        self.assertEqual(job.invoices_created, 2)
+        # The unnumbered invoice in the same chunk already skips the imported number
+        self.assertEqual(Invoice.objects.get(client_name='Client b').invoice_number,
+                         Invoice.format_invoice_number(self.user, 51))
+        self.assertEqual(InvoiceNumberSequence.reserve(self.user, 1), 52)
+
+    def test_resuming_skips_committed_records(self):
+        job = run_job(self.job(HEADER + _row('a') + _row('b') + _row('c'), committed_records=2))
+        self.assertEqual(job.committed_records, 3)
+        self.assertEqual(list(Invoice.objects.values_list('client_name', flat=True)), ['Client c'])
+
+    def test_a_chunk_the_database_rejects_is_reported_and_passed(self):
+        job = self.job(HEADER + _row('a') + _row('b') + _row('c'), chunk_size=1)
+        bulk_create = Invoice.objects.bulk_create
+
+        def reject_b(invoices, *args, **kwargs):
+            if invoices[0].client_name == 'Client b':
+                raise IntegrityError('duplicate key value')
+            return bulk_create(invoices, *args, **kwargs)
+
+        with mock.patch.object(Invoice.objects, 'bulk_create', side_effect=reject_b):
+            with self.assertLogs('invoices.importer', 'ERROR'):
+                job = run_job(job)
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual((job.committed_records, job.invoices_created, job.items_created), (3, 2, 2))
+        self.assertEqual(self.errors(job), {2: 'could not be saved: duplicate key value'})
+        self.assertEqual(sorted(Invoice.objects.values_list('client_name', flat=True)), ['Client a', 'Client c'])
+        self.assertEqual(InvoiceItem.objects.count(), 2)
+
+        # A resume has nothing left to retry
+        job = run_job(job)
+        self.assertEqual(Invoice.objects.count(), 2)
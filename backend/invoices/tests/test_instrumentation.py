@@ -0,0 +1,126 @@
+"""
+Request instrumentation
+Per-request query, upstream and cache totals reported as Server-Timing and in the request log
+(hisabpro/instrumentation.py, hisabpro/middleware.py)
+"""
+
+import contextvars
+import json
+import threading
+
+from django.contrib.auth.models import User
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from hisabpro import instrumentation
+from hisabpro.instrumentation import Traced, server_timing, span
+from invoices import services
+
+from .fakes import CallLog, FakeSupabase, fake_services
+
+
+def timings(response):
+    """{metric: (duration or None, description or None)} from a Server-Timing header"""
+    found = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        values = dict(param.split('=', 1) for param in params)
+        found[name] = (values.get('dur'), values.get('desc', '').strip('"') or None)
+    return found
+
+
+class SpanTests(SimpleTestCase):
+
+    def setUp(self):
+        token = instrumentation.start()
+        self.addCleanup(instrumentation.finish, token)
+        self.trace = instrumentation.current()
+
+    def test_nested_spans_of_one_service_count_once(self):
+        with span('supabase'):
+            with span('supabase'):
+                pass
+        with span('smtp'):
+            pass
+        self.assertEqual({name: calls for name, (calls, _) in self.trace.spans.items()}, {'supabase': 1, 'smtp': 1})
+
+    def test_threads_share_the_trace_they_were_started_with(self):
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(self.work,))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.trace.spans['supabase'][0], 1)
+
+    def work(self):
+        with span('supabase'):
+            pass
+
+    def test_traced_proxies_method_calls(self):
+        class Service:
+            table = 'invoices'
+
+            def fetch(self):
+                return 'rows'
+
+        traced = Traced(Service(), 'supabase')
+        self.assertEqual(traced.fetch(), 'rows')
+        self.assertEqual(traced.table, 'invoices')
+        self.assertEqual(self.trace.spans['supabase'][0], 1)
+
+    def test_server_timing_format(self):
+        self.assertEqual(server_timing({'db': 1.5, 'cache': None}, {'db': '2 queries', 'cache': '1 hits 0 misses'}),
+                         'db;dur=1.5;desc="2 queries", cache;desc="1 hits 0 misses"')
+
+
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('timing-owner')
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_every_response_reports_its_queries_and_total(self):
+        with fake_services():
+            response = self.client.get(reverse('invoice-list-create'))
+        found = timings(response)
+        self.assertEqual(list(found)[0], 'db')
+        self.assertRegex(found['db'][1], r'^\d+ queries$')
+        self.assertIn('app', found)
+        self.assertIsNotNone(found['render'][0])
+
+    def test_upstream_calls_are_reported_by_service(self):
+        supabase = FakeSupabase(CallLog())
+        with fake_services(supabase):
+            # As services.py wraps the real client
+            services.supabase_service._wrapped = Traced(supabase, 'supabase')
+            response = self.client.get(reverse('supabase-invoice-list-create'))
+        self.assertEqual(response.status_code, 200)
+        found = timings(response)
+        self.assertIsNotNone(found['supabase'][0])
+        self.assertRegex(found['supabase'][1], r'^\d+ call\(s\)$')
+        self.assertIn('serialize', found)
+
+    def test_view_timings_come_first(self):
+        response = self.client.get(reverse('invoice-dashboard'))
+        names = list(timings(response))
+        self.assertEqual(names[:5], ['summary', 'recent', 'overdue', 'aging', 'total'])
+        self.assertIn('db', names[5:])
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_header_can_be_turned_off(self):
+        self.assertFalse(self.client.get(reverse('invoice-list-create')).has_header('Server-Timing'))
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('hisabpro.middleware', 'WARNING') as logs:
+            self.client.get(reverse('invoice-list-create'))
+        line = json.loads(logs.records[0].getMessage().split(' ', 2)[2])
+        self.assertEqual((line['path'], line['status'], line['user']), ('/api/invoices/', 200, self.user.pk))
+        self.assertEqual(len(line['queries']), line['db_queries'])
+        self.assertTrue(all('sql' in query for query in line['queries']))
+
+    @override_settings(PERF_LOG_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_logged_without_sql(self):
+        with self.assertLogs('hisabpro.middleware', 'INFO') as logs:
+            self.client.get(reverse('invoice-list-create'))
+        line = json.loads(logs.records[0].getMessage().split(' ', 1)[1])
+        self.assertNotIn('queries', line)
@@ -0,0 +1,103 @@
+"""
+Local Supabase stand-in
+The SQLite-backed supabase_service used offline: query builder, schema defaults and triggers, round-trip counts
+and injected latency (local_supabase.py)
+"""
+
+import asyncio
+import time
+
+from django.test import SimpleTestCase
+
+from invoices.local_supabase import LocalSupabase
+
+
+class LocalSupabaseTests(SimpleTestCase):
+
+    def setUp(self):
+        self.supabase = LocalSupabase(path=':memory:', latency=0, jitter=0)
+        self.supabase.connect()
+        self.supabase.load('invoices', [{
+            'id': f'inv-{number}', 'user_id': 1 if number < 3 else 2, 'invoice_number': f'INV-L-{number:04d}',
+            'status': status, 'total_amount': 1180.5, 'due_date': f'2024-05-0{number + 1}',
+            'created_at': f'2024-04-0{number + 1}T00:00:00.000000+00:00',
+            'updated_at': f'2024-04-0{number + 1}T00:00:00.000000+00:00',
+        } for number, status in enumerate(('pending', 'paid', 'overdue', 'pending'))])
+        self.supabase.reset_round_trips()
+
+    def test_query_builder(self):
+        query = (self.supabase.client.table('invoices').select('id,status', count='exact')
+                 .eq('user_id', 1).in_('status', ['pending', 'overdue']).order('due_date', desc=True).range(0, 0))
+        result = query.execute()
+        self.assertEqual(result.data, [{'id': 'inv-2', 'status': 'overdue'}])
+        self.assertEqual(result.count, 2)
+        keyset = self.supabase.client.table('invoices').select('id').gte('updated_at', '2024-04-02') \
+            .or_('id.gt.inv-2,updated_at.gt.2024-04-04').order('id').execute()
+        self.assertEqual([row['id'] for row in keyset.data], ['inv-3'])
+        self.assertEqual(self.supabase.reset_round_trips(), {'select invoices': 2})
+
+    def test_unknown_tables_and_columns_are_refused(self):
+        with self.assertRaises(ValueError):
+            self.supabase.client.table('payments')
+        with self.assertRaises(ValueError):
+            self.supabase.client.table('invoices').eq('amount', 1)
+        with self.assertRaises(ValueError):
+            self.supabase.client.table('invoices').select('id; DROP TABLE invoices')
+
+    def test_service_interface(self):
+        self.assertEqual([row['id'] for row in self.supabase.get_user_invoices(1, limit=2)], ['inv-2', 'inv-1'])
+        self.assertEqual(self.supabase.get_invoice('inv-0')['status'], 'pending')
+        self.assertIsNone(self.supabase.get_invoice('missing'))
+        summary = self.supabase.get_invoice_summary(1)
+        self.assertEqual((summary['total_invoices'], summary['paid_invoices']), (3, 1))
+        self.assertEqual(str(summary['total_amount']), '3541.50')
+        self.assertEqual(self.supabase.reset_round_trips(),
+                         {'get_user_invoices': 1, 'get_invoice': 2, 'get_invoice_summary': 1})
+
+    def test_item_changes_touch_the_invoice(self):
+        before = self.supabase.get_invoice('inv-0')['updated_at']
+        item_id = self.supabase.create_invoice_item({'invoice_id': 'inv-0', 'description': 'Design',
+                                                     'quantity': 3, 'unit_price': 100.1})
+        self.assertEqual(self.supabase.get_invoice_items('inv-0')[0]['total'], 300.3)
+        touched = self.supabase.get_invoice('inv-0')['updated_at']
+        self.assertGreater(touched, before)
+        self.assertTrue(self.supabase.delete_invoice_item(item_id))
+        self.assertEqual(self.supabase.get_invoice_items('inv-0'), [])
+
+    def test_updates_stamp_and_deletes_leave_tombstones(self):
+        invoice_id = self.supabase.create_invoice({'user_id': 1, 'invoice_number': 'INV-L-NEW', 'unknown': 'ignored'})
+        self.supabase.create_invoice_item({'invoice_id': invoice_id, 'description': 'Design', 'quantity': 1,
+                                           'unit_price': 10})
+        created = self.supabase.get_invoice(invoice_id)
+        self.assertEqual(created['status'], 'pending')
+
+        self.assertTrue(self.supabase.update_invoice(invoice_id, {'status': 'paid', 'id': 'hijacked'}))
+        updated = self.supabase.get_invoice(invoice_id)
+        self.assertEqual(updated['status'], 'paid')
+        self.assertGreater(updated['updated_at'], created['updated_at'])
+        self.assertFalse(self.supabase.update_invoice('missing', {'status': 'paid'}))
+
+        self.assertTrue(self.supabase.delete_invoice(invoice_id))
+        self.assertFalse(self.supabase.delete_invoice(invoice_id))
+        self.assertEqual(self.supabase.get_invoice_items(invoice_id), [])
+        tombstones = self.supabase.client.table('invoice_tombstones').select('*').execute().data
+        self.assertEqual([(row['invoice_id'], row['invoice_number']) for row in tombstones],
+                         [(invoice_id, 'INV-L-NEW')])
+
+    def test_every_round_trip_waits_out_the_latency(self):
+        self.supabase.latency = 0.05
+        started = time.perf_counter()
+        self.supabase.get_invoice('inv-0')
+        self.supabase.client.table('invoices').select('id').execute()
+        self.assertGreaterEqual(time.perf_counter() - started, 0.1)
+        # Seeding and clearing are not round trips
+        self.supabase.clear()
+        self.assertEqual(sum(self.supabase.reset_round_trips().values()), 2)
+
+    def test_async_select_reads_postgrest_parameters(self):
+        rows, total = asyncio.run(self.supabase.select('invoices', {
+            'select': 'id', 'user_id': 'eq.1', 'status': 'in.(pending,paid)', 'order': 'created_at.desc',
+            'limit': 1, 'offset': 1,
+        }, count=True))
+        self.assertEqual((rows, total), ([{'id': 'inv-0'}], 2))
+        self.assertEqual(self.supabase.reset_round_trips(), {'GET invoices': 1})
@@ -0,0 +1,60 @@
+"""
+Metrics endpoint access
+/metrics exposes per-view traffic and error counts, so outside DEBUG it needs METRICS_TOKEN (hisabpro/metrics.py)
+"""
+
+import os
+import runpy
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from hisabpro import metrics
+
+
+class MetricsAccessTests(TestCase):
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='')
+    def test_refused_in_production_without_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='scrape-me')
+    def test_the_token_is_required_when_set(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN='')
+    def test_open_in_development_without_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class WorkerExitTests(SimpleTestCase):
+
+    def test_an_exited_worker_takes_its_live_gauges_with_it(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name in ('gauge_livesum_4242.db', 'gauge_all_4242.db', 'counter_4242.db', 'gauge_livesum_4343.db'):
+            open(os.path.join(directory.name, name), 'w').close()
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory.name}):
+            metrics.child_exit(None, SimpleNamespace(pid=4242))
+        self.assertEqual(sorted(os.listdir(directory.name)),
+                         ['counter_4242.db', 'gauge_all_4242.db', 'gauge_livesum_4343.db'])
+
+    def test_single_process_mode_has_nothing_to_clean(self):
+        with mock.patch.dict(os.environ), mock.patch.object(metrics.multiprocess, 'mark_process_dead') as mark:
+            os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+            metrics.child_exit(None, SimpleNamespace(pid=4242))
+        mark.assert_not_called()
+
+    def test_both_gunicorn_configs_install_the_hook(self):
+        for name in ('gunicorn.conf.py', 'gunicorn_asgi.py'):
+            with self.subTest(config=name):
+                namespace = runpy.run_path(str(settings.BASE_DIR / name))
+                self.assertIs(namespace['child_exit'], metrics.child_exit)
+                # Gunicorn would take a module-level ``config`` for its own -c setting and refuse to start
+                self.assertNotIn('config', namespace)
@@ -0,0 +1,101 @@
+"""
+Money
+The integer-paise amount type every backend reads and writes through (money.py), and its serializer field
+"""
+
+from decimal import Decimal
+
+from bson.int64 import Int64
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from invoices.money import Money
+from invoices.serializers import MoneyField
+
+
+class MoneyTests(SimpleTestCase):
+
+    def test_parsing(self):
+        self.assertEqual(Money.parse('1,180.50'), Money(118050))
+        self.assertEqual(Money.parse('₹ 99'), Money(9900))
+        self.assertEqual(Money.parse('-0.5'), Money(-50))
+        self.assertEqual(Money.parse(''), Money(0))
+        self.assertEqual(Money.parse('1e3'), Money(100000))
+        with self.assertRaises(ValueError):
+            Money.parse('twelve')
+
+    def test_rupees_round_half_up_to_the_paisa(self):
+        self.assertEqual(Money.from_decimal(Decimal('0.005')), Money(1))
+        self.assertEqual(Money.from_decimal(Decimal('0.004')), Money(0))
+        self.assertEqual(Money.from_decimal(Decimal('-0.005')), Money(-1))
+        self.assertEqual(Money.parse('10.125'), Money(1013))
+        self.assertEqual(Money.from_decimal(None), Money(0))
+
+    def test_from_rupees(self):
+        self.assertEqual(Money.from_rupees(12), Money(1200))
+        # The float's shortest repr, not its binary expansion
+        self.assertEqual(Money.from_rupees(0.1 + 0.2), Money(30))
+        self.assertEqual(Money.from_rupees(1180.5), Money(118050))
+        self.assertEqual(Money.from_rupees(Decimal('1180.50')), Money(118050))
+        self.assertEqual(Money.from_rupees('1,180.50'), Money(118050))
+
+    def test_from_bson(self):
+        # Int64 is paise; a plain number is a legacy rupee amount
+        self.assertEqual(Money.from_bson(Int64(118050)), Money(118050))
+        self.assertEqual(Money.from_bson(1180.5), Money(118050))
+        self.assertEqual(Money.from_bson(1180), Money(118000))
+        self.assertEqual(Money.from_bson(None), Money(0))
+        self.assertIsInstance(Money(118050).to_bson(), Int64)
+        self.assertEqual(Money.from_bson(Money(118050).to_bson()), Money(118050))
+
+    def test_percent_rounds_half_up(self):
+        self.assertEqual(Money(100000).percent(18), Money(18000))
+        self.assertEqual(Money(1005).percent(Decimal('2.5')), Money(25))
+        self.assertEqual(Money(1020).percent(Decimal('2.5')), Money(26))
+        self.assertEqual(Money(-1020).percent(Decimal('2.5')), Money(-26))
+        self.assertEqual(Money(999).percent('0.1'), Money(1))
+
+    def test_times(self):
+        self.assertEqual(Money(333).times(3), Money(999))
+        self.assertEqual(Money(333).times(Decimal('1.5')), Money(500))
+        self.assertEqual(Money(100).times(Decimal('0.005')), Money(1))
+
+    def test_arithmetic(self):
+        self.assertEqual(Money(150) + Money(50), Money(200))
+        self.assertEqual(Money(150) - Money(200), Money(-50))
+        self.assertEqual(-Money(150), Money(-150))
+        self.assertEqual(Money(150) * 3, 3 * Money(150))
+        self.assertEqual(sum([Money(1), Money(2)]), Money(3))
+        self.assertEqual(Money.sum([Money(1), Money(2), Money(3)]), Money(6))
+        self.assertLess(Money(1), Money(2))
+        self.assertFalse(Money(0))
+        with self.assertRaises(TypeError):
+            Money(1) + 1
+        with self.assertRaises(TypeError):
+            Money(1) * Decimal('1.5')
+
+    def test_conversions(self):
+        self.assertEqual(Money(118050).to_decimal(), Decimal('1180.50'))
+        self.assertEqual(Money(118050).to_json(), 1180.5)
+        self.assertEqual(str(Money(-5)), '-0.05')
+        self.assertEqual(f'{Money(118050):,.2f}', '1,180.50')
+
+
+class MoneyFieldTests(SimpleTestCase):
+
+    def test_valid_amounts(self):
+        self.assertEqual(MoneyField().to_internal_value('1,180.50'), Money(118050))
+        self.assertEqual(MoneyField().to_internal_value(1180.5), Money(118050))
+
+    def test_invalid_amounts_are_validation_errors(self):
+        for value in ('twelve', 'Infinity', '-Infinity', 'NaN', float('inf'), [1]):
+            with self.subTest(value=value), self.assertRaises(ValidationError):
+                MoneyField().to_internal_value(value)
+
+    def test_min_value(self):
+        with self.assertRaises(ValidationError):
+            MoneyField(min_value=0).to_internal_value('-1')
+
+    def test_representation(self):
+        self.assertEqual(MoneyField().to_representation(Decimal('1180.5')), '1180.50')
+        self.assertEqual(MoneyField(coerce_to_string=False).to_representation(Money(118050)), 1180.5)
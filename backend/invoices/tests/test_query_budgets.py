@@ -0,0 +1,318 @@
+"""
+Per-endpoint query budgets
+Calls every route in invoices/urls.py and auth_app/urls.py against a fixed seeded dataset and fails when one
+runs more SQL queries, or more Supabase, MongoDB, Razorpay, Celery or email calls, than its declared budget
+
+Budgets are ceilings, not targets: lower one when a change makes an endpoint cheaper. Raising one should come
+with a reason in the commit, since that is usually an N+1 creeping in.
+"""
+
+import importlib.util
+import io
+import re
+from collections import Counter
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from auth_app import urls as auth_urls
+from invoices import urls as invoice_urls
+from invoices.models import ImportJob
+
+from .fakes import CallLog, FakeSupabase, fake_services
+
+PASSWORD = 'bench-password'
+
+# The template PDF view renders with WeasyPrint when it is installed and serves the HTML otherwise
+WEASYPRINT = importlib.util.find_spec('weasyprint') is not None
+
+# Transaction bookkeeping inside the test's own transaction, not work the endpoint asked for
+IGNORED_SQL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class Endpoint:
+    """One request to budget: ``kwargs``, ``data`` and ``params`` may be callables taking the test case"""
+
+    def __init__(self, name, method='get', queries=0, calls=None, kwargs=None, data=None, params=None,
+                 user='owner', multipart=False, content_type=None):
+        self.name = name
+        self.method = method
+        self.queries = queries
+        self.calls = calls or {}
+        self.kwargs = kwargs
+        self.data = data
+        self.params = params
+        self.user = user
+        self.multipart = multipart
+        # Checked so a budget measures the response the endpoint is for, not an error page or fallback
+        self.content_type = content_type
+
+    def __str__(self):
+        return f'{self.method.upper()} {self.name}'
+
+
+def _resolve(value, case):
+    return value(case) if callable(value) else value
+
+
+def _invoice_id(case):
+    return {'invoice_id': case.invoice.id}
+
+
+def _supabase_id(case):
+    return {'invoice_id': str(case.invoice.id)}
+
+
+NEW_INVOICE = {
+    'client_name': 'Budget Client', 'client_email': 'budget@example.com',
+    'issue_date': date(2024, 4, 1).isoformat(), 'due_date': date(2024, 5, 1).isoformat(),
+    'items': [
+        {'description': 'Design', 'quantity': '2', 'unit_price': '1500.00'},
+        {'description': 'Hosting', 'quantity': '1', 'unit_price': '999.00'},
+    ],
+}
+
+ENDPOINTS = [
+    # Django ORM invoices
+    Endpoint('invoice-list-create', queries=5),
+    Endpoint('invoice-list-create', 'post', queries=10, data=NEW_INVOICE),
+    Endpoint('invoice-detail', queries=5, kwargs=lambda case: {'pk': case.invoice.id}),
+    Endpoint('invoice-detail', 'patch', queries=10, kwargs=lambda case: {'pk': case.invoice.id},
+             data={'notes': 'Updated', 'items': NEW_INVOICE['items']}),
+    Endpoint('invoice-detail', 'delete', queries=11, kwargs=lambda case: {'pk': case.invoice.id}),
+    Endpoint('invoice-summary', queries=3),
+    Endpoint('invoice-dashboard', queries=8),
+    Endpoint('generate-razorpay-link', 'post', queries=4, calls={'razorpay': 2}, kwargs=_invoice_id),
+    Endpoint('download-pdf', queries=3, kwargs=_invoice_id, content_type='application/pdf'),
+    Endpoint('send-reminder', 'post', queries=4, calls={'email': 1}, kwargs=_invoice_id, data={}),
+    Endpoint('mark-as-paid', 'post', queries=8, kwargs=_invoice_id),
+    Endpoint('recent-invoices', queries=5),
+    Endpoint('invoice-changes', queries=5),
+    Endpoint('invoice-batch', 'post', queries=9, data=lambda case: {'invoices': [
+        NEW_INVOICE, {'id': str(case.invoice.id), 'notes': 'Batch update'},
+    ]}),
+    Endpoint('invoice-batch-status', 'post', queries=3, data=lambda case: {
+        'status': 'cancelled', 'ids': [str(case.invoice.id)],
+    }),
+    Endpoint('gstr1-report', queries=5, params={'from': '2000-01-01'}),
+    Endpoint('invoice-aging', queries=2),
+    Endpoint('revenue-timeseries', queries=2),
+    Endpoint('invoice-import', 'post', queries=2, calls={'celery': 1}, multipart=True, data=lambda case: {
+        'file': SimpleUploadedFile('invoices.csv', b'invoice_number,client_name\n'),
+    }),
+    Endpoint('invoice-import-detail', queries=2, kwargs=lambda case: {'job_id': case.import_job.id}),
+    Endpoint('invoice-import-resume', 'post', queries=2, calls={'celery': 1},
+             kwargs=lambda case: {'job_id': case.import_job.id}),
+    Endpoint('invoice-export', queries=2, kwargs={'file_type': 'csv'}),
+    Endpoint('razorpay-webhook', 'post', queries=9, calls={'razorpay': 1, 'email': 1}, user=None,
+             data=lambda case: {'event': 'payment.captured', 'payload': {'payment': {'entity': {
+                 'id': 'pay_budget000001', 'order_id': case.invoice.razorpay_order_id,
+                 'amount': 100000, 'status': 'captured',
+             }}}}),
+    Endpoint('single-flight-metrics', queries=1, user='admin'),
+
+    # Supabase invoices
+    Endpoint('dashboard', queries=1, calls={'supabase': 5}),
+    Endpoint('supabase-invoice-list-create', queries=1, calls={'supabase': 2}),
+    Endpoint('supabase-invoice-list-create', 'post', queries=1, calls={'supabase': 4}, data={
+        'client_name': 'Budget Client', 'client_email': 'budget@example.com', 'total_amount': '3999.00',
+        'items': [{'description': 'Design', 'quantity': 2, 'unit_price': 1500}],
+    }),
+    Endpoint('supabase-invoice-summary', queries=1, calls={'supabase': 2}),
+    Endpoint('supabase-recent-invoices', queries=1, calls={'supabase': 3}),
+    Endpoint('supabase-invoice-changes', queries=1, calls={'supabase': 3}),
+    Endpoint('supabase-invoice-detail', queries=1, calls={'supabase': 2},
+             kwargs=lambda case: {'pk': str(case.invoice.id)}),
+    # One delete per item: the service has no bulk delete
+    Endpoint('supabase-invoice-detail', 'delete', queries=1, calls={'supabase': 8},
+             kwargs=lambda case: {'pk': str(case.invoice.id)}),
+    Endpoint('supabase-mark-invoice-paid', 'post', queries=1, calls={'supabase': 1}, kwargs=_supabase_id),
+    Endpoint('supabase-download-pdf', queries=1, calls={'supabase': 2}, kwargs=_supabase_id,
+             content_type='application/pdf'),
+    Endpoint('supabase-generate-payment-link', 'post', queries=1, calls={'supabase': 2}, kwargs=_supabase_id),
+    Endpoint('generate-invoice-pdf', queries=1, calls={'supabase': 2}, kwargs=_supabase_id,
+             content_type='application/pdf' if WEASYPRINT else 'text/html'),
+    Endpoint('preview-invoice-html', queries=1, calls={'supabase': 2}, kwargs=_supabase_id),
+    Endpoint('preview-sample-invoice', queries=1),
+
+    # Async Supabase reads
+    Endpoint('async-dashboard', queries=1, calls={'supabase': 5}),
+    Endpoint('async-supabase-invoice-list', queries=1, calls={'supabase': 2}),
+    Endpoint('async-supabase-invoice-summary', queries=1, calls={'supabase': 2}),
+    Endpoint('async-supabase-recent-invoices', queries=1, calls={'supabase': 3}),
+    Endpoint('async-supabase-invoice-detail', queries=1, calls={'supabase': 2},
+             kwargs=lambda case: {'pk': str(case.invoice.id)}),
+
+    # Store-agnostic views, over the default ORM repository
+    Endpoint('v2-invoice-list', queries=5),
+    Endpoint('v2-invoice-list', queries=3, params=lambda case: {'ids': str(case.invoice.id)}),
+    Endpoint('v2-invoice-list', 'post', queries=9, data=NEW_INVOICE),
+    Endpoint('v2-invoice-summary', queries=3),
+    Endpoint('v2-recent-invoices', queries=5),
+    Endpoint('v2-invoice-detail', queries=3, kwargs=_supabase_id),
+    Endpoint('v2-invoice-detail', 'patch', queries=9, kwargs=_supabase_id,
+             data={'notes': 'Updated', 'items': NEW_INVOICE['items']}),
+    Endpoint('v2-invoice-detail', 'delete', queries=11, kwargs=_supabase_id),
+    Endpoint('v2-invoice-pdf', queries=4, kwargs=_supabase_id, content_type='application/pdf'),
+    Endpoint('v2-invoice-payment-link', 'post', queries=7, calls={'razorpay': 2}, kwargs=_supabase_id),
+    Endpoint('v2-invoice-mark-paid', 'post', queries=9, kwargs=_supabase_id),
+
+    # Accounts
+    Endpoint('register', 'post', queries=5, user=None, data={
+        'username': 'budget-new', 'email': 'new@example.com', 'password': 'Budget-pass-123',
+        'password2': 'Budget-pass-123', 'company_name': 'New Co',
+    }),
+    Endpoint('login', 'post', queries=1, user=None, data={'username': 'budget-0000', 'password': PASSWORD}),
+    Endpoint('logout', 'post', queries=1, data={}),
+    Endpoint('user', queries=1),
+    Endpoint('update_profile', 'put', queries=5, data={'first_name': 'Budget', 'company_name': 'Budget Co'}),
+    Endpoint('change_password', 'post', queries=4, data={
+        'old_password': PASSWORD, 'new_password': 'Budget-pass-456',
+    }),
+    Endpoint('token_refresh', 'post', queries=0, user=None,
+             data=lambda case: {'refresh': str(RefreshToken.for_user(case.owner))}),
+]
+
+
+def route_names():
+    """Every named route in the budgeted URLconfs"""
+    names = set()
+    for patterns in (invoice_urls.urlpatterns, auth_urls.urlpatterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+            elif isinstance(pattern, URLResolver):
+                raise AssertionError(f'Nested URLconf {pattern!r} needs its routes budgeted too')
+    return names
+
+
+def _shape(sql):
+    """A statement with its literals replaced, so repeats of the same query group together"""
+    sql = re.sub(r"'[^']*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    return re.sub(r'\?(, \?)+', '?, ...', sql)
+
+
+def budget_report(endpoint, path, statements, calls):
+    """What ran for one request, with everything past the budget marked ``+`` like a diff"""
+    lines = [f'{endpoint} ({path})']
+    lines.append(f'  SQL: {len(statements)} queries, budget {endpoint.queries}')
+    for number, sql in enumerate(statements, 1):
+        marker = '+' if number > endpoint.queries else ' '
+        lines.append(f'  {marker} {number:3d}. {sql[:300]}')
+    repeated = [(count, shape) for shape, count in Counter(map(_shape, statements)).most_common() if count > 1]
+    if repeated:
+        lines.append('  Repeated statements (likely N+1):')
+        lines.extend(f'    {count}x {shape[:300]}' for count, shape in repeated)
+    counts = calls.counts()
+    for service in sorted(set(counts) | set(endpoint.calls)):
+        budget = endpoint.calls.get(service, 0)
+        lines.append(f'  {service}: {counts.get(service, 0)} calls, budget {budget}')
+        made = [call for name, call in calls if name == service]
+        for number, call in enumerate(made, 1):
+            lines.append(f"  {'+' if number > budget else ' '} {number:3d}. {call}")
+    return '\n'.join(lines)
+
+
+def supabase_rows(invoices):
+    """Supabase ``invoices`` and ``invoice_items`` rows mirroring the seeded ORM invoices"""
+    rows, items = [], []
+    for invoice in invoices:
+        rows.append({
+            'id': str(invoice.id), 'user_id': invoice.user_id, 'invoice_number': invoice.invoice_number,
+            'client_name': invoice.client_name, 'client_email': invoice.client_email,
+            'issue_date': invoice.issue_date.isoformat(), 'invoice_date': invoice.issue_date.isoformat(),
+            'due_date': invoice.due_date.isoformat(), 'status': invoice.status,
+            # PostgREST returns numeric columns as JSON numbers
+            'subtotal': float(invoice.subtotal), 'tax_rate': float(invoice.tax_rate),
+            'tax_amount': float(invoice.tax_amount), 'total_amount': float(invoice.total_amount),
+            'notes': invoice.notes, 'created_at': invoice.created_at.isoformat(),
+            'updated_at': invoice.updated_at.isoformat(),
+        })
+        items.extend({
+            'id': item.id, 'invoice_id': str(invoice.id), 'description': item.description,
+            'quantity': float(item.quantity), 'unit_price': float(item.unit_price), 'total': float(item.total),
+        } for item in invoice.items.all())
+    return rows, items
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='budget-secret', ALLOWED_HOSTS=['testserver'])
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_benchmark_data', users=1, invoices=40, items=3, prefix='budget-', stdout=io.StringIO())
+        cls.owner = User.objects.get(username='budget-0000')
+        cls.admin = User.objects.create_user('budget-admin', password=PASSWORD, is_staff=True)
+        invoices = cls.owner.invoices.prefetch_related('items').order_by('-created_at')
+        # Older than the sync settle window, so the change feeds have a page to return
+        invoices.update(updated_at=timezone.now() - timedelta(days=1))
+        cls.invoice = invoices.filter(status__in=('pending', 'overdue')).first()
+        cls.invoice.razorpay_order_id = 'order_budget0001'
+        cls.invoice.save()
+        cls.import_job = ImportJob.objects.create(
+            user=cls.owner, format='csv', status='failed', source_path='imports/budget.csv',
+        )
+        cls.supabase_invoices, cls.supabase_items = supabase_rows(invoices)
+
+    def client_for(self, user):
+        if user is None:
+            return Client()
+        token = RefreshToken.for_user(getattr(self, user)).access_token
+        return Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def call(self, endpoint):
+        """(path, response, body, SQL statements, service calls) for one request; its writes are rolled back"""
+        path = reverse(endpoint.name, kwargs=_resolve(endpoint.kwargs, self))
+        client = self.client_for(endpoint.user)
+        data = _resolve(endpoint.data, self)
+        request = getattr(client, endpoint.method)
+        if endpoint.method == 'get':
+            args = {'data': _resolve(endpoint.params, self)}
+        elif endpoint.multipart:
+            args = {'data': data}
+        else:
+            args = {'data': data, 'content_type': 'application/json'}
+        # Cached watermarks and bodies would hide the cold-cache cost being budgeted
+        cache.clear()
+        calls = CallLog()
+        supabase = FakeSupabase(calls, self.supabase_invoices, self.supabase_items)
+        sent = len(mail.outbox)
+        with fake_services(supabase), transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                response = request(path, **args)
+                # Streamed exports run their queries while the body is read
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+            transaction.set_rollback(True)
+        for message in mail.outbox[sent:]:
+            calls.record('email', message.subject)
+        statements = [query['sql'] for query in captured.captured_queries if not query['sql'].startswith(IGNORED_SQL)]
+        return path, response, body, statements, calls
+
+    def test_every_route_has_a_budget(self):
+        missing = route_names() - {endpoint.name for endpoint in ENDPOINTS}
+        self.assertFalse(missing, f'Routes without a query budget: {sorted(missing)}')
+
+    def test_endpoints_stay_within_budget(self):
+        for endpoint in ENDPOINTS:
+            with self.subTest(endpoint=str(endpoint)):
+                path, response, body, statements, calls = self.call(endpoint)
+                report = budget_report(endpoint, path, statements, calls)
+                self.assertLess(response.status_code, 400, f'{report}\n  Response: {body[:500]!r}')
+                if endpoint.content_type:
+                    self.assertEqual(response['Content-Type'].split(';')[0], endpoint.content_type,
+                                     f'{report}\n  Response: {body[:500]!r}')
+                over = len(statements) > endpoint.queries or any(
+                    count > endpoint.calls.get(service, 0) for service, count in calls.counts().items()
+                )
+                self.assertFalse(over, f'Over budget:\n{report}')
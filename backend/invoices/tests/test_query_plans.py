@@ -0,0 +1,225 @@
+"""
+Query plans for the invoice hot paths
+Seeds a few thousand invoices, refreshes the planner's statistics and fails if EXPLAIN plans a full scan of the
+invoices table for the nightly tasks, the payment webhook, invoice lists or the admin filters. The MongoDB
+queries get the same check when MONGODB_TEST_URI points at a server the tests may write to.
+"""
+
+import io
+import os
+import re
+import unittest
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from pymongo.errors import OperationFailure
+
+from invoices import mongo_indexes
+from invoices.aging import mongo_aging_pipeline
+from invoices.models import Invoice
+
+USERS = 40
+INVOICES_PER_USER = 200
+
+# A full pass over invoices_invoice, whether over the table or over every entry of an index
+FULL_SCANS = {
+    'sqlite': re.compile(r'\bSCAN invoices_invoice\b'),
+    'postgresql': re.compile(r'\bSeq Scan on invoices_invoice\b'),
+}
+
+# SQLite binds the ORM's parameters after planning, so it can never prove a query meets a partial index's
+# condition; PostgreSQL receives the values and can
+partial_indexes = unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Partial indexes are only usable by parameterised queries on PostgreSQL'
+)
+
+
+def _status(n):
+    # Most of a year-old book is settled: about 8% pending, 4% overdue and 3% cancelled
+    slot = n % 100
+    if slot < 8:
+        return 'pending'
+    if slot < 12:
+        return 'overdue'
+    if slot < 15:
+        return 'cancelled'
+    return 'paid'
+
+
+class InvoiceQueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.localdate()
+        users = User.objects.bulk_create([User(username=f'plan-{n:02d}') for n in range(USERS)])
+        invoices = []
+        for n in range(USERS * INVOICES_PER_USER):
+            status = _status(n)
+            due = cls.today + timedelta(days=30 - n % 730)
+            invoices.append(Invoice(
+                id=uuid.uuid4(), user=users[n % USERS], invoice_number=f'INV-PLAN-{n:06d}',
+                client_name=f'Client {n % 150:03d}', client_email='client@example.com',
+                issue_date=due - timedelta(days=30), due_date=due, status=status,
+                total_amount=Decimal('1180.00'),
+                razorpay_order_id=f'order_{n:010d}' if n % 3 == 0 else '',
+                last_reminder_sent=timezone.now() - timedelta(days=n % 20) if status == 'overdue' else None,
+            ))
+        Invoice.objects.bulk_create(invoices, batch_size=500)
+        cls.user = users[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if connection.vendor == 'sqlite' else 'ANALYZE invoices_invoice')
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        self.assertIsNone(FULL_SCANS[connection.vendor].search(plan), f'Full scan of invoices_invoice:\n{plan}')
+
+    @partial_indexes
+    def test_nightly_tasks(self):
+        # The filters in hisabpro/tasks.py
+        now = timezone.now()
+        self.assertIndexed(Invoice.objects.filter(
+            status='overdue', due_date__lt=self.today, last_reminder_sent__lt=now - timedelta(days=7),
+        ))
+        self.assertIndexed(Invoice.objects.filter(status='pending', due_date__lt=self.today))
+        self.assertIndexed(Invoice.objects.filter(status='overdue', due_date__gte=self.today))
+        self.assertIndexed(Invoice.objects.filter(
+            status='pending', due_date=self.today + timedelta(days=3), last_reminder_sent__isnull=True,
+        ))
+
+    def test_payment_webhook(self):
+        self.assertIndexed(Invoice.objects.filter(razorpay_order_id='order_0000000300'))
+
+    def test_invoice_list(self):
+        self.assertIndexed(self.user.invoices.all()[:20])
+
+    def test_admin_user_and_due_date_filters(self):
+        # The changelist orders by -created_at, then -pk to make the order total
+        ordering = ('-created_at', '-pk')
+        self.assertIndexed(Invoice.objects.filter(user=self.user).order_by(*ordering)[:100])
+        week = self.today - timedelta(days=7)
+        self.assertIndexed(
+            Invoice.objects.filter(due_date__gte=week, due_date__lt=self.today).order_by(*ordering)[:100]
+        )
+
+    @partial_indexes
+    def test_admin_open_status_filter(self):
+        self.assertIndexed(Invoice.objects.filter(status='overdue').order_by('-created_at', '-pk')[:100])
+
+
+class FakeCollection:
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def create_index(self, keys, **options):
+        self.db.created.append((self.name, keys))
+        if (self.name, keys) in self.db.conflicts:
+            raise OperationFailure('Index already exists with different options', code=85)
+
+
+class FakeDatabase:
+
+    client = mock.Mock(address=('localhost', 27017))
+
+    def __init__(self, conflicts=(), name='hisabpro'):
+        self.name = name
+        self.created = []
+        self.conflicts = list(conflicts)
+
+    def __getitem__(self, name):
+        return FakeCollection(self, name)
+
+
+class EnsureMongoIndexesTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(mongo_indexes, '_ensured', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_creates_every_declared_index_once_per_process(self):
+        db = FakeDatabase()
+        self.assertEqual(mongo_indexes.ensure_mongo_indexes(db), [])
+        self.assertEqual(len(db.created), sum(map(len, mongo_indexes.MONGO_INDEXES.values())))
+        mongo_indexes.ensure_mongo_indexes(db)
+        self.assertEqual(len(db.created), sum(map(len, mongo_indexes.MONGO_INDEXES.values())))
+
+    def test_a_new_object_for_a_checked_database_is_not_checked_again(self):
+        mongo_indexes.ensure_mongo_indexes(FakeDatabase())
+        db = FakeDatabase()
+        mongo_indexes.ensure_mongo_indexes(db)
+        self.assertEqual(db.created, [])
+        other = FakeDatabase(name='hisabpro_archive')
+        mongo_indexes.ensure_mongo_indexes(other)
+        self.assertEqual(len(other.created), sum(map(len, mongo_indexes.MONGO_INDEXES.values())))
+
+    def test_a_conflicting_index_is_reported_not_raised(self):
+        conflict = ('invoices', [('invoice_number', 1)])
+        db = FakeDatabase(conflicts=[conflict])
+        with self.assertLogs('invoices.mongo_indexes', 'WARNING'):
+            self.assertEqual(mongo_indexes.ensure_mongo_indexes(db, force=True), [conflict])
+        # The rest are still created
+        self.assertEqual(len(db.created), sum(map(len, mongo_indexes.MONGO_INDEXES.values())))
+
+    @mock.patch.dict(os.environ, {'MONGODB_URI': 'mongodb://localhost:27017/hisabpro'})
+    def test_deploy_step_without_the_mongodb_service(self):
+        # The deploy runs ensure_indexes before gunicorn; a missing MongoDB must not stop the web server starting
+        out = io.StringIO()
+        # What importing the removed lib/mongodb.py does
+        service = mock.Mock(**{'_ensure_connected.side_effect': ImportError})
+        with mock.patch('invoices.management.commands.ensure_indexes.mongodb_service', service):
+            call_command('ensure_indexes', stdout=out)
+        self.assertIn('not configured', out.getvalue())
+
+
+@unittest.skipUnless(os.environ.get('MONGODB_TEST_URI'), 'Set MONGODB_TEST_URI to run against MongoDB')
+class MongoQueryPlanTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from pymongo import MongoClient
+
+        cls.client = MongoClient(os.environ['MONGODB_TEST_URI'])
+        cls.db = cls.client[f'hisabpro_test_{uuid.uuid4().hex[:8]}']
+        now = timezone.now()
+        cls.db.invoices.insert_many([{
+            'id': str(uuid.uuid4()), 'user_id': n % USERS, 'invoice_number': f'INV-PLAN-{n:06d}',
+            'status': _status(n), 'due_date': (now - timedelta(days=n % 730)).date().isoformat(),
+            'total_amount': 1180.0, 'created_at': now - timedelta(minutes=n), 'updated_at': now,
+        } for n in range(USERS * INVOICES_PER_USER)])
+        mongo_indexes.ensure_mongo_indexes(cls.db, force=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database(cls.db.name)
+        cls.client.close()
+        super().tearDownClass()
+
+    def assertIndexed(self, plan):
+        self.assertNotIn('COLLSCAN', str(plan), plan)
+
+    def test_ensure_is_idempotent(self):
+        before = sorted(self.db.invoices.index_information())
+        self.assertEqual(mongo_indexes.ensure_mongo_indexes(self.db, force=True), [])
+        self.assertEqual(sorted(self.db.invoices.index_information()), before)
+
+    def test_hot_queries(self):
+        invoices = self.db.invoices
+        self.assertIndexed(invoices.find({'user_id': 1}).sort([('created_at', -1), ('id', -1)]).limit(20).explain())
+        self.assertIndexed(invoices.find({'id': 'missing', 'user_id': 1}).explain())
+        self.assertIndexed(invoices.find({'user_id': 1, 'updated_at': {'$lte': timezone.now()}})
+                           .sort([('updated_at', 1), ('id', 1)]).explain())
+        self.assertIndexed(self.db.invoice_items.find({'invoice_id': {'$in': ['a', 'b']}})
+                           .sort([('invoice_id', 1), ('position', 1)]).explain())
+        self.assertIndexed(self.db.command(
+            'aggregate', 'invoices', pipeline=mongo_aging_pipeline(1, timezone.localdate()), explain=True,
+        ))
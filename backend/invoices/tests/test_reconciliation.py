@@ -0,0 +1,149 @@
+"""
+Payment reconciliation
+Runs bank statements through the matcher and apply step the reconcile_payments command uses (reconciliation.py)
+"""
+
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from invoices import reconciliation
+from invoices.models import Invoice, Payment
+from invoices.reconciliation import (
+    InvoiceIndex, InvoiceRef, Reconciler, StatementRow, apply_result, read_bank_statement,
+)
+
+# No reference column, so the rows carry no transaction id to recognise on a second run
+STATEMENT = (
+    'Txn Date,Narration,Deposit Amt\n'
+    '05/04/2024,NEFT from client for INV-0001-0001,"1,180.00"\n'
+    '06/04/2024,NEFT from client for INV-0001-0002,590.00\n'
+)
+
+
+class ReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('reconcile-owner')
+        self.invoices = []
+        for number, total in (('INV-0001-0001', Decimal('1180.00')), ('INV-0001-0002', Decimal('590.00'))):
+            invoice = Invoice.objects.create(
+                user=self.user, invoice_number=number, client_name='Client', client_email='client@example.com',
+                issue_date=date(2024, 4, 1), due_date=date(2024, 5, 1),
+            )
+            # save() recomputes the total from the invoice's items, and these have none
+            Invoice.objects.filter(pk=invoice.pk).update(total_amount=total)
+            self.invoices.append(invoice)
+
+    def reconcile(self, statement=STATEMENT):
+        result = Reconciler(InvoiceIndex.from_database(user=self.user)).run(read_bank_statement(io.StringIO(statement)))
+        apply_result(result)
+        return result
+
+    def test_rerunning_a_statement_records_nothing_twice(self):
+        first = self.reconcile()
+        self.assertEqual(len(first.matches), 2)
+        self.assertEqual(Payment.objects.count(), 2)
+
+        second = self.reconcile()
+        self.assertEqual(second.matches, [])
+        self.assertEqual([reason for _, _, reason in second.mismatches], ['already_paid', 'already_paid'])
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_payments_are_dated_from_the_statement(self):
+        self.reconcile()
+        self.assertEqual(
+            sorted(Payment.objects.values_list('payment_date', flat=True)),
+            [timezone.make_aware(datetime.combine(date(2024, 4, day), time.min)) for day in (5, 6)],
+        )
+
+    def test_invoices_marked_paid_by_hand_are_not_paid_again(self):
+        Invoice.objects.filter(pk=self.invoices[0].pk).update(status='paid')
+        result = self.reconcile()
+        self.assertEqual([ref.invoice_number for _, ref, _ in result.matches], ['INV-0001-0002'])
+        self.assertEqual(result.mismatches[0][2], 'already_paid')
+        self.assertFalse(Payment.objects.filter(invoice=self.invoices[0]).exists())
+
+    def test_an_unreadable_row_is_reported_and_the_run_continues(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        directory = directory.name
+        statement, report = os.path.join(directory, 'statement.csv'), os.path.join(directory, 'report.csv')
+        with open(statement, 'w') as fileobj:
+            fileobj.write(STATEMENT.replace('05/04/2024', '31/13/2024'))
+        call_command('reconcile_payments', statement, format='bank', report=report, stdout=io.StringIO())
+
+        self.assertEqual(list(Payment.objects.values_list('invoice__invoice_number', flat=True)), ['INV-0001-0002'])
+        with open(report, newline='') as fileobj:
+            (row,) = csv.DictReader(fileobj)
+        self.assertEqual(row['line'], '2')
+        self.assertEqual(row['reason'], 'invalid_row')
+        self.assertIn('31/13/2024', row['detail'])
+
+
+class AmountMatchTests(SimpleTestCase):
+    """Rows with nothing but an amount and a date"""
+
+    def setUp(self):
+        self.index = InvoiceIndex()
+        self.count = 0
+
+    def invoice(self, paise, issue_date, due_date, status='pending'):
+        self.count += 1
+        ref = InvoiceRef(self.count, 1, f'INV-0001-{self.count:04d}', '', paise, issue_date, due_date, status)
+        self.index.add_invoice(ref)
+        return ref
+
+    def row(self, paise, day):
+        self.count += 1
+        return StatementRow(self.count, 'bank', day, paise, transaction_id=f'UTR{self.count:06d}')
+
+    def reconcile(self, rows):
+        """Match with both the per-row scan and the date-sorted index, which must agree"""
+        scanned = Reconciler(self.index).run(rows)
+        with mock.patch.object(reconciliation, 'AMOUNT_SCAN_LIMIT', 0):
+            indexed = Reconciler(self.index).run(rows)
+        for found in ('matches', 'mismatches'):
+            self.assertEqual([(row.line, ref, detail) for row, ref, detail in getattr(indexed, found)],
+                             [(row.line, ref, detail) for row, ref, detail in getattr(scanned, found)])
+        return indexed
+
+    def test_the_date_window_picks_the_invoice(self):
+        april = self.invoice(100000, date(2024, 4, 1), date(2024, 4, 30))
+        june = self.invoice(100000, date(2024, 6, 1), date(2024, 6, 30))
+        # A long-running invoice issued well before the row is still payable within its due date
+        year = self.invoice(250000, date(2024, 1, 1), date(2024, 12, 31))
+        result = self.reconcile([
+            self.row(100000, date(2024, 6, 10)), self.row(100000, date(2024, 5, 3)),
+            self.row(250000, date(2024, 9, 1)), self.row(100000, date(2024, 8, 1)),
+        ])
+        self.assertEqual([(row.line, ref) for row, ref, _ in result.matches],
+                         [(self.count - 3, june), (self.count - 2, april), (self.count - 1, year)])
+        self.assertEqual([reason for _, _, reason in result.mismatches], ['no_match'])
+
+    def test_overlapping_windows_are_ambiguous_until_one_is_claimed(self):
+        first = self.invoice(100000, date(2024, 4, 1), date(2024, 4, 30))
+        self.invoice(100000, date(2024, 4, 10), date(2024, 5, 10))
+        result = self.reconcile([
+            self.row(100000, date(2024, 4, 20)),
+            StatementRow(99, 'bank', date(2024, 4, 2), 100000, description=f'NEFT {first.invoice_number}'),
+            self.row(100000, date(2024, 4, 20)),
+            self.row(100000, date(2024, 4, 20)),
+        ])
+        self.assertEqual([reason for _, _, reason in result.mismatches], ['ambiguous_amount', 'no_match'])
+        # The numbered row claims the first invoice, which leaves one candidate for the next amount-only row
+        self.assertEqual([rule for _, _, rule in result.matches], ['invoice_number', 'amount_date'])
+
+    def test_settled_invoices_are_not_candidates(self):
+        self.invoice(100000, date(2024, 4, 1), date(2024, 4, 30), status='paid')
+        result = self.reconcile([self.row(100000, date(2024, 4, 5))])
+        self.assertEqual(result.mismatches[0][2], 'no_match')
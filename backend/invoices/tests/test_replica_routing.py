@@ -0,0 +1,125 @@
+"""
+Read-replica routing
+The primary and the 'replica' alias are two separate SQLite databases here, holding different invoices, so each
+response shows which one the view read from (hisabpro/routers.py)
+"""
+
+import unittest
+import uuid
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from hisabpro import routers
+from invoices import aging
+from invoices.models import Invoice
+
+ROUTERS = ['hisabpro.routers.ReplicaRouter']
+
+
+def _invoice(user, number, **fields):
+    return Invoice(
+        id=uuid.uuid4(), user=user, invoice_number=number, client_name='Replica Client',
+        client_email='client@example.com', issue_date=date(2024, 4, 1), due_date=date(2024, 5, 1),
+        subtotal=Decimal('1000.00'), tax_amount=Decimal('180.00'), total_amount=Decimal('1180.00'), **fields,
+    )
+
+
+@unittest.skipIf(settings.DATABASES.get('replica', {}).get('TEST', {}).get('MIRROR'),
+                 'DATABASE_REPLICA_URL is set, so the replica mirrors the primary in tests')
+@override_settings(DATABASE_ROUTERS=ROUTERS)
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('replica-owner')
+        cls.other = User.objects.create_user('replica-other')
+        # The primary has one invoice; the "replica" has two others, as if it held a different moment in time
+        cls.primary_invoice = _invoice(cls.owner, 'INV-P-0001')
+        Invoice.objects.bulk_create([cls.primary_invoice])
+        User.objects.using('replica').bulk_create(
+            [User(id=user.id, username=user.username) for user in (cls.owner, cls.other)]
+        )
+        Invoice.objects.using('replica').bulk_create([
+            _invoice(cls.owner, 'INV-R-0001'), _invoice(cls.owner, 'INV-R-0002', status='paid'),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user):
+        return Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def invoice_count(self, user=None):
+        return self.client_for(user or self.owner).get(reverse('invoice-list-create')).json()['count']
+
+    def test_read_only_views_read_the_replica(self):
+        self.assertEqual(self.invoice_count(), 2)
+        summary = self.client_for(self.owner).get(reverse('invoice-summary')).json()
+        self.assertEqual(summary['total_invoices'], 2)
+        self.assertEqual(summary['paid_invoices'], 1)
+
+    def test_streamed_exports_read_the_replica(self):
+        response = self.client_for(self.owner).get(reverse('invoice-export', kwargs={'file_type': 'csv'}))
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('INV-R-0001', body)
+        self.assertNotIn('INV-P-0001', body)
+
+    def test_other_views_and_writes_use_the_primary(self):
+        detail = reverse('invoice-detail', kwargs={'pk': self.primary_invoice.id})
+        self.assertEqual(self.client_for(self.owner).get(detail).status_code, 200)
+        response = self.client_for(self.owner).post(reverse('mark-as-paid', kwargs={'invoice_id': self.primary_invoice.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Invoice.objects.using('default').get(id=self.primary_invoice.id).status, 'paid')
+
+    def test_a_write_pins_the_user_to_the_primary(self):
+        self.client_for(self.owner).post(reverse('mark-as-paid', kwargs={'invoice_id': self.primary_invoice.id}))
+        self.assertEqual(self.invoice_count(), 1)
+        # Only the writer is pinned
+        self.assertEqual(self.invoice_count(self.other), 0)
+
+    def test_failed_writes_do_not_pin(self):
+        missing = reverse('mark-as-paid', kwargs={'invoice_id': uuid.uuid4()})
+        self.assertEqual(self.client_for(self.owner).post(missing).status_code, 404)
+        self.assertEqual(self.invoice_count(), 2)
+
+    def test_reads_return_to_the_replica_when_the_pin_expires(self):
+        routers.pin_to_primary(self.owner.id)
+        self.assertEqual(self.invoice_count(), 1)
+        # What the cache does after REPLICA_STICKY_SECONDS
+        cache.delete(routers._pin_key(self.owner.id))
+        self.assertEqual(self.invoice_count(), 2)
+
+    def test_reports_read_from_the_replica_are_not_cached(self):
+        # A webhook write bumps the aging namespace but pins no one; the replica's older answer must not be
+        # cached under the new version
+        key = aging.cache_key(self.owner.id, timezone.localdate())
+        self.assertEqual(self.client_for(self.owner).get(reverse('invoice-aging')).status_code, 200)
+        self.assertIsNone(cache.get(key))
+        routers.pin_to_primary(self.owner.id)
+        self.client_for(self.owner).get(reverse('invoice-aging'))
+        self.assertIsNotNone(cache.get(key))
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        with mock.patch.object(routers, 'measure_lag', return_value=settings.REPLICA_MAX_LAG_SECONDS + 1):
+            self.assertEqual(self.invoice_count(), 1)
+
+    def test_unreachable_replica_falls_back_to_the_primary(self):
+        with mock.patch.object(routers, 'measure_lag', return_value=None) as measure:
+            self.assertEqual(self.invoice_count(), 1)
+            self.assertEqual(self.invoice_count(), 1)
+        # The answer is shared for REPLICA_LAG_CHECK_SECONDS instead of asked for on every request
+        self.assertEqual(measure.call_count, 1)
+
+    @override_settings(DATABASE_ROUTERS=[])
+    def test_without_the_router_everything_uses_the_primary(self):
+        self.assertEqual(self.invoice_count(), 1)
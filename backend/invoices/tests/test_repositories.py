@@ -0,0 +1,289 @@
+"""
+InvoiceRepository conformance
+The same behaviour checks run against every store in invoices/repositories.py: the Django ORM, Supabase (through
+the local SQLite stand-in) and MongoDB (only when MONGODB_TEST_URI points at a server the tests may write to)
+"""
+
+import os
+import unittest
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.functional import empty
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from invoices import services
+from invoices.local_supabase import LocalSupabase
+from invoices.money import Money
+from invoices.repositories import (
+    MongoInvoiceRepository, OrmInvoiceRepository, SupabaseInvoiceRepository, get_repository,
+)
+
+ITEMS = [
+    {'description': 'Design', 'quantity': Decimal('2'), 'unit_price': Money.from_rupees('1500.00')},
+    {'description': 'Hosting', 'quantity': Decimal('1'), 'unit_price': Money.from_rupees('999.00')},
+]
+
+
+def invoice_data(**overrides):
+    return {
+        'client_name': 'Conformance Client', 'client_email': 'client@example.com',
+        'issue_date': date(2024, 4, 1), 'due_date': date(2024, 5, 1), **overrides,
+    }
+
+
+class RepositoryConformance:
+    """Behaviour every InvoiceRepository shares; subclasses provide ``make_repository`` and ``cost``"""
+
+    def make_repository(self):
+        raise NotImplementedError
+
+    def cost(self, fn):
+        """Round trips ``fn()`` takes against the store"""
+        raise NotImplementedError
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('repo-owner')
+        self.other = User.objects.create_user('repo-other')
+        self.repository = self.make_repository()
+
+    def create(self, user=None, items=ITEMS, **data):
+        return self.repository.create(user or self.owner, invoice_data(**data), items)
+
+    def test_create_computes_totals_and_numbers(self):
+        record = self.create()
+        self.assertEqual(record['subtotal'], Money.from_rupees('3999.00'))
+        self.assertEqual(record['tax_amount'], Money.from_rupees('719.82'))
+        self.assertEqual(record['total_amount'], Money.from_rupees('4718.82'))
+        self.assertEqual(record['status'], 'pending')
+        self.assertEqual(record['tax_rate'], Decimal('18.00'))
+        self.assertTrue(record['invoice_number'].startswith(f'INV-{self.owner.id:04d}-'))
+        self.assertEqual([item['total'] for item in record['items']], [Money.from_rupees('3000'), Money.from_rupees('999')])
+
+    def test_get_reads_back_what_was_created(self):
+        created = self.create(notes='Thanks', tax_rate=Decimal('5.00'))
+        record = self.repository.get(self.owner, created['id'])
+        for field in ('invoice_number', 'client_name', 'issue_date', 'due_date', 'notes', 'tax_rate', 'total_amount'):
+            self.assertEqual(record[field], created[field], field)
+        self.assertEqual(record['total_amount'], Money.from_rupees('4198.95'))
+        self.assertEqual([item['description'] for item in record['items']], ['Design', 'Hosting'])
+        self.assertEqual(record['items'][0]['quantity'], Decimal('2.00'))
+
+    def test_page_is_newest_first_with_total(self):
+        created = [self.create(client_name=f'Client {n}')['id'] for n in range(3)]
+        self.create(user=self.other)
+        first, total = self.repository.page(self.owner, 2)
+        rest, _ = self.repository.page(self.owner, 2, offset=2)
+        self.assertEqual(total, 3)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(rest), 1)
+        records = first + rest
+        self.assertCountEqual([record['id'] for record in records], created)
+        stamps = [record['created_at'] for record in records]
+        self.assertEqual(stamps, sorted(stamps, reverse=True))
+        self.assertTrue(all(len(record['items']) == 2 for record in records))
+
+    def test_get_many_skips_missing_and_other_users_invoices(self):
+        mine = self.create()['id']
+        theirs = self.create(user=self.other)['id']
+        found = self.repository.get_many(self.owner, [mine, theirs, str(uuid.uuid4()), 'not-an-id'])
+        self.assertEqual(list(found), [mine])
+        self.assertIsNone(self.repository.get(self.owner, theirs))
+
+    def test_update_replaces_items_and_recomputes_totals(self):
+        created = self.create()
+        items = [{'description': 'Audit', 'quantity': Decimal('3'), 'unit_price': Money.from_rupees('100.00')}]
+        updated = self.repository.update(self.owner, created['id'], {'notes': 'Revised'}, items)
+        self.assertEqual(updated['notes'], 'Revised')
+        self.assertEqual(updated['total_amount'], Money.from_rupees('354.00'))
+        record = self.repository.get(self.owner, created['id'])
+        self.assertEqual([item['description'] for item in record['items']], ['Audit'])
+        self.assertEqual(record['total_amount'], Money.from_rupees('354.00'))
+        self.assertEqual(record['invoice_number'], created['invoice_number'])
+
+    def test_update_without_items_keeps_them(self):
+        created = self.create()
+        self.repository.update(self.owner, created['id'], {'status': 'paid', 'payment_link': 'https://rzp.io/i/x'})
+        record = self.repository.get(self.owner, created['id'])
+        self.assertEqual(record['status'], 'paid')
+        self.assertEqual(record['payment_link'], 'https://rzp.io/i/x')
+        self.assertEqual(len(record['items']), 2)
+        self.assertEqual(record['total_amount'], created['total_amount'])
+
+    def test_other_users_cannot_update_or_delete(self):
+        created = self.create()
+        self.assertIsNone(self.repository.update(self.other, created['id'], {'status': 'paid'}))
+        self.assertFalse(self.repository.delete(self.other, created['id']))
+        self.assertEqual(self.repository.get(self.owner, created['id'])['status'], 'pending')
+
+    def test_delete(self):
+        created = self.create()
+        self.assertTrue(self.repository.delete(self.owner, created['id']))
+        self.assertIsNone(self.repository.get(self.owner, created['id']))
+        self.assertFalse(self.repository.delete(self.owner, created['id']))
+        self.assertEqual(self.repository.page(self.owner, 10), ([], 0))
+
+    def test_summary(self):
+        self.create()
+        self.create()
+        paid = self.create(items=ITEMS[1:])
+        self.repository.update(self.owner, paid['id'], {'status': 'paid'})
+        self.create(user=self.other)
+        summary = self.repository.summary(self.owner)
+        self.assertEqual(summary['total_invoices'], 3)
+        self.assertEqual(summary['pending_invoices'], 2)
+        self.assertEqual(summary['paid_invoices'], 1)
+        self.assertEqual(summary['overdue_invoices'], 0)
+        self.assertEqual(summary['total_pending_amount'], Money.from_rupees('9437.64'))
+        self.assertEqual(summary['total_paid_amount'], Money.from_rupees('1178.82'))
+        self.assertEqual(summary['total_amount'], Money.from_rupees('10616.46'))
+
+    def test_watermark_moves_on_writes(self):
+        empty_mark = self.repository.watermark(self.owner)
+        created = self.create()
+        created_mark = self.repository.watermark(self.owner)
+        self.assertNotEqual(created_mark, empty_mark)
+        self.assertEqual(created_mark[1], 1)
+        self.repository.delete(self.owner, created['id'])
+        self.assertEqual(self.repository.watermark(self.owner)[1], 0)
+
+    def test_round_trips_do_not_grow_with_items_or_invoices(self):
+        # The first invoice also creates the user's number sequence and rollup rows
+        self.create()
+        one_item = self.cost(lambda: self.create(items=ITEMS[:1]))
+        many_items = self.cost(lambda: self.create(items=ITEMS * 5))
+        self.assertEqual(many_items, one_item)
+        created = self.create()
+        replace = self.cost(lambda: self.repository.update(self.owner, created['id'], {}, ITEMS * 5))
+        self.assertEqual(replace, self.cost(lambda: self.repository.update(self.owner, created['id'], {}, ITEMS[:1])))
+        small_page = self.cost(lambda: self.repository.page(self.owner, 20))
+        for _ in range(4):
+            self.create()
+        self.assertEqual(self.cost(lambda: self.repository.page(self.owner, 20)), small_page)
+        ids = [record['id'] for record in self.repository.page(self.owner, 20)[0]]
+        self.assertEqual(self.cost(lambda: self.repository.get_many(self.owner, ids)),
+                         self.cost(lambda: self.repository.get_many(self.owner, ids[:1])))
+
+
+class OrmRepositoryTests(RepositoryConformance, TestCase):
+
+    def make_repository(self):
+        return OrmInvoiceRepository()
+
+    def cost(self, fn):
+        with CaptureQueriesContext(connection) as captured:
+            fn()
+        return len([query for query in captured.captured_queries if 'SAVEPOINT' not in query['sql']])
+
+
+class SupabaseRepositoryTests(RepositoryConformance, TestCase):
+
+    def make_repository(self):
+        self.supabase = LocalSupabase(path=':memory:', latency=0)
+        return SupabaseInvoiceRepository(self.supabase)
+
+    def cost(self, fn):
+        self.supabase.reset_round_trips()
+        fn()
+        return sum(self.supabase.reset_round_trips().values())
+
+    def test_writes_are_one_request_each(self):
+        self.assertEqual(self.cost(lambda: self.create(items=ITEMS * 5)), 2)
+        self.assertEqual(self.cost(lambda: self.repository.page(self.owner, 20)), 2)
+
+
+@unittest.skipUnless(os.environ.get('MONGODB_TEST_URI'), 'Set MONGODB_TEST_URI to run against MongoDB')
+class MongoRepositoryTests(RepositoryConformance, TestCase):
+
+    def make_repository(self):
+        from pymongo import MongoClient, monitoring
+
+        class Commands(monitoring.CommandListener):
+            count = 0
+
+            def started(self, event):
+                Commands.count += 1
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        self.commands = Commands
+        client = MongoClient(os.environ['MONGODB_TEST_URI'], event_listeners=[Commands()])
+        db = client[f'hisabpro_test_{uuid.uuid4().hex[:8]}']
+        self.addCleanup(client.close)
+        self.addCleanup(client.drop_database, db.name)
+        return MongoInvoiceRepository(db)
+
+    def cost(self, fn):
+        start = self.commands.count
+        fn()
+        return self.commands.count - start
+
+
+def _user_client(user):
+    return Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+
+class RepositoryViewTests(TestCase):
+    """The v2 views behave the same over each store"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('view-owner')
+        self.other = User.objects.create_user('view-other')
+        self.supabase = LocalSupabase(path=':memory:', latency=0)
+        services.supabase_service._wrapped = self.supabase
+        self.addCleanup(setattr, services.supabase_service, '_wrapped', empty)
+
+    def exercise(self):
+        client = _user_client(self.owner)
+        created = client.post(reverse('v2-invoice-list'), {
+            'client_name': 'View Client', 'client_email': 'view@example.com',
+            'issue_date': '2024-04-01', 'due_date': '2024-05-01',
+            'items': [{'description': 'Design', 'quantity': '2', 'unit_price': '1500.00'}],
+        }, content_type='application/json')
+        self.assertEqual(created.status_code, 201, created.content)
+        invoice_id = created.json()['id']
+        self.assertEqual(created.json()['total_amount'], '3540.00')
+
+        listing = client.get(reverse('v2-invoice-list'))
+        self.assertEqual(listing.json()['count'], 1)
+        self.assertEqual(client.get(reverse('v2-invoice-list'), HTTP_IF_NONE_MATCH=listing['ETag']).status_code, 304)
+        batch = client.get(reverse('v2-invoice-list'), {'ids': f'{uuid.uuid4()},{invoice_id}'})
+        self.assertEqual([record['id'] for record in batch.json()['results']], [invoice_id])
+
+        detail = reverse('v2-invoice-detail', kwargs={'invoice_id': invoice_id})
+        self.assertEqual(_user_client(self.other).get(detail).status_code, 404)
+        patched = client.patch(detail, {'notes': 'Revised'}, content_type='application/json')
+        self.assertEqual(patched.json()['notes'], 'Revised')
+        paid = client.post(reverse('v2-invoice-mark-paid', kwargs={'invoice_id': invoice_id}))
+        self.assertEqual(paid.status_code, 200)
+        summary = client.get(reverse('v2-invoice-summary')).json()
+        self.assertEqual((summary['paid_invoices'], summary['total_paid_amount']), (1, '3540.00'))
+        self.assertEqual(len(client.get(reverse('v2-recent-invoices')).json()), 1)
+        self.assertEqual(client.delete(detail).status_code, 204)
+        self.assertEqual(client.get(detail).status_code, 404)
+
+    def test_orm(self):
+        with override_settings(INVOICE_REPOSITORY='orm'):
+            self.exercise()
+
+    def test_supabase(self):
+        with override_settings(INVOICE_REPOSITORY='supabase'):
+            self.exercise()
+
+    def test_unknown_repository(self):
+        from django.core.exceptions import ImproperlyConfigured
+        with override_settings(INVOICE_REPOSITORY='sqlite'), self.assertRaises(ImproperlyConfigured):
+            get_repository()
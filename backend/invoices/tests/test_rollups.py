@@ -0,0 +1,112 @@
+"""
+Revenue rollups
+Daily and monthly totals kept in step by the invoice signals, rebuilt by backfill and checked by verify (rollups.py)
+"""
+
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from invoices.models import DailyRevenueRollup, Invoice, InvoiceItem, MonthlyRevenueRollup
+from invoices.rollups import backfill, timeseries, verify
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('rollup-owner')
+        self.other = User.objects.create_user('rollup-other')
+        self.count = 0
+
+    def invoice(self, issue_date, unit_price='1000.00', status='pending', user=None):
+        self.count += 1
+        invoice = Invoice.objects.create(
+            user=user or self.user, invoice_number=f'INV-R-{self.count:04d}', client_name='Client',
+            client_email='client@example.com', issue_date=issue_date, due_date=date(2024, 6, 30), status=status,
+        )
+        InvoiceItem.objects.create(invoice=invoice, description='Design', quantity=Decimal('1'),
+                                   unit_price=Decimal(unit_price))
+        invoice.refresh_from_db()
+        return invoice
+
+    def totals(self, model, **period):
+        return model.objects.values(
+            'invoiced_paise', 'invoiced_count', 'paid_paise', 'paid_count', 'outstanding_paise', 'outstanding_count',
+        ).get(user=self.user, **period)
+
+    def test_signals_keep_rollups_in_step(self):
+        first = self.invoice(date(2024, 4, 1))
+        self.invoice(date(2024, 4, 1), unit_price='500.00', status='paid')
+        self.invoice(date(2024, 4, 20))
+        self.assertEqual(self.totals(DailyRevenueRollup, day=date(2024, 4, 1)), {
+            'invoiced_paise': 177000, 'invoiced_count': 2, 'paid_paise': 59000, 'paid_count': 1,
+            'outstanding_paise': 118000, 'outstanding_count': 1,
+        })
+        self.assertEqual(self.totals(MonthlyRevenueRollup, month=date(2024, 4, 1))['invoiced_paise'], 295000)
+
+        # Moving an invoice to another day refreshes both days
+        first.issue_date = date(2024, 5, 2)
+        first.save()
+        self.assertEqual(self.totals(DailyRevenueRollup, day=date(2024, 4, 1))['invoiced_count'], 1)
+        self.assertEqual(self.totals(MonthlyRevenueRollup, month=date(2024, 5, 1))['invoiced_paise'], 118000)
+
+        # Cancelled invoices are not revenue; a day with nothing left loses its row
+        first.status = 'cancelled'
+        first.save()
+        self.assertFalse(DailyRevenueRollup.objects.filter(user=self.user, day=date(2024, 5, 2)).exists())
+        self.assertFalse(MonthlyRevenueRollup.objects.filter(user=self.user, month=date(2024, 5, 1)).exists())
+        self.assertEqual(verify(), [])
+
+    def test_verify_finds_what_queryset_updates_missed(self):
+        invoice = self.invoice(date(2024, 4, 1))
+        # update() skips the signals
+        Invoice.objects.filter(pk=invoice.pk).update(status='paid')
+        problems = verify()
+        self.assertEqual([(granularity, user_id, period) for granularity, user_id, period, _, _ in problems],
+                         [('day', self.user.id, date(2024, 4, 1)), ('month', self.user.id, date(2024, 4, 1))])
+        expected, actual = problems[0][3], problems[0][4]
+        self.assertEqual((expected['paid_count'], actual['paid_count']), (1, 0))
+
+    def test_backfill_rebuilds_from_invoice_history(self):
+        self.invoice(date(2024, 4, 1))
+        self.invoice(date(2024, 4, 15), status='paid')
+        self.invoice(date(2024, 5, 1))
+        self.invoice(date(2024, 4, 1), user=self.other)
+        DailyRevenueRollup.objects.all().delete()
+        MonthlyRevenueRollup.objects.all().delete()
+
+        # Only the users asked for
+        self.assertEqual(backfill(user_ids=[self.other.id], batch_size=1), (1, 1))
+        self.assertEqual(DailyRevenueRollup.objects.filter(user=self.user).count(), 0)
+        self.assertEqual(backfill(batch_size=1), (4, 3))
+        self.assertEqual(verify(), [])
+        self.assertEqual(self.totals(MonthlyRevenueRollup, month=date(2024, 4, 1))['invoiced_count'], 2)
+
+    def test_verify_command(self):
+        invoice = self.invoice(date(2024, 4, 1))
+        out = io.StringIO()
+        call_command('verify_revenue_rollups', stdout=out)
+        self.assertIn('match', out.getvalue())
+
+        Invoice.objects.filter(pk=invoice.pk).update(status='paid')
+        with self.assertRaises(CommandError):
+            call_command('verify_revenue_rollups', stdout=io.StringIO())
+        call_command('verify_revenue_rollups', fix=True, stdout=io.StringIO())
+        # --fix recomputes days, and their months with them
+        self.assertEqual(verify(), [])
+
+        call_command('backfill_revenue_rollups', user='rollup-owner', stdout=io.StringIO())
+        self.assertEqual(verify(), [])
+
+    def test_timeseries_fills_empty_periods(self):
+        self.invoice(date(2024, 4, 1))
+        self.invoice(date(2024, 6, 3), status='paid')
+        points = timeseries(self.user, 'month', date(2024, 4, 10), date(2024, 6, 10))
+        self.assertEqual([(point['period'], point['invoiced'], point['paid']) for point in points], [
+            ('2024-04-01', '1180.00', '0.00'), ('2024-05-01', '0.00', '0.00'), ('2024-06-01', '1180.00', '1180.00'),
+        ])
+        self.assertEqual(len(timeseries(self.user, 'day', date(2024, 4, 1), date(2024, 4, 30))), 30)
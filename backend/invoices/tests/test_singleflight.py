@@ -0,0 +1,112 @@
+"""
+Single-flight
+Overlapping identical calls share one run, within a process and across workers sharing the cache (singleflight.py)
+"""
+
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from invoices import singleflight
+from invoices.singleflight import flight_key, local_counts, single_flight
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.runs = 0
+
+    def work(self, value='result'):
+        self.runs += 1
+        return value
+
+    def outcomes(self, before, name='summary'):
+        after = local_counts()[name]
+        return {outcome: after[outcome] - before[name][outcome] for outcome in singleflight.OUTCOMES}
+
+    def test_overlapping_threads_share_one_run(self):
+        before = local_counts()
+        release = threading.Event()
+        results = []
+
+        def slow():
+            release.wait(5)
+            return self.work()
+
+        def call():
+            results.append(single_flight('summary', (1, 'etag'), slow))
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # Let the followers find the leader's flight before it finishes
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(self.outcomes(before), {'leader': 1, 'local': 3, 'remote': 0, 'fallback': 0})
+
+    def test_the_leaders_error_reaches_the_threads_waiting_on_it(self):
+        release = threading.Event()
+        errors = []
+
+        def fail():
+            release.wait(5)
+            raise ValueError('render failed')
+
+        def call():
+            try:
+                single_flight('pdf', 'invoice', fail)
+            except ValueError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(errors, ['render failed'] * 3)
+        # Nothing is left behind for the next call
+        self.assertEqual(single_flight('pdf', 'invoice', self.work), 'result')
+
+    def test_calls_that_do_not_overlap_each_run(self):
+        self.assertEqual(single_flight('summary', 1, self.work), 'result')
+        self.assertEqual(single_flight('summary', 1, self.work), 'result')
+        self.assertEqual(single_flight('summary', 2, self.work), 'result')
+        self.assertEqual(self.runs, 3)
+
+    def test_a_result_published_by_another_worker(self):
+        before = local_counts()
+        full_key = flight_key('summary', 'shared')
+        cache.set(f'{full_key}:lock', 'other-worker')
+        cache.set(f'{full_key}:other-worker', ('from elsewhere',))
+        self.assertEqual(single_flight('summary', 'shared', self.work), 'from elsewhere')
+        self.assertEqual(self.runs, 0)
+        self.assertEqual(self.outcomes(before)['remote'], 1)
+
+    def test_runs_anyway_when_another_worker_holds_the_lock_too_long(self):
+        before = local_counts()
+        cache.set(f"{flight_key('summary', 'stuck')}:lock", 'other-worker')
+        with mock.patch.object(singleflight, 'WAIT_TIMEOUT', 0.1):
+            self.assertEqual(single_flight('summary', 'stuck', self.work), 'result')
+        self.assertEqual(self.outcomes(before)['fallback'], 1)
+
+    def test_the_leader_publishes_its_result_and_releases_the_lock(self):
+        single_flight('summary', 'published', self.work)
+        full_key = flight_key('summary', 'published')
+        self.assertIsNone(cache.get(f'{full_key}:lock'))
+
+    def test_counting_makes_no_cache_round_trips(self):
+        with mock.patch.object(singleflight, 'cache', wraps=cache) as counted:
+            single_flight('summary', 'counted', self.work)
+        # Take the lock, publish, check and release it; nothing for the outcome count
+        self.assertEqual([call[0] for call in counted.method_calls], ['add', 'set', 'get', 'delete'])
@@ -0,0 +1,35 @@
+"""
+Worker startup budget
+Boots a fresh interpreter per worker type with ``-X importtime`` and fails if a heavy SDK is imported at boot
+"""
+
+from django.test import SimpleTestCase
+from django.utils.functional import empty
+
+from benchmarks.startup import measure
+
+# Generous ceilings: these catch an SDK creeping back into module scope, not small regressions
+BOOT_BUDGET_MS = 3000
+RSS_BUDGET_MB = 150
+
+
+class WorkerStartupTests(SimpleTestCase):
+
+    def check_worker(self, worker):
+        report = measure(worker)
+        self.assertEqual(report['heavy'], [], f"{worker} worker imports {report['heavy']} at boot")
+        self.assertLess(report['boot_ms'], BOOT_BUDGET_MS)
+        if report['rss_kb'] is not None:
+            self.assertLess(report['rss_kb'] / 1024, RSS_BUDGET_MB)
+
+    def test_web_worker(self):
+        self.check_worker('web')
+
+    def test_celery_worker(self):
+        self.check_worker('celery')
+
+    def test_clients_are_not_built_on_import(self):
+        from invoices import services, urls  # noqa: F401
+
+        for name in ('razorpay_client', 'supabase_service', 'mongodb_service'):
+            self.assertIs(getattr(services, name)._wrapped, empty, name)
@@ -0,0 +1,41 @@
+"""
+Deletion side effects
+Deleting an invoice leaves a tombstone for delta sync; deleting its owner takes everything with it
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from invoices.models import DailyRevenueRollup, Invoice, InvoiceItem, InvoiceTombstone
+
+
+class DeletionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('tombstone-owner')
+        self.invoice = Invoice.objects.create(
+            user=self.user, invoice_number='INV-T-0001', client_name='Client', client_email='client@example.com',
+            issue_date=date(2024, 4, 1), due_date=date(2024, 5, 1),
+        )
+        InvoiceItem.objects.create(invoice=self.invoice, description='Design', quantity=Decimal('2'),
+                                   unit_price=Decimal('500.00'))
+
+    def test_deleting_an_invoice_leaves_a_tombstone(self):
+        invoice_id = self.invoice.id
+        self.invoice.delete()
+        tombstone = InvoiceTombstone.objects.get(invoice_id=invoice_id)
+        self.assertEqual(tombstone.user_id, self.user.id)
+
+    def test_deleting_a_user_with_invoices(self):
+        self.user.delete()
+        self.assertFalse(Invoice.objects.exists())
+        self.assertFalse(InvoiceTombstone.objects.exists())
+        self.assertFalse(DailyRevenueRollup.objects.exists())
+
+    def test_deleting_users_in_bulk(self):
+        User.objects.filter(username__startswith='tombstone-').delete()
+        self.assertFalse(Invoice.objects.exists())
+        self.assertFalse(InvoiceTombstone.objects.exists())
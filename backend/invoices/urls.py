@@ -1,18 +1,24 @@
-from django.urls import path
+from django.urls import path, re_path
 from .views import (
     InvoiceListCreateView, InvoiceDetailView, InvoiceSummaryView,
     generate_razorpay_payment_link, download_pdf, send_reminder,
-    mark_as_paid, recent_invoices, razorpay_webhook
+    mark_as_paid, recent_invoices, razorpay_webhook, gstr1_report, invoice_aging,
+    revenue_timeseries, export_invoices, start_invoice_import, import_job_detail,
+    resume_import_job, batch_invoices, batch_invoice_status, invoice_changes, single_flight_metrics,
+    dashboard
 )
 from .supabase_views import (
     SupabaseInvoiceListCreateView,
     SupabaseInvoiceDetailView,
     supabase_invoice_summary,
     supabase_recent_invoices,
+    supabase_invoice_changes,
+    supabase_dashboard_view,
     mark_invoice_as_paid,
     download_invoice_pdf,
     generate_payment_link
 )
+from . import async_views, repository_views
 from .pdf_views import (
     generate_invoice_pdf,
     preview_invoice_html,
@@ -24,17 +30,31 @@ urlpatterns = [
     path('invoices/', InvoiceListCreateView.as_view(), name='invoice-list-create'),
     path('invoices/<uuid:pk>/', InvoiceDetailView.as_view(), name='invoice-detail'),
     path('invoices/summary/', InvoiceSummaryView.as_view(), name='invoice-summary'),
+    path('invoices/dashboard/', dashboard, name='invoice-dashboard'),
     path('invoices/<uuid:invoice_id>/razorpay-link/', generate_razorpay_payment_link, name='generate-razorpay-link'),
     path('invoices/<uuid:invoice_id>/pdf/', download_pdf, name='download-pdf'),
     path('invoices/<uuid:invoice_id>/send-reminder/', send_reminder, name='send-reminder'),
     path('invoices/<uuid:invoice_id>/mark-paid/', mark_as_paid, name='mark-as-paid'),
     path('invoices/recent/', recent_invoices, name='recent-invoices'),
+    path('invoices/changes/', invoice_changes, name='invoice-changes'),
+    path('invoices/batch/', batch_invoices, name='invoice-batch'),
+    path('invoices/batch-status/', batch_invoice_status, name='invoice-batch-status'),
+    path('invoices/gstr1/', gstr1_report, name='gstr1-report'),
+    path('invoices/aging/', invoice_aging, name='invoice-aging'),
+    path('invoices/timeseries/', revenue_timeseries, name='revenue-timeseries'),
+    path('invoices/import/', start_invoice_import, name='invoice-import'),
+    path('invoices/import/<uuid:job_id>/', import_job_detail, name='invoice-import-detail'),
+    path('invoices/import/<uuid:job_id>/resume/', resume_import_job, name='invoice-import-resume'),
+    re_path(r'^invoices/export\.(?P<file_type>csv|xlsx)$', export_invoices, name='invoice-export'),
     path('webhook/razorpay/', razorpay_webhook, name='razorpay-webhook'),
+    path('metrics/single-flight/', single_flight_metrics, name='single-flight-metrics'),
     
     # Supabase-based views (Real-time)
+    path('dashboard/', supabase_dashboard_view, name='dashboard'),
     path('supabase/invoices/', SupabaseInvoiceListCreateView.as_view(), name='supabase-invoice-list-create'),
     path('supabase/invoices/summary/', supabase_invoice_summary, name='supabase-invoice-summary'),
     path('supabase/invoices/recent/', supabase_recent_invoices, name='supabase-recent-invoices'),
+    path('supabase/invoices/changes/', supabase_invoice_changes, name='supabase-invoice-changes'),
     path('supabase/invoices/<str:pk>/', SupabaseInvoiceDetailView.as_view(), name='supabase-invoice-detail'),
     path('supabase/invoices/<str:invoice_id>/mark-paid/', mark_invoice_as_paid, name='supabase-mark-invoice-paid'),
     path('supabase/invoices/<str:invoice_id>/pdf/', download_invoice_pdf, name='supabase-download-pdf'),
@@ -44,4 +64,20 @@ urlpatterns = [
     path('supabase/invoices/<str:invoice_id>/pdf-template/', generate_invoice_pdf, name='generate-invoice-pdf'),
     path('supabase/invoices/<str:invoice_id>/preview/', preview_invoice_html, name='preview-invoice-html'),
     path('preview/sample-invoice/', preview_sample_invoice, name='preview-sample-invoice'),
+    
+    # Async Supabase reads, for ASGI workers (gunicorn -c gunicorn_asgi.py)
+    path('async/dashboard/', async_views.dashboard, name='async-dashboard'),
+    path('async/supabase/invoices/', async_views.invoice_list, name='async-supabase-invoice-list'),
+    path('async/supabase/invoices/summary/', async_views.invoice_summary, name='async-supabase-invoice-summary'),
+    path('async/supabase/invoices/recent/', async_views.recent_invoices, name='async-supabase-recent-invoices'),
+    path('async/supabase/invoices/<str:pk>/', async_views.invoice_detail, name='async-supabase-invoice-detail'),
+    
+    # One set of views over whichever store INVOICE_REPOSITORY selects
+    path('v2/invoices/', repository_views.invoice_list, name='v2-invoice-list'),
+    path('v2/invoices/summary/', repository_views.invoice_summary, name='v2-invoice-summary'),
+    path('v2/invoices/recent/', repository_views.recent_invoices, name='v2-recent-invoices'),
+    path('v2/invoices/<str:invoice_id>/', repository_views.invoice_detail, name='v2-invoice-detail'),
+    path('v2/invoices/<str:invoice_id>/pdf/', repository_views.invoice_pdf, name='v2-invoice-pdf'),
+    path('v2/invoices/<str:invoice_id>/payment-link/', repository_views.invoice_payment_link, name='v2-invoice-payment-link'),
+    path('v2/invoices/<str:invoice_id>/mark-paid/', repository_views.invoice_mark_paid, name='v2-invoice-mark-paid'),
 ]
@@ -5,37 +5,48 @@ from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from django.db.models import Sum, Count
 from django.http import HttpResponse
+from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.conf import settings
-import razorpay
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import time
 
-from .models import Invoice, InvoiceItem, Payment
+from hisabpro.metrics import timed_pdf
+from hisabpro.routers import replica_reads
+
+from .aging import get_aging
+from .conditional import cached_body, list_etag, make_etag, not_modified, orm_watermark, set_validators
+from .dashboard import orm_dashboard, orm_summary, server_timing
+from .batch import MAX_BATCH_BYTES, MAX_BATCH_SIZE, STATUS_TRANSITIONS, BatchWriter, batch_status
+from .exports import export_rows, filtered_invoices
+from .gstr import SECTIONS as GSTR1_SECTIONS, SECTION_COLUMNS, GSTR1Report
+from .importer import READERS as IMPORT_READERS
+from .models import ImportJob, Invoice, InvoiceItem, Payment
+from .money import Money
+from .rollups import timeseries
+from .services import razorpay_client
 from .serializers import (
     InvoiceSerializer, InvoiceCreateSerializer, InvoiceSummarySerializer,
-    RazorpayPaymentLinkSerializer, SendReminderSerializer
+    RazorpayPaymentLinkSerializer, SendReminderSerializer, ImportJobSerializer
 )
+from .singleflight import local_counts, single_flight, stats as single_flight_stats
+from .streaming import csv_response, dict_values, xlsx_response
+from .sync import CursorExpired, orm_changes, page_size
 
-# Configure Razorpay
-razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
+MAX_TIMESERIES_DAYS = 366
 
+@method_decorator(replica_reads, name='list')
 class InvoiceListCreateView(generics.ListCreateAPIView):
     serializer_class = InvoiceSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Invoice.objects.filter(user=self.request.user)
+        # The nested user, items and payments would otherwise cost three queries per invoice on the page
+        return Invoice.objects.filter(user=self.request.user).select_related('user').prefetch_related('items', 'payments')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -51,36 +62,48 @@ class InvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Invoice.objects.filter(user=self.request.user)
+        invoices = Invoice.objects.filter(user=self.request.user)
+        if self.request.method == 'GET':
+            return invoices.select_related('user').prefetch_related('items', 'payments')
+        return invoices
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return InvoiceCreateSerializer
         return InvoiceSerializer
+    
+    def retrieve(self, request, *args, **kwargs):
+        # Item edits save the invoice, so updated_at plus the payment count covers the whole body
+        row = Invoice.objects.filter(user=request.user, pk=kwargs['pk']).annotate(
+            payment_count=Count('payments')
+        ).values('updated_at', 'payment_count').first()
+        if row is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = make_etag('invoice', kwargs['pk'], row['updated_at'].isoformat(), row['payment_count'])
+        response = not_modified(request, etag, row['updated_at'])
+        if response is not None:
+            return response
+        return set_validators(super().retrieve(request, *args, **kwargs), etag, row['updated_at'])
 
 
+@method_decorator(replica_reads, name='get')
 class InvoiceSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
         user_invoices = Invoice.objects.filter(user=request.user)
+        watermark = orm_watermark(user_invoices)
+        etag = list_etag('summary', request.user.id, watermark)
+        response = not_modified(request, etag, watermark[0])
+        if response is not None:
+            return response
         
-        summary = {
-            'total_invoices': user_invoices.count(),
-            'pending_invoices': user_invoices.filter(status='pending').count(),
-            'paid_invoices': user_invoices.filter(status='paid').count(),
-            'overdue_invoices': user_invoices.filter(status='overdue').count(),
-            'total_pending_amount': user_invoices.filter(status='pending').aggregate(
-                total=Sum('total_amount'))['total'] or 0,
-            'total_paid_amount': user_invoices.filter(status='paid').aggregate(
-                total=Sum('total_amount'))['total'] or 0,
-            'total_overdue_amount': user_invoices.filter(status='overdue').aggregate(
-                total=Sum('total_amount'))['total'] or 0,
-            'total_amount': user_invoices.aggregate(total=Sum('total_amount'))['total'] or 0,
-        }
+        def build():
+            return orm_summary(user_invoices)
         
-        serializer = InvoiceSummarySerializer(summary)
-        return Response(serializer.data)
+        # The dashboard fires several requests at once; identical ones share one aggregation
+        data = single_flight('summary', (request.user.id, etag), build)
+        return set_validators(Response(data), etag, watermark[0])
 
 
 @api_view(['POST'])
@@ -89,41 +112,45 @@ def generate_razorpay_payment_link(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id, user=request.user)
     
     try:
-        # Create Razorpay order
-        order_data = {
-            'amount': int(invoice.total_amount * 100),  # Convert to paise
-            'currency': 'INR',
-            'receipt': f'invoice_{invoice.invoice_number}',
-            'notes': {
-                'invoice_number': invoice.invoice_number,
-                'client_name': invoice.client_name,
+        def create():
+            amount_paise = Money.from_decimal(invoice.total_amount).paise
+            
+            # Create Razorpay order
+            order_data = {
+                'amount': amount_paise,
+                'currency': 'INR',
+                'receipt': f'invoice_{invoice.invoice_number}',
+                'notes': {
+                    'invoice_number': invoice.invoice_number,
+                    'client_name': invoice.client_name,
+                }
             }
-        }
-        
-        order = razorpay_client.order.create(data=order_data)
-        
-        # Create payment link
-        payment_link_data = {
-            'amount': int(invoice.total_amount * 100),
-            'currency': 'INR',
-            'accept_partial': False,
-            'reference_id': f'invoice_{invoice.invoice_number}',
-            'description': f'Payment for Invoice #{invoice.invoice_number}',
-            'callback_url': f'{settings.FRONTEND_URL}/payment-success',
-            'callback_method': 'get',
-        }
-        
-        payment_link = razorpay_client.payment_link.create(data=payment_link_data)
-        
-        # Save payment link and order ID to invoice
-        invoice.razorpay_payment_link = payment_link['short_url']
-        invoice.razorpay_order_id = order['id']
-        invoice.save()
+            
+            order = razorpay_client.order.create(data=order_data)
+            
+            # Create payment link
+            payment_link_data = {
+                'amount': amount_paise,
+                'currency': 'INR',
+                'accept_partial': False,
+                'reference_id': f'invoice_{invoice.invoice_number}',
+                'description': f'Payment for Invoice #{invoice.invoice_number}',
+                'callback_url': f'{settings.FRONTEND_URL}/payment-success',
+                'callback_method': 'get',
+            }
+            
+            payment_link = razorpay_client.payment_link.create(data=payment_link_data)
+            
+            # Save payment link and order ID to invoice
+            invoice.razorpay_payment_link = payment_link['short_url']
+            invoice.razorpay_order_id = order['id']
+            invoice.save()
+            
+            return {'payment_link': payment_link['short_url'], 'order_id': order['id']}
         
-        serializer = RazorpayPaymentLinkSerializer({
-            'payment_link': payment_link['short_url'],
-            'order_id': order['id']
-        })
+        # A double-click must not open two Razorpay orders for the same invoice
+        link = single_flight('payment-link', (invoice.id, invoice.total_amount), create)
+        serializer = RazorpayPaymentLinkSerializer(link)
         return Response(serializer.data)
     
     except Exception as e:
@@ -133,149 +160,19 @@ def generate_razorpay_payment_link(request, invoice_id):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def download_pdf(request, invoice_id):
-    invoice = get_object_or_404(Invoice, id=invoice_id, user=request.user)
+    # The PDF header shows the seller's name and profile
+    invoice = get_object_or_404(Invoice.objects.select_related('user__userprofile'), id=invoice_id, user=request.user)
     
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
+    # ReportLab is only loaded by workers that actually render a PDF
+    from .pdf_render import render_invoice_pdf
     
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER
+    # Repeated clicks on "Download PDF" share one render of this version of the invoice
+    pdf_bytes = single_flight(
+        'pdf', ('orm', invoice.id, invoice.updated_at), lambda: timed_pdf('reportlab', render_invoice_pdf, invoice),
     )
     
-    # Header
-    elements.append(Paragraph(f"INVOICE #{invoice.invoice_number}", title_style))
-    elements.append(Spacer(1, 20))
-    
-    # Company and Client Info
-    company_info = []
-    if invoice.user.userprofile.company_name:
-        company_info.append([Paragraph(f"<b>From:</b>", styles['Normal']), 
-                           Paragraph(invoice.user.userprofile.company_name, styles['Normal'])])
-    if invoice.user.userprofile.address:
-        company_info.append(['', Paragraph(invoice.user.userprofile.address, styles['Normal'])])
-    if invoice.user.userprofile.phone:
-        company_info.append(['', Paragraph(f"Phone: {invoice.user.userprofile.phone}", styles['Normal'])])
-    if invoice.user.userprofile.gst_number:
-        company_info.append(['', Paragraph(f"GST: {invoice.user.userprofile.gst_number}", styles['Normal'])])
-    
-    client_info = []
-    client_info.append([Paragraph(f"<b>To:</b>", styles['Normal']), 
-                       Paragraph(invoice.client_name, styles['Normal'])])
-    if invoice.client_address:
-        client_info.append(['', Paragraph(invoice.client_address, styles['Normal'])])
-    if invoice.client_phone:
-        client_info.append(['', Paragraph(f"Phone: {invoice.client_phone}", styles['Normal'])])
-    if invoice.client_email:
-        client_info.append(['', Paragraph(f"Email: {invoice.client_email}", styles['Normal'])])
-    
-    # Combine company and client info
-    info_data = []
-    for i in range(max(len(company_info), len(client_info))):
-        row = []
-        if i < len(company_info):
-            row.extend(company_info[i])
-        else:
-            row.extend(['', ''])
-        if i < len(client_info):
-            row.extend(client_info[i])
-        else:
-            row.extend(['', ''])
-        info_data.append(row)
-    
-    info_table = Table(info_data, colWidths=[1*inch, 2*inch, 1*inch, 2*inch])
-    info_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 20))
-    
-    # Invoice Details
-    details_data = [
-        ['Issue Date:', invoice.issue_date.strftime('%B %d, %Y')],
-        ['Due Date:', invoice.due_date.strftime('%B %d, %Y')],
-        ['Status:', invoice.status.title()],
-    ]
-    
-    details_table = Table(details_data, colWidths=[1*inch, 2*inch])
-    details_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(details_table)
-    elements.append(Spacer(1, 20))
-    
-    # Items Table
-    items_data = [['Description', 'Quantity', 'Unit Price', 'Total']]
-    for item in invoice.items.all():
-        items_data.append([
-            item.description,
-            str(item.quantity),
-            f"₹{item.unit_price:,.2f}",
-            f"₹{item.total:,.2f}"
-        ])
-    
-    items_table = Table(items_data, colWidths=[3*inch, 1*inch, 1*inch, 1*inch])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-    ]))
-    elements.append(items_table)
-    elements.append(Spacer(1, 20))
-    
-    # Totals
-    totals_data = [
-        ['Subtotal:', f"₹{invoice.subtotal:,.2f}"],
-        ['Tax ({:.1f}%):'.format(invoice.tax_rate), f"₹{invoice.tax_amount:,.2f}"],
-        ['Total:', f"₹{invoice.total_amount:,.2f}"],
-    ]
-    
-    totals_table = Table(totals_data, colWidths=[4*inch, 2*inch])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, -1), (1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (1, -1), 14),
-        ('LINEABOVE', (0, -1), (1, -1), 1, colors.black),
-    ]))
-    elements.append(totals_table)
-    
-    # Notes and Terms
-    if invoice.notes:
-        elements.append(Spacer(1, 20))
-        elements.append(Paragraph(f"<b>Notes:</b>", styles['Heading3']))
-        elements.append(Paragraph(invoice.notes, styles['Normal']))
-    
-    if invoice.terms_conditions:
-        elements.append(Spacer(1, 20))
-        elements.append(Paragraph(f"<b>Terms & Conditions:</b>", styles['Heading3']))
-        elements.append(Paragraph(invoice.terms_conditions, styles['Normal']))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
     # Create response
-    response = HttpResponse(buffer, content_type='application/pdf')
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.pdf"'
     return response
 
@@ -346,11 +243,49 @@ def mark_as_paid(request, invoice_id):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@replica_reads
 def recent_invoices(request):
     """Get recent invoices for dashboard"""
-    invoices = Invoice.objects.filter(user=request.user).order_by('-created_at')[:5]
+    user_invoices = Invoice.objects.filter(user=request.user)
+    watermark = orm_watermark(user_invoices)
+    etag = list_etag('recent', request.user.id, watermark)
+    response = not_modified(request, etag, watermark[0])
+    if response is not None:
+        return response
+    invoices = user_invoices.select_related('user').prefetch_related('items', 'payments').order_by('-created_at')[:5]
     serializer = InvoiceSerializer(invoices, many=True)
-    return Response(serializer.data)
+    return set_validators(Response(serializer.data), etag, watermark[0])
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@replica_reads
+def dashboard(request):
+    """Summary, recent invoices, overdue counts and aging for the dashboard in one round trip"""
+    started = time.perf_counter()
+    today = timezone.localdate()
+    user_invoices = Invoice.objects.filter(user=request.user)
+    watermark = orm_watermark(user_invoices)
+    # Aging buckets move at midnight, so the day is part of the validator
+    etag = list_etag(f'dashboard:{today.isoformat()}', request.user.id, watermark)
+    response = not_modified(request, etag, watermark[0])
+    if response is not None:
+        return response
+
+    timings = {}
+
+    def build():
+        payload, section_timings = orm_dashboard(request.user, today)
+        timings.update(section_timings)
+        return payload
+
+    data = single_flight('dashboard', (request.user.id, etag), lambda: cached_body('dashboard', request.user.id, etag, build))
+    response = set_validators(Response(data), etag, watermark[0])
+    # Sections only appear when this request built the payload; otherwise it came from the cache
+    timings = timings or {'cache': 0}
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    response['Server-Timing'] = server_timing(timings)
+    return response
 
 
 @api_view(['POST'])
@@ -378,7 +313,7 @@ def razorpay_webhook(request):
             # Extract payment details
             payment_id = entity_data.get('id')
             order_id = entity_data.get('order_id')
-            amount = entity_data.get('amount') / 100  # Convert from paise to rupees
+            amount = Money(entity_data.get('amount') or 0)  # Razorpay reports paise
             status = entity_data.get('status')
             
             # Find the invoice by order ID
@@ -389,7 +324,7 @@ def razorpay_webhook(request):
                     # Create payment record
                     Payment.objects.create(
                         invoice=invoice,
-                        amount=amount,
+                        amount=amount.to_decimal(),
                         payment_method='razorpay',
                         transaction_id=payment_id,
                         status='completed',
@@ -428,3 +363,235 @@ def razorpay_webhook(request):
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@replica_reads
+def gstr1_report(request):
+    """GSTR-1 style return for a filing period; ?export=csv streams a single section"""
+    today = timezone.now().date()
+    try:
+        start = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if 'from' in request.GET else today.replace(day=1)
+        end = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if 'to' in request.GET else today
+    except ValueError:
+        return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({'error': '"from" must not be after "to"'}, status=status.HTTP_400_BAD_REQUEST)
+
+    report = GSTR1Report(request.user, start, end)
+    section = request.GET.get('section')
+    if section and section not in GSTR1_SECTIONS:
+        return Response({'error': f'Unknown section {section!r}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.GET.get('export') == 'csv':
+        section = section or 'b2b'
+        columns = SECTION_COLUMNS[section]
+        return csv_response(
+            columns, dict_values(columns, report.section(section)),
+            f'gstr1-{section}-{start.isoformat()}-{end.isoformat()}.csv',
+        )
+
+    data = {
+        'period': {'from': start.isoformat(), 'to': end.isoformat()},
+        'seller_state': report.seller_state,
+    }
+    if section:
+        data[section] = list(report.section(section))
+    else:
+        data['summary'] = report.summary()
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@replica_reads
+def invoice_aging(request):
+    """Outstanding receivables bucketed by days past due, per client and overall"""
+    return Response(get_aging(request.user))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@replica_reads
+def revenue_timeseries(request):
+    """Invoiced, paid and outstanding totals per day or month, read from the rollup tables"""
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in ('day', 'month'):
+        return Response({'error': 'granularity must be "day" or "month"'}, status=status.HTTP_400_BAD_REQUEST)
+
+    today = timezone.now().date()
+    default_span = 365 if granularity == 'month' else 30
+    try:
+        end = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if 'to' in request.GET else today
+        start = (datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if 'from' in request.GET
+                 else end - timedelta(days=default_span))
+    except ValueError:
+        return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({'error': '"from" must not be after "to"'}, status=status.HTTP_400_BAD_REQUEST)
+    if granularity == 'day' and (end - start).days > MAX_TIMESERIES_DAYS:
+        return Response(
+            {'error': f'Daily series are limited to {MAX_TIMESERIES_DAYS} days; use granularity=month'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response({
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'points': timeseries(request.user, granularity, start, end),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@replica_reads
+def export_invoices(request, file_type):
+    """Stream the user's invoices (or, with ?items=1, their line items) as CSV or XLSX"""
+    try:
+        invoices = filtered_invoices(request.user, request.GET)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    items = request.GET.get('items') in ('1', 'true')
+    header, rows = export_rows(invoices, items=items)
+    filename = f"{'invoice-items' if items else 'invoices'}-{timezone.now():%Y%m%d}.{file_type}"
+    if file_type == 'xlsx':
+        return xlsx_response(header, rows, filename, sheet_name='Items' if items else 'Invoices')
+    return csv_response(header, rows, filename)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def start_invoice_import(request):
+    """Upload a CSV or JSON Lines file and import it in the background"""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Attach the file to import as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+    file_format = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+    if file_format == 'json':
+        file_format = 'jsonl'
+    if file_format not in IMPORT_READERS:
+        return Response({'error': 'format must be csv or jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = ImportJob(user=request.user, format=file_format)
+    job.source_path = default_storage.save(f'imports/{job.id}.{file_format}', upload)
+    job.save()
+    return _queue_import(job)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def import_job_detail(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+    return Response(ImportJobSerializer(job).data)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def resume_import_job(request, job_id):
+    """Re-queue a failed import; it continues after the last committed chunk"""
+    job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+    if job.status in ('completed', 'running'):
+        return Response({'error': f'Import job is {job.status}'}, status=status.HTTP_409_CONFLICT)
+    return _queue_import(job)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_changes(request):
+    """Invoices created, updated or deleted after ?since=<cursor>; follow next_cursor while has_more"""
+    try:
+        page = orm_changes(request.user, request.GET.get('since'), page_size(request.GET))
+    except CursorExpired as e:
+        return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(page.as_dict(InvoiceSerializer(page.changes, many=True).data))
+
+
+def _batch_entries(request, key):
+    """Pull the list under ``key`` from a batch request, or return an error Response"""
+    try:
+        size = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return None, Response({'error': 'Invalid Content-Length header'}, status=status.HTTP_400_BAD_REQUEST)
+    if size > MAX_BATCH_BYTES:
+        return None, Response(
+            {'error': f'Batch requests are limited to {MAX_BATCH_BYTES} bytes'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    entries = request.data.get(key) if isinstance(request.data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return None, Response({'error': f'"{key}" must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(entries) > MAX_BATCH_SIZE:
+        return None, Response(
+            {'error': f'Batch requests are limited to {MAX_BATCH_SIZE} entries, got {len(entries)}'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    return entries, None
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_invoices(request):
+    """Create (no "id") or update (with "id") many invoices in one transaction; results are per entry"""
+    entries, error = _batch_entries(request, 'invoices')
+    if error:
+        return error
+    results, timing = BatchWriter(request.user).apply(entries)
+    failed = sum(result['status'] == 'error' for result in results)
+    return Response({
+        'created': sum(result['status'] == 'created' for result in results),
+        'updated': sum(result['status'] == 'updated' for result in results),
+        'failed': failed,
+        'results': results,
+        'timing_ms': timing,
+    }, status=status.HTTP_400_BAD_REQUEST if failed == len(results) else status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_invoice_status(request):
+    """Mark many invoices paid or cancelled with a single UPDATE"""
+    # _batch_entries checks the size before anything reads request.data
+    ids, error = _batch_entries(request, 'ids')
+    if error:
+        return error
+    new_status = request.data.get('status')
+    if new_status not in STATUS_TRANSITIONS:
+        return Response(
+            {'error': f"status must be one of {', '.join(sorted(STATUS_TRANSITIONS))}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    results, timing = batch_status(request.user, ids, new_status)
+    return Response({
+        'status': new_status,
+        'updated': sum(result['status'] == 'updated' for result in results),
+        'unchanged': sum(result['status'] == 'unchanged' for result in results),
+        'failed': sum(result['status'] == 'error' for result in results),
+        'results': results,
+        'timing_ms': timing,
+    })
+
+
+def _queue_import(job):
+    from hisabpro.tasks import run_import_job
+    try:
+        run_import_job.delay(str(job.id))
+    except Exception as e:
+        job.status = 'failed'
+        job.message = f'Could not queue import: {e}'
+        job.save(update_fields=['status', 'message', 'updated_at'])
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def single_flight_metrics(request):
+    """How many requests joined another identical request instead of running their own work"""
+    flights = single_flight_stats()
+    collapsed = {name: counts['local'] + counts['remote'] for name, counts in flights.items()}
+    return Response({'flights': flights, 'collapsed': collapsed, 'process': local_counts()})
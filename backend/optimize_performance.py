@@ -6,18 +6,18 @@ Performance Optimization Script for HisabPro
 import os
 import sys
 import django
-import time
 import psutil
 import requests
 from datetime import datetime
+from prometheus_client.parser import text_string_to_metric_families
 
 # Setup Django
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hisabpro.settings')
 django.setup()
 
-from lib.mongodb import mongodb_service
-from invoices.mongodb_models import MongoDBInvoice, MongoDBInvoiceItem
+from invoices.mongo_indexes import MONGO_INDEXES, ensure_mongo_indexes
+from invoices.services import mongodb_service
 
 def check_system_performance():
     """Check system performance metrics"""
@@ -44,7 +44,7 @@ def check_system_performance():
     return cpu_percent < 80 and memory.percent < 80 and disk_ok
 
 def optimize_mongodb_indexes():
-    """Create and optimize MongoDB indexes"""
+    """Create the MongoDB indexes (the same set manage.py ensure_indexes creates on deploy)"""
     print("\n🗄️ MongoDB Index Optimization")
     print("=" * 50)
     
@@ -54,126 +54,64 @@ def optimize_mongodb_indexes():
             print("❌ MongoDB connection failed")
             return False
         
-        # Create indexes for better performance
-        indexes_created = []
+        failed = ensure_mongo_indexes(mongodb_service.db, force=True)
+        for collection, indexes in MONGO_INDEXES.items():
+            for keys, options in indexes:
+                mark = "⚠️" if (collection, keys) in failed else "✅"
+                unique = " (unique)" if options.get('unique') else ""
+                print(f"   {mark} {collection}: {' + '.join(field for field, _ in keys)}{unique}")
         
-        # Invoice indexes
-        try:
-            mongodb_service.db.invoices.create_index([("user_id", 1), ("created_at", -1)])
-            indexes_created.append("invoices: user_id + created_at")
-        except Exception as e:
-            print(f"⚠️ Invoice index already exists: {str(e)}")
-        
-        try:
-            mongodb_service.db.invoices.create_index([("invoice_number", 1)], unique=True)
-            indexes_created.append("invoices: invoice_number (unique)")
-        except Exception as e:
-            print(f"⚠️ Invoice number index already exists: {str(e)}")
-        
-        try:
-            mongodb_service.db.invoices.create_index([("status", 1)])
-            indexes_created.append("invoices: status")
-        except Exception as e:
-            print(f"⚠️ Status index already exists: {str(e)}")
-        
-        # Invoice items indexes
-        try:
-            mongodb_service.db.invoice_items.create_index([("invoice_id", 1)])
-            indexes_created.append("invoice_items: invoice_id")
-        except Exception as e:
-            print(f"⚠️ Invoice items index already exists: {str(e)}")
-        
-        print(f"✅ Created {len(indexes_created)} indexes:")
-        for index in indexes_created:
-            print(f"   - {index}")
-        
-        return True
+        return not failed
         
     except Exception as e:
         print(f"❌ Error optimizing indexes: {str(e)}")
         return False
 
-def test_api_performance():
-    """Test API endpoint performance"""
-    print("\n🌐 API Performance Test")
+def report_api_metrics():
+    """Summarise the live request metrics a running server exposes at /metrics"""
+    print("\n🌐 API Performance (from /metrics)")
     print("=" * 50)
     
-    base_url = "http://localhost:8000/api"
-    endpoints = [
-        "/mongodb/invoices/summary/",
-        "/mongodb/invoices/recent/",
-        "/mongodb/invoices/",
-    ]
+    url = os.environ.get('METRICS_URL', 'http://localhost:8000/metrics')
+    token = os.environ.get('METRICS_TOKEN', '')
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    try:
+        response = requests.get(url, headers=headers, timeout=10)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Could not read {url}: {str(e)}")
+        return []
+    
+    latency, errors, cache = {}, {}, {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            if sample.name.startswith('hisabpro_http_request_duration_seconds_'):
+                totals = latency.setdefault(sample.labels['view'], {'sum': 0.0, 'count': 0.0})
+                if sample.name.endswith('_sum'):
+                    totals['sum'] += sample.value
+                elif sample.name.endswith('_count'):
+                    totals['count'] += sample.value
+            elif sample.name == 'hisabpro_http_request_errors_total':
+                errors[sample.labels['view']] = errors.get(sample.labels['view'], 0) + sample.value
+            elif sample.name == 'hisabpro_cache_lookups_total':
+                cache[sample.labels['result']] = sample.value
     
     results = []
-    
-    for endpoint in endpoints:
-        try:
-            start_time = time.time()
-            response = requests.get(f"{base_url}{endpoint}", timeout=10)
-            end_time = time.time()
-            
-            response_time = (end_time - start_time) * 1000  # Convert to milliseconds
-            
-            if response.status_code in [200, 401]:
-                status = "✅ Success"
-            else:
-                status = f"⚠️ Status {response.status_code}"
-            
-            print(f"{endpoint}: {status} ({response_time:.2f}ms)")
-            results.append(response_time)
-            
-        except requests.exceptions.ConnectionError:
-            print(f"{endpoint}: ❌ Server not running")
-        except Exception as e:
-            print(f"{endpoint}: ❌ Error: {str(e)}")
-    
-    if results:
-        avg_response_time = sum(results) / len(results)
-        print(f"\n📊 Average Response Time: {avg_response_time:.2f}ms")
-        
-        if avg_response_time < 500:
-            print("✅ API performance is excellent!")
-        elif avg_response_time < 1000:
-            print("⚠️ API performance is good, but could be optimized")
-        else:
-            print("❌ API performance needs improvement")
-    
+    for view, totals in sorted(latency.items(), key=lambda item: -item[1]['sum']):
+        if not totals['count']:
+            continue
+        average = totals['sum'] / totals['count'] * 1000
+        print(f"{view}: {average:.2f}ms average over {int(totals['count'])} requests, "
+              f"{int(errors.get(view, 0))} errors")
+        results.append(average)
+    
+    lookups = cache.get('hit', 0) + cache.get('miss', 0)
+    if lookups:
+        print(f"\n📊 Cache hit ratio: {cache.get('hit', 0) / lookups:.1%} of {int(lookups)} lookups")
+    if not results:
+        print("No requests recorded yet")
     return results
 
-def optimize_database_queries():
-    """Optimize database queries"""
-    print("\n🔍 Database Query Optimization")
-    print("=" * 50)
-    
-    try:
-        mongodb_service.connect()
-        if not mongodb_service._connected:
-            print("❌ MongoDB connection failed")
-            return False
-        
-        # Test query performance
-        start_time = time.time()
-        
-        # Test invoice retrieval
-        invoices = MongoDBInvoice.get_by_user(1, limit=10)
-        query_time = (time.time() - start_time) * 1000
-        
-        print(f"✅ Invoice query performance: {query_time:.2f}ms for {len(invoices)} invoices")
-        
-        if query_time < 100:
-            print("✅ Query performance is excellent!")
-        elif query_time < 500:
-            print("⚠️ Query performance is good")
-        else:
-            print("❌ Query performance needs optimization")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error testing queries: {str(e)}")
-        return False
-
 def create_performance_report():
     """Create a comprehensive performance report"""
     print("\n📋 Performance Report")
@@ -183,8 +121,7 @@ def create_performance_report():
         'timestamp': datetime.now().isoformat(),
         'system_performance': check_system_performance(),
         'mongodb_optimized': optimize_mongodb_indexes(),
-        'api_performance': test_api_performance(),
-        'query_optimization': optimize_database_queries()
+        'api_performance': report_api_metrics(),
     }
     
     # Save report
@@ -205,13 +142,9 @@ def create_performance_report():
             f.write("API Performance: ")
             if report['api_performance']:
                 avg_time = sum(report['api_performance']) / len(report['api_performance'])
-                f.write(f"✅ {avg_time:.2f}ms average")
+                f.write(f"✅ {avg_time:.2f}ms average across endpoints (live figures at /metrics)")
             else:
-                f.write("❌ Failed to test")
-            f.write("\n")
-            
-            f.write("Query Optimization: ")
-            f.write("✅ Complete" if report['query_optimization'] else "❌ Failed")
+                f.write("❌ No metrics available")
             f.write("\n")
         
         print("✅ Performance report saved to 'performance_report.txt'")
@@ -235,7 +168,7 @@ def main():
     print("2. Keep MongoDB indexes up to date")
     print("3. Use pagination for large datasets")
     print("4. Implement caching for frequently accessed data")
-    print("5. Monitor API response times")
+    print("5. Watch API response times at /metrics")
 
 if __name__ == '__main__':
     main()
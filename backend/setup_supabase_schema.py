@@ -111,6 +111,56 @@ def setup_supabase_schema():
             CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice_id ON invoice_items(invoice_id);
             CREATE INDEX IF NOT EXISTS idx_payments_invoice_id ON payments(invoice_id);
             CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status);
+            CREATE INDEX IF NOT EXISTS idx_invoices_user_updated ON invoices(user_id, updated_at, id);
+            """,
+
+            """
+            -- Delta sync: keep updated_at current and leave a tombstone behind on delete
+            CREATE TABLE IF NOT EXISTS invoice_tombstones (
+                invoice_id UUID PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                invoice_number VARCHAR(50),
+                deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+            CREATE INDEX IF NOT EXISTS idx_invoice_tombstones_user_deleted
+                ON invoice_tombstones(user_id, deleted_at, invoice_id);
+
+            CREATE OR REPLACE FUNCTION touch_invoice() RETURNS TRIGGER AS $$
+            BEGIN
+                NEW.updated_at = NOW();
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION touch_invoice_from_item() RETURNS TRIGGER AS $$
+            BEGIN
+                UPDATE invoices SET updated_at = NOW() WHERE id = COALESCE(NEW.invoice_id, OLD.invoice_id);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION record_invoice_tombstone() RETURNS TRIGGER AS $$
+            BEGIN
+                INSERT INTO invoice_tombstones (invoice_id, user_id, invoice_number, deleted_at)
+                VALUES (OLD.id, OLD.user_id, OLD.invoice_number, NOW())
+                ON CONFLICT (invoice_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS invoices_touch ON invoices;
+            CREATE TRIGGER invoices_touch BEFORE UPDATE ON invoices
+                FOR EACH ROW EXECUTE FUNCTION touch_invoice();
+            DROP TRIGGER IF EXISTS invoice_items_touch ON invoice_items;
+            CREATE TRIGGER invoice_items_touch AFTER INSERT OR UPDATE OR DELETE ON invoice_items
+                FOR EACH ROW EXECUTE FUNCTION touch_invoice_from_item();
+            DROP TRIGGER IF EXISTS invoices_tombstone ON invoices;
+            CREATE TRIGGER invoices_tombstone AFTER DELETE ON invoices
+                FOR EACH ROW EXECUTE FUNCTION record_invoice_tombstone();
+
+            ALTER TABLE invoice_tombstones ENABLE ROW LEVEL SECURITY;
+            CREATE POLICY "Users can view own invoice tombstones" ON invoice_tombstones
+                FOR SELECT USING (user_id = auth.uid());
             """,
             
             """
@@ -233,6 +283,7 @@ def setup_supabase_schema():
         print("   - invoices")
         print("   - invoice_items")
         print("   - payments")
+        print("   - invoice_tombstones")
         print("\n🔒 Row Level Security (RLS) enabled with policies")
         print("📊 Indexes created for better performance")
         
@@ -67,12 +67,12 @@ function DashboardContent() {
     try {
       console.log('Loading dashboard data...');
       
-      // Load summary data
-      const summaryResponse = await invoiceAPI.getSummary();
-      console.log('Summary response:', summaryResponse);
+      // Summary and recent invoices arrive together from the combined dashboard endpoint
+      const dashboardResponse = await invoiceAPI.getDashboard();
+      console.log('Dashboard response:', dashboardResponse);
       
       // Handle summary data - it might be a single object or have a different structure
-      let summaryData = summaryResponse.data;
+      let summaryData = dashboardResponse.data?.summary;
       if (summaryData && typeof summaryData === 'object') {
         // If it's a single invoice object, create a summary from it
         if (summaryData.invoice_number) {
@@ -90,12 +90,8 @@ function DashboardContent() {
       }
       setSummary(summaryData);
       
-      // Load recent invoices data
-      const recentResponse = await invoiceAPI.getRecent();
-      console.log('Recent response:', recentResponse);
-      
       // Handle recent invoices data - it might be a single object or an array
-      let recentData = recentResponse.data;
+      let recentData = dashboardResponse.data?.recent;
       if (recentData && typeof recentData === 'object') {
         // If it's a single invoice object, wrap it in an array
         if (recentData.invoice_number) {
@@ -84,6 +84,7 @@ export const invoiceAPI = {
   deleteInvoice: (id: string) => api.delete(`/supabase/invoices/${id}/`),
   getSummary: () => api.get('/supabase/invoices/summary/'),
   getRecent: () => api.get('/supabase/invoices/recent/'),
+  getDashboard: () => api.get('/dashboard/'),
   generatePaymentLink: (id: string) => api.post(`/supabase/invoices/${id}/payment-link/`),
   downloadPDF: (id: string) => api.get(`/supabase/invoices/${id}/pdf/`, { responseType: 'blob' }),
   sendReminder: (id: string, data?: any) => api.post(`/invoices/${id}/send-reminder/`, data),